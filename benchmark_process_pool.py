@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+プロセスプールのベンチマークスクリプト
+LLM抽出済みの特徴の正規化・CVSS評価について、ワーカー数ごとのスループットとプロセス内処理との比を表示します
+
+使い方:
+    python benchmark_process_pool.py --items 20000 --workers 1,2,4,8,16,32
+    python benchmark_process_pool.py --normalized   # 正規化器を使わずCVSSロジック評価のみを計測
+"""
+
+import os
+import sys
+import time
+import argparse
+from pathlib import Path
+
+# プロジェクトのルートを追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+from mcp_threat_extraction.process_pool import ShardProcessPool, score_shard
+from mcp_threat_extraction.threat_data import ASSET_CLASSIFICATION
+
+# LLMが返す表記ゆれを含む未正規化の値（--normalizedなしの場合は正規化器を通る）
+RAW_ATTACK_VECTORS = ["インターネット経由", "USBメモリ", "院内Wi-Fi", "ローカル端末", "物理的な接触"]
+RAW_DATA_TYPES = ["患者の診療記録", "MRI画像", "心電図の波形", "投薬スケジュール", "装置の設定値"]
+RAW_IMPACT_TYPES = ["情報漏洩", "データ改ざん", "サービス停止"]
+
+NORMALIZED_ATTACK_VECTORS = ["network", "usb", "wireless", "local", "physical"]
+NORMALIZED_DATA_TYPES = ["personal_medical", "diagnostic_imaging", "vital_biometric", "medication_protocol",
+                         "device_configuration"]
+NORMALIZED_IMPACT_TYPES = ["機密性重視", "完全性重視", "可用性重視"]
+
+
+def make_items(count: int, normalized: bool) -> list:
+    """機器・攻撃経路・データ種別を組み合わせた評価対象"""
+    devices = [device for asset in ASSET_CLASSIFICATION.values() for device in asset["devices"]]
+    attack_types = ["マルウェア感染", "ファームウェア改ざん", "DoS攻撃", "不正アクセス"]
+    items = []
+    for i in range(count):
+        device = devices[i % len(devices)]
+        attack_type = attack_types[i % len(attack_types)]
+        features = {
+            "device_type": device,
+            "attack_type": attack_type,
+            "requires_authentication": i % 2 == 0,
+            "requires_user_interaction": i % 3 == 0,
+            "asset_category": ""
+        }
+        if normalized:
+            features.update({
+                "attack_vector": NORMALIZED_ATTACK_VECTORS[i % 5],
+                "data_type": [NORMALIZED_DATA_TYPES[i % 5]],
+                "impact_type": [NORMALIZED_IMPACT_TYPES[i % 3]]
+            })
+        else:
+            features.update({
+                "attack_vector": RAW_ATTACK_VECTORS[i % 5],
+                "data_type": [RAW_DATA_TYPES[i % 5]],
+                "impact_type": [RAW_IMPACT_TYPES[i % 3]]
+            })
+        threat = f"攻撃者が{features['attack_vector']}から{device}に{attack_type}を行った（{i}）"
+        items.append((threat, None, features) if normalized else (threat, features, None))
+    return items
+
+
+def run_in_process(items: list, shard_size: int) -> float:
+    """プロセス内で順に処理した秒数（基準値）"""
+    score_shard(items[:shard_size], "none", True)  # 正規化器・エンジンの初期化を計測から除く
+    start = time.perf_counter()
+    for i in range(0, len(items), shard_size):
+        score_shard(items[i:i + shard_size], "none", True)
+    return time.perf_counter() - start
+
+
+def run_with_pool(items: list, workers: int, shard_size: int) -> float:
+    """ワーカー数workersで処理した秒数（ワーカーの起動・初期化は計測から除く）"""
+    with ShardProcessPool(workers=workers) as pool:
+        pool.warm_up()
+        shards = (items[i:i + shard_size] for i in range(0, len(items), shard_size))
+        start = time.perf_counter()
+        count = sum(len(results) for results in pool.map(shards, "none", compact=True))
+        elapsed = time.perf_counter() - start
+    assert count == len(items)
+    return elapsed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="プロセスプールのベンチマーク")
+    parser.add_argument("--items", type=int, default=5000)
+    parser.add_argument("--workers", default=None, help="カンマ区切りのワーカー数（既定: 1,2,4,...,CPU数）")
+    parser.add_argument("--shard-size", type=int, default=64)
+    parser.add_argument("--normalized", action="store_true", help="正規化済みの特徴を入力し、CVSSロジック評価のみを計測")
+    args = parser.parse_args()
+
+    cpu_count = os.cpu_count() or 1
+    if args.workers:
+        worker_counts = [int(w) for w in args.workers.split(",")]
+    else:
+        worker_counts = [1]
+        while worker_counts[-1] * 2 <= cpu_count:
+            worker_counts.append(worker_counts[-1] * 2)
+        if worker_counts[-1] != cpu_count:
+            worker_counts.append(cpu_count)
+
+    items = make_items(args.items, args.normalized)
+    stage = "CVSSロジック評価のみ" if args.normalized else "正規化＋CVSSロジック評価"
+    print(f"対象: {stage} / {args.items}件 / シャード{args.shard_size}件 / CPU {cpu_count}コア")
+
+    baseline = run_in_process(items, args.shard_size)
+    print(f"{'workers':>8} {'秒':>9} {'件/秒':>10} {'速度比':>8} {'効率':>6}")
+    print(f"{'in-proc':>8} {baseline:>9.2f} {args.items / baseline:>10.1f} {1.0:>8.2f} {'-':>6}")
+
+    for workers in worker_counts:
+        elapsed = run_with_pool(items, workers, args.shard_size)
+        speedup = baseline / elapsed
+        print(f"{workers:>8} {elapsed:>9.2f} {args.items / elapsed:>10.1f} {speedup:>8.2f} {speedup / workers:>6.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
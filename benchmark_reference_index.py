@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+参照文索引のベンチマークスクリプト
+参照文の件数ごとに、総当たりとIVFの構築時間・検索レイテンシ・再現率を表示します
+
+参照文エンベディングは、カテゴリ → 話題 → 文の3階層でばらつかせた合成ベクトルです
+（インシデント報告から集めた参照文が、カテゴリ内でいくつかの話題にまとまる状況を模しています）
+
+使い方:
+    python benchmark_reference_index.py --sizes 1000,10000,100000 --nprobe 4,8,16
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+# プロジェクトのルートを追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+from mcp_threat_extraction.reference_index import BruteForceIndex, IVFIndex, normalize_rows
+
+
+def make_corpus(count: int, categories: int, dim: int, noise: float, rng: np.random.Generator):
+    """合成の参照文エンベディングとカテゴリ番号、同じ分布から引いた入力文の生成関数"""
+    topics_per_category = max(1, int(np.sqrt(count / categories)))
+    category_centers = normalize_rows(rng.standard_normal((categories, dim)))
+    topic_centers = normalize_rows(
+        np.repeat(category_centers, topics_per_category, axis=0)
+        + 0.8 * normalize_rows(rng.standard_normal((categories * topics_per_category, dim)))
+    )
+
+    def sample(n: int):
+        topics = rng.integers(0, len(topic_centers), n)
+        vectors = topic_centers[topics] + noise * normalize_rows(rng.standard_normal((n, dim)))
+        return normalize_rows(vectors), topics // topics_per_category
+
+    vectors, labels = sample(count)
+    return vectors, labels, sample
+
+
+def measure(index, queries: np.ndarray):
+    """検索結果とレイテンシ（ミリ秒）のp50・p99"""
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(index.label_scores(query))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(results), np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="参照文索引のベンチマーク")
+    parser.add_argument("--sizes", default="1000,10000,50000,100000", help="カンマ区切りの参照文の件数")
+    parser.add_argument("--nprobe", default="4,8,16", help="カンマ区切りのIVFの探索クラスタ数")
+    parser.add_argument("--categories", type=int, default=7)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--noise", type=float, default=1.0, help="話題の中心からの文のばらつき（大きいほど近似が難しい）")
+    parser.add_argument("--threshold", type=float, default=0.55, help="カテゴリを採用する類似度の閾値")
+    args = parser.parse_args()
+
+    categories = [f"category_{i}" for i in range(args.categories)]
+    print(f"{'件数':>8} {'索引':>10} {'構築秒':>8} {'p50 ms':>8} {'p99 ms':>8} {'最近傍再現率':>12} {'判定一致率':>10}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        rng = np.random.default_rng(size)
+        vectors, labels, sample = make_corpus(size, args.categories, args.dim, args.noise, rng)
+        queries, _ = sample(args.queries)
+
+        start = time.perf_counter()
+        brute = BruteForceIndex(vectors, labels, categories)
+        build = time.perf_counter() - start
+        exact, p50, p99 = measure(brute, queries)
+        exact_best = exact.argmax(axis=1)
+        exact_decision = np.where(exact.max(axis=1) >= args.threshold, exact_best, -1)
+        print(f"{size:>8} {'brute':>10} {build:>8.2f} {p50:>8.3f} {p99:>8.3f} {1.0:>12.3f} {1.0:>10.3f}")
+
+        for nprobe in (int(n) for n in args.nprobe.split(",")):
+            start = time.perf_counter()
+            ivf = IVFIndex(vectors, labels, categories, nprobe=nprobe)
+            build = time.perf_counter() - start
+            approx, p50, p99 = measure(ivf, queries)
+            # 最近傍再現率: 最も近い参照文（全カテゴリの最大類似度）を見つけられた割合
+            recall = np.mean(np.isclose(approx.max(axis=1), exact.max(axis=1), atol=1e-5))
+            decision = np.where(approx.max(axis=1) >= args.threshold, approx.argmax(axis=1), -1)
+            agreement = np.mean(decision == exact_decision)
+            name = f"ivf/{ivf.nlist}/{nprobe}"
+            print(f"{size:>8} {name:>10} {build:>8.2f} {p50:>8.3f} {p99:>8.3f} {recall:>12.3f} {agreement:>10.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+静的エンベディングのベンチマークスクリプト
+短い入力（攻撃経路・データ種別・影響種別の表記ゆれ）について、SentenceTransformerとの判定一致率と
+1件あたりの正規化レイテンシを表示します
+
+使い方:
+    python -m mcp_threat_extraction.static_embeddings distill ./static-minilm
+    python benchmark_static_embeddings.py ./static-minilm
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+# プロジェクトのルートを追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+from mcp_threat_extraction.semantic_normalizer_optimized import OptimizedSemanticNormalizer
+from mcp_threat_extraction.static_embeddings import StaticEmbeddingModel
+
+# LLMが返す1〜2語程度の値
+SHORT_INPUTS = {
+    "attack_vector": [
+        "インターネット経由", "ネットワーク", "リモート", "Web API", "外部ネットワーク", "VPN経由",
+        "USBメモリ", "USB", "外部記憶媒体", "リムーバブルメディア", "USBポート",
+        "Wi-Fi", "Bluetooth", "無線LAN", "院内Wi-Fi", "近距離無線",
+        "ローカル端末", "院内LAN", "内部ネットワーク", "隣接ネットワーク", "ローカル",
+        "物理的な接触", "物理アクセス", "機器の盗難", "物理", "直接操作"
+    ],
+    "data_type": [
+        "患者の診療記録", "電子カルテ", "患者情報", "個人情報", "病歴",
+        "MRI画像", "CT画像", "DICOM", "X線画像", "超音波画像",
+        "心電図の波形", "バイタルサイン", "血圧", "血糖値", "脳波",
+        "投薬スケジュール", "処方箋", "投与量", "治療計画", "薬剤情報",
+        "装置の設定値", "ファームウェア設定", "校正データ", "機器パラメータ",
+        "アクセスログ", "監査証跡", "ユーザー権限", "認証情報",
+        "匿名化データ", "研究データ", "統計情報"
+    ],
+    "impact_type": [
+        "情報漏洩", "盗聴", "不正閲覧", "データ窃取",
+        "データ改ざん", "書き換え", "不正変更", "偽装",
+        "サービス停止", "機能停止", "DoS", "業務中断"
+    ]
+}
+
+
+def run(normalizer: OptimizedSemanticNormalizer, repeat: int):
+    """各入力の判定結果と1件あたりのレイテンシ（ミリ秒）"""
+    decisions, latencies = {}, []
+    for _ in range(repeat):
+        for category_type, inputs in SHORT_INPUTS.items():
+            for text in inputs:
+                start = time.perf_counter()
+                decisions[(category_type, text)] = normalizer.find_best_match(text, category_type)
+                latencies.append((time.perf_counter() - start) * 1000)
+    return decisions, np.array(latencies)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="静的エンベディングのベンチマーク")
+    parser.add_argument("static_path", help="静的エンベディングのディレクトリ（distillの出力）")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2", help="比較するSentenceTransformerモデル")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    transformer = OptimizedSemanticNormalizer(args.model, backend="transformer")
+    transformer_init = time.perf_counter() - start
+    start = time.perf_counter()
+    static = OptimizedSemanticNormalizer(model=StaticEmbeddingModel(args.static_path))
+    static_init = time.perf_counter() - start
+
+    expected, transformer_latency = run(transformer, args.repeat)
+    actual, static_latency = run(static, args.repeat)
+
+    print(f"{'バックエンド':<12} {'初期化秒':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, init, latency in (("transformer", transformer_init, transformer_latency),
+                                ("static", static_init, static_latency)):
+        print(f"{name:<12} {init:>8.2f} {np.percentile(latency, 50):>8.3f} {np.percentile(latency, 99):>8.3f}")
+
+    print(f"\n{'種別':<14} {'件数':>4} {'一致率':>8}")
+    for category_type, inputs in SHORT_INPUTS.items():
+        agree = sum(expected[(category_type, text)] == actual[(category_type, text)] for text in inputs)
+        print(f"{category_type:<14} {len(inputs):>4} {agree / len(inputs):>8.1%}")
+    total = len(expected)
+    agree = sum(expected[key] == actual[key] for key in expected)
+    print(f"{'合計':<14} {total:>4} {agree / total:>8.1%}")
+
+    disagreements = [(key, expected[key], actual[key]) for key in expected if expected[key] != actual[key]]
+    for (category_type, text), want, got in disagreements:
+        print(f"  {category_type}: {text!r} transformer={want} static={got}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+HTTPサーバーの流入制御（アドミッションコントロール）
+エンドポイント種別（single / batch / normalize）ごとに同時処理数と待機数を制限し、
+上限を超えたリクエストには即座に429（Retry-After付き）を返す
+"""
+
+import os
+import math
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict
+
+from fastapi import HTTPException
+
+from .metrics import ADMISSION_QUEUE_WAIT, ADMISSION_REJECTED, ADMISSION_IN_FLIGHT, ADMISSION_QUEUED
+
+# エンドポイント種別ごとの既定値（同時処理数, 待機数）
+ADMISSION_DEFAULTS = {
+    "single": (32, 64),
+    "batch": (4, 8),
+    "normalize": (16, 32),
+}
+
+
+class AdmissionRejected(Exception):
+    """待機枠が埋まっているため受け付けられない"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    """同時処理数と待機数の上限を持つFIFOの受付窓口"""
+
+    def __init__(self, name: str, max_in_flight: int, max_queued: int, retry_after: int = 1):
+        self.name = name
+        self.max_in_flight = max(max_in_flight, 1)
+        self.max_queued = max(max_queued, 0)
+        self.retry_after = max(retry_after, 1)
+        self.in_flight = 0
+        self._waiters: deque = deque()
+        self._service_seconds = None  # 処理時間の指数移動平均（Retry-Afterの見積もりに使用）
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _update_gauges(self) -> None:
+        ADMISSION_IN_FLIGHT.labels(endpoint_class=self.name).set(self.in_flight)
+        ADMISSION_QUEUED.labels(endpoint_class=self.name).set(self.queued)
+
+    def estimate_retry_after(self) -> int:
+        """待機中のリクエストが捌けるまでの見込み秒数"""
+        if self._service_seconds is None:
+            return self.retry_after
+        rounds = self.queued / self.max_in_flight + 1
+        return max(self.retry_after, math.ceil(self._service_seconds * rounds))
+
+    async def acquire(self) -> float:
+        """処理枠を確保し、待機した秒数を返す（待機枠も埋まっていればAdmissionRejected）"""
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            self._update_gauges()
+            ADMISSION_QUEUE_WAIT.labels(endpoint_class=self.name).observe(0.0)
+            return 0.0
+
+        if len(self._waiters) >= self.max_queued:
+            ADMISSION_REJECTED.labels(endpoint_class=self.name).inc()
+            raise AdmissionRejected(self.estimate_retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self._update_gauges()
+        start = time.monotonic()
+        try:
+            # release()から処理枠がそのまま引き渡される
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 引き渡し後に取り消された場合は枠を返す
+                self.release()
+            elif future in self._waiters:
+                self._waiters.remove(future)
+                self._update_gauges()
+            raise
+        waited = time.monotonic() - start
+        ADMISSION_QUEUE_WAIT.labels(endpoint_class=self.name).observe(waited)
+        return waited
+
+    def release(self, service_seconds: float = None) -> None:
+        """処理枠を返し、待機中の先頭リクエストに引き渡す"""
+        if service_seconds is not None:
+            if self._service_seconds is None:
+                self._service_seconds = service_seconds
+            else:
+                self._service_seconds = 0.8 * self._service_seconds + 0.2 * service_seconds
+
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                self._update_gauges()
+                return
+        self.in_flight -= 1
+        self._update_gauges()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queued": self.max_queued,
+            "in_flight": self.in_flight,
+            "queued": self.queued
+        }
+
+
+def _create_limiter(endpoint_class: str) -> AdmissionLimiter:
+    """ADMISSION_<CLASS>_MAX_IN_FLIGHT / ADMISSION_<CLASS>_MAX_QUEUEDから上限を読み込む"""
+    max_in_flight, max_queued = ADMISSION_DEFAULTS[endpoint_class]
+    prefix = f"ADMISSION_{endpoint_class.upper()}"
+    return AdmissionLimiter(
+        endpoint_class,
+        int(os.getenv(f"{prefix}_MAX_IN_FLIGHT", str(max_in_flight))),
+        int(os.getenv(f"{prefix}_MAX_QUEUED", str(max_queued))),
+        int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+    )
+
+
+admission_limiters: Dict[str, AdmissionLimiter] = {
+    endpoint_class: _create_limiter(endpoint_class) for endpoint_class in ADMISSION_DEFAULTS
+}
+
+
+@asynccontextmanager
+async def admitted(endpoint_class: str):
+    """エンドポイント種別の処理枠を確保してブロックを実行する（MCPのツール呼び出し用、待機枠も埋まっていればAdmissionRejected）"""
+    limiter = admission_limiters[endpoint_class]
+    await limiter.acquire()
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        limiter.release(time.monotonic() - start)
+
+
+def admission(endpoint_class: str):
+    """FastAPIの依存関係: 処理枠を確保できなければ429を返し、レスポンス後に枠を解放する"""
+    limiter = admission_limiters[endpoint_class]
+
+    async def dependency():
+        try:
+            await limiter.acquire()
+        except AdmissionRejected as e:
+            raise HTTPException(
+                status_code=429,
+                detail=f"{endpoint_class}リクエストが混雑しています。しばらくしてから再試行してください",
+                headers={"Retry-After": str(e.retry_after)}
+            )
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            limiter.release(time.monotonic() - start)
+
+    return dependency
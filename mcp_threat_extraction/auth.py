@@ -1,16 +1,26 @@
 """
 Firebase認証モジュール
+Firebase Admin SDKによる検証に加え、ローカルにキャッシュしたJWKSでFirebase / OIDCのIDトークンを検証するバックエンドを提供する
 """
 
 import os
 import json
+import time
+import asyncio
+import hashlib
+import threading
+import urllib.request
+from collections import OrderedDict
 from typing import Optional, Dict, Any
 from fastapi import HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import firebase_admin
 from firebase_admin import credentials, auth
+from jose import jwt
+from jose.exceptions import JOSEError, ExpiredSignatureError
 from dotenv import load_dotenv
 from .logging_config import get_logger
+from .metrics import register_cache
 
 load_dotenv()
 
@@ -85,6 +95,178 @@ def initialize_firebase():
 # HTTPBearer認証スキーム
 security = HTTPBearer(auto_error=False)
 
+class TokenCache:
+    """検証済みIDトークンのLRUキャッシュ（トークンのハッシュをキーに、expまで保持）"""
+    
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+    
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """有効期限内のデコード済みトークンを返す（期限切れ・未登録はNone）"""
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                decoded, expires_at = entry
+                if time.time() < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return decoded
+                del self._entries[key]
+            self.misses += 1
+            return None
+    
+    def put(self, token: str, decoded: Dict[str, Any]) -> None:
+        """exp（秒）まで保持する。expのないトークンはキャッシュしない"""
+        expires_at = decoded.get("exp")
+        if not expires_at or self.max_size <= 0:
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (decoded, float(expires_at))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+token_cache = TokenCache(int(os.getenv("TOKEN_CACHE_SIZE", "10000")))
+register_cache("id_token", lambda: (token_cache.hits, token_cache.misses))
+
+# FirebaseのIDトークン署名鍵（JWKS形式）
+FIREBASE_JWKS_URL = "https://www.googleapis.com/service_accounts/v1/jwk/securetoken@system.gserviceaccount.com"
+
+class UnknownSigningKeyError(JOSEError):
+    """JWKSにトークンのkidに対応する鍵がない"""
+
+class JWKSKeyStore:
+    """
+    ファイルまたはURLから読み込んだJWKSを保持し、IDトークンの署名とクレームを検証する
+    既定のGoogle securetokenのJWKSは全Firebaseプロジェクトで共有されるため、iss・audは必須（常に検証する）
+    """
+    
+    def __init__(self, source: str, issuer: str, audience: str, refresh_interval: float = 300.0):
+        if not issuer or not audience:
+            raise ValueError("JWKS認証にはiss・audの指定が必要です"
+                             "（FIREBASE_PROJECT_ID、またはJWT_ISSUERとJWT_AUDIENCEを設定してください）")
+        self.source = source
+        self.issuer = issuer
+        self.audience = audience
+        self.refresh_interval = refresh_interval
+        self._keys: Dict[str, Dict[str, Any]] = {}
+        self._max_age: Optional[float] = None
+        self._lock = threading.Lock()
+        self.loaded_at: Optional[float] = None
+    
+    @property
+    def is_url(self) -> bool:
+        return self.source.startswith(("http://", "https://"))
+    
+    def _fetch(self):
+        """JWKSと（URLの場合）Cache-Controlのmax-ageを取得"""
+        if not self.is_url:
+            with open(self.source, encoding="utf-8") as f:
+                return json.load(f), None
+        
+        with urllib.request.urlopen(self.source, timeout=10) as response:
+            max_age = None
+            for directive in response.headers.get("Cache-Control", "").split(","):
+                name, _, value = directive.strip().partition("=")
+                if name == "max-age" and value.isdigit():
+                    max_age = float(value)
+            return json.loads(response.read()), max_age
+    
+    def refresh(self) -> int:
+        """JWKSを読み込み直し、鍵の数を返す（ブロッキング処理）"""
+        jwks, max_age = self._fetch()
+        keys = {key["kid"]: key for key in jwks.get("keys", []) if "kid" in key}
+        if not keys:
+            raise ValueError(f"JWKSに有効な鍵がありません: {self.source}")
+        with self._lock:
+            self._keys = keys
+            self._max_age = max_age
+            self.loaded_at = time.time()
+        logger.info(f"JWKS loaded: {len(keys)} keys from {self.source}")
+        return len(keys)
+    
+    def next_refresh_in(self) -> float:
+        """次の更新までの秒数（max-ageがあれば期限の8割の時点で更新する）"""
+        if self._max_age:
+            return max(min(self._max_age * 0.8, self.refresh_interval), 1.0)
+        return self.refresh_interval
+    
+    async def run_refresh_loop(self, retry_interval: float = 30.0) -> None:
+        """バックグラウンドで定期的にJWKSを更新する（失敗時は既存の鍵を使い続ける）"""
+        while True:
+            delay = self.next_refresh_in()
+            try:
+                await asyncio.sleep(delay)
+                await asyncio.to_thread(self.refresh)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"JWKS refresh failed ({self.source}): {e}")
+                await asyncio.sleep(retry_interval)
+    
+    def verify(self, token: str) -> Dict[str, Any]:
+        """署名・有効期限・iss/audを検証し、デコード済みクレームを返す"""
+        if self.loaded_at is None:
+            self.refresh()
+        
+        header = jwt.get_unverified_header(token)
+        with self._lock:
+            key = self._keys.get(header.get("kid"))
+        if key is None:
+            raise UnknownSigningKeyError(f"unknown key id: {header.get('kid')}")
+        
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=[key.get("alg", "RS256")],
+            audience=self.audience,
+            issuer=self.issuer,
+            options={"verify_aud": True, "verify_iss": True}
+        )
+        # Firebase Admin SDKと同様にsubをuidとして扱う
+        claims.setdefault("uid", claims.get("sub"))
+        return claims
+
+_jwks_store: Optional[JWKSKeyStore] = None
+
+def get_auth_backend() -> str:
+    """AUTH_BACKEND環境変数（firebase / jwks）"""
+    return os.getenv("AUTH_BACKEND", "firebase").lower()
+
+def get_jwks_store() -> JWKSKeyStore:
+    """環境変数からJWKSの取得元・iss・audを読み込み、鍵ストアを作成（iss・audが決まらない場合はValueError）"""
+    global _jwks_store
+    
+    if _jwks_store is None:
+        project_id = os.getenv("FIREBASE_PROJECT_ID")
+        _jwks_store = JWKSKeyStore(
+            os.getenv("JWKS_SOURCE", FIREBASE_JWKS_URL),
+            issuer=os.getenv("JWT_ISSUER", f"https://securetoken.google.com/{project_id}" if project_id else None),
+            audience=os.getenv("JWT_AUDIENCE", project_id),
+            refresh_interval=float(os.getenv("JWKS_REFRESH_INTERVAL", "300"))
+        )
+    return _jwks_store
+
+def get_token_verifier():
+    """設定されたバックエンドのトークン検証関数（ブロッキング）"""
+    if get_auth_backend() == "jwks":
+        return get_jwks_store().verify
+    return auth.verify_id_token
+
 async def verify_firebase_token(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)) -> Optional[Dict[str, Any]]:
     """
     Firebase IDトークンを検証する
@@ -103,20 +285,27 @@ async def verify_firebase_token(credentials: Optional[HTTPAuthorizationCredentia
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # 検証済みのトークンはexpまでキャッシュから返す
+    decoded_token = token_cache.get(credentials.credentials)
+    if decoded_token is not None:
+        return decoded_token
+    
     try:
-        # Firebase Admin SDKでトークンを検証
-        decoded_token = auth.verify_id_token(credentials.credentials)
+        # トークンを検証（署名検証・公開鍵の取得はワーカースレッドで実行）
+        decoded_token = await asyncio.to_thread(get_token_verifier(), credentials.credentials)
+        token_cache.put(credentials.credentials, decoded_token)
         return decoded_token
-    except auth.InvalidIdTokenError:
+    except (auth.ExpiredIdTokenError, ExpiredSignatureError):
+        # ExpiredIdTokenErrorはInvalidIdTokenErrorのサブクラスのため先に判定する
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="無効な認証トークンです",
+            detail="認証トークンが期限切れです",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    except auth.ExpiredIdTokenError:
+    except (auth.InvalidIdTokenError, JOSEError):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="認証トークンが期限切れです",
+            detail="無効な認証トークンです",
             headers={"WWW-Authenticate": "Bearer"},
         )
     except Exception as e:
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+JSONLファイルのストリーミング・再開可能なバッチ処理
+入力を1行ずつ読みながら並行処理し、完了した結果から順に出力へ追記する。
+チェックポイント（<出力>.ckpt）から中断した位置を再開できる
+
+入力の各行は {"threat_description": "...", "id": ...} 形式のJSONオブジェクト、またはJSON文字列。
+LLM抽出済みの特徴（features: LLMの出力 / extracted_features: 正規化済み）があればLLM呼び出しを省く
+出力の各行は {"line": 入力の行番号, "id": ..., "fingerprint": ..., ...結果} 形式（完了順）
+
+previousに前回の出力を指定すると、フィンガープリント（記述文・入力の特徴・出力形式・パイプラインの版）が
+一致する件は再計算せずに前回の結果を引き継ぐ（新規・変更された件だけを評価する）
+
+workersを指定すると、特徴の正規化・CVSS評価をシャード単位でワーカープロセスに分割する（LLM抽出済みの入力が対象）
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Set, TextIO, Tuple
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+ProcessFunc = Callable[[str], Awaitable[Dict[str, Any]]]
+
+
+def iter_input(path: str) -> Iterator[Tuple[int, str]]:
+    """入力を1行ずつ読み、(行番号, 前後の空白を除いた内容)を返す"""
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f):
+            yield line_number, line.strip()
+
+
+def count_items(path: str) -> int:
+    """空行を除いた入力件数（1行ずつ読むためメモリは一定）"""
+    return sum(1 for _, line in iter_input(path) if line)
+
+
+def parse_input_line(line: str) -> Tuple[str, Any, Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """入力1行から脅威記述文・ID・LLMの抽出結果・正規化済みの特徴を取り出す"""
+    item = json.loads(line)
+    if isinstance(item, str):
+        return item, None, None, None
+    if isinstance(item, dict) and isinstance(item.get("threat_description"), str):
+        return item["threat_description"], item.get("id"), item.get("features"), item.get("extracted_features")
+    raise ValueError("threat_descriptionがありません")
+
+
+def format_duration(seconds: float) -> str:
+    """残り時間の表示（時:分:秒）"""
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+class Checkpoint:
+    """
+    完了した行の記録
+    watermark未満の行はすべて完了済み、done_aboveはwatermark以上で完了済みの行。
+    output_offsetは記録時点の出力ファイルのサイズで、再開時はそこまで切り詰めて重複を防ぐ
+    """
+
+    def __init__(self, path: str, input_path: str):
+        self.path = path
+        self.input_path = os.path.abspath(input_path)
+        self.input_size = os.path.getsize(input_path)
+        self.watermark = 0
+        self.done_above: Set[int] = set()
+        self.completed = 0
+        self.errors = 0
+        self.output_offset = 0
+        self.finished = False
+
+    def is_done(self, line_number: int) -> bool:
+        return line_number < self.watermark or line_number in self.done_above
+
+    def mark_done(self, line_number: int, failed: bool) -> None:
+        self.done_above.add(line_number)
+        self.completed += 1
+        self.errors += failed
+
+    def mark_blank(self, line_number: int) -> None:
+        """空行は件数に含めず完了扱いにする"""
+        self.done_above.add(line_number)
+
+    def advance(self) -> None:
+        """連続して完了した行の分だけwatermarkを進める"""
+        while self.watermark in self.done_above:
+            self.done_above.discard(self.watermark)
+            self.watermark += 1
+
+    def load(self) -> bool:
+        """既存のチェックポイントを読み込む（入力が変わっていればValueError）"""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, encoding="utf-8") as f:
+            state = json.load(f)
+        if state["input_path"] != self.input_path or state["input_size"] != self.input_size:
+            raise ValueError(f"チェックポイントの入力ファイルが一致しません: {state['input_path']}")
+        self.watermark = state["watermark"]
+        self.done_above = set(state["done_above"])
+        self.completed = state["completed"]
+        self.errors = state["errors"]
+        self.output_offset = state["output_offset"]
+        self.finished = state["finished"]
+        return True
+
+    def save(self, output: TextIO) -> None:
+        """出力をディスクに書き出してから、一時ファイル経由で原子的に記録する"""
+        output.flush()
+        os.fsync(output.fileno())
+        self.output_offset = output.tell()
+        state = {
+            "input_path": self.input_path,
+            "input_size": self.input_size,
+            "watermark": self.watermark,
+            "done_above": sorted(self.done_above),
+            "completed": self.completed,
+            "errors": self.errors,
+            "output_offset": self.output_offset,
+            "finished": self.finished
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+
+class ProgressReporter:
+    """処理件数・スループット・残り時間を一定間隔で表示"""
+
+    def __init__(self, total: int, already_done: int, interval: float = 2.0, stream: Optional[TextIO] = None):
+        self.total = total
+        self.already_done = already_done
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self.processed = 0
+        self.start = time.monotonic()
+        self._last_report = self.start
+
+    @property
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.start
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def record(self) -> None:
+        """1件の完了を記録し、前回の表示から一定時間経っていれば表示する"""
+        self.processed += 1
+        if time.monotonic() - self._last_report >= self.interval:
+            self.report()
+
+    def report(self) -> None:
+        self._last_report = time.monotonic()
+        done = self.already_done + self.processed
+        percent = done / self.total * 100 if self.total else 100.0
+        rate = self.rate
+        eta = format_duration((self.total - done) / rate) if rate > 0 else "-"
+        print(f"処理済み {done}/{self.total} ({percent:.1f}%) {rate:.1f}件/秒 残り {eta}", file=self.stream, flush=True)
+
+
+async def run_batch(
+    input_path: str,
+    output_path: str,
+    process: Optional[ProcessFunc] = None,
+    concurrency: int = 8,
+    workers: int = 0,
+    shard_size: int = 64,
+    explain: str = "none",
+    fields: Optional[str] = None,
+    compact: bool = False,
+    restart: bool = False,
+    previous: Optional[str] = None,
+    checkpoint_every: int = 100,
+    checkpoint_interval: float = 5.0,
+    progress_interval: float = 2.0,
+    progress_stream: Optional[TextIO] = None
+) -> Dict[str, Any]:
+    """
+    JSONLの脅威記述文をストリーミングでCVSS評価し、結果をJSONLに追記する
+
+    Args:
+        input_path: 入力JSONL
+        output_path: 出力JSONL（チェックポイントは<出力>.ckpt）
+        process: 1件を処理する非同期関数（既定はLLM抽出＋CVSS計算）
+        concurrency: 同時に処理する件数（workers指定時は無視）
+        workers: ワーカープロセス数（0はプロセス内で処理）
+        shard_size: ワーカープロセスに1回で渡す件数
+        explain: ロジックパスの出力形式（none / ids / full）
+        fields: 結果に含めるフィールドのドット区切りパス（カンマ区切り）
+        compact: 記述文・抽出特徴を省く
+        restart: チェックポイントを無視して最初から処理する
+        previous: 前回の出力JSONL（フィンガープリントが一致する件の結果を引き継ぐ）
+        checkpoint_every: チェックポイントを記録する完了件数の間隔
+        checkpoint_interval: チェックポイントを記録する時間の間隔（秒）
+        progress_interval: 進捗を表示する間隔（秒）
+        progress_stream: 進捗の出力先（既定は標準エラー出力）
+
+    Returns:
+        処理件数・引き継いだ件数・エラー件数・経過時間・スループット
+    """
+    from .fingerprint import PreviousResults, item_fingerprint, output_options
+    from .server import calculate_cvss_async, parse_field_paths, shape_batch_result
+    from .executors import run_cpu
+    from .threat_extraction import build_cvss_result, score_raw_features
+
+    field_paths = parse_field_paths(fields)
+    options = output_options(explain, field_paths, compact)
+    if previous is not None and os.path.abspath(previous) == os.path.abspath(output_path):
+        raise ValueError("前回の出力と今回の出力には別のファイルを指定してください")
+    if workers > 0:
+        # 各ワーカーに2シャードずつ投入して待ち時間をなくす
+        concurrency = workers * 2
+    else:
+        shard_size = 1
+    concurrency = max(concurrency, 1)
+    shard_size = max(shard_size, 1)
+    # 先頭の遅いシャードが完了しない間に読み進める上限（完了記録のメモリを一定に保つ）
+    window = concurrency * shard_size * 16
+
+    checkpoint = Checkpoint(f"{output_path}.ckpt", input_path)
+    resumed = not restart and checkpoint.load()
+    if resumed and checkpoint.finished:
+        logger.info(f"Batch already finished: {output_path}")
+        return {"processed": 0, "reused": 0, "completed": checkpoint.completed, "errors": checkpoint.errors,
+                "elapsed": 0.0, "rate": 0.0}
+    previous_results = PreviousResults(previous) if previous is not None else None
+    if previous_results is not None:
+        logger.info(f"Previous results indexed: {len(previous_results)} items from {previous}")
+
+    # 最後のチェックポイント以降に書かれた結果は再処理するため切り詰める
+    mode = "r+" if resumed and os.path.exists(output_path) else "w"
+    output = open(output_path, mode, encoding="utf-8")
+    output.seek(checkpoint.output_offset if mode == "r+" else 0)
+    output.truncate()
+
+    progress = ProgressReporter(count_items(input_path), checkpoint.completed, progress_interval, progress_stream)
+    pool = None
+    if workers > 0:
+        from .process_pool import ShardProcessPool
+        pool = ShardProcessPool(workers)
+
+    async def process_item(threat: str, raw_features: Optional[dict], features: Optional[dict]) -> Dict[str, Any]:
+        """1件をプロセス内で処理（抽出済みの特徴があればLLMを呼ばない）"""
+        if process is not None:
+            return await process(threat)
+        if features is not None:
+            return await run_cpu(build_cvss_result, features, threat, explain)
+        if raw_features is not None:
+            return await run_cpu(score_raw_features, raw_features, threat, explain)
+        return await calculate_cvss_async(threat, explain)
+
+    async def process_shard(items: List[Tuple[str, Optional[dict], Optional[dict]]]) -> List[Dict[str, Any]]:
+        """シャードを処理して入力順の結果を返す"""
+        if pool is None:
+            results = []
+            for threat, raw_features, features in items:
+                try:
+                    results.append(await process_item(threat, raw_features, features))
+                except Exception as e:
+                    results.append({"threat_description": threat, "error": str(e)})
+            return results
+
+        scorable = [item for item in items if item[1] is not None or item[2] is not None]
+        scored = iter(await pool.run(scorable, explain, compact)) if scorable else iter(())
+        results = []
+        for threat, raw_features, features in items:
+            if raw_features is None and features is None:
+                result = {"error": "ワーカープロセスで処理するにはLLM抽出済みの特徴（features / extracted_features）が必要です"}
+            else:
+                result = next(scored)
+            # ワーカーは記述文を返さないため、ここで先頭に戻す
+            results.append({"threat_description": threat, **result})
+        return results
+
+    reused = 0
+
+    async def handle(shard: List[Tuple[int, str]]) -> List[Tuple[int, Dict[str, Any]]]:
+        nonlocal reused
+        parsed, items = [], []
+        for line_number, line in shard:
+            try:
+                threat, item_id, raw_features, features = parse_input_line(line)
+            except ValueError as e:
+                parsed.append((line_number, None, None, f"入力の形式が不正です: {e}"))
+                continue
+            fingerprint = item_fingerprint(threat, raw_features, features, options)
+            parsed.append((line_number, item_id, fingerprint, None))
+            if previous_results is None or fingerprint not in previous_results:
+                items.append((threat, raw_features, features))
+
+        results = iter(await process_shard(items))
+        handled = []
+        for line_number, item_id, fingerprint, parse_error in parsed:
+            if parse_error is not None:
+                handled.append((line_number, {"error": parse_error}))
+                continue
+            if previous_results is not None and fingerprint in previous_results:
+                # 変更のない件は前回の結果を引き継ぐ
+                result = previous_results.get(fingerprint)
+                reused += 1
+            else:
+                result = shape_batch_result(next(results), field_paths, compact)
+            result = {"fingerprint": fingerprint, **result}
+            if item_id is not None:
+                result = {"id": item_id, **result}
+            handled.append((line_number, result))
+        return handled
+
+    pending: Set[asyncio.Task] = set()
+    since_checkpoint = 0
+    last_checkpoint = time.monotonic()
+
+    def collect(done: Set[asyncio.Task]) -> None:
+        nonlocal since_checkpoint
+        for task in done:
+            for line_number, result in task.result():
+                output.write(json.dumps({"line": line_number, **result}, ensure_ascii=False) + "\n")
+                checkpoint.mark_done(line_number, "error" in result)
+                since_checkpoint += 1
+                progress.record()
+
+    def maybe_checkpoint() -> None:
+        nonlocal since_checkpoint, last_checkpoint
+        checkpoint.advance()
+        if since_checkpoint >= checkpoint_every or time.monotonic() - last_checkpoint >= checkpoint_interval:
+            checkpoint.save(output)
+            since_checkpoint = 0
+            last_checkpoint = time.monotonic()
+
+    start = time.monotonic()
+    shard: List[Tuple[int, str]] = []
+    try:
+        for line_number, line in iter_input(input_path):
+            if checkpoint.is_done(line_number):
+                continue
+            if not line:
+                checkpoint.mark_blank(line_number)
+                continue
+            shard.append((line_number, line))
+            if len(shard) < shard_size:
+                continue
+            while len(pending) >= concurrency or (pending and line_number - checkpoint.watermark >= window):
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                collect(done)
+                maybe_checkpoint()
+            pending.add(asyncio.create_task(handle(shard)))
+            shard = []
+
+        if shard:
+            pending.add(asyncio.create_task(handle(shard)))
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            collect(done)
+            maybe_checkpoint()
+        checkpoint.finished = True
+    finally:
+        # 中断時も書き出し済みの結果までを記録する（処理中の行は再開時にやり直す）
+        for task in pending:
+            task.cancel()
+        checkpoint.advance()
+        checkpoint.save(output)
+        output.close()
+        if pool is not None:
+            pool.shutdown()
+        if previous_results is not None:
+            previous_results.close()
+
+    progress.report()
+    elapsed = time.monotonic() - start
+    return {
+        "processed": progress.processed,
+        "reused": reused,
+        "completed": checkpoint.completed,
+        "errors": checkpoint.errors,
+        "elapsed": round(elapsed, 3),
+        "rate": round(progress.rate, 3)
+    }
@@ -1,21 +1,75 @@
 #!/usr/bin/env python3
 """
 CLI entry point for MCP Threat Extraction Server
+
+    mcp-threat-extraction                          # MCPサーバー（stdio）を起動
+    mcp-threat-extraction batch in.jsonl out.jsonl # JSONLのバッチ処理（中断しても再実行で再開）
 """
 
+import argparse
 import asyncio
 import sys
 from .server import main as server_main
+from .cvss_logic import LOGIC_PATH_DETAILS
+from .batch import run_batch
 from .logging_config import get_logger
 
 # Logger設定
 logger = get_logger(__name__)
 
+def build_parser() -> argparse.ArgumentParser:
+    """コマンドライン引数の定義"""
+    parser = argparse.ArgumentParser(prog="mcp-threat-extraction", description="MCP Threat Extraction Server")
+    subparsers = parser.add_subparsers(dest="command")
+
+    batch = subparsers.add_parser("batch", help="JSONLの脅威記述文をCVSS評価してJSONLに出力")
+    batch.add_argument("input", help="入力JSONL（各行に{\"threat_description\": ...}またはJSON文字列）")
+    batch.add_argument("output", help="出力JSONL（完了順に追記、チェックポイントは<出力>.ckpt）")
+    batch.add_argument("--concurrency", type=int, default=8, help="同時に処理する件数（既定8）")
+    batch.add_argument("--workers", type=int, default=0,
+                       help="正規化・CVSS評価を分割するワーカープロセス数（LLM抽出済みの特徴を含む入力が対象、既定0）")
+    batch.add_argument("--shard-size", type=int, default=64, help="ワーカープロセスに1回で渡す件数（既定64）")
+    batch.add_argument("--explain", choices=list(LOGIC_PATH_DETAILS), default="none", help="ロジックパスの出力形式（既定none）")
+    batch.add_argument("--fields", help="結果に含めるフィールドのドット区切りパス（カンマ区切り）")
+    batch.add_argument("--compact", action="store_true", help="記述文・抽出特徴を省く")
+    batch.add_argument("--restart", action="store_true", help="チェックポイントを無視して最初から処理する")
+    batch.add_argument("--previous", help="前回の出力JSONL（記述文・パイプラインの版が同じ件は再計算せずに引き継ぐ）")
+    batch.add_argument("--checkpoint-every", type=int, default=100, help="チェックポイントを記録する件数の間隔（既定100）")
+    return parser
+
+def run_batch_command(args: argparse.Namespace) -> int:
+    """batchサブコマンドを実行し、終了時に集計を表示する"""
+    summary = asyncio.run(run_batch(
+        args.input,
+        args.output,
+        concurrency=args.concurrency,
+        workers=args.workers,
+        shard_size=args.shard_size,
+        explain=args.explain,
+        fields=args.fields,
+        compact=args.compact,
+        restart=args.restart,
+        previous=args.previous,
+        checkpoint_every=args.checkpoint_every
+    ))
+    print(
+        f"完了: {summary['completed']}件（エラー {summary['errors']}件）、"
+        f"今回 {summary['processed']}件（引き継ぎ {summary['reused']}件） / {summary['elapsed']:.1f}秒 ({summary['rate']:.1f}件/秒)",
+        file=sys.stderr
+    )
+    return 0
+
 def main():
     """CLI entry point"""
+    args = build_parser().parse_args()
     try:
+        if args.command == "batch":
+            sys.exit(run_batch_command(args))
         asyncio.run(server_main())
     except KeyboardInterrupt:
+        if args.command == "batch":
+            logger.info("中断しました。同じコマンドを再実行すると続きから処理します。")
+            sys.exit(130)
         logger.info("サーバーを停止しました。")
         sys.exit(0)
     except Exception as e:
@@ -23,4 +77,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -4,8 +4,122 @@
 threat_generator.pyとthreat_extraction.pyで共有される機能
 """
 
-from typing import Dict, List, Tuple
-from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from functools import lru_cache, wraps
+import threading
+import time
+
+import numpy as np
+
+
+# CVSSv3.1ベースメトリクスの順序と許容値（ベクトル文字列・一括計算で共通）
+CVSS_BASE_METRICS = ("AV", "AC", "PR", "UI", "S", "C", "I", "A")
+CVSS_METRIC_VALUES = {
+    "AV": ("N", "A", "L", "P"),
+    "AC": ("L", "H"),
+    "PR": ("N", "L", "H"),
+    "UI": ("N", "R"),
+    "S": ("U", "C"),
+    "C": ("N", "L", "H"),
+    "I": ("N", "L", "H"),
+    "A": ("N", "L", "H"),
+}
+CVSS_VECTOR_PREFIXES = ("CVSS:3.1", "CVSS:3.0")
+SEVERITY_LABELS = np.array(["None", "Low", "Medium", "High", "Critical"])
+
+# CVSSv3.1現状評価基準（Temporal）の係数（X = 未評価）
+CVSS_TEMPORAL_WEIGHTS = {
+    "E": {"X": 1.0, "H": 1.0, "F": 0.97, "P": 0.94, "U": 0.91},
+    "RL": {"X": 1.0, "U": 1.0, "W": 0.97, "T": 0.96, "O": 0.95},
+    "RC": {"X": 1.0, "C": 1.0, "R": 0.96, "U": 0.92},
+}
+
+# CVSSv3.1環境評価基準（Environmental）のセキュリティ要求度の係数
+CVSS_REQUIREMENT_WEIGHTS = {"X": 1.0, "L": 0.5, "M": 1.0, "H": 1.5}
+CVSS_REQUIREMENT_METRICS = ("CR", "IR", "AR")
+
+# 環境評価基準の修正ベースメトリクス（M + ベースメトリクス名、X = ベース値を使用）
+CVSS_MODIFIED_METRICS = tuple(f"M{key}" for key in CVSS_BASE_METRICS)
+
+# ベース以外にベクトル文字列で受け付けるメトリクスと許容値
+CVSS_OPTIONAL_METRIC_VALUES = {
+    **{key: tuple(weights) for key, weights in CVSS_TEMPORAL_WEIGHTS.items()},
+    **{key: tuple(CVSS_REQUIREMENT_WEIGHTS) for key in CVSS_REQUIREMENT_METRICS},
+    **{f"M{key}": CVSS_METRIC_VALUES[key] + ("X",) for key in CVSS_BASE_METRICS},
+}
+
+# 資産分類の優先度からセキュリティ要求度への対応
+# （最優先の属性はH、優先属性は標準のM、優先度の定めがない属性はL）
+PRIORITY_TO_REQUIREMENT = {"highest": "H", "high": "M"}
+DEFAULT_REQUIREMENT = "L"
+
+
+def derive_requirement_profiles(asset_classification: dict) -> Dict[str, Dict[str, str]]:
+    """
+    ASSET_CLASSIFICATIONの機密性・完全性・可用性の優先度から資産分類ごとのCR/IR/ARを導出
+    
+    Returns:
+        {"life_critical": {"CR": "L", "IR": "M", "AR": "H"}, ...}
+    """
+    priorities = {
+        "CR": "confidentiality_priority",
+        "IR": "integrity_priority",
+        "AR": "availability_priority",
+    }
+    return {
+        asset_class: {
+            metric: PRIORITY_TO_REQUIREMENT.get(details.get(priority), DEFAULT_REQUIREMENT)
+            for metric, priority in priorities.items()
+        }
+        for asset_class, details in asset_classification.items()
+    }
+
+
+def parse_cvss_vector(vector: str) -> Dict[str, str]:
+    """
+    CVSSv3.xベクトル文字列をメトリクス辞書に分解
+    
+    Args:
+        vector: "CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:H/A:H" 形式の文字列
+    
+    Returns:
+        {"AV": "N", "AC": "L", ...} 形式の辞書（ベース以外のメトリクスも含む）
+    
+    Raises:
+        ValueError: 形式が不正、またはベースメトリクスが欠けている場合
+    """
+    parts = vector.strip().split("/")
+    if parts and parts[0].startswith("CVSS:"):
+        if parts[0] not in CVSS_VECTOR_PREFIXES:
+            raise ValueError(f"Unsupported CVSS version: {parts[0]}")
+        parts = parts[1:]
+    
+    metrics = {}
+    for part in parts:
+        key, sep, value = part.partition(":")
+        if not sep or not key or not value:
+            raise ValueError(f"Invalid CVSS vector component '{part}' in '{vector}'")
+        if key in metrics:
+            raise ValueError(f"Duplicate CVSS metric '{key}' in '{vector}'")
+        metrics[key] = value
+    
+    for key in CVSS_BASE_METRICS:
+        if key not in metrics:
+            raise ValueError(f"Missing CVSS base metric '{key}' in '{vector}'")
+        if metrics[key] not in CVSS_METRIC_VALUES[key]:
+            raise ValueError(f"Invalid value '{metrics[key]}' for CVSS metric '{key}' in '{vector}'")
+    
+    for key, value in metrics.items():
+        if key in CVSS_METRIC_VALUES:
+            continue
+        if key not in CVSS_OPTIONAL_METRIC_VALUES:
+            raise ValueError(f"Unknown CVSS metric '{key}' in '{vector}'")
+        if value not in CVSS_OPTIONAL_METRIC_VALUES[key]:
+            raise ValueError(f"Invalid value '{value}' for CVSS metric '{key}' in '{vector}'")
+    
+    return metrics
 
 
 @dataclass
@@ -81,6 +195,259 @@ class CVSSCalculator:
         values = {"N": 0.85, "R": 0.62}
         return values[ui]
     
+    def calculate_cvss_scores_batch(self, attack_vector: Sequence[str], attack_complexity: Sequence[str],
+                                    privileges_required: Sequence[str], user_interaction: Sequence[str],
+                                    scope: Sequence[str], confidentiality: Sequence[str],
+                                    integrity: Sequence[str], availability: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        メトリクスコードの列（列指向）からCVSSv3.1ベーススコアと深刻度を一括計算
+        
+        calculate_cvss_score と同じ計算式をNumPyでベクトル化したもの。
+        
+        Returns:
+            (ベーススコアのfloat64配列, 深刻度の文字列配列)
+        """
+        columns = (attack_vector, attack_complexity, privileges_required, user_interaction,
+                   scope, confidentiality, integrity, availability)
+        indices = [self._encode_metric_codes(codes, metric)
+                   for codes, metric in zip(columns, CVSS_BASE_METRICS)]
+        
+        lengths = {len(idx) for idx in indices}
+        if len(lengths) > 1:
+            raise ValueError(f"All metric columns must have the same length: {sorted(lengths)}")
+        
+        scores = self._calculate_scores_from_indices(*indices)
+        return scores, self.get_severity_ratings(scores)
+    
+    def calculate_cvss_scores_from_vectors(self, vectors: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        CVSS:3.1ベクトル文字列の列からベーススコアと深刻度を一括計算
+        
+        同一ベクトルの解析結果はメモ化し、メトリクスの組み合わせ番号に変換してから
+        ベクトル化された計算式に渡す。
+        
+        Returns:
+            (ベーススコアのfloat64配列, 深刻度の文字列配列)
+        """
+        parsed, rows = self._parse_vectors(vectors)
+        
+        def combination_id(metrics: Dict[str, str]) -> int:
+            cid = 0
+            for key in CVSS_BASE_METRICS:
+                values = CVSS_METRIC_VALUES[key]
+                cid = cid * len(values) + values.index(metrics[key])
+            return cid
+        
+        ids = np.fromiter((combination_id(metrics) for metrics in parsed), dtype=np.int64, count=len(parsed))[rows]
+        shape = tuple(len(CVSS_METRIC_VALUES[key]) for key in CVSS_BASE_METRICS)
+        indices = np.unravel_index(ids, shape)
+        
+        scores = self._calculate_scores_from_indices(*indices)
+        return scores, self.get_severity_ratings(scores)
+    
+    def calculate_environmental_scores_batch(self, metrics: Dict[str, Union[str, Sequence[str]]],
+                                             size: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """
+        CVSSv3.1の現状評価（Temporal）・環境評価（Environmental）スコアを一括計算
+        
+        ベーススコアはcalculate_cvss_scoreと同じ値を使い、現状・環境評価には仕様のRoundupを適用する。
+        
+        Args:
+            metrics: CVSS略称（AV, AC, ..., E, RL, RC, CR, IR, AR, MAV, ...）をキーとする
+                メトリクスコードの列。単一の文字列を指定すると全行に適用する。
+                ベース以外のメトリクスは省略時 "X"（未評価）として扱う。
+            size: 行数（全列が単一の文字列の場合に指定）
+        
+        Returns:
+            base_score / temporal_score / environmental_score のfloat64配列と
+            environmental_severity の文字列配列を含む辞書
+        """
+        unknown = set(metrics) - set(CVSS_METRIC_VALUES) - set(CVSS_OPTIONAL_METRIC_VALUES)
+        if unknown:
+            raise ValueError(f"Unknown CVSS metric(s): {sorted(unknown)}")
+        missing = [key for key in CVSS_BASE_METRICS if key not in metrics]
+        if missing:
+            raise ValueError(f"Missing CVSS base metric(s): {missing}")
+        
+        if size is None:
+            lengths = {len(codes) for codes in metrics.values() if not isinstance(codes, str)}
+            if len(lengths) > 1:
+                raise ValueError(f"All metric columns must have the same length: {sorted(lengths)}")
+            size = lengths.pop() if lengths else 1
+        
+        def column(key: str) -> np.ndarray:
+            codes = metrics.get(key, "X")
+            if isinstance(codes, str):
+                codes = [codes]
+            indices = self._encode_metric_codes(codes, key)
+            if indices.size == 1 and size != 1:
+                return np.broadcast_to(indices, (size,))
+            if indices.size != size:
+                raise ValueError(f"Column '{key}' has {indices.size} rows, expected {size}")
+            return indices
+        
+        base = {key: column(key) for key in CVSS_BASE_METRICS}
+        base_score = self._calculate_scores_from_indices(*(base[key] for key in CVSS_BASE_METRICS))
+        
+        # 現状評価係数
+        temporal_factor = np.ones(size)
+        for key, weights in CVSS_TEMPORAL_WEIGHTS.items():
+            temporal_factor = temporal_factor * np.array(list(weights.values()))[column(key)]
+        temporal_score = self._roundup_scores(base_score * temporal_factor)
+        
+        # 修正ベースメトリクス（X はベース値を使用）
+        modified = {}
+        for key in CVSS_BASE_METRICS:
+            indices = column(f"M{key}")
+            modified[key] = np.where(indices == len(CVSS_METRIC_VALUES[key]), base[key], indices)
+        
+        requirement_table = np.array(list(CVSS_REQUIREMENT_WEIGHTS.values()))
+        cr, ir, ar = (requirement_table[column(key)] for key in CVSS_REQUIREMENT_METRICS)
+        
+        environmental_score = self._calculate_environmental_from_indices(modified, cr, ir, ar, temporal_factor)
+        
+        return {
+            "base_score": base_score,
+            "temporal_score": temporal_score,
+            "environmental_score": environmental_score,
+            "environmental_severity": self.get_severity_ratings(environmental_score),
+        }
+    
+    def calculate_environmental_scores_from_vectors(self, vectors: Sequence[str],
+                                                    overrides: Dict[str, Union[str, Sequence[str]]] = None) -> Dict[str, np.ndarray]:
+        """
+        ベクトル文字列（現状・環境評価メトリクスを含んでもよい）から一括で再評価
+        
+        overridesに指定したメトリクスはベクトル内の値より優先する（CR/IR/ARの一括変更など）。
+        ベーススコアの一括計算と同じく、同一ベクトルの解析は1回にまとめる。
+        """
+        parsed, rows = self._parse_vectors(vectors)
+        keys = set(CVSS_BASE_METRICS)
+        for metrics in parsed:
+            keys.update(metrics)
+        
+        # 異なるベクトルごとの値を各行に展開
+        columns: Dict[str, Union[str, Sequence[str]]] = {
+            key: np.array([metrics.get(key, "X") for metrics in parsed], dtype=str)[rows] for key in keys
+        }
+        columns.update(overrides or {})
+        return self.calculate_environmental_scores_batch(columns, size=len(rows))
+    
+    @staticmethod
+    def _parse_vectors(vectors: Iterable[str]) -> Tuple[List[Dict[str, str]], np.ndarray]:
+        """
+        ベクトル文字列の列を重複を除いて解析
+        
+        Returns:
+            (異なるベクトルの解析結果のリスト, 各行の解析結果の位置を表すint64配列)
+        """
+        positions: Dict[str, int] = {}
+        parsed: List[Dict[str, str]] = []
+        
+        def position(vector: str) -> int:
+            index = positions.get(vector)
+            if index is None:
+                index = positions[vector] = len(parsed)
+                parsed.append(parse_cvss_vector(vector))
+            return index
+        
+        rows = np.fromiter((position(v) for v in vectors), dtype=np.int64)
+        return parsed, rows
+    
+    def _calculate_environmental_from_indices(self, modified: Dict[str, np.ndarray], cr: np.ndarray,
+                                              ir: np.ndarray, ar: np.ndarray,
+                                              temporal_factor: np.ndarray) -> np.ndarray:
+        """修正ベースメトリクスとセキュリティ要求度からCVSSv3.1環境評価スコアを計算"""
+        impact_table = np.array([self._get_impact_value(v) for v in CVSS_METRIC_VALUES["C"]])
+        av_table = np.array([self._get_av_value(v) for v in CVSS_METRIC_VALUES["AV"]])
+        ac_table = np.array([self._get_ac_value(v) for v in CVSS_METRIC_VALUES["AC"]])
+        pr_table = np.array([[self._get_pr_value(v, scope) for v in CVSS_METRIC_VALUES["PR"]]
+                             for scope in CVSS_METRIC_VALUES["S"]])
+        ui_table = np.array([self._get_ui_value(v) for v in CVSS_METRIC_VALUES["UI"]])
+        
+        unchanged = modified["S"] == CVSS_METRIC_VALUES["S"].index("U")
+        
+        # Modified Impact Sub Score
+        miss = np.minimum(
+            1 - ((1 - cr * impact_table[modified["C"]]) *
+                 (1 - ir * impact_table[modified["I"]]) *
+                 (1 - ar * impact_table[modified["A"]])),
+            0.915
+        )
+        modified_impact = np.where(
+            unchanged,
+            6.42 * miss,
+            7.52 * (miss - 0.029) - 3.25 * ((miss * 0.9731 - 0.02) ** 13)
+        )
+        
+        # Modified Exploitability Sub Score（PRは修正後スコープで評価）
+        modified_exploitability = (8.22 * av_table[modified["AV"]] * ac_table[modified["AC"]] *
+                                   pr_table[modified["S"], modified["PR"]] * ui_table[modified["UI"]])
+        
+        modified_base = np.where(
+            unchanged,
+            np.minimum(modified_impact + modified_exploitability, 10.0),
+            np.minimum(1.08 * (modified_impact + modified_exploitability), 10.0)
+        )
+        environmental = self._roundup_scores(self._roundup_scores(modified_base) * temporal_factor)
+        return np.where(modified_impact <= 0, 0.0, environmental)
+    
+    def _roundup_scores(self, scores: np.ndarray) -> np.ndarray:
+        """CVSSv3.1仕様のRoundup（小数第1位への切り上げ、浮動小数点誤差を考慮）"""
+        int_input = np.round(scores * 100000)
+        return np.where(int_input % 10000 == 0, int_input / 100000.0, (np.floor(int_input / 10000) + 1) / 10.0)
+    
+    def _encode_metric_codes(self, codes: Sequence[str], metric: str) -> np.ndarray:
+        """メトリクスコードの列を許容値テーブル上のインデックス配列に変換"""
+        allowed = CVSS_METRIC_VALUES.get(metric) or CVSS_OPTIONAL_METRIC_VALUES[metric]
+        codes = np.asarray(codes, dtype=str)
+        indices = np.full(codes.shape, -1, dtype=np.int64)
+        for i, value in enumerate(allowed):
+            indices[codes == value] = i
+        
+        invalid = indices < 0
+        if invalid.any():
+            bad = sorted(set(codes[invalid].tolist()))
+            raise ValueError(f"Invalid value(s) for CVSS metric '{metric}': {bad}")
+        return indices
+    
+    def _calculate_scores_from_indices(self, av, ac, pr, ui, s, c, i, a) -> np.ndarray:
+        """インデックス配列に対してcalculate_cvss_scoreの計算式を適用"""
+        # 各メトリクスの重みテーブル（スカラー版の値定義から生成）
+        impact_table = np.array([self._get_impact_value(v) for v in CVSS_METRIC_VALUES["C"]])
+        av_table = np.array([self._get_av_value(v) for v in CVSS_METRIC_VALUES["AV"]])
+        ac_table = np.array([self._get_ac_value(v) for v in CVSS_METRIC_VALUES["AC"]])
+        # PRはスコープにより値が変わるため [scope, pr] の2次元テーブル
+        pr_table = np.array([[self._get_pr_value(v, scope) for v in CVSS_METRIC_VALUES["PR"]]
+                             for scope in CVSS_METRIC_VALUES["S"]])
+        ui_table = np.array([self._get_ui_value(v) for v in CVSS_METRIC_VALUES["UI"]])
+        
+        unchanged = s == CVSS_METRIC_VALUES["S"].index("U")
+        
+        # Impact Sub Score
+        iss_base = 1 - ((1 - impact_table[c]) * (1 - impact_table[i]) * (1 - impact_table[a]))
+        impact = np.where(
+            unchanged,
+            6.42 * iss_base,
+            7.52 * (iss_base - 0.029) - 3.25 * ((iss_base - 0.02) ** 15)
+        )
+        
+        # Exploitability Sub Score
+        exploitability = 8.22 * av_table[av] * ac_table[ac] * pr_table[s, pr] * ui_table[ui]
+        
+        base_score = np.where(
+            unchanged,
+            np.minimum(impact + exploitability, 10.0),
+            np.minimum(1.08 * (impact + exploitability), 10.0)
+        )
+        base_score = np.where(impact <= 0, 0.0, base_score)
+        
+        return np.round(base_score, 1)
+    
+    def get_severity_ratings(self, scores: np.ndarray) -> np.ndarray:
+        """CVSSスコア配列から深刻度を一括判定（get_severity_ratingのベクトル版）"""
+        return SEVERITY_LABELS[np.searchsorted([0.0, 3.9, 6.9, 8.9], scores, side="left")]
+    
     def get_severity_rating(self, score: float) -> str:
         """CVSSスコアから深刻度を判定"""
         if score == 0.0:
@@ -94,347 +461,846 @@ class CVSSCalculator:
         else:
             return "Critical"
 
+# 機器索引で扱うCVSS_ATTACK_PATTERNSの機器キーワードリスト
+DEVICE_PATTERN_GROUPS = (
+    "high_complexity_devices",
+    "networked_critical_devices",
+    "life_critical_keywords",
+    "diagnostic_keywords",
+    "info_system_keywords",
+)
+
+# 資産分類用のグループ名（ランクはASSET_CLASSIFICATIONの定義順）
+ASSET_CLASS_GROUP = "asset_class"
+
+
+@dataclass(frozen=True)
+class DeviceClassification:
+    """device_typeの分類結果（1脅威につき1回解決し、各決定関数で共有する）"""
+    device_type: str
+    asset_class: Optional[str] = None
+    matches: Dict[str, str] = field(default_factory=dict)  # グループ名 → 最初に一致したキーワード
+
+    def match(self, group: str) -> Optional[str]:
+        """グループ内で（リスト順で）最初に一致したキーワードを返す"""
+        return self.matches.get(group)
+
+
+class DeviceIndex:
+    """機器名・機器キーワードの部分文字列索引（Aho-Corasickオートマトン）"""
+
+    def __init__(self, asset_classification: dict, attack_patterns: dict):
+        # パターン文字列 → [(グループ名, ランク, 値)]
+        entries: Dict[str, List[Tuple[str, int, str]]] = {}
+
+        self.asset_classes = list(asset_classification)
+        for rank, (asset_class, details) in enumerate(asset_classification.items()):
+            for device in details.get("devices", []):
+                entries.setdefault(device, []).append((ASSET_CLASS_GROUP, rank, asset_class))
+
+        for group in DEVICE_PATTERN_GROUPS:
+            for rank, keyword in enumerate(attack_patterns.get(group, [])):
+                entries.setdefault(keyword, []).append((group, rank, keyword))
+
+        self._build(entries)
+
+    def _build(self, entries: Dict[str, List[Tuple[str, int, str]]]) -> None:
+        """goto/failure/outputテーブルを構築"""
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[str, int, str]]] = [[]]
+
+        for pattern, pattern_entries in entries.items():
+            if not pattern:
+                continue
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].extend(pattern_entries)
+
+        # 幅優先でfailureリンクを張り、出力を継承する
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def classify(self, device_type: str) -> DeviceClassification:
+        """
+        device_typeを走査し、各グループで最初（定義順）に一致したキーワードを求める
+
+        従来の「リストを順に走査して部分文字列一致した最初の要素」と同じ結果になる。
+        """
+        device_type = device_type or ""
+        best: Dict[str, Tuple[int, str]] = {}
+
+        state = 0
+        for char in device_type:
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for group, rank, value in self._output[state]:
+                current = best.get(group)
+                if current is None or rank < current[0]:
+                    best[group] = (rank, value)
+
+        asset = best.pop(ASSET_CLASS_GROUP, None)
+        return DeviceClassification(
+            device_type=device_type,
+            asset_class=asset[1] if asset else None,
+            matches={group: value for group, (_, value) in best.items()}
+        )
+
+
+# 決定関数が順に走査するCVSS_ATTACK_PATTERNSの攻撃パターンリスト
+# いずれも「どのパターンが一致したか」で決定値が変わらないため、リスト内の走査順は入れ替え可能
+SCANNED_PATTERN_GROUPS = (
+    "usb_attacks",
+    "wireless_attacks",
+    "hospital_network_attacks",
+    "high_complexity_attacks",
+    "no_privileges_attacks",
+    "high_privileges_attacks",
+    "user_interaction_attacks",
+    "no_ui_attacks",
+    "scope_change_attacks",
+    "confidentiality_attacks",
+    "integrity_attacks",
+    "availability_attacks",
+    "destructive_attacks",
+    "complex_attacks",
+)
+
+# 一致したパターンをロジックパスに記録しない（一致の有無だけを使う）グループ
+UNRECORDED_PATTERN_GROUPS = frozenset({"wireless_attacks"})
+
+# ルールプロファイリングのモード（off: 無効、on: 集計のみ、adaptive: 集計結果で走査順を並べ替え）
+RULE_PROFILING_MODES = ("off", "on", "adaptive")
+
+
+class RuleProfiler:
+    """
+    決定分岐（ルールID）とパターン一致のヒット数、各チェックのコストを集計する
+    
+    adaptiveモードではreorder_interval回の決定ごとに、攻撃パターンリストの
+    走査順をヒット数の多い順に並べ替える（同数の場合は定義順）。
+    """
+    
+    def __init__(self, adaptive: bool = False, reorder_interval: int = 1000):
+        self.adaptive = adaptive
+        self.reorder_interval = max(reorder_interval, 1)
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self) -> None:
+        """集計値をクリア"""
+        with self._lock:
+            self.decisions: Dict[str, List[float]] = {}      # ツリー名 → [回数, 合計秒]
+            self.rule_hits: Counter = Counter()              # ルールID → ヒット数
+            self.scans: Dict[str, List[float]] = {}          # グループ名 → [走査回数, 一致回数, 比較回数, 合計秒]
+            self.pattern_hits: Dict[str, Counter] = {}       # グループ名 → パターン → ヒット数
+            self.reorders = 0
+            self._since_reorder = 0
+    
+    def record_decision(self, tree: str, steps: List[tuple], elapsed: float) -> bool:
+        """決定1回分を記録し、走査順の並べ替え時期であればTrueを返す"""
+        with self._lock:
+            stats = self.decisions.setdefault(tree, [0, 0.0])
+            stats[0] += 1
+            stats[1] += elapsed
+            for step in steps:
+                self.rule_hits[step[0]] += 1
+            
+            if not self.adaptive:
+                return False
+            self._since_reorder += 1
+            if self._since_reorder < self.reorder_interval:
+                return False
+            self._since_reorder = 0
+            self.reorders += 1
+            return True
+    
+    def record_scan(self, group: str, matched: Optional[str], comparisons: int, elapsed: float) -> None:
+        """攻撃パターンリストの走査1回分を記録"""
+        with self._lock:
+            stats = self.scans.setdefault(group, [0, 0, 0, 0.0])
+            stats[0] += 1
+            stats[2] += comparisons
+            stats[3] += elapsed
+            if matched:
+                stats[1] += 1
+                self.pattern_hits.setdefault(group, Counter())[matched] += 1
+    
+    def order_patterns(self, group: str, patterns: Sequence[str]) -> List[str]:
+        """ヒット数の多い順（同数は定義順）に並べたパターンリスト"""
+        with self._lock:
+            hits = dict(self.pattern_hits.get(group, {}))
+        return sorted(patterns, key=lambda pattern: -hits.get(pattern, 0))
+    
+    def report(self, pattern_order: Dict[str, List[str]] = None) -> dict:
+        """/metrics/rules向けの集計レポート"""
+        with self._lock:
+            decisions = {
+                tree: {
+                    "count": count,
+                    "total_ms": round(total * 1000, 3),
+                    "mean_us": round(total / count * 1e6, 2) if count else 0.0
+                }
+                for tree, (count, total) in self.decisions.items()
+            }
+            pattern_groups = {}
+            for group, (scans, hits, comparisons, total) in self.scans.items():
+                pattern_groups[group] = {
+                    "scans": scans,
+                    "hits": hits,
+                    "hit_rate": round(hits / scans, 4) if scans else 0.0,
+                    "mean_comparisons": round(comparisons / scans, 2) if scans else 0.0,
+                    "total_ms": round(total * 1000, 3),
+                    "patterns": dict(self.pattern_hits.get(group, Counter()).most_common())
+                }
+                if pattern_order is not None:
+                    pattern_groups[group]["order"] = list(pattern_order.get(group, []))
+            
+            return {
+                "enabled": True,
+                "mode": "adaptive" if self.adaptive else "on",
+                "reorders": self.reorders,
+                "decisions": decisions,
+                "rules": dict(self.rule_hits.most_common()),
+                "pattern_groups": pattern_groups
+            }
+
+
+def _profiled_decision(method):
+    """プロファイラ有効時のみ決定関数の所要時間と通過したルールIDを記録する"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        profiler = self.profiler
+        if profiler is None:
+            return method(self, *args, **kwargs)
+        
+        start = time.perf_counter()
+        result = method(self, *args, **kwargs)
+        path = result[-1]
+        if profiler.record_decision(path.tree, path.steps, time.perf_counter() - start):
+            self.reorder_patterns()
+        return result
+    return wrapper
+
+
+# ロジックツリー名（メトリクスごとの決定フロー）
+LOGIC_TREE_NAMES = {
+    "attack_vector": "攻撃ベクトル決定フロー（医療機器版）",
+    "attack_complexity": "攻撃複雑度決定フロー（医療機器版）",
+    "privileges_required": "必要権限決定フロー（医療機器版）",
+    "user_interaction": "ユーザー操作決定フロー（医療機器版）",
+    "scope": "スコープ決定フロー（医療機器版）",
+    "cia_impact": "CIA影響度決定フロー（医療機器版）",
+}
+
+# ルールIDごとの説明テンプレート
+# check: checksに追加される文、reasoning/result: 終端ルールの判断理由と結果（{0}以降はルールのパラメータ）
+LOGIC_RULE_TEMPLATES = {
+    # 攻撃ベクトル
+    "av.usb": {"check": "USB攻撃パターン検出: '{0}' → YES"},
+    "av.usb.maintenance": {"check": "保守/メンテナンス/技術者 → Physical",
+                           "reasoning": "保守時の物理アクセスとして評価（医療機器の保守業務特性を考慮）",
+                           "result": "AV:P (Physical)"},
+    "av.usb.vendor": {"check": "外部業者アクセス → Physical",
+                      "reasoning": "外部業者による物理アクセスとして評価",
+                      "result": "AV:P (Physical)"},
+    "av.usb.staff": {"check": "院内スタッフの日常使用 → Adjacent",
+                     "reasoning": "院内でのUSBメモリ共有慣行を考慮した隣接ネットワーク評価",
+                     "result": "AV:A (Adjacent - 院内USBネットワーク)"},
+    "av.wireless": {"check": "無線インターフェース (Wi-Fi/Bluetooth/NFC) → YES",
+                    "reasoning": "無線通信による隣接ネットワーク攻撃",
+                    "result": "AV:A (Adjacent Network)"},
+    "av.hospital_network": {"check": "院内ネットワーク攻撃: '{0}' → YES",
+                            "reasoning": "病院内ネットワークセグメント内での攻撃として評価",
+                            "result": "AV:A (Adjacent Network)"},
+    "av.network": {"check": "ネットワーク攻撃 → YES"},
+    "av.network.internal": {"check": "院内ネットワーク/HIS/PACS/DICOM → YES",
+                            "reasoning": "院内ネットワーク内での攻撃",
+                            "result": "AV:A (Adjacent)"},
+    "av.network.external": {"check": "院内ネットワーク/HIS/PACS/DICOM → NO"},
+    "av.network.remote": {"check": "リモート/インターネット攻撃 → Network",
+                          "reasoning": "インターネット経由のリモート攻撃",
+                          "result": "AV:N (Network)"},
+    "av.network.web": {"check": "SQL/Web攻撃 → Network",
+                       "reasoning": "Webアプリケーション経由の攻撃",
+                       "result": "AV:N (Network)"},
+    "av.network.default": {"reasoning": "ネットワーク攻撃として評価",
+                           "result": "AV:N (Network)"},
+    "av.physical": {"check": "物理攻撃 → YES"},
+    "av.physical.direct": {"check": "直接物理攻撃 → Physical",
+                           "reasoning": "機器への直接的な物理アクセスが必要な攻撃",
+                           "result": "AV:P (Physical)"},
+    "av.physical.local": {"check": "ローカル物理攻撃 → Local",
+                          "reasoning": "ローカルシステムレベルでの物理的操作",
+                          "result": "AV:L (Local)"},
+    "av.wireless_category": {"check": "無線攻撃 → Adjacent",
+                             "reasoning": "無線通信による隣接ネットワーク攻撃",
+                             "result": "AV:A (Adjacent)"},
+    "av.software.remote": {"check": "リモートソフトウェア攻撃 → Network",
+                           "reasoning": "ネットワーク経由のソフトウェア攻撃",
+                           "result": "AV:N (Network)"},
+    "av.software.hospital": {"check": "院内ソフトウェア攻撃 → Adjacent",
+                             "reasoning": "院内ネットワーク経由のソフトウェア攻撃",
+                             "result": "AV:A (Adjacent)"},
+    "av.software.local": {"check": "ローカルソフトウェア攻撃 → Local",
+                          "reasoning": "ローカルシステムでのソフトウェア攻撃",
+                          "result": "AV:L (Local)"},
+    "av.default": {"check": "その他（デフォルト）",
+                   "reasoning": "デフォルトローカル攻撃として評価",
+                   "result": "AV:L (Local)"},
+    
+    # 攻撃複雑度
+    "ac.attack": {"check": "高複雑度攻撃検出: '{0}' → High",
+                  "reasoning": "{0}は高度な技術知識と専門ツールが必要な攻撃",
+                  "result": "AC:H (High)"},
+    "ac.device.advanced": {"check": "高複雑度医療機器 + 高度攻撃: '{0}' → High",
+                           "reasoning": "{0}への高度な攻撃手法は高い技術的複雑度を要求",
+                           "result": "AC:H (High)"},
+    "ac.device.simple": {"check": "高複雑度医療機器 + 単純攻撃: '{0}' → Low",
+                         "reasoning": "{0}でも単純な攻撃手法は比較的実行しやすい",
+                         "result": "AC:L (Low)"},
+    "ac.device.default": {"check": "高複雑度医療機器: '{0}' → High (デフォルト)",
+                          "reasoning": "{0}は複雑な制御システムを持つため攻撃も複雑化",
+                          "result": "AC:H (High)"},
+    "ac.simple": {"check": "単純攻撃手法 → Low",
+                  "reasoning": "比較的実行しやすい攻撃手法",
+                  "result": "AC:L (Low)"},
+    "ac.default": {"check": "一般的攻撃（デフォルト高複雑度）",
+                   "reasoning": "詳細不明な攻撃は安全側評価で高複雑度とする",
+                   "result": "AC:H (High)"},
+    
+    # 必要権限
+    "pr.none": {"check": "権限不要攻撃: '{0}' → None",
+                "reasoning": "{0}は事前の認証や権限取得が不要な攻撃",
+                "result": "PR:N (None)"},
+    "pr.high": {"check": "高権限必要攻撃: '{0}' → High",
+                "reasoning": "{0}は管理者権限や特権アクセスが必要な攻撃",
+                "result": "PR:H (High)"},
+    "pr.auth": {"check": "認証が必要 → YES"},
+    "pr.auth.admin": {"check": "高権限要求攻撃 → PR:H", "result": "PR:H"},
+    "pr.auth.user": {"check": "一般ユーザー権限 → PR:L", "result": "PR:L"},
+    "pr.application": {"check": "アプリケーションレベル攻撃 → PR:L",
+                       "reasoning": "アプリケーションレベルでの攻撃は一般ユーザー権限で実行可能",
+                       "result": "PR:L"},
+    "pr.default": {"check": "一般的攻撃（デフォルト低権限）",
+                   "reasoning": "医療機器の一般的な操作権限で実行可能な攻撃",
+                   "result": "PR:L"},
+    
+    # ユーザー操作
+    "ui.attack": {"check": "ユーザー操作必要攻撃: '{0}' → Required",
+                  "reasoning": "{0}は医療従事者による操作やクリックが必要な攻撃",
+                  "result": "UI:R (Required)"},
+    "ui.feature": {"check": "requires_user_interaction: true", "result": "UI:R"},
+    "ui.no_ui_attack": {"check": "ユーザー操作不要攻撃: {0} → YES", "result": "UI:N"},
+    "ui.operation": {"check": "医療機器操作関連 → 操作が必要",
+                     "reasoning": "医療従事者による機器操作や設定変更が攻撃の起点となる",
+                     "result": "UI:R (Required)"},
+    "ui.automated": {"check": "自動化攻撃 → UI:N",
+                     "reasoning": "自動化された攻撃はユーザー操作不要",
+                     "result": "UI:N"},
+    "ui.default": {"check": "一般的攻撃（デフォルト不要）",
+                   "reasoning": "医療機器攻撃の多くはユーザー操作不要で実行可能",
+                   "result": "UI:N"},
+    
+    # スコープ
+    "s.attack": {"check": "スコープ変更攻撃: '{0}' → Changed",
+                 "reasoning": "{0}は初期侵入点から他のシステムや機器に影響を拡大する攻撃",
+                 "result": "S:C (Changed)"},
+    "s.device.spreading": {"check": "拡散型攻撃 + 重要機器: '{0}' → Changed",
+                           "reasoning": "{0}への拡散型攻撃は他システムに影響を及ぼしやすい",
+                           "result": "S:C (Changed)"},
+    "s.device.isolated": {"check": "単体攻撃 + 重要機器: '{0}' → Unchanged",
+                          "reasoning": "{0}への単体攻撃は当該機器に限定",
+                          "result": "S:U (Unchanged)"},
+    "s.device.default": {"check": "ネットワーク接続重要機器: '{0}' → Unchanged (デフォルト)",
+                         "reasoning": "{0}への攻撃は当該機器に限定される（安全側評価）",
+                         "result": "S:U (Unchanged)"},
+    "s.spreading": {"check": "ネットワーク拡散攻撃 → S:C",
+                    "reasoning": "ネットワーク経由で拡散する攻撃はスコープ変更の可能性が高い",
+                    "result": "S:C (Changed)"},
+    "s.default": {"check": "一般的攻撃（デフォルト単体）",
+                  "reasoning": "一般的な攻撃は単一機器に限定される（安全側評価）",
+                  "result": "S:U (Unchanged)"},
+    
+    # CIA影響度 Step 1: 攻撃タイプ別基本影響度
+    "cia.base": {"check": "Step 1: 攻撃タイプ別基本影響度の決定（各CIA属性を独立評価）"},
+    "cia.c.flag": {"check": "機密性重視攻撃フラグ → C:H"},
+    "cia.c.keywords": {"check": "機密性攻撃キーワード検出: {0} → C:H"},
+    "cia.c.pattern": {"check": "機密性攻撃パターン: '{0}' → C:H"},
+    "cia.i.flag": {"check": "完全性重視攻撃フラグ → I:H"},
+    "cia.i.keywords": {"check": "完全性攻撃キーワード検出: {0} → I:H"},
+    "cia.i.pattern": {"check": "完全性攻撃パターン: '{0}' → I:H"},
+    "cia.a.flag": {"check": "可用性重視攻撃フラグ → A:H"},
+    "cia.a.keywords": {"check": "可用性攻撃キーワード検出: {0} → A:H"},
+    "cia.a.pattern": {"check": "可用性攻撃パターン: '{0}' → A:H"},
+    "cia.destructive": {"check": "破壊・物理攻撃: '{0}' → I:H, A:H"},
+    "cia.complex": {"check": "複合影響攻撃: '{0}' → I:H, A:H"},
+    "cia.network": {"check": "ネットワーク系攻撃 → C:H（通常ネットワーク経由で情報取得可能）"},
+    "cia.base.final": {"check": "最終基本影響度: C:{0}, I:{1}, A:{2}"},
+    
+    # CIA影響度 Step 2: 資産分類による調整
+    "cia.asset": {"check": "Step 2: 医療機器資産分類による調整"},
+    "cia.asset.class": {"check": "資産分類: {0} → '{1}'"},
+    "cia.asset.c.highest": {"check": "→ 機密性: +2段階 (最高優先度)"},
+    "cia.asset.c.high": {"check": "→ 機密性: +1段階 (高優先度)"},
+    "cia.asset.i.highest": {"check": "→ 完全性: +2段階 (最高優先度)"},
+    "cia.asset.i.high": {"check": "→ 完全性: +1段階 (高優先度)"},
+    "cia.asset.a.highest": {"check": "→ 可用性: +2段階 (最高優先度)"},
+    "cia.asset.a.high": {"check": "→ 可用性: +1段階 (高優先度)"},
+    "cia.asset.none": {"check": "該当する特定資産分類なし → 調整なし"},
+    
+    # CIA影響度 Step 3: データ要求レベルの推定
+    "cia.data": {"check": "Step 3: データ要求レベルの推定"},
+    "cia.data.pii": {"check": "患者個人識別情報 (PII) → 機密性: 最高"},
+    "cia.data.safety": {"check": "安全性・リスク管理データ: {0} → I: 最高, A: 最高"},
+    "cia.data.life_critical": {"check": "生命維持機器: '{0}' → 安全性・有効性クリティカル"},
+    "cia.data.diagnostic": {"check": "診断・画像機器: '{0}' → 診断精度クリティカル"},
+    "cia.data.info_system": {"check": "医療情報システム: '{0}' → 情報セキュリティクリティカル"},
+    "cia.data.default": {"check": "一般的医療機器 → 標準的なデータ要求"},
+    "cia.data.requirements": {"check": "→ C:{0}, I:{1}, A:{2}"},
+    
+    # CIA影響度 最終調整
+    "cia.adjust.c": {"check": "機密性調整: Base:{0}(値:{1}) + 資産調整:{2} → 最終:{3}"},
+    "cia.adjust.i": {"check": "完全性調整: Base:{0}(値:{1}) + 資産調整:{2} → 最終:{3}"},
+    "cia.adjust.a": {"check": "可用性調整: Base:{0}(値:{1}) + 資産調整:{2} → 最終:{3}"},
+    "cia.adjust.c.none": {"check": "機密性調整: Base:{0}(直接影響なし) → 最終:{1}"},
+    "cia.adjust.i.none": {"check": "完全性調整: Base:{0}(直接影響なし) → 最終:{1}"},
+    "cia.adjust.a.none": {"check": "可用性調整: Base:{0}(直接影響なし) → 最終:{1}"},
+    "cia.requirement.c": {"check": "機密性調整: Base:{0}(値:{1}) + 資産調整:{2} = {3}, データ要求:{4}(値:{5}) → 最終:{6}"},
+    "cia.requirement.i": {"check": "完全性調整: Base:{0}(値:{1}) + 資産調整:{2} = {3}, データ要求:{4}(値:{5}) → 最終:{6}"},
+    "cia.requirement.a": {"check": "可用性調整: Base:{0}(値:{1}) + 資産調整:{2} = {3}, データ要求:{4}(値:{5}) → 最終:{6}"},
+    "cia.requirement.c.none": {"check": "機密性調整: Base:{0}(直接影響なし) → データ要求による調整をスキップ → 最終:{1}"},
+    "cia.requirement.i.none": {"check": "完全性調整: Base:{0}(直接影響なし) → データ要求による調整をスキップ → 最終:{1}"},
+    "cia.requirement.a.none": {"check": "可用性調整: Base:{0}(直接影響なし) → データ要求による調整をスキップ → 最終:{1}"},
+    "cia.final": {"reasoning": "医療機器の資産分類を考慮してCIA影響度を決定",
+                  "result": "最終CIA: C:{0}, I:{1}, A:{2}"},
+}
+
+# ロジックパスの出力形式
+LOGIC_PATH_DETAILS = ("none", "ids", "full")
+
+
+def render_logic_steps(tree: str, steps: List[tuple]) -> dict:
+    """ルールIDの列をテンプレートから従来形式の説明（checks/reasoning/result）に展開"""
+    path = {
+        "decision_tree": LOGIC_TREE_NAMES[tree],
+        "checks": [],
+        "reasoning": ""
+    }
+    for rule_id, *params in steps:
+        template = LOGIC_RULE_TEMPLATES[rule_id]
+        if "check" in template:
+            path["checks"].append(template["check"].format(*params))
+        if "reasoning" in template:
+            path["reasoning"] = template["reasoning"].format(*params)
+        if "result" in template:
+            path["result"] = template["result"].format(*params)
+    return path
+
+
+def render_logic_paths(logic_paths: Dict[str, "LogicPath"], detail: str = "full") -> dict:
+    """
+    メトリクスごとのロジックパスを指定の形式で出力
+    
+    Args:
+        logic_paths: メトリクス名をキーとするLogicPathの辞書
+        detail: "none"（出力なし）、"ids"（ルールIDとパラメータのみ）、"full"（日本語の説明文）
+    
+    Returns:
+        出力形式に応じた辞書（"none"の場合はNone）
+    """
+    if detail not in LOGIC_PATH_DETAILS:
+        raise ValueError(f"Invalid logic path detail '{detail}': expected one of {LOGIC_PATH_DETAILS}")
+    if detail == "none":
+        return None
+    if detail == "ids":
+        return {metric: path.to_ids() for metric, path in logic_paths.items()}
+    return {metric: path.render() for metric, path in logic_paths.items()}
+
+
+class LogicPath:
+    """ロジックツリーの選択パス（ルールIDとパラメータの列）。説明文は必要になった時点で生成する"""
+    
+    __slots__ = ("tree", "steps")
+    
+    def __init__(self, tree: str):
+        self.tree = tree
+        self.steps: List[tuple] = []
+    
+    def add(self, rule_id: str, *params) -> None:
+        """通過したルールを記録"""
+        self.steps.append((rule_id, *params))
+    
+    def extend(self, steps: List[tuple]) -> None:
+        """サブ判定で記録されたルールを追加"""
+        self.steps.extend(steps)
+    
+    def to_ids(self) -> list:
+        """コンパクト形式（パラメータなしのルールはID文字列、ありは[ID, パラメータ...]）"""
+        return [step[0] if len(step) == 1 else list(step) for step in self.steps]
+    
+    @classmethod
+    def from_ids(cls, tree: str, ids: list) -> "LogicPath":
+        """to_ids()の出力から復元（保存済みのパスを説明文に展開する場合に使用）"""
+        path = cls(tree)
+        path.steps = [(step,) if isinstance(step, str) else tuple(step) for step in ids]
+        return path
+    
+    def render(self) -> dict:
+        """テンプレートから説明文を生成"""
+        return render_logic_steps(self.tree, self.steps)
+
+
 class CVSSLogicEngine:
     """CVSS決定ロジックエンジン"""
     
-    def __init__(self, asset_classification, data_classification, attack_patterns):
+    def __init__(self, asset_classification, data_classification, attack_patterns,
+                 profiler: Optional[RuleProfiler] = None):
         self.asset_classification = asset_classification
         self.data_classification = data_classification
         self.attack_patterns = attack_patterns
+        
+        # 攻撃パターンリストの走査順（adaptiveモードでは観測頻度順に並べ替えられる）
+        self.profiler = profiler
+        self._definition_order = {group: list(attack_patterns.get(group, [])) for group in SCANNED_PATTERN_GROUPS}
+        # 定義順のままのグループは定義順のリスト自体を保持する（同一オブジェクトなら引き直しは不要）
+        self.pattern_order = dict(self._definition_order)
+        # パターン → 定義順の位置（報告するパターンは走査順によらず定義順で最初に一致したものにする）
+        self._definition_index = {
+            group: {pattern: index for index, pattern in reversed(list(enumerate(attack_patterns.get(group, []))))}
+            for group in SCANNED_PATTERN_GROUPS
+        }
+        
+        # 機器名・機器キーワードの索引（device_typeごとの分類結果はキャッシュ）
+        self.device_index = DeviceIndex(asset_classification, attack_patterns)
+        self._classify_device_cached = lru_cache(maxsize=4096)(self.device_index.classify)
+        
+        # 資産分類ごとの環境評価セキュリティ要求度（CR/IR/AR）
+        self.requirement_profiles = derive_requirement_profiles(asset_classification)
+    
+    def classify_device(self, device_type: str) -> DeviceClassification:
+        """device_typeを資産分類・機器キーワードに解決（決定関数間で共有する分類レコード）"""
+        return self._classify_device_cached(device_type or "")
     
+    def _resolve_device(self, device_type: Union[str, DeviceClassification]) -> DeviceClassification:
+        """文字列または解決済みの分類レコードを受け付ける"""
+        if isinstance(device_type, DeviceClassification):
+            return device_type
+        return self.classify_device(device_type)
+    
+    def _match_first(self, group: str, text: str) -> Optional[str]:
+        """
+        攻撃パターンリストを照合し、定義順で最初に一致したパターンを返す
+        adaptiveモードで並べ替えた走査順は一致の有無の判定に使い、一致したパターンをロジックパスに記録するグループでは
+        定義順で最初に一致したパターンを別に引き直す（記録するパターンが過去のトラフィックに依存しないようにする）。
+        プロファイラには並べ替えた走査で実際に行った比較回数だけを記録する
+        """
+        patterns = self.pattern_order[group]
+        profiler = self.profiler
+        if profiler is None:
+            for pattern in patterns:
+                if pattern in text:
+                    return pattern
+            return None
+        
+        start = time.perf_counter()
+        matched = None
+        comparisons = len(patterns)
+        for index, pattern in enumerate(patterns):
+            if pattern in text:
+                matched = pattern
+                comparisons = index + 1
+                break
+        profiler.record_scan(group, matched, comparisons, time.perf_counter() - start)
+        if matched is not None and patterns is not self._definition_order[group] \
+                and group not in UNRECORDED_PATTERN_GROUPS:
+            matched = self._first_in_definition_order(group, text, matched)
+        return matched
+    
+    def _first_in_definition_order(self, group: str, text: str, matched: str) -> str:
+        """一致したパターンより定義順で前にあり、テキストにも含まれる最初のパターン（なければmatched）"""
+        for pattern in self._definition_order[group][:self._definition_index[group][matched]]:
+            if pattern in text:
+                return pattern
+        return matched
+    
+    def reorder_patterns(self) -> None:
+        """観測されたヒット数に基づき攻撃パターンリストの走査順を更新"""
+        if self.profiler is None:
+            return
+        pattern_order = {}
+        for group, definition in self._definition_order.items():
+            order = self.profiler.order_patterns(group, definition)
+            pattern_order[group] = definition if order == definition else order
+        self.pattern_order = pattern_order
+    
+    def rule_report(self) -> dict:
+        """ルールプロファイリングの集計レポート（無効時はenabled: False）"""
+        if self.profiler is None:
+            return {"enabled": False, "mode": "off"}
+        return self.profiler.report(self.pattern_order)
+    
+    @_profiled_decision
     def determine_attack_vector_with_path(self, threat_category: str, threat_name: str, device_type: str = "", 
-                                        context: str = "generator") -> Tuple[str, dict]:
+                                        context: str = "generator") -> Tuple[str, LogicPath]:
         """攻撃ベクトルを決定し、ロジックパスを記録"""
-        path = {
-            "decision_tree": "攻撃ベクトル決定フロー（医療機器版）",
-            "checks": [],
-            "reasoning": ""
-        }
+        path = LogicPath("attack_vector")
         
         # USBやリムーバブルメディア攻撃（院内での広範囲使用を考慮）
-        for attack in self.attack_patterns["usb_attacks"]:
-            if attack in threat_name:
-                path["checks"].append(f"USB攻撃パターン検出: '{attack}' → YES")
-                # 院内USBメモリの使用パターンを考慮
-                if "保守" in threat_name or "メンテナンス" in threat_name or "技術者" in threat_name:
-                    path["checks"].append("保守/メンテナンス/技術者 → Physical")
-                    path["reasoning"] = "保守時の物理アクセスとして評価（医療機器の保守業務特性を考慮）"
-                    path["result"] = "AV:P (Physical)"
-                    return "P", path
-                elif "外部" in threat_name or "業者" in threat_name:
-                    path["checks"].append("外部業者アクセス → Physical")
-                    path["reasoning"] = "外部業者による物理アクセスとして評価"
-                    path["result"] = "AV:P (Physical)"
-                    return "P", path
-                else:
-                    path["checks"].append("院内スタッフの日常使用 → Adjacent")
-                    path["reasoning"] = "院内でのUSBメモリ共有慣行を考慮した隣接ネットワーク評価"
-                    path["result"] = "AV:A (Adjacent - 院内USBネットワーク)"
-                    return "A", path
+        attack = self._match_first("usb_attacks", threat_name)
+        if attack:
+            path.add("av.usb", attack)
+            # 院内USBメモリの使用パターンを考慮
+            if "保守" in threat_name or "メンテナンス" in threat_name or "技術者" in threat_name:
+                path.add("av.usb.maintenance")
+                return "P", path
+            elif "外部" in threat_name or "業者" in threat_name:
+                path.add("av.usb.vendor")
+                return "P", path
+            else:
+                path.add("av.usb.staff")
+                return "A", path
         
         # 無線インターフェース攻撃
-        if any(w in threat_name for w in self.attack_patterns["wireless_attacks"]):
-            path["checks"].append("無線インターフェース (Wi-Fi/Bluetooth/NFC) → YES")
-            path["reasoning"] = "無線通信による隣接ネットワーク攻撃"
-            path["result"] = "AV:A (Adjacent Network)"
+        if self._match_first("wireless_attacks", threat_name):
+            path.add("av.wireless")
             return "A", path
         
         # 院内ネットワーク経由の攻撃
-        for attack in self.attack_patterns["hospital_network_attacks"]:
-            if attack in threat_name:
-                path["checks"].append(f"院内ネットワーク攻撃: '{attack}' → YES")
-                path["reasoning"] = "病院内ネットワークセグメント内での攻撃として評価"
-                path["result"] = "AV:A (Adjacent Network)"
-                return "A", path
+        attack = self._match_first("hospital_network_attacks", threat_name)
+        if attack:
+            path.add("av.hospital_network", attack)
+            return "A", path
         
         # ネットワーク攻撃の判定（カテゴリベース）
         if threat_category == "ネットワーク" or any(n in threat_name for n in ["ネットワーク", "API", "リモート", "外部"]):
-            path["checks"].append("ネットワーク攻撃 → YES")
+            path.add("av.network")
             # 院内ネットワーク/HIS/PACS/DICOM
             if any(h in threat_name for h in ["院内", "HIS", "PACS", "DICOM"]):
-                path["checks"].append("院内ネットワーク/HIS/PACS/DICOM → YES")
-                path["reasoning"] = "院内ネットワーク内での攻撃"
-                path["result"] = "AV:A (Adjacent)"
+                path.add("av.network.internal")
                 return "A", path
             else:
-                path["checks"].append("院内ネットワーク/HIS/PACS/DICOM → NO")
+                path.add("av.network.external")
                 if "リモート" in threat_name or "インターネット" in threat_name:
-                    path["checks"].append("リモート/インターネット攻撃 → Network")
-                    path["reasoning"] = "インターネット経由のリモート攻撃"
-                    path["result"] = "AV:N (Network)"
+                    path.add("av.network.remote")
                     return "N", path
                 elif "SQL" in threat_name or "Web" in threat_name:
-                    path["checks"].append("SQL/Web攻撃 → Network")
-                    path["reasoning"] = "Webアプリケーション経由の攻撃"
-                    path["result"] = "AV:N (Network)"
+                    path.add("av.network.web")
                     return "N", path
                 else:
-                    path["reasoning"] = "ネットワーク攻撃として評価"
-                    path["result"] = "AV:N (Network)"
+                    path.add("av.network.default")
                     return "N", path
         
         # 物理攻撃
         if threat_category == "物理" or "物理" in threat_name:
-            path["checks"].append("物理攻撃 → YES")
+            path.add("av.physical")
             # 直接的な物理アクセスか、ローカルアクセスかを判定
             if any(direct in threat_name for direct in ["破壊", "盗難", "改ざん", "直接"]):
-                path["checks"].append("直接物理攻撃 → Physical")
-                path["reasoning"] = "機器への直接的な物理アクセスが必要な攻撃"
-                path["result"] = "AV:P (Physical)"
+                path.add("av.physical.direct")
                 return "P", path
             else:
-                path["checks"].append("ローカル物理攻撃 → Local")
-                path["reasoning"] = "ローカルシステムレベルでの物理的操作"
-                path["result"] = "AV:L (Local)"
+                path.add("av.physical.local")
                 return "L", path
         
         # 無線カテゴリ
         if threat_category == "無線":
-            path["checks"].append("無線攻撃 → Adjacent")
-            path["reasoning"] = "無線通信による隣接ネットワーク攻撃"
-            path["result"] = "AV:A (Adjacent)"
+            path.add("av.wireless_category")
             return "A", path
         
         # デフォルト（ソフトウェアやその他）
         if threat_category == "ソフトウェア":
             # ソフトウェア攻撃の具体的な種類で判定
             if any(remote in threat_name for remote in ["API", "Web", "外部", "インターネット"]):
-                path["checks"].append("リモートソフトウェア攻撃 → Network")
-                path["reasoning"] = "ネットワーク経由のソフトウェア攻撃"
-                path["result"] = "AV:N (Network)"
+                path.add("av.software.remote")
                 return "N", path
             elif any(adjacent in threat_name for adjacent in ["院内", "LAN", "内部ネットワーク"]):
-                path["checks"].append("院内ソフトウェア攻撃 → Adjacent")
-                path["reasoning"] = "院内ネットワーク経由のソフトウェア攻撃"
-                path["result"] = "AV:A (Adjacent)"
+                path.add("av.software.hospital")
                 return "A", path
             else:
-                path["checks"].append("ローカルソフトウェア攻撃 → Local")
-                path["reasoning"] = "ローカルシステムでのソフトウェア攻撃"
-                path["result"] = "AV:L (Local)"
+                path.add("av.software.local")
                 return "L", path
         else:
-            path["checks"].append("その他（デフォルト）")
-            path["reasoning"] = "デフォルトローカル攻撃として評価"
-            path["result"] = "AV:L (Local)"
+            path.add("av.default")
             return "L", path
     
-    def determine_attack_complexity_with_path(self, threat_name: str, device_type: str) -> Tuple[str, dict]:
+    @_profiled_decision
+    def determine_attack_complexity_with_path(self, threat_name: str,
+                                              device_type: Union[str, DeviceClassification]) -> Tuple[str, LogicPath]:
         """攻撃複雑度を決定し、ロジックパスを記録"""
-        path = {
-            "decision_tree": "攻撃複雑度決定フロー（医療機器版）",
-            "checks": [],
-            "reasoning": ""
-        }
+        path = LogicPath("attack_complexity")
+        device_class = self._resolve_device(device_type)
         
         # 高複雑度の攻撃
-        for attack in self.attack_patterns["high_complexity_attacks"]:
-            if attack in threat_name:
-                path["checks"].append(f"高複雑度攻撃検出: '{attack}' → High")
-                path["reasoning"] = f"{attack}は高度な技術知識と専門ツールが必要な攻撃"
-                path["result"] = "AC:H (High)"
-                return "H", path
+        attack = self._match_first("high_complexity_attacks", threat_name)
+        if attack:
+            path.add("ac.attack", attack)
+            return "H", path
         
         # 医療機器固有の複雑度判定
-        for device in self.attack_patterns["high_complexity_devices"]:
-            if device in device_type:
-                # 攻撃の種類と機器の複雑度を組み合わせて判定
-                if any(complex_attack in threat_name for complex_attack in [
-                    "ファームウェア", "制御システム", "アルゴリズム", "プロトコル", "暗号化"
-                ]):
-                    path["checks"].append(f"高複雑度医療機器 + 高度攻撃: '{device}' → High")
-                    path["reasoning"] = f"{device}への高度な攻撃手法は高い技術的複雑度を要求"
-                    path["result"] = "AC:H (High)"
-                    return "H", path
-                elif any(simple_attack in threat_name for simple_attack in [
-                    "DoS", "盗聴", "パスワード", "設定変更", "アクセス"
-                ]):
-                    path["checks"].append(f"高複雑度医療機器 + 単純攻撃: '{device}' → Low")
-                    path["reasoning"] = f"{device}でも単純な攻撃手法は比較的実行しやすい"
-                    path["result"] = "AC:L (Low)"
-                    return "L", path
-                else:
-                    path["checks"].append(f"高複雑度医療機器: '{device}' → High (デフォルト)")
-                    path["reasoning"] = f"{device}は複雑な制御システムを持つため攻撃も複雑化"
-                    path["result"] = "AC:H (High)"
-                    return "H", path
+        device = device_class.match("high_complexity_devices")
+        if device:
+            # 攻撃の種類と機器の複雑度を組み合わせて判定
+            if any(complex_attack in threat_name for complex_attack in [
+                "ファームウェア", "制御システム", "アルゴリズム", "プロトコル", "暗号化"
+            ]):
+                path.add("ac.device.advanced", device)
+                return "H", path
+            elif any(simple_attack in threat_name for simple_attack in [
+                "DoS", "盗聴", "パスワード", "設定変更", "アクセス"
+            ]):
+                path.add("ac.device.simple", device)
+                return "L", path
+            else:
+                path.add("ac.device.default", device)
+                return "H", path
         
         # デフォルト判定（攻撃手法ベース）
         if any(simple in threat_name for simple in [
             "DoS", "盗聴", "パスワード", "設定", "アクセス", "USB", "無線"
         ]):
-            path["checks"].append("単純攻撃手法 → Low")
-            path["reasoning"] = "比較的実行しやすい攻撃手法"
-            path["result"] = "AC:L (Low)"
+            path.add("ac.simple")
             return "L", path
         else:
-            path["checks"].append("一般的攻撃（デフォルト高複雑度）")
-            path["reasoning"] = "詳細不明な攻撃は安全側評価で高複雑度とする"
-            path["result"] = "AC:H (High)"
+            path.add("ac.default")
             return "H", path
     
+    @_profiled_decision
     def determine_privileges_required_with_path(self, threat_name: str, threat_category: str, 
-                                              requires_auth: bool = None) -> Tuple[str, dict]:
+                                              requires_auth: bool = None) -> Tuple[str, LogicPath]:
         """必要権限を決定し、ロジックパスを記録"""
-        path = {
-            "decision_tree": "必要権限決定フロー（医療機器版）",
-            "checks": [],
-            "reasoning": ""
-        }
+        path = LogicPath("privileges_required")
         
         # 権限不要の攻撃
-        for attack in self.attack_patterns["no_privileges_attacks"]:
-            if attack in threat_name:
-                path["checks"].append(f"権限不要攻撃: '{attack}' → None")
-                path["reasoning"] = f"{attack}は事前の認証や権限取得が不要な攻撃"
-                path["result"] = "PR:N (None)"
-                return "N", path
+        attack = self._match_first("no_privileges_attacks", threat_name)
+        if attack:
+            path.add("pr.none", attack)
+            return "N", path
         
         # 高権限必要な攻撃
-        for attack in self.attack_patterns["high_privileges_attacks"]:
-            if attack in threat_name:
-                path["checks"].append(f"高権限必要攻撃: '{attack}' → High")
-                path["reasoning"] = f"{attack}は管理者権限や特権アクセスが必要な攻撃"
-                path["result"] = "PR:H (High)"
-                return "H", path
+        attack = self._match_first("high_privileges_attacks", threat_name)
+        if attack:
+            path.add("pr.high", attack)
+            return "H", path
         
         # 認証が必要な場合（threat_extraction用）
         if requires_auth is not None and requires_auth:
-            path["checks"].append("認証が必要 → YES")
+            path.add("pr.auth")
             # 攻撃の種類で必要権限を判定
             if any(admin in threat_name for admin in ["管理者", "システム", "設定変更", "権限昇格"]):
-                path["checks"].append("高権限要求攻撃 → PR:H")
-                path["result"] = "PR:H"
+                path.add("pr.auth.admin")
                 return "H", path
             else:
-                path["checks"].append("一般ユーザー権限 → PR:L")
-                path["result"] = "PR:L"
+                path.add("pr.auth.user")
                 return "L", path
         
         # デフォルト判定（攻撃対象ベース）
         if any(system in threat_name for system in ["API", "Web", "インターフェース", "アプリケーション"]):
-            path["checks"].append("アプリケーションレベル攻撃 → PR:L")
-            path["reasoning"] = "アプリケーションレベルでの攻撃は一般ユーザー権限で実行可能"
-            path["result"] = "PR:L"
+            path.add("pr.application")
             return "L", path
         else:
-            path["checks"].append("一般的攻撃（デフォルト低権限）")
-            path["reasoning"] = "医療機器の一般的な操作権限で実行可能な攻撃"
-            path["result"] = "PR:L"
+            path.add("pr.default")
             return "L", path
     
+    @_profiled_decision
     def determine_user_interaction_with_path(self, threat_name: str, 
-                                           requires_ui: bool = None) -> Tuple[str, dict]:
+                                           requires_ui: bool = None) -> Tuple[str, LogicPath]:
         """ユーザー操作の必要性を決定し、ロジックパスを記録"""
-        path = {
-            "decision_tree": "ユーザー操作決定フロー（医療機器版）",
-            "checks": [],
-            "reasoning": ""
-        }
+        path = LogicPath("user_interaction")
         
         # ユーザー操作が必要な攻撃
-        for attack in self.attack_patterns["user_interaction_attacks"]:
-            if attack in threat_name:
-                path["checks"].append(f"ユーザー操作必要攻撃: '{attack}' → Required")
-                path["reasoning"] = f"{attack}は医療従事者による操作やクリックが必要な攻撃"
-                path["result"] = "UI:R (Required)"
-                return "R", path
+        attack = self._match_first("user_interaction_attacks", threat_name)
+        if attack:
+            path.add("ui.attack", attack)
+            return "R", path
         
         # 特徴データのrequires_user_interaction判定（threat_extraction用）
         if requires_ui is not None and requires_ui:
-            path["checks"].append("requires_user_interaction: true")
-            path["result"] = "UI:R"
+            path.add("ui.feature")
             return "R", path
         
         # ユーザー操作不要攻撃
-        for attack in self.attack_patterns["no_ui_attacks"]:
-            if attack in threat_name:
-                path["checks"].append(f"ユーザー操作不要攻撃: {attack} → YES")
-                path["result"] = "UI:N"
-                return "N", path
+        attack = self._match_first("no_ui_attacks", threat_name)
+        if attack:
+            path.add("ui.no_ui_attack", attack)
+            return "N", path
         
         # 医療機器特有のユーザー操作パターン
         if "診断" in threat_name or "検査" in threat_name or "設定" in threat_name:
-            path["checks"].append("医療機器操作関連 → 操作が必要")
-            path["reasoning"] = "医療従事者による機器操作や設定変更が攻撃の起点となる"
-            path["result"] = "UI:R (Required)"
+            path.add("ui.operation")
             return "R", path
         
         # デフォルト判定（攻撃性質ベース）
         if any(automated in threat_name for automated in ["自動", "システム", "プログラム", "スクリプト"]):
-            path["checks"].append("自動化攻撃 → UI:N")
-            path["reasoning"] = "自動化された攻撃はユーザー操作不要"
-            path["result"] = "UI:N"
+            path.add("ui.automated")
             return "N", path
         else:
-            path["checks"].append("一般的攻撃（デフォルト不要）")
-            path["reasoning"] = "医療機器攻撃の多くはユーザー操作不要で実行可能"
-            path["result"] = "UI:N"
+            path.add("ui.default")
             return "N", path
     
-    def determine_scope_with_path(self, threat_name: str, device_type: str) -> Tuple[str, dict]:
+    @_profiled_decision
+    def determine_scope_with_path(self, threat_name: str,
+                                  device_type: Union[str, DeviceClassification]) -> Tuple[str, LogicPath]:
         """スコープを決定し、ロジックパスを記録"""
-        path = {
-            "decision_tree": "スコープ決定フロー（医療機器版）",
-            "checks": [],
-            "reasoning": ""
-        }
+        path = LogicPath("scope")
+        device_class = self._resolve_device(device_type)
         
         # スコープが変わる攻撃（他システムに影響）
-        for attack in self.attack_patterns["scope_change_attacks"]:
-            if attack in threat_name:
-                path["checks"].append(f"スコープ変更攻撃: '{attack}' → Changed")
-                path["reasoning"] = f"{attack}は初期侵入点から他のシステムや機器に影響を拡大する攻撃"
-                path["result"] = "S:C (Changed)"
-                return "C", path
+        attack = self._match_first("scope_change_attacks", threat_name)
+        if attack:
+            path.add("s.attack", attack)
+            return "C", path
         
         # 医療機器ネットワーク相互接続性の考慮
-        for device in self.attack_patterns["networked_critical_devices"]:
-            if device in device_type:
-                # 攻撃の種類でスコープ影響を判定
-                if any(spreading in threat_name for spreading in [
-                    "ワーム", "ランサム", "横展開", "他システム", "ネットワーク全体"
-                ]):
-                    path["checks"].append(f"拡散型攻撃 + 重要機器: '{device}' → Changed")
-                    path["reasoning"] = f"{device}への拡散型攻撃は他システムに影響を及ぼしやすい"
-                    path["result"] = "S:C (Changed)"
-                    return "C", path
-                elif any(isolated in threat_name for isolated in [
-                    "盗聴", "設定変更", "データ改ざん", "単体"
-                ]):
-                    path["checks"].append(f"単体攻撃 + 重要機器: '{device}' → Unchanged")
-                    path["reasoning"] = f"{device}への単体攻撃は当該機器に限定"
-                    path["result"] = "S:U (Unchanged)"
-                    return "U", path
-                else:
-                    path["checks"].append(f"ネットワーク接続重要機器: '{device}' → Unchanged (デフォルト)")
-                    path["reasoning"] = f"{device}への攻撃は当該機器に限定される（安全側評価）"
-                    path["result"] = "S:U (Unchanged)"
-                    return "U", path
+        device = device_class.match("networked_critical_devices")
+        if device:
+            # 攻撃の種類でスコープ影響を判定
+            if any(spreading in threat_name for spreading in [
+                "ワーム", "ランサム", "横展開", "他システム", "ネットワーク全体"
+            ]):
+                path.add("s.device.spreading", device)
+                return "C", path
+            elif any(isolated in threat_name for isolated in [
+                "盗聴", "設定変更", "データ改ざん", "単体"
+            ]):
+                path.add("s.device.isolated", device)
+                return "U", path
+            else:
+                path.add("s.device.default", device)
+                return "U", path
         
         # デフォルト判定（攻撃の性質ベース）
         if any(spreading in threat_name for spreading in [
             "ネットワーク", "拡散", "伝播", "全体", "系全体"
         ]):
-            path["checks"].append("ネットワーク拡散攻撃 → S:C")
-            path["reasoning"] = "ネットワーク経由で拡散する攻撃はスコープ変更の可能性が高い"
-            path["result"] = "S:C (Changed)"
+            path.add("s.spreading")
             return "C", path
         else:
-            path["checks"].append("一般的攻撃（デフォルト単体）")
-            path["reasoning"] = "一般的な攻撃は単一機器に限定される（安全側評価）"
-            path["result"] = "S:U (Unchanged)"
+            path.add("s.default")
             return "U", path
     
-    def determine_cia_impact_with_path(self, threat_name: str, device_type: str, 
+    @_profiled_decision
+    def determine_cia_impact_with_path(self, threat_name: str, device_type: Union[str, DeviceClassification], 
                                      impact_types: List[str] = None, data_types: List[str] = None,
-                                     attack_type: str = "") -> Tuple[str, str, str, dict]:
+                                     attack_type: str = "") -> Tuple[str, str, str, LogicPath]:
         """CIA影響度を決定し、ロジックパスを記録"""
-        path = {
-            "decision_tree": "CIA影響度決定フロー（医療機器版）",
-            "checks": [],
-            "reasoning": ""
-        }
+        path = LogicPath("cia_impact")
         
         if impact_types is None:
             impact_types = []
@@ -442,29 +1308,28 @@ class CVSSLogicEngine:
             data_types = []
         
         # ベースとなる影響度を攻撃タイプから決定
-        base_c, base_i, base_a, base_reasoning = self._get_base_impact_from_attack_with_path(threat_name, impact_types)
-        path["checks"].extend(base_reasoning)
+        base_c, base_i, base_a, base_steps = self._get_base_impact_from_attack_with_path(threat_name, impact_types)
+        path.extend(base_steps)
         
         # デバイスタイプから資産分類を特定
-        asset_adjustment, asset_reasoning = self._get_asset_adjustment_with_path(device_type)
-        path["checks"].extend(asset_reasoning)
+        asset_adjustment, asset_steps = self._get_asset_adjustment_with_path(device_type)
+        path.extend(asset_steps)
         
         # 最終影響度を計算（資産調整のみ）
-        final_c, c_reasoning = self._apply_asset_adjustment_only_with_path(base_c, asset_adjustment.get("confidentiality", 0), "機密性")
-        final_i, i_reasoning = self._apply_asset_adjustment_only_with_path(base_i, asset_adjustment.get("integrity", 0), "完全性")
-        final_a, a_reasoning = self._apply_asset_adjustment_only_with_path(base_a, asset_adjustment.get("availability", 0), "可用性")
+        final_c, c_step = self._apply_asset_adjustment_only_with_path(base_c, asset_adjustment.get("confidentiality", 0), "c")
+        final_i, i_step = self._apply_asset_adjustment_only_with_path(base_i, asset_adjustment.get("integrity", 0), "i")
+        final_a, a_step = self._apply_asset_adjustment_only_with_path(base_a, asset_adjustment.get("availability", 0), "a")
         
-        path["checks"].extend([c_reasoning, i_reasoning, a_reasoning])
-        path["reasoning"] = "医療機器の資産分類を考慮してCIA影響度を決定"
-        path["result"] = f"最終CIA: C:{final_c}, I:{final_i}, A:{final_a}"
+        path.extend([c_step, i_step, a_step])
+        path.add("cia.final", final_c, final_i, final_a)
         
         return final_c, final_i, final_a, path
     
-    def _get_base_impact_from_attack_with_path(self, threat_name: str, impact_types: List[str] = None) -> Tuple[str, str, str, List[str]]:
+    def _get_base_impact_from_attack_with_path(self, threat_name: str, impact_types: List[str] = None) -> Tuple[str, str, str, List[tuple]]:
         """攻撃タイプから基本影響度を決定し、推論過程を記録（各CIA属性を独立評価）"""
         if impact_types is None:
             impact_types = []
-        reasoning = ["Step 1: 攻撃タイプ別基本影響度の決定（各CIA属性を独立評価）"]
+        steps = [("cia.base",)]
         
         # 初期値を設定
         confidentiality = "L"
@@ -474,160 +1339,162 @@ class CVSSLogicEngine:
         # 機密性への影響を評価
         if "機密性重視" in impact_types:
             confidentiality = "H"
-            reasoning.append("機密性重視攻撃フラグ → C:H")
+            steps.append(("cia.c.flag",))
         
         if any(conf in threat_name for conf in ["漏洩", "盗聴", "傍受", "搾取", "不正取得"]):
             confidentiality = "H"
             conf_keywords = [w for w in ["漏洩", "盗聴", "傍受", "搾取", "不正取得"] if w in threat_name]
-            reasoning.append(f"機密性攻撃キーワード検出: {conf_keywords} → C:H")
+            steps.append(("cia.c.keywords", conf_keywords))
         
-        for attack in self.attack_patterns["confidentiality_attacks"]:
-            if attack in threat_name:
-                confidentiality = "H"
-                reasoning.append(f"機密性攻撃パターン: '{attack}' → C:H")
-                break
+        attack = self._match_first("confidentiality_attacks", threat_name)
+        if attack:
+            confidentiality = "H"
+            steps.append(("cia.c.pattern", attack))
         
         # 完全性への影響を評価
         if "完全性重視" in impact_types:
             integrity = "H"
-            reasoning.append("完全性重視攻撃フラグ → I:H")
+            steps.append(("cia.i.flag",))
         
         if any(integ in threat_name for integ in ["改ざん", "書き換え", "偽装", "変更", "操作"]):
             integrity = "H"
             integ_keywords = [w for w in ["改ざん", "書き換え", "偽装", "変更", "操作"] if w in threat_name]
-            reasoning.append(f"完全性攻撃キーワード検出: {integ_keywords} → I:H")
+            steps.append(("cia.i.keywords", integ_keywords))
         
-        for attack in self.attack_patterns["integrity_attacks"]:
-            if attack in threat_name:
-                integrity = "H"
-                reasoning.append(f"完全性攻撃パターン: '{attack}' → I:H")
-                break
+        attack = self._match_first("integrity_attacks", threat_name)
+        if attack:
+            integrity = "H"
+            steps.append(("cia.i.pattern", attack))
         
         # 可用性への影響を評価
         if "可用性重視" in impact_types:
             availability = "H"
-            reasoning.append("可用性重視攻撃フラグ → A:H")
+            steps.append(("cia.a.flag",))
         
         if any(avail in threat_name for avail in ["停止", "不能", "DoS", "ジャミング", "妨害", "遮断"]):
             availability = "H"
             avail_keywords = [w for w in ["停止", "不能", "DoS", "ジャミング", "妨害", "遮断"] if w in threat_name]
-            reasoning.append(f"可用性攻撃キーワード検出: {avail_keywords} → A:H")
+            steps.append(("cia.a.keywords", avail_keywords))
         
-        for attack in self.attack_patterns["availability_attacks"]:
-            if attack in threat_name:
-                availability = "H"
-                reasoning.append(f"可用性攻撃パターン: '{attack}' → A:H")
-                break
+        attack = self._match_first("availability_attacks", threat_name)
+        if attack:
+            availability = "H"
+            steps.append(("cia.a.pattern", attack))
         
         # 破壊・物理攻撃の評価
-        for attack in self.attack_patterns["destructive_attacks"]:
-            if attack in threat_name:
-                integrity = "H"
-                availability = "H"
-                reasoning.append(f"破壊・物理攻撃: '{attack}' → I:H, A:H")
-                break
+        attack = self._match_first("destructive_attacks", threat_name)
+        if attack:
+            integrity = "H"
+            availability = "H"
+            steps.append(("cia.destructive", attack))
         
         # 複合影響攻撃の評価
-        for attack in self.attack_patterns["complex_attacks"]:
-            if attack in threat_name:
-                if confidentiality == "L":
-                    confidentiality = "L"  # 既に評価済みなら維持
-                integrity = "H"
-                availability = "H"
-                reasoning.append(f"複合影響攻撃: '{attack}' → I:H, A:H")
-                break
+        attack = self._match_first("complex_attacks", threat_name)
+        if attack:
+            if confidentiality == "L":
+                confidentiality = "L"  # 既に評価済みなら維持
+            integrity = "H"
+            availability = "H"
+            steps.append(("cia.complex", attack))
         
         # ネットワーク系攻撃の特別処理
         if any(network in threat_name for network in ["ネットワーク", "API", "Web", "リモート"]):
             if confidentiality == "L":
                 confidentiality = "H"
-                reasoning.append("ネットワーク系攻撃 → C:H（通常ネットワーク経由で情報取得可能）")
+                steps.append(("cia.network",))
         
         
-        reasoning.append(f"最終基本影響度: C:{confidentiality}, I:{integrity}, A:{availability}")
-        return confidentiality, integrity, availability, reasoning
+        steps.append(("cia.base.final", confidentiality, integrity, availability))
+        return confidentiality, integrity, availability, steps
     
-    def _get_asset_adjustment_with_path(self, device_type: str) -> Tuple[Dict[str, int], List[str]]:
+    def _get_asset_adjustment_with_path(self, device_type: Union[str, DeviceClassification]) -> Tuple[Dict[str, int], List[tuple]]:
         """デバイスタイプから資産調整値を取得し、推論過程を記録"""
-        reasoning = ["Step 2: 医療機器資産分類による調整"]
-        
-        for asset_class, details in self.asset_classification.items():
-            if any(device in device_type for device in details.get("devices", [])):
-                adjustment = {"confidentiality": 0, "integrity": 0, "availability": 0}
-                reasoning.append(f"資産分類: {asset_class} → '{device_type}'")
-                
-                # 優先度に基づく調整
-                if details.get("confidentiality_priority") == "highest":
-                    adjustment["confidentiality"] = 2
-                    reasoning.append("→ 機密性: +2段階 (最高優先度)")
-                elif details.get("confidentiality_priority") == "high":
-                    adjustment["confidentiality"] = 1
-                    reasoning.append("→ 機密性: +1段階 (高優先度)")
-                
-                if details.get("integrity_priority") == "highest":
-                    adjustment["integrity"] = 2
-                    reasoning.append("→ 完全性: +2段階 (最高優先度)")
-                elif details.get("integrity_priority") == "high":
-                    adjustment["integrity"] = 1
-                    reasoning.append("→ 完全性: +1段階 (高優先度)")
-                
-                if details.get("availability_priority") == "highest":
-                    adjustment["availability"] = 2
-                    reasoning.append("→ 可用性: +2段階 (最高優先度)")
-                elif details.get("availability_priority") == "high":
-                    adjustment["availability"] = 1
-                    reasoning.append("→ 可用性: +1段階 (高優先度)")
-                
-                return adjustment, reasoning
-        
-        reasoning.append("該当する特定資産分類なし → 調整なし")
-        return {"confidentiality": 0, "integrity": 0, "availability": 0}, reasoning
-    
-    def _estimate_data_requirements_with_path(self, device_type: str, threat_name: str, data_types: List[str] = None) -> Tuple[Dict[str, str], List[str]]:
+        steps = [("cia.asset",)]
+        device_class = self._resolve_device(device_type)
+        
+        asset_class = device_class.asset_class
+        if asset_class is not None:
+            details = self.asset_classification[asset_class]
+            adjustment = {"confidentiality": 0, "integrity": 0, "availability": 0}
+            steps.append(("cia.asset.class", asset_class, device_class.device_type))
+            
+            # 優先度に基づく調整
+            if details.get("confidentiality_priority") == "highest":
+                adjustment["confidentiality"] = 2
+                steps.append(("cia.asset.c.highest",))
+            elif details.get("confidentiality_priority") == "high":
+                adjustment["confidentiality"] = 1
+                steps.append(("cia.asset.c.high",))
+            
+            if details.get("integrity_priority") == "highest":
+                adjustment["integrity"] = 2
+                steps.append(("cia.asset.i.highest",))
+            elif details.get("integrity_priority") == "high":
+                adjustment["integrity"] = 1
+                steps.append(("cia.asset.i.high",))
+            
+            if details.get("availability_priority") == "highest":
+                adjustment["availability"] = 2
+                steps.append(("cia.asset.a.highest",))
+            elif details.get("availability_priority") == "high":
+                adjustment["availability"] = 1
+                steps.append(("cia.asset.a.high",))
+            
+            return adjustment, steps
+        
+        steps.append(("cia.asset.none",))
+        return {"confidentiality": 0, "integrity": 0, "availability": 0}, steps
+    
+    def _estimate_data_requirements_with_path(self, device_type: Union[str, DeviceClassification], threat_name: str, data_types: List[str] = None) -> Tuple[Dict[str, str], List[tuple]]:
         """デバイスタイプと脅威名からデータ要求レベルを推定し、推論過程を記録"""
         if data_types is None:
             data_types = []
-        reasoning = ["Step 3: データ要求レベルの推定"]
+        steps = [("cia.data",)]
+        device_class = self._resolve_device(device_type)
         
         # データタイプベースの調整（threat_extraction用）
         if "患者情報" in data_types:
-            reasoning.append("患者個人識別情報 (PII) → 機密性: 最高")
-            return {"confidentiality": "highest", "integrity": "high", "availability": "medium"}, reasoning
+            steps.append(("cia.data.pii",))
+            return {"confidentiality": "highest", "integrity": "high", "availability": "medium"}, steps
         
         safety_data = ["安全機能設定", "アラーム閾値", "治療計画"]
         for data in safety_data:
             if data in data_types:
-                reasoning.append(f"安全性・リスク管理データ: {data} → I: 最高, A: 最高")
-                return {"confidentiality": "medium", "integrity": "highest", "availability": "highest"}, reasoning
+                steps.append(("cia.data.safety", data))
+                return {"confidentiality": "medium", "integrity": "highest", "availability": "highest"}, steps
         
         # 安全性・有効性クリティカルなデータ
-        for keyword in self.attack_patterns["life_critical_keywords"]:
-            if keyword in device_type:
-                reasoning.append(f"生命維持機器: '{keyword}' → 安全性・有効性クリティカル")
-                reasoning.append("→ C:high, I:highest, A:highest")
-                return {"confidentiality": "high", "integrity": "highest", "availability": "highest"}, reasoning
+        keyword = device_class.match("life_critical_keywords")
+        if keyword:
+            steps.append(("cia.data.life_critical", keyword))
+            steps.append(("cia.data.requirements", "high", "highest", "highest"))
+            return {"confidentiality": "high", "integrity": "highest", "availability": "highest"}, steps
         
         # 診断・画像データ
-        for keyword in self.attack_patterns["diagnostic_keywords"]:
-            if keyword in device_type:
-                reasoning.append(f"診断・画像機器: '{keyword}' → 診断精度クリティカル")
-                reasoning.append("→ C:high, I:highest, A:high")
-                return {"confidentiality": "high", "integrity": "highest", "availability": "high"}, reasoning
+        keyword = device_class.match("diagnostic_keywords")
+        if keyword:
+            steps.append(("cia.data.diagnostic", keyword))
+            steps.append(("cia.data.requirements", "high", "highest", "high"))
+            return {"confidentiality": "high", "integrity": "highest", "availability": "high"}, steps
         
         # 情報システム
-        for keyword in self.attack_patterns["info_system_keywords"]:
-            if keyword in device_type:
-                reasoning.append(f"医療情報システム: '{keyword}' → 情報セキュリティクリティカル")
-                reasoning.append("→ C:highest, I:high, A:high")
-                return {"confidentiality": "highest", "integrity": "high", "availability": "high"}, reasoning
+        keyword = device_class.match("info_system_keywords")
+        if keyword:
+            steps.append(("cia.data.info_system", keyword))
+            steps.append(("cia.data.requirements", "highest", "high", "high"))
+            return {"confidentiality": "highest", "integrity": "high", "availability": "high"}, steps
         
         # デフォルト
-        reasoning.append("一般的医療機器 → 標準的なデータ要求")
-        reasoning.append("→ C:medium, I:high, A:medium")
-        return {"confidentiality": "medium", "integrity": "high", "availability": "medium"}, reasoning
+        steps.append(("cia.data.default",))
+        steps.append(("cia.data.requirements", "medium", "high", "medium"))
+        return {"confidentiality": "medium", "integrity": "high", "availability": "medium"}, steps
     
-    def _apply_adjustments_with_path(self, base_impact: str, asset_adjustment: int, data_requirement: str, impact_type: str) -> Tuple[str, str]:
-        """調整値を適用して最終影響度を決定し、推論過程を記録"""
+    def _apply_adjustments_with_path(self, base_impact: str, asset_adjustment: int, data_requirement: str, impact_type: str) -> Tuple[str, tuple]:
+        """
+        調整値を適用して最終影響度を決定し、推論過程を記録
+        
+        impact_typeは "c"、"i"、"a" のいずれか（ルールIDの選択に使用）
+        """
         # 影響度の数値変換
         impact_values = {"N": 0, "L": 1, "H": 2}
         requirement_values = {"low": 0, "medium": 1, "high": 2, "highest": 3}
@@ -638,7 +1505,7 @@ class CVSSLogicEngine:
         # ベース影響度がNoneの場合は調整を行わない（攻撃に直接影響がない場合）
         if base_impact == "N":
             final_impact = "N"
-            reasoning = f"{impact_type}調整: Base:{base_impact}(直接影響なし) → データ要求による調整をスキップ → 最終:{final_impact}"
+            step = (f"cia.requirement.{impact_type}.none", base_impact, final_impact)
         else:
             # 調整適用
             adjusted_value = min(base_value + asset_adjustment, 2)
@@ -648,13 +1515,17 @@ class CVSSLogicEngine:
             value_to_impact = {0: "N", 1: "L", 2: "H"}
             final_impact = value_to_impact[final_value]
             
-            # 推論文生成
-            reasoning = f"{impact_type}調整: Base:{base_impact}(値:{base_value}) + 資産調整:{asset_adjustment} = {adjusted_value}, データ要求:{data_requirement}(値:{requirement_value}) → 最終:{final_impact}"
+            step = (f"cia.requirement.{impact_type}", base_impact, base_value, asset_adjustment,
+                    adjusted_value, data_requirement, requirement_value, final_impact)
         
-        return final_impact, reasoning
+        return final_impact, step
     
-    def _apply_asset_adjustment_only_with_path(self, base_impact: str, asset_adjustment: int, impact_type: str) -> Tuple[str, str]:
-        """資産調整のみを適用して最終影響度を決定し、推論過程を記録"""
+    def _apply_asset_adjustment_only_with_path(self, base_impact: str, asset_adjustment: int, impact_type: str) -> Tuple[str, tuple]:
+        """
+        資産調整のみを適用して最終影響度を決定し、推論過程を記録
+        
+        impact_typeは "c"、"i"、"a" のいずれか（ルールIDの選択に使用）
+        """
         # 影響度の数値変換
         impact_values = {"N": 0, "L": 1, "H": 2}
         
@@ -663,7 +1534,7 @@ class CVSSLogicEngine:
         # ベース影響度がNoneの場合は調整を行わない
         if base_impact == "N":
             final_impact = "N"
-            reasoning = f"{impact_type}調整: Base:{base_impact}(直接影響なし) → 最終:{final_impact}"
+            step = (f"cia.adjust.{impact_type}.none", base_impact, final_impact)
         else:
             # 資産調整のみ適用
             adjusted_value = min(base_value + asset_adjustment, 2)
@@ -672,7 +1543,6 @@ class CVSSLogicEngine:
             value_to_impact = {0: "N", 1: "L", 2: "H"}
             final_impact = value_to_impact[adjusted_value]
             
-            # 推論文生成
-            reasoning = f"{impact_type}調整: Base:{base_impact}(値:{base_value}) + 資産調整:{asset_adjustment} → 最終:{final_impact}"
+            step = (f"cia.adjust.{impact_type}", base_impact, base_value, asset_adjustment, final_impact)
         
-        return final_impact, reasoning
\ No newline at end of file
+        return final_impact, step
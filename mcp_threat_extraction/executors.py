@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+ブロッキング処理の実行レイヤー
+上流LLM呼び出し（I/O待ち）と埋め込み推論・ルール評価（CPU処理）を
+それぞれ専用のスレッドプールで実行し、イベントループを塞がないようにする
+
+空き枠は優先度順に割り当てる（interactiveが常に先、bulkはユーザーごとにラウンドロビン）
+"""
+
+import os
+import sys
+import time
+import asyncio
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .logging_config import get_logger
+from .metrics import EXECUTOR_QUEUE_WAIT
+
+logger = get_logger(__name__)
+
+
+# torchの読み込み前に指定されたスレッド数（transformerバックエンドの読み込み時に適用する）
+_pending_torch_threads: Optional[int] = None
+
+
+def _pin_torch_threads(num_threads: int) -> None:
+    """
+    torchのスレッド数を固定（CPUプールのワーカー同士でコアを奪い合わないようにする）
+    torchが未読み込みなら読み込まずに保留する（tfidf・staticバックエンドではtorchを読み込まない）
+    """
+    global _pending_torch_threads
+    torch = sys.modules.get("torch")
+    if torch is None:
+        _pending_torch_threads = num_threads
+        return
+    torch.set_num_threads(num_threads)
+    logger.info(f"torch threads pinned to {num_threads}")
+
+
+def apply_pending_torch_threads() -> None:
+    """保留中のtorchのスレッド数を適用（torchを読み込んだ直後に呼ぶ）"""
+    if _pending_torch_threads is not None:
+        _pin_torch_threads(_pending_torch_threads)
+
+
+# スケジューリング優先度（単発・対話的な呼び出し → 一括処理の順）
+SCHEDULING_PRIORITIES = ("interactive", "bulk")
+
+# 実行中のリクエストの（優先度, ユーザーID）。タスク生成時にコピーされるため、バッチ内の各項目にも引き継がれる
+_scheduling: ContextVar[Tuple[str, str]] = ContextVar("executor_scheduling", default=("interactive", ""))
+
+
+@contextmanager
+def scheduling(priority: str, user: str = ""):
+    """このブロック内でプールに投入するタスクの優先度とユーザーを指定"""
+    if priority not in SCHEDULING_PRIORITIES:
+        raise ValueError(f"Unknown priority '{priority}'")
+    token = _scheduling.set((priority, user or ""))
+    try:
+        yield
+    finally:
+        _scheduling.reset(token)
+
+
+class FairPriorityQueue:
+    """優先度別の待ち行列（interactiveはFIFO、bulkはユーザーごとのキューをラウンドロビンで取り出す）"""
+
+    def __init__(self):
+        self._interactive: deque = deque()
+        self._bulk: Dict[str, deque] = {}
+        self._rotation: deque = deque()  # bulkの待機があるユーザーの巡回順
+
+    def __len__(self) -> int:
+        return len(self._interactive) + sum(len(items) for items in self._bulk.values())
+
+    def counts(self) -> Dict[str, int]:
+        return {"interactive": len(self._interactive), "bulk": len(self) - len(self._interactive)}
+
+    def has_waiting(self, priority: str) -> bool:
+        """priorityと同じか、より高い優先度の待機があるか"""
+        if priority == "interactive":
+            return bool(self._interactive)
+        return len(self) > 0
+
+    def push(self, priority: str, user: str, item: Any) -> None:
+        if priority == "interactive":
+            self._interactive.append(item)
+            return
+        if user not in self._bulk:
+            self._bulk[user] = deque()
+            self._rotation.append(user)
+        self._bulk[user].append(item)
+
+    def pop(self, allow_bulk: bool = True) -> Optional[Tuple[str, Any]]:
+        """次に実行する（優先度, 項目）。allow_bulk=Falseではinteractiveのみ"""
+        if self._interactive:
+            return "interactive", self._interactive.popleft()
+        if not allow_bulk or not self._rotation:
+            return None
+        user = self._rotation.popleft()
+        items = self._bulk[user]
+        item = items.popleft()
+        if items:
+            self._rotation.append(user)
+        else:
+            del self._bulk[user]
+        return "bulk", item
+
+    def discard(self, item: Any) -> None:
+        """取り消された項目を取り除く"""
+        if item in self._interactive:
+            self._interactive.remove(item)
+            return
+        for user, items in list(self._bulk.items()):
+            if item in items:
+                items.remove(item)
+                if not items:
+                    del self._bulk[user]
+                    self._rotation.remove(user)
+                return
+
+
+class ExecutorPool:
+    """サイズ固定のスレッドプール（実行中・待機中のタスク数と稼働時間を集計する）"""
+
+    def __init__(self, name: str, max_workers: int, reserved_interactive: int = 0):
+        self.name = name
+        self.max_workers = max(max_workers, 1)
+        # bulkが使えない、interactive専用の枠数
+        self.reserved_interactive = min(max(reserved_interactive, 0), self.max_workers - 1)
+        self._running = {priority: 0 for priority in SCHEDULING_PRIORITIES}
+        self._waiting = FairPriorityQueue()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"{name}-executor")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0
+        self._started_at = time.monotonic()
+
+    def _call(self, state: dict, submitted_at: float, func: Callable, args: tuple, kwargs: dict) -> Any:
+        """ワーカースレッド側で実行され、待機時間と処理時間を記録する"""
+        start = time.monotonic()
+        with self._lock:
+            if state["cancelled"]:
+                return None
+            state["started"] = True
+            self.queued -= 1
+            self.active += 1
+            self.wait_seconds += start - submitted_at
+        failed = False
+        try:
+            return func(*args, **kwargs)
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.busy_seconds += time.monotonic() - start
+                if failed:
+                    self.failed += 1
+                else:
+                    self.completed += 1
+
+    def _can_start(self, priority: str) -> bool:
+        """priorityのタスクに今すぐ枠を割り当てられるか"""
+        if sum(self._running.values()) >= self.max_workers:
+            return False
+        if priority == "bulk":
+            return self._running["bulk"] < self.max_workers - self.reserved_interactive
+        return True
+
+    def _dispatch(self) -> None:
+        """空いた枠を優先度順に待機中のタスクへ引き渡す（イベントループ上で呼ばれる）"""
+        while sum(self._running.values()) < self.max_workers:
+            entry = self._waiting.pop(allow_bulk=self._can_start("bulk"))
+            if entry is None:
+                return
+            priority, gate = entry
+            if gate.done():
+                continue
+            self._running[priority] += 1
+            gate.set_result(None)
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """プール上でfuncを実行し、結果を待つ（枠の割り当てはscheduling()の優先度・ユーザーに従う）"""
+        loop = asyncio.get_running_loop()
+        priority, user = _scheduling.get()
+        submitted_at = time.monotonic()
+        
+        if self._can_start(priority) and not self._waiting.has_waiting(priority):
+            self._running[priority] += 1
+        else:
+            gate = loop.create_future()
+            self._waiting.push(priority, user, gate)
+            try:
+                await gate
+            except asyncio.CancelledError:
+                if gate.done() and not gate.cancelled():
+                    # 枠を引き渡された後に取り消された場合は返却する
+                    self._release(priority)
+                else:
+                    self._waiting.discard(gate)
+                raise
+        EXECUTOR_QUEUE_WAIT.labels(pool=self.name, priority=priority).observe(time.monotonic() - submitted_at)
+        
+        state = {"started": False, "cancelled": False}
+        with self._lock:
+            self.queued += 1
+        # リクエストIDなどのコンテキスト変数をワーカースレッドに引き継ぐ
+        context = contextvars.copy_context()
+        try:
+            future = self._executor.submit(context.run, self._call, state, submitted_at, func, args, kwargs)
+        except BaseException:
+            with self._lock:
+                self.queued -= 1
+            self._release(priority)
+            raise
+        # 枠はスレッド側の処理が終わった時点で返却する（待機側が取り消されても、実行中のスレッドは枠を使い続ける）
+        future.add_done_callback(lambda _: self._release_threadsafe(loop, priority))
+        try:
+            return await asyncio.wrap_future(future, loop=loop)
+        except asyncio.CancelledError:
+            # 実行開始前に取り消された場合は待機数を戻す（開始済みのタスクは完了まで計上される）
+            with self._lock:
+                if not state["started"]:
+                    state["cancelled"] = True
+                    self.queued -= 1
+            raise
+
+    def _release(self, priority: str) -> None:
+        """実行を終えたタスクの枠を返却し、待機中のタスクに引き渡す（イベントループ上で呼ばれる）"""
+        self._running[priority] -= 1
+        self._dispatch()
+
+    def _release_threadsafe(self, loop: asyncio.AbstractEventLoop, priority: str) -> None:
+        """ワーカースレッドの完了時に、枠の返却をイベントループに依頼する"""
+        try:
+            loop.call_soon_threadsafe(self._release, priority)
+        except RuntimeError:
+            # イベントループが既に閉じている（停止処理中）
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        """プールの利用状況"""
+        with self._lock:
+            finished = self.completed + self.failed
+            uptime = max(time.monotonic() - self._started_at, 1e-9)
+            return {
+                "max_workers": self.max_workers,
+                "reserved_interactive": self.reserved_interactive,
+                "active": self.active,
+                "queued": self.queued + len(self._waiting),
+                "running_by_priority": dict(self._running),
+                "waiting_by_priority": self._waiting.counts(),
+                "completed": self.completed,
+                "failed": self.failed,
+                "utilization": round(self.active / self.max_workers, 4),
+                "busy_ratio": round(self.busy_seconds / (uptime * self.max_workers), 4),
+                "mean_wait_ms": round(self.wait_seconds / finished * 1000, 3) if finished else 0.0,
+                "mean_run_ms": round(self.busy_seconds / finished * 1000, 3) if finished else 0.0
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """プールを停止（wait=Falseでは未開始のタスクを取り消す）"""
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+# プールのサイズは環境変数で設定可能
+llm_executor: Optional[ExecutorPool] = None
+cpu_executor: Optional[ExecutorPool] = None
+
+
+def get_llm_executor() -> ExecutorPool:
+    """上流LLM呼び出し用プール（LLM_EXECUTOR_WORKERS、既定16。うちinteractive専用はLLM_EXECUTOR_RESERVED_INTERACTIVE、既定2）"""
+    global llm_executor
+    if llm_executor is None:
+        llm_executor = ExecutorPool(
+            "llm",
+            int(os.getenv("LLM_EXECUTOR_WORKERS", "16")),
+            int(os.getenv("LLM_EXECUTOR_RESERVED_INTERACTIVE", "2"))
+        )
+    return llm_executor
+
+
+def get_cpu_executor() -> ExecutorPool:
+    """埋め込み推論・ルール評価用プール（CPU_EXECUTOR_WORKERS、既定はCPU数と4の小さい方）"""
+    global cpu_executor
+    if cpu_executor is None:
+        cpu_count = os.cpu_count() or 1
+        workers = int(os.getenv("CPU_EXECUTOR_WORKERS", str(min(cpu_count, 4))))
+        # ワーカー数×torchスレッド数がCPU数を超えないようにする
+        torch_threads = int(os.getenv("TORCH_NUM_THREADS", str(max(cpu_count // max(workers, 1), 1))))
+        _pin_torch_threads(torch_threads)
+        cpu_executor = ExecutorPool("cpu", workers, int(os.getenv("CPU_EXECUTOR_RESERVED_INTERACTIVE", "0")))
+    return cpu_executor
+
+
+async def run_llm(func: Callable, *args, **kwargs) -> Any:
+    """上流LLM呼び出しをLLMプールで実行"""
+    return await get_llm_executor().run(func, *args, **kwargs)
+
+
+async def run_cpu(func: Callable, *args, **kwargs) -> Any:
+    """CPU処理（埋め込み・ルール評価・スコア計算）をCPUプールで実行"""
+    return await get_cpu_executor().run(func, *args, **kwargs)
+
+
+def executor_stats() -> Dict[str, Any]:
+    """/metrics/executors向けの利用状況（未使用のプールは生成しない）"""
+    return {
+        "llm": llm_executor.stats() if llm_executor is not None else None,
+        "cpu": cpu_executor.stats() if cpu_executor is not None else None
+    }
+
+
+def shutdown_executors() -> None:
+    """全プールを停止"""
+    global llm_executor, cpu_executor
+    for pool in (llm_executor, cpu_executor):
+        if pool is not None:
+            pool.shutdown(wait=False)
+    llm_executor = None
+    cpu_executor = None
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+評価結果のフィンガープリント（差分再評価用）
+脅威記述文・入力済みの特徴・出力形式と、結果を左右するパイプラインの版
+（LLMモデル、プロンプト、CVSSルール、正規化器と参照文、threat_dataの定義）をまとめてハッシュする。
+前回の結果と同じフィンガープリントの件は再計算せずに結果を引き継げる
+"""
+
+import os
+import json
+import hashlib
+import inspect
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+FINGERPRINT_LENGTH = 32
+
+# 正規化の結果を左右する設定（モデル・バックエンドの選択）
+NORMALIZER_SETTINGS = ("USE_SMALL_MODEL", "NORMALIZER_BACKEND", "STATIC_EMBEDDINGS_PATH",
+                       "TFIDF_MATCH_THRESHOLD", "TFIDF_TEXT_THRESHOLD")
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _canonical_json(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+
+
+@lru_cache(maxsize=1)
+def pipeline_components() -> Dict[str, str]:
+    """結果を左右する構成要素ごとの版（ルール・データはソースと定義のハッシュ）"""
+    from . import cvss_logic, reference_index, semantic_normalizer_optimized, tfidf_normalizer, threat_extraction
+    from .semantic_normalizer_optimized import load_reference_corpora
+    from .threat_data import ASSET_CLASSIFICATION, DATA_CLASSIFICATION, CVSS_ATTACK_PATTERNS
+
+    return {
+        "model": threat_extraction.llm.model_name,
+        "prompt": _digest("".join(message.prompt.template for message in threat_extraction.prompt.messages)),
+        "rules": _digest(inspect.getsource(cvss_logic)
+                         + inspect.getsource(threat_extraction.determine_cvss_from_features)
+                         + inspect.getsource(threat_extraction.build_cvss_result)),
+        "normalizer": _digest(inspect.getsource(semantic_normalizer_optimized)
+                              + inspect.getsource(reference_index)
+                              + inspect.getsource(tfidf_normalizer)
+                              + inspect.getsource(threat_extraction.normalize_features_with_semantic)
+                              + _canonical_json([os.getenv(name) for name in NORMALIZER_SETTINGS])),
+        "reference_corpora": _digest(_canonical_json(load_reference_corpora())),
+        "threat_data": _digest(_canonical_json([ASSET_CLASSIFICATION, DATA_CLASSIFICATION, CVSS_ATTACK_PATTERNS]))
+    }
+
+
+@lru_cache(maxsize=1)
+def pipeline_version() -> str:
+    """パイプライン全体の版（いずれかの構成要素が変わると変わる）"""
+    version = _digest(_canonical_json(pipeline_components()))
+    logger.info(f"Pipeline version: {version} {pipeline_components()}")
+    return version
+
+
+def output_options(explain: str, field_paths: Optional[List[Tuple[str, ...]]], compact: bool) -> Dict[str, Any]:
+    """結果の形に影響する出力形式（fieldsは指定方法によらず同じ表現にそろえる）"""
+    fields = ",".join(".".join(path) for path in field_paths) if field_paths else None
+    return {"explain": explain, "fields": fields, "compact": bool(compact)}
+
+
+def item_fingerprint(threat_description: str, raw_features: Optional[Dict[str, Any]] = None,
+                     features: Optional[Dict[str, Any]] = None, options: Optional[Dict[str, Any]] = None) -> str:
+    """
+    1件のフィンガープリント
+
+    Args:
+        threat_description: 脅威記述文
+        raw_features: 入力に含まれるLLMの抽出結果
+        features: 入力に含まれる正規化済みの特徴
+        options: 結果の形に影響する出力形式（explain / fields / compact）
+    """
+    payload = _canonical_json([pipeline_version(), options or {}, threat_description, raw_features, features])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:FINGERPRINT_LENGTH]
+
+
+class PreviousResults:
+    """
+    前回のバッチ出力（JSONL）をフィンガープリントで引く索引
+    メモリを抑えるため、フィンガープリントごとに行の位置だけを保持し、引き継ぐ時に読み出す。
+    エラーになった件は引き継がない
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._offsets: Dict[str, int] = {}
+        self._file = open(path, "rb")
+        offset = 0
+        for line in self._file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 中断した前回出力の末尾の書きかけ行
+                record = None
+            if isinstance(record, dict) and "fingerprint" in record and "error" not in record:
+                self._offsets[record["fingerprint"]] = offset
+            offset += len(line)
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __contains__(self, fingerprint: str) -> bool:
+        return fingerprint in self._offsets
+
+    def get(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """前回の結果（行番号・ID・フィンガープリントを除く）"""
+        offset = self._offsets.get(fingerprint)
+        if offset is None:
+            return None
+        self._file.seek(offset)
+        record = json.loads(self._file.readline())
+        for key in ("line", "id", "fingerprint"):
+            record.pop(key, None)
+        return record
+
+    def close(self) -> None:
+        self._file.close()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+ローカル検証用のJWKS・IDトークン発行ツール
+AUTH_BACKEND=jwks と JWKS_SOURCE=<jwks.json> を組み合わせ、ネットワークなしで認証経路を含めた負荷試験を行う
+
+使い方:
+    python -m mcp_threat_extraction.local_tokens keygen ./keys
+    python -m mcp_threat_extraction.local_tokens mint ./keys/signing_key.pem --uid load-user --count 100
+"""
+
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+DEFAULT_KID = "local-test-key"
+
+
+def generate_signing_key(kid: str = DEFAULT_KID) -> Tuple[str, Dict[str, Any]]:
+    """RSA署名鍵（PEM）と、その公開鍵だけを含むJWKSを生成"""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    ).decode()
+
+    public_jwk = jwk.construct(private_pem, "RS256").public_key().to_dict()
+    public_jwk.update({"kid": kid, "use": "sig", "alg": "RS256"})
+    return private_pem, {"keys": [public_jwk]}
+
+
+def mint_token(private_pem: str, uid: str, kid: str = DEFAULT_KID, issuer: Optional[str] = None,
+               audience: Optional[str] = None, lifetime: int = 3600, **extra_claims) -> str:
+    """Firebase IDトークンと同じ形式のクレームを持つトークンを発行"""
+    now = int(time.time())
+    claims = {"sub": uid, "user_id": uid, "iat": now, "exp": now + lifetime, **extra_claims}
+    if issuer:
+        claims["iss"] = issuer
+    if audience:
+        claims["aud"] = audience
+    return jwt.encode(claims, private_pem, algorithm="RS256", headers={"kid": kid})
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="ローカル検証用のJWKS・IDトークン発行")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    keygen = subparsers.add_parser("keygen", help="署名鍵とjwks.jsonを生成")
+    keygen.add_argument("out_dir")
+    keygen.add_argument("--kid", default=DEFAULT_KID)
+
+    mint = subparsers.add_parser("mint", help="IDトークンを発行（1行に1トークン）")
+    mint.add_argument("key_file")
+    mint.add_argument("--uid", default="load-test-user")
+    mint.add_argument("--kid", default=DEFAULT_KID)
+    mint.add_argument("--issuer")
+    mint.add_argument("--audience")
+    mint.add_argument("--lifetime", type=int, default=3600)
+    mint.add_argument("--count", type=int, default=1, help="uidに連番を付けて複数発行")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "keygen":
+        out_dir = Path(args.out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        private_pem, jwks = generate_signing_key(args.kid)
+        key_file = out_dir / "signing_key.pem"
+        key_file.write_text(private_pem)
+        key_file.chmod(0o600)
+        (out_dir / "jwks.json").write_text(json.dumps(jwks, indent=2))
+        print(f"JWKS_SOURCE={out_dir / 'jwks.json'}")
+        return 0
+
+    private_pem = Path(args.key_file).read_text()
+    for i in range(args.count):
+        uid = args.uid if args.count == 1 else f"{args.uid}-{i}"
+        print(mint_token(private_pem, uid, args.kid, args.issuer, args.audience, args.lifetime))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
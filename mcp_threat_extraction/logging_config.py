@@ -1,20 +1,180 @@
-import logging
+import os
 import sys
-from typing import Optional
+import copy
+import json
+import uuid
+import zlib
+import atexit
+import queue
+import random
+import logging
+import logging.handlers
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, TextIO
+
+
+# リクエスト単位の相関ID・処理段階ごとの所要時間（ミリ秒）
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+_stage_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("stage_timings", default=None)
+
+# ログレコードの標準属性（これ以外はextraとしてJSONに出力する）
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {
+    "message", "asctime", "taskName", "request_id", "stage_timings"
+}
+
+_listeners: List[logging.handlers.QueueListener] = []
+
+
+@contextmanager
+def request_context(request_id: Optional[str] = None) -> Iterator[str]:
+    """
+    リクエストIDと処理段階の計測値をコンテキストに設定する。
+    
+    Args:
+        request_id: 引き継ぐリクエストID。Noneの場合は新しく採番する。
+    
+    Yields:
+        設定したリクエストID
+    """
+    request_id = request_id or uuid.uuid4().hex
+    id_token = request_id_var.set(request_id)
+    stages_token = _stage_timings.set({})
+    try:
+        yield request_id
+    finally:
+        _stage_timings.reset(stages_token)
+        request_id_var.reset(id_token)
+
+
+def get_request_id() -> Optional[str]:
+    """現在のリクエストID（リクエスト外ではNone）"""
+    return request_id_var.get()
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    """処理段階の所要時間を現在のリクエストに加算する（リクエスト外では何もしない）"""
+    stages = _stage_timings.get()
+    if stages is not None:
+        stages[stage] = round(stages.get(stage, 0.0) + seconds * 1000, 3)
+
+
+def get_stage_timings() -> Dict[str, float]:
+    """現在のリクエストで計測済みの処理段階ごとの所要時間（ミリ秒）"""
+    return dict(_stage_timings.get() or {})
+
+
+class RequestContextFilter(logging.Filter):
+    """ログ出力元のスレッドでリクエストIDと段階別の所要時間をレコードに付与する"""
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        record.stage_timings = get_stage_timings()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    DEBUGレベルのログをロガー名ごとの割合で間引く（INFO以上は常に出力）。
+    リクエスト内ではリクエストIDで判定するため、採用されたリクエストのログは欠けずに残る。
+    """
+    
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+    
+    def rate_for(self, logger_name: str) -> float:
+        """最も長く一致するロガー名の割合（未指定は1.0）"""
+        best_prefix, best_rate = "", 1.0
+        for prefix, rate in self.rates.items():
+            matches = logger_name == prefix or logger_name.startswith(prefix + ".")
+            if matches and len(prefix) > len(best_prefix):
+                best_prefix, best_rate = prefix, rate
+        return best_rate
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        rate = self.rate_for(record.name)
+        if rate >= 1.0:
+            return True
+        request_id = getattr(record, "request_id", None) or request_id_var.get()
+        if request_id:
+            return zlib.crc32(request_id.encode()) % 10000 < rate * 10000
+        return random.random() < rate
+
+
+def parse_sample_rates(spec: Optional[str]) -> Dict[str, float]:
+    """"logger.name=0.01,other=0.5"形式のサンプリング指定を読み込む"""
+    rates = {}
+    for item in (spec or "").split(","):
+        name, _, rate = item.strip().partition("=")
+        if name and rate:
+            rates[name] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    """
+    メッセージだけを出力元のスレッドで確定し、例外情報は残したままキューに渡す。
+    標準のprepare()はトレースバックをメッセージに埋め込んでexc_infoを消すため、
+    JsonFormatterがexc_infoを別のキーとして出力できるよう整形はリスナー側に任せる。
+    """
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """1行1レコードの構造化JSON（リクエストID・段階別の所要時間・extraを含む）"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            payload["request_id"] = request_id
+        stages = getattr(record, "stage_timings", None)
+        if stages:
+            payload["stages_ms"] = stages
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
 
 
 def setup_logging(
     name: Optional[str] = None,
     level: str = "INFO",
-    format_string: Optional[str] = None
+    format_string: Optional[str] = None,
+    json_format: Optional[bool] = None,
+    stream: Optional[TextIO] = None,
+    sample_rates: Optional[Dict[str, float]] = None
 ) -> logging.Logger:
     """
     Set up logging configuration for the application.
     
+    Records are handed to a QueueHandler and written by a QueueListener thread,
+    so log I/O never blocks the event loop.
+    
     Args:
         name: Logger name. If None, returns root logger.
         level: Logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
         format_string: Custom format string. If None, uses default format.
+        json_format: Emit structured JSON lines. If None, enabled when LOG_FORMAT=json.
+        stream: Output stream. If None, uses sys.stdout.
+        sample_rates: DEBUG sampling rates per logger name. If None, read from LOG_SAMPLE_RATES.
     
     Returns:
         Configured logger instance
@@ -23,19 +183,57 @@ def setup_logging(
     
     # Only configure if no handlers are set (avoid duplicate handlers)
     if not logger.handlers:
-        handler = logging.StreamHandler(sys.stdout)
-        
-        if format_string is None:
-            format_string = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+        handler = logging.StreamHandler(stream or sys.stdout)
         
-        formatter = logging.Formatter(format_string)
+        if json_format is None:
+            json_format = os.getenv("LOG_FORMAT", "text").lower() == "json"
+        if json_format:
+            formatter = JsonFormatter()
+        else:
+            if format_string is None:
+                format_string = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+            formatter = logging.Formatter(format_string)
         handler.setFormatter(formatter)
-        logger.addHandler(handler)
+        
+        if sample_rates is None:
+            sample_rates = parse_sample_rates(os.getenv("LOG_SAMPLE_RATES"))
+        
+        queue_handler = ContextQueueHandler(queue.SimpleQueue())
+        queue_handler.addFilter(RequestContextFilter())
+        queue_handler.addFilter(SamplingFilter(sample_rates))
+        logger.addHandler(queue_handler)
         logger.setLevel(getattr(logging, level.upper()))
+        
+        listener = logging.handlers.QueueListener(queue_handler.queue, handler)
+        listener.start()
+        if not _listeners:
+            atexit.register(shutdown_logging)
+        _listeners.append(listener)
     
     return logger
 
 
+def configure_logging_from_env(stream: Optional[TextIO] = None) -> Optional[logging.Logger]:
+    """
+    LOG_FORMAT（text / json）が設定されている場合のみルートロガーを構成する。
+    
+    Args:
+        stream: Output stream. stdioのMCPサーバーではsys.stderrを指定する。
+    
+    Returns:
+        構成したルートロガー（LOG_FORMAT未設定の場合はNone）
+    """
+    if not os.getenv("LOG_FORMAT"):
+        return None
+    return setup_logging(level=os.getenv("LOG_LEVEL", "INFO"), stream=stream)
+
+
+def shutdown_logging() -> None:
+    """キューに残ったログを書き出してリスナーを停止"""
+    while _listeners:
+        _listeners.pop().stop()
+
+
 def get_logger(name: str) -> logging.Logger:
     """
     Get a logger instance with the module name.
@@ -46,4 +244,4 @@ def get_logger(name: str) -> logging.Logger:
     Returns:
         Logger instance
     """
-    return logging.getLogger(name)
\ No newline at end of file
+    return logging.getLogger(name)
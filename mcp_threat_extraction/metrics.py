@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Prometheusメトリクス
+ツールごとのリクエスト数・レイテンシ、処理段階ごとのレイテンシ、キャッシュヒット率を集計する
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Tuple
+
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from .logging_config import get_logger, record_stage
+
+logger = get_logger(__name__)
+
+# 処理段階（意味キャッシュの検索 → LLM呼び出し → JSON解析 → セマンティック正規化 → CVSSロジック → スコア計算 → 結果の保存）
+PIPELINE_STAGES = ("semantic_cache", "llm_call", "json_parse", "semantic_normalization", "cvss_logic", "scoring",
+                   "result_store")
+
+# LLM呼び出しは数秒、ルール評価はマイクロ秒単位のため広い範囲のバケットを用意する
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+TOOL_REQUESTS = Counter(
+    "mcp_tool_requests_total", "ツール呼び出し数", ["tool", "status"]
+)
+TOOL_LATENCY = Histogram(
+    "mcp_tool_duration_seconds", "ツール呼び出しのレイテンシ", ["tool"], buckets=LATENCY_BUCKETS
+)
+TOOL_IN_FLIGHT = Gauge(
+    "mcp_tool_requests_in_flight", "処理中のツール呼び出し数", ["tool"]
+)
+STAGE_LATENCY = Histogram(
+    "mcp_stage_duration_seconds", "処理段階ごとのレイテンシ", ["stage"], buckets=LATENCY_BUCKETS
+)
+NORMALIZER_INIT_SECONDS = Gauge(
+    "mcp_semantic_normalizer_init_seconds", "セマンティック正規化器の初期化時間"
+)
+ADMISSION_QUEUE_WAIT = Histogram(
+    "mcp_admission_queue_wait_seconds", "受付待機時間", ["endpoint_class"], buckets=LATENCY_BUCKETS
+)
+ADMISSION_REJECTED = Counter(
+    "mcp_admission_rejected_total", "待機枠超過で拒否（429）したリクエスト数", ["endpoint_class"]
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "mcp_admission_in_flight", "受付済みで処理中のリクエスト数", ["endpoint_class"]
+)
+ADMISSION_QUEUED = Gauge(
+    "mcp_admission_queued", "受付待機中のリクエスト数", ["endpoint_class"]
+)
+EXECUTOR_QUEUE_WAIT = Histogram(
+    "mcp_executor_queue_wait_seconds", "実行プールの枠待ち時間", ["pool", "priority"], buckets=LATENCY_BUCKETS
+)
+NORMALIZER_LATENCY = Histogram(
+    "mcp_normalizer_duration_seconds", "モデル階層ごとのセマンティック正規化のレイテンシ", ["model"], buckets=LATENCY_BUCKETS
+)
+MODEL_REGISTRY_EVENTS = Counter(
+    "mcp_model_registry_events_total", "モデル登録簿の読み込み・退避数", ["model", "event"]
+)
+MODEL_REGISTRY_MEMORY = Gauge(
+    "mcp_model_registry_memory_bytes", "読み込み済みの正規化器の推定メモリ（退避済みは0）", ["model"]
+)
+PROCESS_RSS = Gauge(
+    "mcp_process_rss_bytes", "プロセスの常駐メモリ（RSS）"
+)
+
+try:
+    import psutil
+    _process = psutil.Process()
+    PROCESS_RSS.set_function(lambda: _process.memory_info().rss)
+except ImportError:
+    pass
+
+# キャッシュ名 → (ヒット数, ミス数)を返す関数
+_cache_sources: Dict[str, Callable[[], Tuple[int, int]]] = {}
+
+
+def register_cache(name: str, info: Callable[[], Tuple[int, int]]) -> None:
+    """ヒット数・ミス数をスクレイプ時に読み出すキャッシュを登録"""
+    _cache_sources[name] = info
+
+
+def lru_cache_info(cached_function) -> Callable[[], Tuple[int, int]]:
+    """functools.lru_cacheのcache_info()をregister_cache用の関数に変換"""
+    def info() -> Tuple[int, int]:
+        stats = cached_function.cache_info()
+        return stats.hits, stats.misses
+    return info
+
+
+class CacheCollector:
+    """登録済みキャッシュのヒット数・ミス数・ヒット率"""
+
+    def collect(self):
+        hits = CounterMetricFamily("mcp_cache_hits", "キャッシュヒット数", labels=["cache"])
+        misses = CounterMetricFamily("mcp_cache_misses", "キャッシュミス数", labels=["cache"])
+        ratio = GaugeMetricFamily("mcp_cache_hit_ratio", "キャッシュヒット率", labels=["cache"])
+        for name, info in list(_cache_sources.items()):
+            hit_count, miss_count = info()
+            hits.add_metric([name], hit_count)
+            misses.add_metric([name], miss_count)
+            total = hit_count + miss_count
+            ratio.add_metric([name], hit_count / total if total else 0.0)
+        yield hits
+        yield misses
+        yield ratio
+
+
+REGISTRY.register(CacheCollector())
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """処理段階の所要時間をヒストグラムと現在のリクエストのログ項目に記録"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY.labels(stage=stage).observe(elapsed)
+        record_stage(stage, elapsed)
+
+
+@contextmanager
+def track_tool(tool: str):
+    """ツール呼び出しの処理中数・レイテンシ・成否を記録"""
+    in_flight = TOOL_IN_FLIGHT.labels(tool=tool)
+    in_flight.inc()
+    start = time.perf_counter()
+    status = "error"
+    try:
+        yield
+        status = "success"
+    finally:
+        elapsed = time.perf_counter() - start
+        in_flight.dec()
+        TOOL_LATENCY.labels(tool=tool).observe(elapsed)
+        TOOL_REQUESTS.labels(tool=tool, status=status).inc()
+        logger.info(f"Tool {tool} finished: {status} in {elapsed * 1000:.1f}ms",
+                    extra={"tool": tool, "status": status, "duration_ms": round(elapsed * 1000, 3)})
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Prometheusテキスト形式の出力とContent-Type"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+セマンティック正規化器のモデル登録簿
+精度重視・レイテンシ重視の利用者を同じプロセスで扱えるよう、名前（モデル階層）ごとの正規化器を必要になった時に読み込み、
+推定メモリの合計が予算（NORMALIZER_MEMORY_BUDGET_MB、既定1024）を超えたら最も長く使われていないものから退避する
+
+リクエストはmodel_tierで階層を選ぶ（未指定ならNORMALIZER_BACKEND・USE_SMALL_MODELで決まる既定の正規化器）。
+既定の正規化器も登録簿が保持して予算に含め（退避はしない）、既定と同じモデルの階層はその正規化器を共有する。
+階層はNORMALIZER_MODEL_TIERSにJSONで定義できる:
+    {"accurate": {"backend": "transformer", "model_name": "all-MiniLM-L6-v2"},
+     "light": {"backend": "tfidf"},
+     "static": {"backend": "static", "path": "./static-minilm"}}
+"""
+
+import os
+import json
+import time
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+from .logging_config import get_logger
+from .metrics import NORMALIZER_LATENCY, MODEL_REGISTRY_EVENTS, MODEL_REGISTRY_MEMORY
+
+logger = get_logger(__name__)
+
+# 既定のモデル階層（NORMALIZER_MODEL_TIERSで置き換え可能）
+DEFAULT_MODEL_TIERS: Dict[str, Dict[str, Any]] = {
+    "accurate": {"backend": "transformer", "model_name": "all-MiniLM-L6-v2"},
+    "fast": {"backend": "transformer", "model_name": "paraphrase-MiniLM-L3-v2"},
+    "light": {"backend": "tfidf"},
+}
+
+# 階層を指定しないリクエストの正規化器のレイテンシのラベル
+DEFAULT_TIER_LABEL = "default"
+
+# 実行中のリクエストのモデル階層（Noneは既定の正規化器）。タスク生成時・実行プールへの投入時に引き継がれる
+_model_tier: ContextVar[Optional[str]] = ContextVar("normalizer_model_tier", default=None)
+
+
+def default_normalizer_spec() -> Dict[str, Any]:
+    """NORMALIZER_BACKEND・USE_SMALL_MODEL・STATIC_EMBEDDINGS_PATHで決まる既定の正規化器の定義"""
+    backend = os.getenv("NORMALIZER_BACKEND", "transformer").lower()
+    if backend == "tfidf":
+        return {"backend": backend}
+    if backend == "static":
+        return {"backend": backend, "path": os.getenv("STATIC_EMBEDDINGS_PATH")}
+    small = os.getenv("USE_SMALL_MODEL", "false").lower() == "true"
+    return {"backend": backend, "model_name": "paraphrase-MiniLM-L3-v2" if small else "all-MiniLM-L6-v2"}
+
+
+def spec_key(spec: Dict[str, Any]) -> tuple:
+    """同じ正規化器になる定義を同一視するキー（省略された既定値を補う）"""
+    backend = spec.get("backend", "transformer").lower()
+    if backend == "transformer":
+        return backend, spec.get("model_name", "all-MiniLM-L6-v2")
+    if backend == "static":
+        return backend, spec.get("path")
+    if backend == "tfidf":
+        return (backend,)
+    return backend, json.dumps(spec, sort_keys=True)
+
+
+def load_normalizer(spec: Dict[str, Any]):
+    """
+    階層の定義から正規化器を生成
+    USE_SMALL_MODEL・NORMALIZER_BACKENDなどプロセス全体の設定には影響されない
+    """
+    from .semantic_normalizer_optimized import OptimizedSemanticNormalizer, create_embedding_model, create_semantic_normalizer
+
+    backend = spec.get("backend", "transformer")
+    if backend == "tfidf":
+        return create_semantic_normalizer("tfidf")
+    if backend == "static":
+        if not spec.get("path"):
+            raise ValueError("staticバックエンドにはpath（既定の正規化器はSTATIC_EMBEDDINGS_PATH）の指定が必要です")
+        from .static_embeddings import StaticEmbeddingModel
+        return OptimizedSemanticNormalizer(model=StaticEmbeddingModel(spec["path"]), backend=backend)
+    model_name = spec.get("model_name", "all-MiniLM-L6-v2")
+    return OptimizedSemanticNormalizer(model_name, model=create_embedding_model(backend, model_name), backend=backend)
+
+
+class LoadedModel:
+    """読み込み済みの正規化器と利用状況"""
+
+    def __init__(self, normalizer: Any, memory_bytes: int, load_seconds: float):
+        self.normalizer = normalizer
+        self.memory_bytes = memory_bytes
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+
+
+class ModelRegistry:
+    """
+    名前ごとの正規化器をLRUで保持する登録簿（推定メモリの合計が予算を超えたら最も古く使われたものを退避）
+    既定の正規化器は予算に含めるが退避せず、既定と同じ定義の階層はその正規化器を返す
+    """
+
+    def __init__(self, tiers: Dict[str, Dict[str, Any]], memory_budget_bytes: int,
+                 loader: Callable[[Dict[str, Any]], Any] = load_normalizer, max_events: int = 100,
+                 default_spec: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            tiers: 階層名 → 正規化器の定義（load_normalizerに渡す）
+            memory_budget_bytes: 読み込み済みの正規化器の推定メモリの上限
+            loader: 定義から正規化器を生成する関数
+            max_events: 保持する読み込み・退避イベントの件数
+            default_spec: 既定の正規化器の定義（省略時はdefault_normalizer_spec()）
+        """
+        self.tiers = tiers
+        self.memory_budget_bytes = memory_budget_bytes
+        self.default_spec = default_spec if default_spec is not None else default_normalizer_spec()
+        self._loader = loader
+        self._loaded: "OrderedDict[str, LoadedModel]" = OrderedDict()
+        self._default: Optional[LoadedModel] = None
+        # 既定の正規化器と同じ定義の階層（別に読み込まず既定の正規化器を共有する）
+        default_key = spec_key(self.default_spec)
+        self._shared_tiers = {name for name, spec in tiers.items() if spec_key(spec) == default_key}
+        self._lock = threading.Lock()
+        # 同じ階層の読み込みは1回だけ行い、別の階層の利用は止めない
+        self._load_locks = {name: threading.Lock() for name in tiers}
+        self._default_load_lock = threading.Lock()
+        self._events: deque = deque(maxlen=max_events)
+        self._usage = {name: {"loads": 0, "evictions": 0, "calls": 0, "seconds": 0.0} for name in tiers}
+
+    def validate(self, name: str) -> None:
+        if name not in self.tiers:
+            raise ValueError(f"Unknown model tier: {name} (choose from {', '.join(self.tiers)})")
+
+    def get_default(self):
+        """既定の正規化器（未読み込みなら読み込み、予算を超えたら階層の正規化器を古いものから退避する）"""
+        entry = self._default
+        if entry is not None:
+            return entry.normalizer
+        with self._default_load_lock:
+            if self._default is None:
+                start = time.perf_counter()
+                normalizer = self._loader(self.default_spec)
+                seconds = time.perf_counter() - start
+                entry = LoadedModel(normalizer, normalizer.memory_bytes(), seconds)
+                with self._lock:
+                    self._default = entry
+                    MODEL_REGISTRY_MEMORY.labels(model=DEFAULT_TIER_LABEL).set(entry.memory_bytes)
+                    self._record("load", DEFAULT_TIER_LABEL, entry.memory_bytes, seconds)
+                    self._evict()
+            return self._default.normalizer
+
+    def get(self, name: str):
+        """階層の正規化器（未読み込みなら読み込み、予算を超えたら古いものを退避する）"""
+        self.validate(name)
+        if name in self._shared_tiers:
+            return self.get_default()
+        with self._lock:
+            entry = self._loaded.get(name)
+            if entry is not None:
+                self._loaded.move_to_end(name)
+                return entry.normalizer
+
+        with self._load_locks[name]:
+            with self._lock:
+                entry = self._loaded.get(name)
+                if entry is not None:
+                    self._loaded.move_to_end(name)
+                    return entry.normalizer
+
+            start = time.perf_counter()
+            normalizer = self._loader(self.tiers[name])
+            seconds = time.perf_counter() - start
+            entry = LoadedModel(normalizer, normalizer.memory_bytes(), seconds)
+            with self._lock:
+                self._loaded[name] = entry
+                self._usage[name]["loads"] += 1
+                MODEL_REGISTRY_MEMORY.labels(model=name).set(entry.memory_bytes)
+                self._record("load", name, entry.memory_bytes, seconds)
+                self._evict()
+            return normalizer
+
+    def _evict(self) -> None:
+        """予算に収まるまで最も長く使われていない正規化器を退避（直近に使ったもの・既定の正規化器は予算超過でも残す）"""
+        while len(self._loaded) > 1 and self.memory_used_bytes() > self.memory_budget_bytes:
+            name, entry = self._loaded.popitem(last=False)
+            self._usage[name]["evictions"] += 1
+            MODEL_REGISTRY_MEMORY.labels(model=name).set(0)
+            # 処理中のリクエストは取得済みの正規化器で完了し、参照がなくなった時点で解放される
+            self._record("evict", name, entry.memory_bytes)
+        if self.memory_used_bytes() > self.memory_budget_bytes:
+            logger.warning(f"Model registry over budget: {self.memory_used_bytes() / 2**20:.1f}MB "
+                           f"> {self.memory_budget_bytes / 2**20:.1f}MB")
+
+    def _record(self, event: str, name: str, memory_bytes: int, seconds: Optional[float] = None) -> None:
+        item = {"event": event, "model": name, "memory_mb": round(memory_bytes / 2**20, 1), "timestamp": time.time()}
+        if seconds is not None:
+            item["seconds"] = round(seconds, 3)
+        self._events.append(item)
+        MODEL_REGISTRY_EVENTS.labels(model=name, event=event).inc()
+        logger.info(f"Model registry {event}: {name} ({item['memory_mb']}MB)", extra=item)
+
+    def memory_used_bytes(self) -> int:
+        default_bytes = self._default.memory_bytes if self._default is not None else 0
+        return default_bytes + sum(entry.memory_bytes for entry in self._loaded.values())
+
+    def loaded_normalizers(self) -> List[Any]:
+        """読み込み済みの正規化器（既定の正規化器を含む、参照文の再読み込み用）"""
+        with self._lock:
+            default = [self._default.normalizer] if self._default is not None else []
+            return default + [entry.normalizer for entry in self._loaded.values()]
+
+    def observe(self, name: str, seconds: float) -> None:
+        """階層の正規化1回分のレイテンシを記録"""
+        with self._lock:
+            usage = self._usage.get(name)
+            if usage is not None:
+                usage["calls"] += 1
+                usage["seconds"] += seconds
+
+    def stats(self) -> Dict[str, Any]:
+        """/metrics/models向けの階層ごとの状態・利用状況と直近の読み込み・退避イベント"""
+        with self._lock:
+            models = {}
+            for name, spec in self.tiers.items():
+                usage = self._usage[name]
+                entry = self._default if name in self._shared_tiers else self._loaded.get(name)
+                models[name] = {
+                    "spec": spec,
+                    "shared_with_default": name in self._shared_tiers,
+                    "loaded": entry is not None,
+                    "memory_mb": round(entry.memory_bytes / 2**20, 1) if entry else None,
+                    "load_seconds": round(entry.load_seconds, 3) if entry else None,
+                    "loads": usage["loads"],
+                    "evictions": usage["evictions"],
+                    "calls": usage["calls"],
+                    "mean_latency_ms": round(usage["seconds"] / usage["calls"] * 1000, 3) if usage["calls"] else None
+                }
+            return {
+                "memory_budget_mb": round(self.memory_budget_bytes / 2**20, 1),
+                "memory_used_mb": round(self.memory_used_bytes() / 2**20, 1),
+                "default": {
+                    "spec": self.default_spec,
+                    "loaded": self._default is not None,
+                    "memory_mb": round(self._default.memory_bytes / 2**20, 1) if self._default else None,
+                    "load_seconds": round(self._default.load_seconds, 3) if self._default else None
+                },
+                # 最も長く使われていないものから順（既定の正規化器・既定を共有する階層は含まない）
+                "lru_order": list(self._loaded),
+                "models": models,
+                "events": list(self._events)
+            }
+
+
+_model_registry: Optional[ModelRegistry] = None
+_model_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> ModelRegistry:
+    """環境変数（NORMALIZER_MODEL_TIERS・NORMALIZER_MEMORY_BUDGET_MB）で設定した登録簿"""
+    global _model_registry
+    if _model_registry is None:
+        with _model_registry_lock:
+            if _model_registry is None:
+                tiers_json = os.getenv("NORMALIZER_MODEL_TIERS")
+                tiers = json.loads(tiers_json) if tiers_json else DEFAULT_MODEL_TIERS
+                budget_mb = float(os.getenv("NORMALIZER_MEMORY_BUDGET_MB", "1024"))
+                _model_registry = ModelRegistry(tiers, int(budget_mb * 2**20))
+                logger.info(f"Model registry: tiers={list(tiers)}, budget={budget_mb}MB")
+    return _model_registry
+
+
+def current_model_tier() -> Optional[str]:
+    """実行中のリクエストのモデル階層（指定なしはNone）"""
+    return _model_tier.get()
+
+
+@contextmanager
+def model_tier(name: Optional[str]):
+    """このブロック内の正規化に使うモデル階層を指定（Noneは既定の正規化器、未知の階層はValueError）"""
+    if name is None:
+        yield
+        return
+    get_model_registry().validate(name)
+    token = _model_tier.set(name)
+    try:
+        yield
+    finally:
+        _model_tier.reset(token)
+
+
+@contextmanager
+def normalizer_timer():
+    """実行中のモデル階層の正規化レイテンシを記録（階層なしはdefaultとして記録）"""
+    name = current_model_tier()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        NORMALIZER_LATENCY.labels(model=name or DEFAULT_TIER_LABEL).observe(elapsed)
+        if name is not None:
+            get_model_registry().observe(name, elapsed)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+オフラインバッチ用のプロセスプール
+LLM抽出済みの特徴の正規化・CVSSロジック評価をワーカープロセスに分割し、GILとtorchのスレッド競合を避ける。
+各ワーカーは起動時に正規化器・ロジックエンジンを1回だけ読み込み、シャード（複数件）単位で結果を返す
+"""
+
+import os
+import time
+import asyncio
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# シャードの1件: (脅威記述文, LLMの抽出結果, 正規化済みの特徴)。特徴はどちらか一方を指定する
+ShardItem = Tuple[str, Optional[Dict[str, Any]], Optional[Dict[str, Any]]]
+
+
+def _init_worker() -> None:
+    """ワーカー起動時に1回だけ実行（torchは1スレッドに固定し、プロセス数でコアを使い切る）"""
+    from .executors import _pin_torch_threads
+    from .threat_extraction import get_cvss_logic_engine, get_semantic_normalizer
+
+    _pin_torch_threads(1)
+    get_cvss_logic_engine()
+    try:
+        get_semantic_normalizer()
+    except Exception as e:
+        # 正規化済みの特徴だけを扱う場合は正規化器がなくても処理できる
+        logger.warning(f"Semantic normalizer unavailable in worker {os.getpid()}: {e}")
+
+
+def _get_mp_context(start_method: Optional[str] = None):
+    """
+    ワーカーの起動方式（BATCH_PROCESS_START_METHOD、既定はforkserver、使えない環境ではspawn）
+    torchを使用中のプロセスをforkすると固まることがあるため、forkserverでパッケージを1回だけ読み込み、
+    そこから各ワーカーをforkして起動時間を短縮する
+    """
+    start_method = start_method or os.getenv("BATCH_PROCESS_START_METHOD")
+    if start_method is None:
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    context = multiprocessing.get_context(start_method)
+    if start_method == "forkserver":
+        context.set_forkserver_preload([__name__])
+    return context
+
+
+def _worker_ready(delay: float) -> int:
+    """全ワーカーを起動させるための待機タスク"""
+    time.sleep(delay)
+    return os.getpid()
+
+
+def score_shard(shard: List[ShardItem], explain: str = "none", compact: bool = False) -> List[Dict[str, Any]]:
+    """
+    シャード内の各件を正規化・CVSS評価する（ワーカープロセスで実行）
+
+    Returns:
+        入力順の結果。転送量を減らすため脅威記述文（compact時は抽出特徴も）を省き、失敗した件は{"error": ...}
+    """
+    from .threat_extraction import build_cvss_result, score_raw_features
+
+    results = []
+    for threat, raw_features, features in shard:
+        try:
+            if features is not None:
+                result = build_cvss_result(features, threat, explain)
+            else:
+                result = score_raw_features(raw_features, threat, explain)
+        except Exception as e:
+            results.append({"error": str(e)})
+            continue
+        result.pop("threat_description", None)
+        if compact:
+            result.pop("extracted_features", None)
+        results.append(result)
+    return results
+
+
+class ShardProcessPool:
+    """シャードをワーカープロセスに割り当て、結果を入力順に返すプール"""
+
+    def __init__(self, workers: Optional[int] = None, start_method: Optional[str] = None,
+                 shard_func: Callable[..., List[Dict[str, Any]]] = score_shard):
+        self.workers = workers or int(os.getenv("BATCH_PROCESS_WORKERS", str(os.cpu_count() or 1)))
+        self.shard_func = shard_func
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=_get_mp_context(start_method),
+            initializer=_init_worker
+        )
+
+    def warm_up(self, delay: float = 0.2) -> int:
+        """全ワーカーを起動して初期化を済ませ、起動したプロセス数を返す"""
+        futures = [self._executor.submit(_worker_ready, delay) for _ in range(self.workers)]
+        return len({future.result() for future in futures})
+
+    async def run(self, shard: List[ShardItem], explain: str = "none", compact: bool = False) -> List[Dict[str, Any]]:
+        """シャード1つをワーカーで処理し、結果を待つ"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.shard_func, shard, explain, compact)
+
+    def map(self, shards: Iterable[List[ShardItem]], explain: str = "none", compact: bool = False,
+            max_pending: Optional[int] = None) -> Iterator[List[Dict[str, Any]]]:
+        """シャードを順に投入し、結果を入力順に返す（投入済みの未完了シャード数を制限してメモリを一定に保つ）"""
+        max_pending = max_pending or self.workers * 2
+        pending = deque()
+        for shard in shards:
+            pending.append(self._executor.submit(self.shard_func, shard, explain, compact))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self) -> "ShardProcessPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.shutdown()
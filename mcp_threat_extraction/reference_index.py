@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+セマンティック正規化の参照文索引
+参照文のエンベディング（L2正規化済み）から、入力文に対するカテゴリごとの最大類似度を求める。
+参照文が少ない間は総当たり、多い場合はk-meansで分割した転置リスト（IVF）を近いクラスタだけ探索する
+
+REFERENCE_INDEX: auto（既定、REFERENCE_INDEX_IVF_MIN_SIZE件以上でivf）/ brute / ivf / centroid
+"""
+
+import os
+from typing import Dict, List, Optional, Type
+
+import numpy as np
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """各行をL2正規化したfloat32配列（内積がコサイン類似度になる）"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class BruteForceIndex:
+    """全参照文との内積を計算する索引（厳密、参照文が数万件までは十分速い）"""
+
+    kind = "brute"
+
+    def __init__(self, vectors: np.ndarray, labels: np.ndarray, categories: List[str]):
+        """
+        Args:
+            vectors: L2正規化済みの参照文エンベディング
+            labels: 各参照文のカテゴリ番号（categoriesの添字、各カテゴリに1件以上）
+            categories: カテゴリ名
+        """
+        order = np.argsort(labels, kind="stable")
+        self.vectors = np.ascontiguousarray(vectors[order], dtype=np.float32)
+        self.labels = np.asarray(labels)[order]
+        self.categories = categories
+        self._starts = np.searchsorted(self.labels, np.arange(len(categories)))
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def label_scores(self, query: np.ndarray) -> np.ndarray:
+        """カテゴリごとの最大類似度（queryはL2正規化済み）"""
+        return np.maximum.reduceat(self.vectors @ query, self._starts)
+
+
+class IVFIndex:
+    """
+    転置リスト索引（近似）
+    参照文をk-meansでnlist個のクラスタに分け、入力文に近いnprobe個のクラスタの参照文だけと比較する。
+    探索したクラスタに参照文がないカテゴリの類似度は-1とする
+    """
+
+    kind = "ivf"
+
+    def __init__(self, vectors: np.ndarray, labels: np.ndarray, categories: List[str],
+                 nlist: Optional[int] = None, nprobe: Optional[int] = None, iterations: int = 10,
+                 train_size: int = 32768, seed: int = 0):
+        """
+        Args:
+            vectors: L2正規化済みの参照文エンベディング
+            labels: 各参照文のカテゴリ番号
+            categories: カテゴリ名
+            nlist: クラスタ数（既定は参照文数の平方根）
+            nprobe: 探索するクラスタ数（既定REFERENCE_INDEX_NPROBE、8）
+            iterations: k-meansの反復回数
+            train_size: k-meansの学習に使う参照文の最大数
+            seed: 乱数シード（同じ入力なら同じ索引になる）
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        count = len(vectors)
+        self.categories = categories
+        self.nlist = min(nlist or max(1, int(np.sqrt(count))), count)
+        self.nprobe = min(nprobe or int(os.getenv("REFERENCE_INDEX_NPROBE", "8")), self.nlist)
+
+        rng = np.random.default_rng(seed)
+        train = vectors[rng.choice(count, min(train_size, count), replace=False)]
+        self.centroids = self._train(train, rng, iterations)
+
+        assignment = self._assign(vectors)
+        order = np.argsort(assignment, kind="stable")
+        self.vectors = np.ascontiguousarray(vectors[order])
+        self.labels = np.asarray(labels)[order]
+        self._offsets = np.searchsorted(assignment[order], np.arange(self.nlist + 1))
+
+    def _assign(self, vectors: np.ndarray, block_size: int = 8192) -> np.ndarray:
+        """各ベクトルに最も近いクラスタ（メモリを抑えるためブロックごとに計算）"""
+        return np.concatenate([
+            np.argmax(vectors[start:start + block_size] @ self.centroids.T, axis=1)
+            for start in range(0, len(vectors), block_size)
+        ]) if len(vectors) else np.zeros(0, dtype=np.int64)
+
+    def _train(self, train: np.ndarray, rng: np.random.Generator, iterations: int) -> np.ndarray:
+        """球面k-means（重心は正規化し、空になったクラスタは前回の重心を保つ）"""
+        self.centroids = train[rng.choice(len(train), self.nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = self._assign(train)
+            order = np.argsort(assignment, kind="stable")
+            sorted_assignment = assignment[order]
+            present = np.unique(sorted_assignment)
+            starts = np.searchsorted(sorted_assignment, present)
+            sums = np.add.reduceat(train[order], starts, axis=0)
+            self.centroids[present] = normalize_rows(sums)
+        return self.centroids
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def label_scores(self, query: np.ndarray) -> np.ndarray:
+        """近いクラスタの参照文だけから求めたカテゴリごとの最大類似度（queryはL2正規化済み）"""
+        centroid_scores = self.centroids @ query
+        if self.nprobe < self.nlist:
+            probes = np.argpartition(centroid_scores, -self.nprobe)[-self.nprobe:]
+        else:
+            probes = np.arange(self.nlist)
+        candidates = np.concatenate([np.arange(self._offsets[c], self._offsets[c + 1]) for c in probes])
+        scores = np.full(len(self.categories), -1.0, dtype=np.float32)
+        if len(candidates):
+            np.maximum.at(scores, self.labels[candidates], self.vectors[candidates] @ query)
+        return scores
+
+
+class CentroidIndex:
+    """
+    カテゴリの重心（参照文エンベディングの平均を正規化したもの）との類似度を返す索引（最近傍重心分類）
+    参照文ごとの最大類似度ではなくカテゴリ全体との近さで判定するため、疎なTF-IDFベクトルでも安定する
+    """
+
+    kind = "centroid"
+
+    def __init__(self, vectors: np.ndarray, labels: np.ndarray, categories: List[str]):
+        """
+        Args:
+            vectors: L2正規化済みの参照文エンベディング
+            labels: 各参照文のカテゴリ番号（各カテゴリに1件以上）
+            categories: カテゴリ名
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        labels = np.asarray(labels)
+        self.categories = categories
+        self.centroids = normalize_rows(np.stack([vectors[labels == label].mean(axis=0)
+                                                  for label in range(len(categories))]))
+        self._size = len(vectors)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def label_scores(self, query: np.ndarray) -> np.ndarray:
+        """カテゴリごとの重心との類似度（queryはL2正規化済み）"""
+        return self.centroids @ query
+
+
+# 索引の種類（新しい索引はlabel_scores()を持つクラスを登録する）
+REFERENCE_INDEX_TYPES: Dict[str, Type] = {
+    BruteForceIndex.kind: BruteForceIndex,
+    IVFIndex.kind: IVFIndex,
+    CentroidIndex.kind: CentroidIndex,
+}
+
+
+def build_reference_index(vectors: np.ndarray, labels: np.ndarray, categories: List[str],
+                          kind: Optional[str] = None, **options):
+    """
+    参照文の件数と設定に応じた索引を作成
+
+    Args:
+        kind: brute / ivf / centroid / auto（既定はREFERENCE_INDEX、未設定ならauto）
+        **options: 索引クラスへの追加引数（IVFのnlist・nprobeなど）
+    """
+    kind = (kind or os.getenv("REFERENCE_INDEX", "auto")).lower()
+    if kind == "auto":
+        min_size = int(os.getenv("REFERENCE_INDEX_IVF_MIN_SIZE", "20000"))
+        kind = IVFIndex.kind if len(vectors) >= min_size else BruteForceIndex.kind
+    if kind not in REFERENCE_INDEX_TYPES:
+        raise ValueError(f"Unknown reference index: {kind} (choose from {', '.join(REFERENCE_INDEX_TYPES)})")
+    return REFERENCE_INDEX_TYPES[kind](vectors, labels, categories, **options)
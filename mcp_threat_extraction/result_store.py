@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+分析結果の保存・検索（SQLite）
+CVSS評価の結果を1件ずつ保存し、機器・攻撃経路・深刻度・スコア・期間で絞り込んで検索する。
+ロジックパスと抽出特徴はzlib圧縮したJSONで保持し、詳細取得時に要求された形式へ展開する
+
+RESULT_STORE_PATHを設定した場合のみ有効（WALモードのため複数スレッド・プロセスから同時に書き込める）
+"""
+
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from .cvss_logic import CVSSMetrics, LogicPath, render_logic_paths
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# CVSSメトリクスの列名と結果のキー
+METRIC_COLUMNS = {
+    "av": "attack_vector",
+    "ac": "attack_complexity",
+    "pr": "privileges_required",
+    "ui": "user_interaction",
+    "s": "scope",
+    "c": "confidentiality_impact",
+    "i": "integrity_impact",
+    "a": "availability_impact",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    description_hash TEXT NOT NULL,
+    threat_description TEXT NOT NULL,
+    device_type TEXT NOT NULL,
+    attack_vector TEXT NOT NULL,
+    av TEXT NOT NULL, ac TEXT NOT NULL, pr TEXT NOT NULL, ui TEXT NOT NULL,
+    s TEXT NOT NULL, c TEXT NOT NULL, i TEXT NOT NULL, a TEXT NOT NULL,
+    base_score REAL NOT NULL,
+    severity TEXT NOT NULL,
+    features BLOB NOT NULL,
+    logic_paths BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_analyses_hash ON analyses(description_hash, id);
+CREATE INDEX IF NOT EXISTS idx_analyses_device ON analyses(device_type, id);
+CREATE INDEX IF NOT EXISTS idx_analyses_attack_vector ON analyses(attack_vector, id);
+CREATE INDEX IF NOT EXISTS idx_analyses_severity ON analyses(severity, id);
+CREATE INDEX IF NOT EXISTS idx_analyses_score ON analyses(base_score, id);
+CREATE INDEX IF NOT EXISTS idx_analyses_created ON analyses(created_at, id);
+"""
+
+# 一覧で返す列（圧縮列は詳細取得時のみ読む）
+SUMMARY_COLUMNS = ("id", "created_at", "description_hash", "threat_description", "device_type", "attack_vector",
+                   *METRIC_COLUMNS, "base_score", "severity")
+
+MAX_PAGE_SIZE = 500
+
+
+def description_hash(threat_description: str) -> str:
+    """脅威記述文のハッシュ（前後の空白は無視）"""
+    return hashlib.sha256(threat_description.strip().encode("utf-8")).hexdigest()
+
+
+def _compress(value: Any) -> bytes:
+    return zlib.compress(json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def _decompress(blob: bytes) -> Any:
+    return json.loads(zlib.decompress(blob))
+
+
+def _isoformat(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat(timespec="seconds")
+
+
+class ResultStore:
+    """分析結果のSQLiteストア（スレッドごとに接続を持つ）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """現在のスレッドの接続（初回のみ作成）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def save(self, threat_description: str, features: Dict[str, Any], cvss_metrics: CVSSMetrics,
+             base_score: float, severity: str) -> int:
+        """評価結果1件を保存し、IDを返す"""
+        logic_paths = {metric: {"tree": path.tree, "steps": path.to_ids()}
+                       for metric, path in cvss_metrics.logic_paths.items()}
+        row = (
+            time.time(),
+            description_hash(threat_description),
+            threat_description,
+            str(features.get("device_type", "")),
+            str(features.get("attack_vector", "")),
+            cvss_metrics.attack_vector, cvss_metrics.attack_complexity, cvss_metrics.privileges_required,
+            cvss_metrics.user_interaction, cvss_metrics.scope,
+            cvss_metrics.confidentiality, cvss_metrics.integrity, cvss_metrics.availability,
+            base_score,
+            severity,
+            _compress(features),
+            _compress(logic_paths)
+        )
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO analyses (created_at, description_hash, threat_description, device_type, attack_vector,"
+                " av, ac, pr, ui, s, c, i, a, base_score, severity, features, logic_paths)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                row
+            )
+        return cursor.lastrowid
+
+    @staticmethod
+    def _build_filters(filters: Dict[str, Any]) -> Tuple[str, List[Any]]:
+        """指定された条件だけをWHERE句に変換"""
+        clauses, params = [], []
+        for column in ("device_type", "attack_vector", "severity", "description_hash"):
+            if filters.get(column) is not None:
+                clauses.append(f"{column} = ?")
+                params.append(filters[column])
+        if filters.get("min_score") is not None:
+            clauses.append("base_score >= ?")
+            params.append(filters["min_score"])
+        if filters.get("max_score") is not None:
+            clauses.append("base_score <= ?")
+            params.append(filters["max_score"])
+        if filters.get("since") is not None:
+            clauses.append("created_at >= ?")
+            params.append(filters["since"])
+        if filters.get("until") is not None:
+            clauses.append("created_at < ?")
+            params.append(filters["until"])
+        if filters.get("cursor") is not None:
+            clauses.append("id < ?")
+            params.append(filters["cursor"])
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, limit: int = 50, **filters) -> Dict[str, Any]:
+        """
+        条件に合う結果を新しい順に返す（キーセット方式のページング）
+
+        Args:
+            limit: 1ページの件数（最大500）
+            **filters: device_type / attack_vector / severity / description_hash / min_score / max_score /
+                       since / until（UNIX時刻）/ cursor（前ページのnext_cursor）
+
+        Returns:
+            {"items": [...], "next_cursor": 次ページのカーソル（最終ページはNone）}
+        """
+        limit = min(max(int(limit), 1), MAX_PAGE_SIZE)
+        where, params = self._build_filters(filters)
+        rows = self._connect().execute(
+            f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM analyses{where} ORDER BY id DESC LIMIT ?",
+            (*params, limit + 1)
+        ).fetchall()
+        items = [self._summary(row) for row in rows[:limit]]
+        return {"items": items, "next_cursor": items[-1]["id"] if len(rows) > limit else None}
+
+    def get(self, analysis_id: int, explain: str = "full") -> Optional[Dict[str, Any]]:
+        """1件の詳細（抽出特徴とロジックパスを含む）"""
+        row = self._connect().execute(
+            f"SELECT {', '.join(SUMMARY_COLUMNS)}, features, logic_paths FROM analyses WHERE id = ?",
+            (analysis_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        item = self._summary(row)
+        item["extracted_features"] = _decompress(row["features"])
+        logic_paths = {metric: LogicPath.from_ids(path["tree"], path["steps"])
+                       for metric, path in _decompress(row["logic_paths"]).items()}
+        logic_tree_paths = render_logic_paths(logic_paths, explain)
+        if logic_tree_paths is not None:
+            item["logic_tree_paths"] = logic_tree_paths
+        return item
+
+    def explain_query(self, **filters) -> str:
+        """検索のクエリプラン（索引が使われているかの確認用）"""
+        where, params = self._build_filters(filters)
+        rows = self._connect().execute(
+            f"EXPLAIN QUERY PLAN SELECT id FROM analyses{where} ORDER BY id DESC LIMIT 1", params
+        ).fetchall()
+        return "\n".join(row["detail"] for row in rows)
+
+    @staticmethod
+    def _summary(row: sqlite3.Row) -> Dict[str, Any]:
+        cvss_metrics = {key: row[column] for column, key in METRIC_COLUMNS.items()}
+        cvss_metrics["base_score"] = row["base_score"]
+        cvss_metrics["severity"] = row["severity"]
+        return {
+            "id": row["id"],
+            "created_at": _isoformat(row["created_at"]),
+            "threat_description": row["threat_description"],
+            "description_hash": row["description_hash"],
+            "device_type": row["device_type"],
+            "attack_vector": row["attack_vector"],
+            "cvss_metrics": cvss_metrics
+        }
+
+
+_result_store: Optional[ResultStore] = None
+_result_store_lock = threading.Lock()
+
+
+def get_result_store() -> Optional[ResultStore]:
+    """RESULT_STORE_PATHが設定されていればストアを返す（未設定ならNone）"""
+    global _result_store
+
+    path = os.getenv("RESULT_STORE_PATH")
+    if not path:
+        return None
+    if _result_store is None or _result_store.path != path:
+        with _result_store_lock:
+            if _result_store is None or _result_store.path != path:
+                _result_store = ResultStore(path)
+                logger.info(f"Result store enabled: {path}")
+    return _result_store
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+言い換えに強いLLM抽出結果のキャッシュ
+過去に評価した脅威記述文のエンベディングをfloat16のベクトル索引に保持し、
+新しい記述文とのコサイン類似度が閾値以上なら、LLMを呼ばずにその抽出特徴を再利用する
+
+SEMANTIC_CACHE=onの場合のみ有効
+"""
+
+import os
+import copy
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .logging_config import get_logger
+from .metrics import register_cache, stage_timer
+
+logger = get_logger(__name__)
+
+EmbedFunc = Callable[[List[str]], np.ndarray]
+
+
+class VectorIndex:
+    """
+    L2正規化済みベクトルの総当たり索引（float16で保持し、検索時はブロックごとにfloat32で内積を計算）
+    上限件数に達すると古いものから上書きする
+    """
+
+    def __init__(self, dim: int, max_size: int = 50000, block_size: int = 8192):
+        self.dim = dim
+        self.max_size = max_size
+        self.block_size = block_size
+        self._vectors = np.zeros((min(max_size, 1024), dim), dtype=np.float16)
+        self._size = 0
+        self._next = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, vector: np.ndarray) -> int:
+        """ベクトルを追加し、格納した位置を返す"""
+        slot = self._next
+        if slot >= len(self._vectors):
+            grown = np.zeros((min(len(self._vectors) * 2, self.max_size), self.dim), dtype=np.float16)
+            grown[:len(self._vectors)] = self._vectors
+            self._vectors = grown
+        self._vectors[slot] = vector
+        self._size = max(self._size, slot + 1)
+        self._next = (slot + 1) % self.max_size
+        return slot
+
+    def search(self, query: np.ndarray) -> Tuple[int, float]:
+        """最も類似度の高い位置と類似度（空の場合は(-1, -1.0)）"""
+        vectors, size = self._vectors, self._size
+        query = np.asarray(query, dtype=np.float32)
+        best_slot, best_score = -1, -1.0
+        for start in range(0, size, self.block_size):
+            scores = vectors[start:min(start + self.block_size, size)].astype(np.float32) @ query
+            slot = int(np.argmax(scores))
+            if scores[slot] > best_score:
+                best_slot, best_score = start + slot, float(scores[slot])
+        return best_slot, best_score
+
+    def similarity(self, slot: int, query: np.ndarray) -> float:
+        """格納済みベクトル1件との類似度"""
+        return float(self._vectors[slot].astype(np.float32) @ np.asarray(query, dtype=np.float32))
+
+
+class SemanticFeatureCache:
+    """記述文の類似度で引くLLM抽出結果（正規化済みの特徴）のキャッシュ"""
+
+    def __init__(self, embed: EmbedFunc, threshold: float = 0.92, max_size: int = 50000):
+        self.embed = embed
+        self.threshold = threshold
+        self.max_size = max_size
+        self._index: Optional[VectorIndex] = None
+        self._entries: List[Optional[Tuple[str, Dict[str, Any]]]] = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, threat_description: str) -> Tuple[Optional[Dict[str, Any]], np.ndarray]:
+        """
+        類似する記述文の特徴を探す
+
+        Returns:
+            (一致した場合は{"features", "matched_description", "similarity"}、記述文のエンベディング)
+        """
+        with stage_timer("semantic_cache"):
+            embedding = self.embed([threat_description])[0]
+            with self._lock:
+                index, entries = self._index, self._entries
+            slot = index.search(embedding)[0] if index is not None and len(index) else -1
+        if slot >= 0:
+            with self._lock:
+                # 検索中にclearされた場合は旧索引の位置を使わない（索引と記述文はclearで組ごと置き換わる）
+                # 上書きされた場合に備え、一致した位置を取り直して類似度を確かめる
+                similarity = index.similarity(slot, embedding) if index is self._index else -1.0
+                if similarity >= self.threshold:
+                    description, features = entries[slot]
+                    self.hits += 1
+                    return {
+                        "features": copy.deepcopy(features),
+                        "matched_description": description,
+                        "similarity": round(similarity, 4)
+                    }, embedding
+        with self._lock:
+            self.misses += 1
+        return None, embedding
+
+    def add(self, threat_description: str, features: Dict[str, Any], embedding: np.ndarray) -> None:
+        """LLMで抽出した記述文の特徴を登録"""
+        with self._lock:
+            if self._index is None:
+                self._index = VectorIndex(len(embedding), self.max_size)
+            slot = self._index.add(embedding)
+            entry = (threat_description, copy.deepcopy(features))
+            if slot < len(self._entries):
+                self._entries[slot] = entry
+            else:
+                self._entries.append(entry)
+
+    def clear(self) -> None:
+        """登録済みの記述文をすべて削除（参照文の再読み込みなどで特徴の正規化結果が変わった場合）"""
+        with self._lock:
+            self._index = None
+            self._entries = []
+
+    def __len__(self) -> int:
+        return len(self._index) if self._index is not None else 0
+
+
+_semantic_cache: Optional[SemanticFeatureCache] = None
+_semantic_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> Optional[SemanticFeatureCache]:
+    """SEMANTIC_CACHE=onなら正規化器のエンベディングを使うキャッシュを返す（無効ならNone）"""
+    global _semantic_cache
+
+    if os.getenv("SEMANTIC_CACHE", "off").lower() != "on":
+        return None
+    if _semantic_cache is None:
+        with _semantic_cache_lock:
+            if _semantic_cache is None:
+                from .threat_extraction import get_semantic_normalizer
+
+                cache = SemanticFeatureCache(
+                    lambda texts: get_semantic_normalizer().embed(texts),
+                    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+                    max_size=int(os.getenv("SEMANTIC_CACHE_SIZE", "50000"))
+                )
+                register_cache("semantic_features", lambda: (cache.hits, cache.misses))
+                logger.info(f"Semantic feature cache enabled: threshold={cache.threshold}, max_size={cache.max_size}")
+                _semantic_cache = cache
+    return _semantic_cache
@@ -1,262 +1,316 @@
-from sentence_transformers import SentenceTransformer
 import numpy as np
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+from pathlib import Path
 import json
 import os
+import logging
+import threading
+from .logging_config import get_logger
+from .reference_index import build_reference_index, normalize_rows
+
+logger = get_logger(__name__)
+
+# 参照文のカテゴリ種別（reference_corpora.jsonのキー）
+CATEGORY_TYPES = ("data_type", "attack_vector", "impact_type")
+
+DEFAULT_REFERENCE_CORPORA_PATH = Path(__file__).with_name("reference_corpora.json")
+
+
+def reference_corpora_path() -> str:
+    """参照文ファイルのパス（REFERENCE_CORPORA_PATH、既定はパッケージ同梱のreference_corpora.json）"""
+    return os.getenv("REFERENCE_CORPORA_PATH") or str(DEFAULT_REFERENCE_CORPORA_PATH)
+
+
+def load_reference_corpora(path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    参照文ファイルを読み込んで検証
+    
+    Returns:
+        {"version": ..., "data_type": {カテゴリ: [参照文, ...]}, "attack_vector": {...}, "impact_type": {...}}
+    """
+    path = path or reference_corpora_path()
+    with open(path, encoding="utf-8") as f:
+        corpora = json.load(f)
+    if "version" not in corpora:
+        raise ValueError(f"参照文ファイルにversionがありません: {path}")
+    for category_type in CATEGORY_TYPES:
+        references = corpora.get(category_type)
+        if not isinstance(references, dict) or not references:
+            raise ValueError(f"参照文ファイルに{category_type}がありません: {path}")
+        for category, texts in references.items():
+            if not isinstance(texts, list) or not texts or not all(isinstance(t, str) and t for t in texts):
+                raise ValueError(f"{category_type}.{category}の参照文は空でない文字列のリストにしてください")
+    return corpora
+
+
+def create_embedding_model(backend: str, model_name: str):
+    """
+    正規化バックエンドのエンコーダー
+    transformer: SentenceTransformer / static: STATIC_EMBEDDINGS_PATHの静的エンベディング（Transformerの推論なし）
+    """
+    if backend == "transformer":
+        # torchの読み込みに時間とメモリがかかるため、transformerを選んだ場合だけ読み込む
+        from sentence_transformers import SentenceTransformer
+        from .executors import apply_pending_torch_threads
+        model = SentenceTransformer(model_name)
+        apply_pending_torch_threads()
+        return model
+    if backend == "static":
+        path = os.getenv("STATIC_EMBEDDINGS_PATH")
+        if not path:
+            raise ValueError("NORMALIZER_BACKEND=staticにはSTATIC_EMBEDDINGS_PATHの指定が必要です")
+        from .static_embeddings import StaticEmbeddingModel
+        return StaticEmbeddingModel(path)
+    raise ValueError(f"Unknown normalizer backend: {backend} (choose from transformer, static)")
+
+
+def create_semantic_normalizer(backend: Optional[str] = None, **kwargs) -> "OptimizedSemanticNormalizer":
+    """
+    バックエンドに応じた正規化器を生成（既定はNORMALIZER_BACKEND、未設定ならtransformer）
+    tfidf: 参照文で学習する文字n-gramのTF-IDF分類器（torchを読み込まない）
+    """
+    backend = (backend or os.getenv("NORMALIZER_BACKEND", "transformer")).lower()
+    if backend == "tfidf":
+        from .tfidf_normalizer import TfidfSemanticNormalizer
+        return TfidfSemanticNormalizer(**kwargs)
+    return OptimizedSemanticNormalizer(backend=backend, **kwargs)
+
+
+class ReferenceSnapshot:
+    """
+    参照文・カテゴリごとのエンベディング行列・種別ごとの索引と、参照文をエンコードしたエンコーダーの組
+    （入れ替えは参照ごと1回の代入で行う。入力文は同じスナップショットのエンコーダーでエンコードする）
+    """
+    
+    def __init__(self, version: Any, references: Dict[str, Dict[str, List[str]]], embeddings: Dict[str, np.ndarray],
+                 indexes: Dict[str, Any], encoder: Any):
+        self.version = version
+        self.references = references
+        self.embeddings = embeddings
+        self.indexes = indexes
+        self.encoder = encoder
+    
+    def sentences(self) -> Dict[str, set]:
+        """カテゴリ（"種別_カテゴリ"）ごとの参照文の集合"""
+        return {
+            f"{category_type}_{category}": set(texts)
+            for category_type in CATEGORY_TYPES
+            for category, texts in self.references[category_type].items()
+        }
+
 
 class OptimizedSemanticNormalizer:
     """最適化されたSentenceTransformerベースのセマンティック正規化"""
     
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+    # 既定の類似度の閾値（短い値のカテゴリ判定 / 脅威記述文からのデータタイプ抽出）
+    match_threshold = 0.55
+    text_threshold = 0.7
+    # 参照文の索引の種類（Noneはbuild_reference_indexの既定）
+    reference_index_kind: Optional[str] = None
+    
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", references_path: Optional[str] = None, model=None,
+                 backend: Optional[str] = None):
         """
         初期化
         Args:
             model_name: 使用するSentenceTransformerモデル名
+            references_path: 参照文ファイルのパス（既定はreference_corpora_path()）
+            model: 読み込み済みのモデル（encode()を持つもの、指定時はmodel_name・backendを無視）
+            backend: エンコーダーの種類（transformer / static、既定はNORMALIZER_BACKEND、未設定ならtransformer）
         """
         # メモリ効率のため、より小さいモデルを使用するオプション
         if os.getenv("USE_SMALL_MODEL", "false").lower() == "true":
             model_name = "paraphrase-MiniLM-L3-v2"  # より軽量なモデル
         
-        self.model = SentenceTransformer(model_name)
-        self.embeddings_cache = {}
+        self.backend = (backend or os.getenv("NORMALIZER_BACKEND", "transformer")).lower()
+        self.model = model if model is not None else create_embedding_model(self.backend, model_name)
+        self.references_path = references_path or reference_corpora_path()
+        # 参照文 → エンベディング（再読み込み時は追加・変更された参照文だけを計算する）
+        self._sentence_embeddings: Dict[str, np.ndarray] = {}
+        self._reload_lock = threading.Lock()
         self._initialize_optimized_embeddings()
     
     def _initialize_optimized_embeddings(self):
-        """最適化された参照文とエンベディングを初期化"""
-        
-        # 医療特化語彙を大幅に拡充したデータタイプの参照文
-        self.data_type_references = {
-            "personal_medical": [
-                "患者の個人医療情報や診療データ",
-                "患者データベースの個人識別情報",
-                "診療録、カルテ、医療記録",
-                "患者の病歴や既往歴情報",
-                "医療保険情報や患者登録データ",
-                "個人の健康状態記録",
-                "患者プロファイルと医療履歴",
-                "個人医療データの機密情報"
-            ],
-            "diagnostic_imaging": [
-                "CT、MRI、X線などの医療画像データ",
-                "DICOM形式の診断画像ファイル",
-                "放射線画像や超音波画像",
-                "医療スキャン結果と画像診断",
-                "レントゲン写真や断層撮影",
-                "画像診断データとスキャン結果",
-                "医療用撮影画像と診断映像",
-                "CT画像データとMRI撮影結果"
-            ],
-            "vital_biometric": [
-                "血圧、心拍数、体温などのバイタルサイン",
-                "心電図波形や脳波データ",
-                "血糖値測定結果と生体指標",
-                "呼吸数や酸素飽和度の測定値",
-                "生体認証データと生理学的指標",
-                "リアルタイム生体監視データ",
-                "血圧測定値と心拍変動データ",
-                "バイタルサイン記録と生体情報"
-            ],
-            "medication_protocol": [
-                "薬剤処方情報と投薬記録",
-                "治療プロトコルと医療手順",
-                "薬物投与量と処方箋データ",
-                "治療計画と薬剤管理情報",
-                "医薬品データベースと薬効情報",
-                "処方箋記録と薬剤相互作用データ",
-                "投薬スケジュールと治療ガイドライン",
-                "薬剤情報システムと処方管理"
-            ],
-            "device_configuration": [
-                "医療機器の設定パラメータ",
-                "機器校正データと調整値",
-                "装置設定ファイルと構成情報",
-                "医療機器のファームウェア設定",
-                "機器制御パラメータと動作設定",
-                "装置キャリブレーションデータ",
-                "機器設定ファイルと構成管理",
-                "システム設定と機器調整情報"
-            ],
-            "operational_admin": [
-                "ユーザーアクセス権限と認証情報",
-                "システム操作ログと監査証跡",
-                "管理者権限とアクセス制御データ",
-                "ユーザー管理記録と認証履歴",
-                "システム管理ログと操作追跡",
-                "アクセス記録と権限管理情報",
-                "管理運用データと監査ログ",
-                "ユーザーアクセス記録と認証管理"
-            ],
-            "public_research": [
-                "匿名化された研究統計データ",
-                "公開医学研究のデータセット",
-                "非識別化された分析結果",
-                "研究目的の集計統計情報",
-                "公開ガイドラインと標準データ",
-                "学術研究用の匿名データ",
-                "統計分析結果と研究報告",
-                "公開医療統計と研究データ"
-            ]
-        }
+        """参照文ファイルを読み込み、エンベディングを事前計算"""
+        self._snapshot, _ = self._precompute_embeddings(load_reference_corpora(self.references_path))
+        logger.info(f"Reference corpora loaded: version={self._snapshot.version} ({self.references_path})")
+    
+    @property
+    def corpora_version(self) -> Any:
+        return self._snapshot.version
+    
+    @property
+    def data_type_references(self) -> Dict[str, List[str]]:
+        return self._snapshot.references["data_type"]
+    
+    @property
+    def attack_vector_references(self) -> Dict[str, List[str]]:
+        return self._snapshot.references["attack_vector"]
+    
+    @property
+    def impact_type_references(self) -> Dict[str, List[str]]:
+        return self._snapshot.references["impact_type"]
+    
+    @property
+    def embeddings_cache(self) -> Dict[str, np.ndarray]:
+        return self._snapshot.embeddings
+    
+    def _precompute_embeddings(self, corpora: Dict[str, Any]) -> Tuple[ReferenceSnapshot, int]:
+        """すべての参照文のエンベディング行列を作成（未計算の参照文だけをまとめてエンコードし、その件数も返す）"""
+        references = {category_type: corpora[category_type] for category_type in CATEGORY_TYPES}
+        missing = sorted({
+            text
+            for category_type in CATEGORY_TYPES
+            for texts in references[category_type].values()
+            for text in texts
+            if text not in self._sentence_embeddings
+        })
+        if missing:
+            for text, embedding in zip(missing, self.model.encode(missing)):
+                self._sentence_embeddings[text] = embedding
         
-        # 攻撃ベクトルの参照文（医療環境特化）
-        self.attack_vector_references = {
-            "network": [
-                "インターネット経由のネットワーク攻撃",
-                "外部ネットワークからの遠隔侵入",
-                "ウェブベースの攻撃とAPI侵害",
-                "オンライン経由の不正アクセス",
-                "ネットワーク通信を利用した攻撃",
-                "インターネット接続を悪用した侵入",
-                "リモートネットワーク経由の攻撃"
-            ],
-            "usb": [
-                "USBメモリを使用したマルウェア攻撃",
-                "リムーバブルデバイス経由の感染",
-                "USB診断ポートへの不正アクセス",
-                "外部記憶媒体を利用した攻撃",
-                "USBデバイスによるシステム侵害",
-                "ポータブルメディア経由の脅威",
-                "USB接続による物理的侵入"
-            ],
-            "wireless": [
-                "Wi-Fi、Bluetooth経由の無線攻撃",
-                "無線通信の傍受と中間者攻撃",
-                "近距離無線による不正アクセス",
-                "WiFi経由の無線ネットワーク侵害",
-                "Bluetooth接続の悪用攻撃",
-                "無線LAN経由の通信傍受",
-                "ワイヤレス通信を標的とした攻撃"
-            ],
-            "local": [
-                "ローカルシステムへの直接アクセス",
-                "院内ネットワークからの内部攻撃",
-                "隣接システム経由の侵入",
-                "内部ネットワークでの横展開攻撃",
-                "ローカルアクセス権限を悪用した攻撃",
-                "内部システムからの不正操作",
-                "院内LANを利用した攻撃"
-            ],
-            "physical": [
-                "物理的機器への直接攻撃",
-                "装置への物理的アクセスと破壊",
-                "機器の物理的改ざんと盗難",
-                "ハードウェアレベルの物理攻撃",
-                "機器への直接的な物理操作",
-                "装置の物理的破壊と妨害",
-                "機器に対する物理的脅威"
-            ]
-        }
+        embeddings, indexes = {}, {}
+        for category_type in CATEGORY_TYPES:
+            categories = list(references[category_type])
+            vectors, labels = [], []
+            for label, category in enumerate(categories):
+                matrix = np.stack([self._sentence_embeddings[text] for text in references[category_type][category]])
+                embeddings[f"{category_type}_{category}"] = matrix
+                vectors.append(matrix)
+                labels.append(np.full(len(matrix), label))
+            indexes[category_type] = build_reference_index(
+                normalize_rows(np.concatenate(vectors)), np.concatenate(labels), categories,
+                kind=self.reference_index_kind
+            )
+        return ReferenceSnapshot(corpora["version"], references, embeddings, indexes, self.model), len(missing)
+    
+    def reload_references(self, path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        参照文ファイルを再読み込みし、処理中のリクエストを止めずに参照行列を入れ替える
         
-        # 影響タイプの参照文（医療リスク特化）
-        self.impact_type_references = {
-            "機密性重視": [
-                "医療情報の漏洩と盗聴攻撃",
-                "患者データの不正な閲覧",
-                "機密医療情報への無許可アクセス",
-                "医療記録の不正取得",
-                "個人健康情報の盗取",
-                "診療データの機密性侵害",
-                "医療プライバシーの漏洩"
-            ],
-            "完全性重視": [
-                "医療データの改ざんと不正変更",
-                "診療記録の書き換え攻撃",
-                "医療情報の完全性破壊",
-                "治療データの偽装と改変",
-                "医療記録の不正修正",
-                "診断結果の改ざん攻撃",
-                "医療データの整合性破壊"
-            ],
-            "可用性重視": [
-                "医療システムの機能停止",
-                "医療サービスの利用不能攻撃",
-                "診療業務の中断と妨害",
-                "医療機器の動作停止",
-                "システムダウンによるサービス中断",
-                "医療業務の可用性阻害",
-                "診療システムの機能不全"
-            ]
-        }
+        Args:
+            path: 参照文ファイルのパス（既定は初期化時のパス）
         
-        # エンベディングを事前計算
-        self._precompute_embeddings()
+        Returns:
+            新旧の版、追加・削除された参照文の数、再計算した参照文の数、変更されたカテゴリ
+        """
+        with self._reload_lock:
+            path = path or self.references_path
+            corpora = load_reference_corpora(path)
+            old = self._snapshot
+            new, encoded = self._precompute_embeddings(corpora)
+            old_sentences, new_sentences = old.sentences(), new.sentences()
+            changed = sorted(
+                key for key in set(old_sentences) | set(new_sentences)
+                if old_sentences.get(key) != new_sentences.get(key)
+            )
+            added = set().union(*new_sentences.values()) - set().union(*old_sentences.values())
+            removed = set().union(*old_sentences.values()) - set().union(*new_sentences.values())
+            
+            # 読み込み中のリクエストは旧スナップショットを使い続け、以降は新しい参照行列を使う
+            self._snapshot = new
+            self.references_path = path
+            for text in removed:
+                self._sentence_embeddings.pop(text, None)
+            
+            summary = {
+                "previous_version": old.version,
+                "version": new.version,
+                "added": len(added),
+                "removed": len(removed),
+                "reembedded": encoded,
+                "changed_categories": changed
+            }
+            logger.info(f"Reference corpora reloaded: {summary}")
+            return summary
     
-    def _precompute_embeddings(self):
-        """すべての参照文のエンベディングを事前計算"""
-        
-        # データタイプ
-        for category, texts in self.data_type_references.items():
-            embeddings = self.model.encode(texts)
-            self.embeddings_cache[f"data_type_{category}"] = embeddings
+    def memory_bytes(self) -> int:
+        """モデルと参照行列・索引のおおよそのバイト数（モデル登録簿のメモリ予算に使う）"""
+        model = self.model
+        if hasattr(model, "memory_bytes"):
+            size = model.memory_bytes()
+        elif hasattr(model, "parameters"):
+            # SentenceTransformer（torchのモジュール）はパラメータの合計
+            size = sum(parameter.numel() * parameter.element_size() for parameter in model.parameters())
+        else:
+            size = 0
+        snapshot = self._snapshot
+        size += sum(matrix.nbytes for matrix in snapshot.embeddings.values())
+        size += sum(value.nbytes for index in snapshot.indexes.values()
+                    for value in vars(index).values() if isinstance(value, np.ndarray))
+        return size
+    
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        テキストのエンベディング（L2正規化済み、内積がコサイン類似度になる）
         
-        # 攻撃ベクトル
-        for category, texts in self.attack_vector_references.items():
-            embeddings = self.model.encode(texts)
-            self.embeddings_cache[f"attack_vector_{category}"] = embeddings
+        Args:
+            texts: エンベディングを計算するテキストのリスト
         
-        # 影響タイプ
-        for category, texts in self.impact_type_references.items():
-            embeddings = self.model.encode(texts)
-            self.embeddings_cache[f"impact_type_{category}"] = embeddings
+        Returns:
+            (len(texts), 次元数)のfloat32配列
+        """
+        return np.asarray(self._snapshot.encoder.encode(texts, normalize_embeddings=True), dtype=np.float32)
+    
+    def _label_scores(self, snapshot: ReferenceSnapshot, texts: List[str], category_type: str) -> np.ndarray:
+        """各テキストのカテゴリごとの最大類似度（(len(texts), カテゴリ数)、索引と同じ版のエンコーダーを使う）"""
+        index = snapshot.indexes[category_type]
+        embeddings = normalize_rows(snapshot.encoder.encode(texts))
+        return np.stack([index.label_scores(embedding) for embedding in embeddings])
     
-    def find_best_match(self, text: str, category_type: str, threshold: float = 0.55) -> Optional[str]:
+    def find_best_match(self, text: str, category_type: str, threshold: Optional[float] = None) -> Optional[str]:
         """
         テキストに最も近いカテゴリを見つける（最適化された閾値）
         
         Args:
             text: 分類したいテキスト
             category_type: "data_type", "attack_vector", "impact_type"のいずれか
-            threshold: 類似度の閾値（最適化: 0.55）
+            threshold: 類似度の閾値（既定はmatch_threshold、最適化: 0.55）
         
         Returns:
             最も類似度の高いカテゴリ名、または閾値以下の場合None
         """
-        if not text:
-            return None
-        
-        # テキストのエンベディング
-        text_embedding = self.model.encode([text])[0]
-        
-        # 各カテゴリとの類似度を計算
-        best_score = -1
-        best_category = None
-        
-        references = getattr(self, f"{category_type}_references", {})
+        return self.find_best_matches([text], category_type, threshold)[0]
+    
+    def find_best_matches(self, texts: List[str], category_type: str,
+                          threshold: Optional[float] = None) -> List[Optional[str]]:
+        """
+        複数のテキストそれぞれに最も近いカテゴリ（エンコードは1回にまとめる）
         
-        for category in references:
-            cache_key = f"{category_type}_{category}"
-            if cache_key in self.embeddings_cache:
-                category_embeddings = self.embeddings_cache[cache_key]
-                
-                # コサイン類似度を計算
-                similarities = np.dot(category_embeddings, text_embedding) / (
-                    np.linalg.norm(category_embeddings, axis=1) * np.linalg.norm(text_embedding)
-                )
-                
-                # 最大類似度
-                max_similarity = np.max(similarities)
-                
-                if max_similarity > best_score and max_similarity >= threshold:
-                    best_score = max_similarity
-                    best_category = category
+        Returns:
+            textsと同じ順のカテゴリ名（空のテキスト・閾値以下・未知の種別はNone）
+        """
+        threshold = self.match_threshold if threshold is None else threshold
+        results: List[Optional[str]] = [None] * len(texts)
+        # 各カテゴリとの最大コサイン類似度を索引で計算（再読み込み中でも同じ版の索引を使う）
+        snapshot = self._snapshot
+        positions = [i for i, text in enumerate(texts) if text]
+        if not positions or category_type not in snapshot.indexes:
+            return results
         
-        return best_category
+        categories = snapshot.indexes[category_type].categories
+        all_scores = self._label_scores(snapshot, [texts[i] for i in positions], category_type)
+        debug_enabled = logger.isEnabledFor(logging.DEBUG)
+        for position, scores in zip(positions, all_scores):
+            best = int(np.argmax(scores))
+            best_score = scores[best]
+            best_category = categories[best] if best_score >= threshold else None
+            results[position] = best_category
+            
+            # 大量に出力されるためLOG_SAMPLE_RATESで間引けるDEBUGレベルで記録（無効時はextraも作らない）
+            if debug_enabled:
+                logger.debug("Normalizer decision: %s %r -> %s", category_type, texts[position], best_category,
+                             extra={"category_type": category_type, "input": texts[position],
+                                    "decision": best_category, "score": round(float(best_score), 4)})
+        return results
     
     def normalize_data_types(self, data_types: List[str]) -> List[str]:
         """データタイプのリストを正規化"""
-        normalized = []
-        
-        for dt in data_types:
-            # すでに正しいカテゴリの場合はそのまま使用
-            if dt in self.data_type_references:
-                normalized.append(dt)
-            else:
-                # セマンティック検索で最適なカテゴリを見つける
-                best_match = self.find_best_match(dt, "data_type")
-                if best_match:
-                    normalized.append(best_match)
-        
-        return list(set(normalized))
+        # すでに正しいカテゴリの場合はそのまま使用し、それ以外はまとめてセマンティック検索
+        known = [dt for dt in data_types if dt in self.data_type_references]
+        unknown = [dt for dt in data_types if dt not in self.data_type_references]
+        matches = self.find_best_matches(unknown, "data_type") if unknown else []
+        return list(set(known + [match for match in matches if match]))
     
     def normalize_attack_vector(self, attack_vector: str) -> str:
         """攻撃ベクトルを正規化"""
@@ -268,44 +322,34 @@ class OptimizedSemanticNormalizer:
     
     def normalize_impact_types(self, impact_types: List[str]) -> List[str]:
         """影響タイプのリストを正規化"""
-        normalized = []
-        
-        for impact in impact_types:
-            if impact in self.impact_type_references:
-                normalized.append(impact)
-            else:
-                best_match = self.find_best_match(impact, "impact_type")
-                if best_match:
-                    normalized.append(best_match)
-        
-        return list(set(normalized))
+        known = [impact for impact in impact_types if impact in self.impact_type_references]
+        unknown = [impact for impact in impact_types if impact not in self.impact_type_references]
+        matches = self.find_best_matches(unknown, "impact_type") if unknown else []
+        return list(set(known + [match for match in matches if match]))
     
-    def extract_data_types_from_text(self, text: str, threshold: float = 0.7) -> List[str]:
+    def extract_data_types_from_text(self, text: str, threshold: Optional[float] = None) -> List[str]:
         """
         テキストから関連するデータタイプを抽出（最適化された閾値）
         
         Args:
             text: 分析するテキスト
-            threshold: 類似度の閾値（最適化: 0.7）
+            threshold: 類似度の閾値（既定はtext_threshold、最適化: 0.7）
         
         Returns:
             抽出されたデータタイプのリスト
         """
-        text_embedding = self.model.encode([text])[0]
-        data_types = []
-        
-        for category, _ in self.data_type_references.items():
-            cache_key = f"data_type_{category}"
-            if cache_key in self.embeddings_cache:
-                category_embeddings = self.embeddings_cache[cache_key]
-                
-                # コサイン類似度を計算
-                similarities = np.dot(category_embeddings, text_embedding) / (
-                    np.linalg.norm(category_embeddings, axis=1) * np.linalg.norm(text_embedding)
-                )
-                
-                # 閾値を超える類似度があればカテゴリを追加
-                if np.max(similarities) >= threshold:
-                    data_types.append(category)
+        return self.extract_data_types_from_texts([text], threshold)[0]
+    
+    def extract_data_types_from_texts(self, texts: List[str], threshold: Optional[float] = None) -> List[List[str]]:
+        """複数のテキストそれぞれから関連するデータタイプを抽出（エンコードは1回にまとめる）"""
+        if not texts:
+            return []
+        threshold = self.text_threshold if threshold is None else threshold
+        snapshot = self._snapshot
+        categories = snapshot.indexes["data_type"].categories
         
-        return data_types
\ No newline at end of file
+        # 閾値を超える類似度があればカテゴリを追加
+        return [
+            [category for category, score in zip(categories, scores) if score >= threshold]
+            for scores in self._label_scores(snapshot, texts, "data_type")
+        ]
@@ -8,17 +8,29 @@ import sys
 import os
 import json
 import asyncio
-from typing import Dict, List, Any
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple, Union
 from pathlib import Path
 
+import numpy as np
+
 from mcp.server import Server
 from mcp.types import Tool, TextContent
-from .threat_extraction import calculate_cvss_with_ai, process_threats_with_cvss
+from .threat_extraction import (
+    extract_raw_features, score_raw_features, build_cvss_result, get_cvss_logic_engine, get_semantic_normalizer
+)
+from .semantic_cache import get_semantic_cache
+from .fingerprint import item_fingerprint, output_options, pipeline_components, pipeline_version
+from .executors import run_llm, run_cpu, executor_stats, shutdown_executors, scheduling
+from .admission import AdmissionRejected, admitted
+from .metrics import track_tool, render_metrics
+from .model_registry import current_model_tier, get_model_registry, model_tier, normalizer_timer
+from .cvss_logic import CVSSCalculator, LOGIC_PATH_DETAILS, CVSS_REQUIREMENT_METRICS
 from dotenv import load_dotenv
-from .logging_config import get_logger
+from .logging_config import get_logger, request_context, get_request_id, configure_logging_from_env
 
 # セマンティック正規化器のインポート
-from .semantic_normalizer_optimized import OptimizedSemanticNormalizer
+from .semantic_normalizer_optimized import load_reference_corpora, reference_corpora_path
 
 # 環境変数を読み込む
 load_dotenv()
@@ -29,47 +41,273 @@ logger = get_logger(__name__)
 # MCPサーバーのインスタンスを作成
 server = Server("threat-extraction")
 
-# セマンティック正規化器のインスタンス（グローバル）
-semantic_normalizer = None
+async def calculate_cvss_async(threat_description: str, explain: str = "full") -> dict:
+    """
+    LLM抽出をLLMプール、正規化・スコア計算をCPUプールで実行してCVSSを算出
+    意味キャッシュが有効で、類似する記述文が評価済みならLLMを呼ばずにその特徴を再利用する
+    （キャッシュの特徴は既定の正規化器で正規化したものなので、モデル階層を指定したリクエストでは使わない）
+    """
+    cache = get_semantic_cache() if current_model_tier() is None else None
+    embedding = None
+    if cache is not None:
+        try:
+            match, embedding = await run_cpu(cache.lookup, threat_description)
+        except Exception as e:
+            # エンベディングを計算できない場合はキャッシュなしで処理を続ける
+            logger.warning(f"Semantic cache lookup failed: {e}")
+            match = None
+        if match is not None:
+            result = await run_cpu(build_cvss_result, match["features"], threat_description, explain)
+            result["semantic_cache"] = {
+                "matched_description": match["matched_description"],
+                "similarity": match["similarity"]
+            }
+            return result
+
+    raw_features = await run_llm(extract_raw_features, threat_description)
+    result = await run_cpu(score_raw_features, raw_features, threat_description, explain)
+    if embedding is not None:
+        cache.add(threat_description, result["extracted_features"], embedding)
+    return result
 
-def get_semantic_normalizer():
-    """SemanticNormalizerのレイジーローディング"""
-    global semantic_normalizer
-    if semantic_normalizer is None:
+async def process_threats_async(threat_descriptions: List[str], explain: str = "full") -> List[dict]:
+    """複数の脅威を並行処理（同時実行数は各プールのサイズで制限される）"""
+    async def process(threat: str) -> dict:
         try:
-            import time
-            import psutil
-            import os
-            
-            # メモリ使用量を記録
-            process = psutil.Process(os.getpid())
-            memory_before = process.memory_info().rss / 1024 / 1024  # MB
-            
-            start_time = time.time()
-            semantic_normalizer = OptimizedSemanticNormalizer()
-            init_time = time.time() - start_time
-            
-            # 初期化後のメモリ使用量
-            memory_after = process.memory_info().rss / 1024 / 1024  # MB
-            memory_used = memory_after - memory_before
-            
-            logger.info(f"Semantic normalizer initialized in {init_time:.2f} seconds")
-            logger.info(f"Memory usage: {memory_before:.1f}MB -> {memory_after:.1f}MB (delta: {memory_used:.1f}MB)")
-        except ImportError as e:
-            if "psutil" in str(e):
-                # psutilがない場合は通常の初期化
-                start_time = time.time()
-                semantic_normalizer = OptimizedSemanticNormalizer()
-                init_time = time.time() - start_time
-                logger.info(f"Semantic normalizer initialized in {init_time:.2f} seconds")
-            else:
-                raise Exception(f"Missing required dependency: {str(e)}. Please install sentence-transformers: pip install sentence-transformers")
-        except MemoryError:
-            logger.error("Memory error during semantic normalizer initialization")
-            raise Exception("Insufficient memory to initialize semantic normalizer. Consider using USE_SMALL_MODEL=true environment variable.")
+            return await calculate_cvss_async(threat, explain)
         except Exception as e:
-            raise Exception(f"Failed to initialize normalizer: {str(e)}")
-    return semantic_normalizer
+            return {
+                "threat_description": threat,
+                "error": str(e)
+            }
+    
+    logger.info("CVSS計算付きバッチ処理を開始します...")
+    return list(await asyncio.gather(*(process(threat) for threat in threat_descriptions)))
+
+def reload_reference_corpora() -> Dict[str, Any]:
+    """
+    読み込み済みの正規化器の参照文を参照文ファイルから再読み込み（追加・変更された参照文だけを再計算）
+    不正なファイルの場合はValueErrorで、現在の参照文を使い続ける
+    """
+    from . import threat_extraction
+
+    corpora = load_reference_corpora()
+    normalizers = []
+    for normalizer in (threat_extraction.semantic_normalizer, *get_model_registry().loaded_normalizers()):
+        if normalizer is not None and all(normalizer is not loaded for loaded in normalizers):
+            normalizers.append(normalizer)
+    summaries = [normalizer.reload_references() for normalizer in normalizers]
+    
+    # 旧い参照文で正規化した特徴・フィンガープリントを使い続けないようにする
+    pipeline_components.cache_clear()
+    pipeline_version.cache_clear()
+    cache = get_semantic_cache()
+    if cache is not None:
+        cache.clear()
+    
+    summary = summaries[0] if summaries else {"version": corpora["version"]}
+    return {**summary, "reloaded_normalizers": len(summaries)}
+
+async def watch_reference_corpora(interval: float) -> None:
+    """参照文ファイルの更新を一定間隔で確認し、変わっていれば再読み込みする"""
+    path = reference_corpora_path()
+    last_mtime = os.path.getmtime(path)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            mtime = os.path.getmtime(path)
+            if mtime != last_mtime:
+                last_mtime = mtime
+                await run_cpu(reload_reference_corpora)
+        except Exception as e:
+            logger.error(f"Reference corpora reload failed: {e}")
+
+def normalize_features_response(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """指定された特徴を正規化し、元の値と正規化後の値を返す"""
+    normalizer = get_semantic_normalizer()
+    
+    response = {}
+    
+    with normalizer_timer():
+        # 攻撃ベクトルの正規化
+        if "attack_vector" in arguments:
+            attack_vector = arguments["attack_vector"]
+            normalized_av = normalizer.normalize_attack_vector(attack_vector)
+            response["attack_vector"] = {
+                "original": attack_vector,
+                "normalized": normalized_av
+            }
+    
+        # データタイプの正規化
+        if "data_types" in arguments:
+            data_types = arguments["data_types"]
+            normalized_dt = normalizer.normalize_data_types(data_types)
+            response["data_types"] = {
+                "original": data_types,
+                "normalized": normalized_dt
+            }
+    
+        # 影響タイプの正規化
+        if "impact_types" in arguments:
+            impact_types = arguments["impact_types"]
+            normalized_it = normalizer.normalize_impact_types(impact_types)
+            response["impact_types"] = {
+                "original": impact_types,
+                "normalized": normalized_it
+            }
+    
+    return response
+
+# score_cvss_vectorsの列指向入力で受け付けるメトリクス名（CVSSCalculator.calculate_cvss_scores_batchの引数順）
+SCORE_METRIC_COLUMNS = (
+    "attack_vector", "attack_complexity", "privileges_required", "user_interaction",
+    "scope", "confidentiality", "integrity", "availability"
+)
+
+def score_cvss_vectors(vectors: List[str] = None, metrics: Dict[str, List[str]] = None) -> Dict[str, Any]:
+    """ベクトル文字列または列指向メトリクスからスコアを一括計算し、レスポンス辞書を返す"""
+    calculator = CVSSCalculator()
+    
+    if vectors:
+        scores, severities = calculator.calculate_cvss_scores_from_vectors(vectors)
+    elif metrics:
+        missing = [column for column in SCORE_METRIC_COLUMNS if column not in metrics]
+        if missing:
+            raise ValueError(f"metricsに必要な列がありません: {missing}")
+        scores, severities = calculator.calculate_cvss_scores_batch(
+            *(metrics[column] for column in SCORE_METRIC_COLUMNS)
+        )
+    else:
+        raise ValueError("vectorsまたはmetricsが必要です")
+    
+    labels, counts = np.unique(severities, return_counts=True)
+    return {
+        "base_scores": scores.tolist(),
+        "severities": severities.tolist(),
+        "statistics": {
+            "total": int(scores.size),
+            "severity_distribution": dict(zip(labels.tolist(), counts.tolist()))
+        }
+    }
+
+def rescore_cvss_environmental(vectors: List[str], asset_classes: List[str] = None,
+                               device_types: List[str] = None,
+                               overrides: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    保存済みのCVSSベクトルを資産分類ごとの要求度プロファイルで一括再評価し、レスポンス辞書を返す
+    
+    資産分類はasset_classesで直接指定するか、device_typesから機器索引で解決する。
+    overridesで指定した現状・環境評価メトリクスはプロファイルより優先する。
+    """
+    if not vectors:
+        raise ValueError("vectorsが必要です")
+    
+    engine = get_cvss_logic_engine()
+    if device_types is not None:
+        if len(device_types) != len(vectors):
+            raise ValueError("device_typesはvectorsと同じ長さである必要があります")
+        asset_classes = [engine.classify_device(device_type).asset_class for device_type in device_types]
+    elif asset_classes is not None:
+        if len(asset_classes) != len(vectors):
+            raise ValueError("asset_classesはvectorsと同じ長さである必要があります")
+        unknown = sorted({c for c in asset_classes if c and c not in engine.requirement_profiles})
+        if unknown:
+            raise ValueError(f"不明な資産分類: {unknown}")
+    
+    columns = {}
+    if asset_classes is not None:
+        # 該当する資産分類がない行は未評価（X）
+        for metric in CVSS_REQUIREMENT_METRICS:
+            columns[metric] = [
+                engine.requirement_profiles[c][metric] if c else "X" for c in asset_classes
+            ]
+    columns.update(overrides or {})
+    
+    calculator = CVSSCalculator()
+    scores = calculator.calculate_environmental_scores_from_vectors(vectors, columns)
+    
+    labels, counts = np.unique(scores["environmental_severity"], return_counts=True)
+    response = {
+        "base_scores": scores["base_score"].tolist(),
+        "temporal_scores": scores["temporal_score"].tolist(),
+        "environmental_scores": scores["environmental_score"].tolist(),
+        "environmental_severities": scores["environmental_severity"].tolist(),
+        "statistics": {
+            "total": len(vectors),
+            "severity_distribution": dict(zip(labels.tolist(), counts.tolist()))
+        }
+    }
+    if asset_classes is not None:
+        response["asset_classes"] = asset_classes
+    return response
+
+# ロジックパス出力形式の入力スキーマ（extract_cvss / extract_cvss_batch共通）
+EXPLAIN_SCHEMA = {
+    "type": "string",
+    "enum": list(LOGIC_PATH_DETAILS),
+    "default": "full",
+    "description": "ロジックパスの出力形式: none（出力なし）、ids（ルールIDとパラメータのみ）、full（説明文）"
+}
+
+# バッチ結果の射影・簡略化の入力スキーマ（extract_cvss_batch）
+FIELDS_SCHEMA = {
+    "type": "string",
+    "description": "各結果に含めるフィールドのドット区切りパス（カンマ区切り、例: cvss_metrics.base_score,cvss_metrics.severity）"
+}
+COMPACT_SCHEMA = {
+    "type": "boolean",
+    "default": False,
+    "description": "trueの場合、各結果からthreat_descriptionとextracted_featuresを省き、インデントなしで出力"
+}
+# 正規化に使うモデル階層の入力スキーマ（未指定は既定の正規化器）
+MODEL_TIER_SCHEMA = {
+    "type": "string",
+    "description": "正規化に使うモデル階層（例: accurate、fast、light。未指定は既定の正規化器）"
+}
+
+PREVIOUS_RESULTS_SCHEMA = {
+    "type": "array",
+    "items": {"type": "object"},
+    "description": "前回の結果（fingerprint付き）。フィンガープリントが一致する記述文は再計算せずに引き継ぐ"
+}
+
+def parse_field_paths(fields: Union[str, List[str], None]) -> Optional[List[Tuple[str, ...]]]:
+    """fields指定（カンマ区切り文字列またはリスト）をキーのタプルのリストに変換"""
+    if not fields:
+        return None
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    paths = [tuple(field.strip().split(".")) for field in fields if field.strip()]
+    for path in paths:
+        if "" in path:
+            raise ValueError(f"不正なfields指定: {'.'.join(path)}")
+    return paths or None
+
+def project_fields(item: Dict[str, Any], paths: List[Tuple[str, ...]]) -> Dict[str, Any]:
+    """指定パスの値のみを元の入れ子構造のまま取り出す（存在しないパスは無視）"""
+    projected = {}
+    for path in paths:
+        value = item
+        for key in path:
+            if not isinstance(value, dict) or key not in value:
+                break
+            value = value[key]
+        else:
+            target = projected
+            for key in path[:-1]:
+                target = target.setdefault(key, {})
+            target[path[-1]] = value
+    return projected
+
+def shape_batch_result(item: Dict[str, Any], paths: Optional[List[Tuple[str, ...]]], compact: bool) -> Dict[str, Any]:
+    """バッチ結果1件にfields射影・compact指定を適用（エラーは常に残す）"""
+    if "error" in item:
+        return {"error": item["error"]} if compact else item
+    if paths is not None:
+        return project_fields(item, paths)
+    if compact:
+        return {key: value for key, value in item.items() if key not in ("threat_description", "extracted_features")}
+    return item
 
 # ツールを定義
 @server.list_tools()
@@ -85,7 +323,9 @@ async def list_tools() -> List[Tool]:
                     "threat_description": {
                         "type": "string",
                         "description": "脅威の記述文（日本語）"
-                    }
+                    },
+                    "explain": EXPLAIN_SCHEMA,
+                    "model_tier": MODEL_TIER_SCHEMA
                 },
                 "required": ["threat_description"]
             }
@@ -102,7 +342,12 @@ async def list_tools() -> List[Tool]:
                             "type": "string"
                         },
                         "description": "脅威記述文のリスト（日本語）"
-                    }
+                    },
+                    "explain": EXPLAIN_SCHEMA,
+                    "fields": FIELDS_SCHEMA,
+                    "compact": COMPACT_SCHEMA,
+                    "previous_results": PREVIOUS_RESULTS_SCHEMA,
+                    "model_tier": MODEL_TIER_SCHEMA
                 },
                 "required": ["threat_descriptions"]
             }
@@ -116,7 +361,8 @@ async def list_tools() -> List[Tool]:
                     "text": {
                         "type": "string",
                         "description": "データタイプを抽出する対象のテキスト（日本語）"
-                    }
+                    },
+                    "model_tier": MODEL_TIER_SCHEMA
                 },
                 "required": ["text"]
             }
@@ -144,179 +390,383 @@ async def list_tools() -> List[Tool]:
                             "type": "string"
                         },
                         "description": "正規化する影響タイプのリスト"
+                    },
+                    "model_tier": MODEL_TIER_SCHEMA
+                }
+            }
+        ),
+        Tool(
+            name="score_cvss_vectors",
+            description="CVSS:3.1ベクトル文字列またはメトリクスコードの配列からベーススコアと深刻度を一括計算します（LLM・埋め込み不使用）",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "vectors": {
+                        "type": "array",
+                        "items": {
+                            "type": "string"
+                        },
+                        "description": "CVSS:3.1ベクトル文字列のリスト（例: CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:H/A:H）"
+                    },
+                    "metrics": {
+                        "type": "object",
+                        "properties": {
+                            metric: {"type": "array", "items": {"type": "string"}}
+                            for metric in SCORE_METRIC_COLUMNS
+                        },
+                        "required": list(SCORE_METRIC_COLUMNS),
+                        "description": "メトリクスコードの列指向配列（vectorsの代わりに指定）"
                     }
                 }
             }
+        ),
+        Tool(
+            name="rescore_cvss_environmental",
+            description="保存済みのCVSSベクトルを資産分類ごとの環境要求度（CR/IR/AR）と修正メトリクスで一括再評価します（LLM不使用）",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "vectors": {
+                        "type": "array",
+                        "items": {
+                            "type": "string"
+                        },
+                        "description": "CVSS:3.1ベクトル文字列のリスト（現状・環境評価メトリクスを含んでもよい）"
+                    },
+                    "asset_classes": {
+                        "type": "array",
+                        "items": {
+                            "type": ["string", "null"]
+                        },
+                        "description": "各ベクトルの資産分類（ASSET_CLASSIFICATIONのキー）"
+                    },
+                    "device_types": {
+                        "type": "array",
+                        "items": {
+                            "type": "string"
+                        },
+                        "description": "各ベクトルの機器タイプ（資産分類に自動解決、asset_classesより優先）"
+                    },
+                    "overrides": {
+                        "type": "object",
+                        "description": "全行または行ごとに上書きするメトリクス（例: {\"E\": \"P\", \"MAV\": [\"L\", \"N\"]}）"
+                    }
+                },
+                "required": ["vectors"]
+            }
         )
     ]
 
+class ToolInputError(ValueError):
+    """ツールの入力エラー（HTTPでは400。LLM応答の解析エラーなど、その他のValueErrorは500のまま）"""
+
+@contextmanager
+def tool_input():
+    """このブロック内の入力検証で発生したValueErrorをToolInputErrorにする"""
+    try:
+        yield
+    except ToolInputError:
+        raise
+    except ValueError as e:
+        raise ToolInputError(str(e)) from e
+
+def validate_explain(explain: str) -> str:
+    """explain指定を検証（LLM呼び出しの前に不正な指定を入力エラーにする）"""
+    if explain not in LOGIC_PATH_DETAILS:
+        raise ToolInputError(f"Invalid logic path detail '{explain}': expected one of {LOGIC_PATH_DETAILS}")
+    return explain
+
+def requested_model_tier(arguments: Dict[str, Any]):
+    """引数で指定されたモデル階層のコンテキスト（未知の階層はToolInputError）"""
+    name = arguments.get("model_tier")
+    if name is not None:
+        with tool_input():
+            get_model_registry().validate(name)
+    return model_tier(name)
+
 # ツールハンドラーを定義
-@server.call_tool()
-async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
-    """ツール呼び出しを処理する"""
+async def extract_cvss_tool(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """単一の脅威記述文からCVSSを抽出"""
+    threat_description = arguments.get("threat_description", "")
+    if not threat_description:
+        raise ToolInputError("threat_descriptionが必要です")
+    
+    return await calculate_cvss_async(threat_description, validate_explain(arguments.get("explain", "full")))
+
+async def extract_cvss_batch_tool(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    複数の脅威記述文からCVSSをバッチ抽出
+    各結果にはフィンガープリントを付け、previous_resultsで一致した記述文は前回の結果を引き継ぐ
+    """
+    threat_descriptions = arguments.get("threat_descriptions", [])
+    if not threat_descriptions:
+        raise ToolInputError("threat_descriptionsが必要です")
+    
+    with tool_input():
+        paths = parse_field_paths(arguments.get("fields"))
+    compact = bool(arguments.get("compact", False))
+    explain = validate_explain(arguments.get("explain", "full"))
+    options = output_options(explain, paths, compact)
+    if current_model_tier() is not None:
+        # 正規化の結果は階層ごとに異なるため、別の階層の結果は引き継がない
+        options["model_tier"] = current_model_tier()
+    if paths is not None and not any(path[0] == "logic_tree_paths" for path in paths):
+        # 射影で捨てられるロジックパスは生成しない
+        explain = "none"
+    
+    fingerprints = [item_fingerprint(threat, options=options) for threat in threat_descriptions]
+    previous = {
+        item["fingerprint"]: item for item in arguments.get("previous_results") or []
+        if isinstance(item, dict) and "fingerprint" in item and "error" not in item
+    }
+    changed = [threat for threat, fingerprint in zip(threat_descriptions, fingerprints) if fingerprint not in previous]
+    computed = iter(await process_threats_async(changed, explain))
+    
+    results = []
+    severities = {}
+    for fingerprint in fingerprints:
+        if fingerprint in previous:
+            # 変更のない記述文は前回の結果を引き継ぐ（整形済みのため、fieldsで深刻度を省いていれば統計に数えない）
+            result = shaped = previous[fingerprint]
+        else:
+            result = next(computed)
+            shaped = shape_batch_result(result, paths, compact)
+        # 統計情報を追加
+        severity = result.get("cvss_metrics", {}).get("severity")
+        if severity is not None:
+            severities[severity] = severities.get(severity, 0) + 1
+        results.append({**shaped, "fingerprint": fingerprint})
+    
+    return {
+        "results": results,
+        "statistics": {
+            "total": len(results),
+            "recomputed": len(changed),
+            "reused": len(results) - len(changed),
+            "severity_distribution": severities
+        }
+    }
+
+async def extract_data_types_tool(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """テキストからデータタイプを抽出"""
+    text = arguments.get("text", "")
+    if not text:
+        raise ToolInputError("textが必要です")
+    
+    def extract(normalizer) -> List[str]:
+        with normalizer_timer():
+            return normalizer.extract_data_types_from_text(text)
     
     try:
-        if name == "extract_cvss":
-            # 単一の脅威記述文からCVSSを抽出
-            threat_description = arguments.get("threat_description", "")
-            if not threat_description:
-                return [TextContent(type="text", text="エラー: threat_descriptionが必要です")]
-            
-            result = calculate_cvss_with_ai(threat_description)
-            return [TextContent(type="text", text=json.dumps(result, ensure_ascii=False, indent=2))]
-        
-        elif name == "extract_cvss_batch":
-            # 複数の脅威記述文からCVSSをバッチ抽出
-            threat_descriptions = arguments.get("threat_descriptions", [])
-            if not threat_descriptions:
-                return [TextContent(type="text", text="エラー: threat_descriptionsが必要です")]
-            
-            results = process_threats_with_cvss(threat_descriptions)
-            
-            # 統計情報を追加
-            severities = {}
-            for result in results:
-                if "cvss_metrics" in result:
-                    severity = result["cvss_metrics"]["severity"]
-                    severities[severity] = severities.get(severity, 0) + 1
-            
-            response = {
-                "results": results,
-                "statistics": {
-                    "total": len(results),
-                    "severity_distribution": severities
-                }
-            }
-            
-            return [TextContent(type="text", text=json.dumps(response, ensure_ascii=False, indent=2))]
+        normalizer = await run_cpu(get_semantic_normalizer)
+        data_types = await run_cpu(extract, normalizer)
         
-        elif name == "extract_data_types":
-            # テキストからデータタイプを抽出
-            text = arguments.get("text", "")
-            if not text:
-                return [TextContent(type="text", text="エラー: textが必要です")]
-            
-            try:
-                # 初期化ステータスを返す
-                init_response = {
-                    "text": text,
-                    "status": "initializing_normalizer"
-                }
-                
-                normalizer = get_semantic_normalizer()
-                
-                # 処理開始ステータス
-                processing_status = {
-                    "text": text,
-                    "status": "processing"
-                }
-                
-                data_types = normalizer.extract_data_types_from_text(text)
-                
-                response = {
-                    "text": text,
-                    "extracted_data_types": data_types,
-                    "status": "success"
-                }
-                
-                return [TextContent(type="text", text=json.dumps(response, ensure_ascii=False, indent=2))]
-            except Exception as normalize_error:
-                error_response = {
-                    "text": text,
-                    "error": f"Normalization error: {str(normalize_error)}",
-                    "error_type": type(normalize_error).__name__,
-                    "status": "error"
-                }
-                return [TextContent(type="text", text=json.dumps(error_response, ensure_ascii=False, indent=2))]
-        
-        elif name == "normalize_features":
-            # セキュリティ特徴を正規化
-            normalizer = get_semantic_normalizer()
-            
-            response = {}
-            
-            # 攻撃ベクトルの正規化
-            if "attack_vector" in arguments:
-                attack_vector = arguments["attack_vector"]
-                normalized_av = normalizer.normalize_attack_vector(attack_vector)
-                response["attack_vector"] = {
-                    "original": attack_vector,
-                    "normalized": normalized_av
-                }
-            
-            # データタイプの正規化
-            if "data_types" in arguments:
-                data_types = arguments["data_types"]
-                normalized_dt = normalizer.normalize_data_types(data_types)
-                response["data_types"] = {
-                    "original": data_types,
-                    "normalized": normalized_dt
-                }
-            
-            # 影響タイプの正規化
-            if "impact_types" in arguments:
-                impact_types = arguments["impact_types"]
-                normalized_it = normalizer.normalize_impact_types(impact_types)
-                response["impact_types"] = {
-                    "original": impact_types,
-                    "normalized": normalized_it
-                }
-            
-            return [TextContent(type="text", text=json.dumps(response, ensure_ascii=False, indent=2))]
-        
-        else:
-            return [TextContent(type="text", text=f"エラー: 不明なツール '{name}'")]
+        return {
+            "text": text,
+            "extracted_data_types": data_types,
+            "status": "success"
+        }
+    except Exception as normalize_error:
+        return {
+            "text": text,
+            "error": f"Normalization error: {str(normalize_error)}",
+            "error_type": type(normalize_error).__name__,
+            "status": "error"
+        }
+
+async def normalize_features_tool(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """セキュリティ特徴を正規化"""
+    return await run_cpu(normalize_features_response, arguments)
+
+async def score_cvss_vectors_tool(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """ベクトル/メトリクス配列からスコアを一括計算（LLM・埋め込み不使用）"""
+    with tool_input():
+        return await run_cpu(score_cvss_vectors, arguments.get("vectors"), arguments.get("metrics"))
+
+async def rescore_cvss_environmental_tool(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """資産分類プロファイルによる現状・環境評価の一括再計算（LLM不使用）"""
+    with tool_input():
+        return await run_cpu(
+            rescore_cvss_environmental,
+            arguments.get("vectors", []),
+            arguments.get("asset_classes"),
+            arguments.get("device_types"),
+            arguments.get("overrides")
+        )
+
+# ツール名 → 結果を辞書で返す処理関数（MCP・HTTPで共有）
+TOOL_HANDLERS = {
+    "extract_cvss": extract_cvss_tool,
+    "extract_cvss_batch": extract_cvss_batch_tool,
+    "extract_data_types": extract_data_types_tool,
+    "normalize_features": normalize_features_tool,
+    "score_cvss_vectors": score_cvss_vectors_tool,
+    "rescore_cvss_environmental": rescore_cvss_environmental_tool,
+}
+
+# 一括処理のツール（実行プールでは単発の呼び出しを優先し、ユーザー間で公平に割り当てる）
+BULK_TOOLS = {"extract_cvss_batch", "score_cvss_vectors", "rescore_cvss_environmental"}
+
+def tool_priority(name: str) -> str:
+    """ツールの実行優先度（interactive / bulk）"""
+    return "bulk" if name in BULK_TOOLS else "interactive"
+
+# ツール名 → 流入制御のエンドポイント種別（HTTPエンドポイントのadmission(...)と同じ）
+TOOL_ENDPOINT_CLASSES = {
+    "extract_cvss": "single",
+    "extract_cvss_batch": "batch",
+    "extract_data_types": "normalize",
+    "normalize_features": "normalize",
+    "score_cvss_vectors": "batch",
+    "rescore_cvss_environmental": "batch",
+}
+
+def mcp_user_id() -> str:
+    """MCPトランスポートで認証したユーザーID（標準入出力・直接呼び出しでは空文字）"""
+    try:
+        request = server.request_context.request
+    except LookupError:
+        return ""
+    user = request.scope.get("user") if request is not None else None
+    return (user or {}).get("uid", "")
+
+# 数値配列が大きくなるツールはMCPのテキスト出力でもインデントしない
+COMPACT_TEXT_TOOLS = {"score_cvss_vectors", "rescore_cvss_environmental"}
+
+@server.call_tool()
+async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
+    """ツール呼び出しを処理する（結果の辞書をMCP用のテキストに変換する薄いラッパー）"""
+    handler = TOOL_HANDLERS.get(name)
+    if handler is None:
+        return [TextContent(type="text", text=f"エラー: 不明なツール '{name}'")]
     
+    endpoint_class = TOOL_ENDPOINT_CLASSES[name]
+    try:
+        # HTTPエンドポイントと同じ流入制御・ユーザー単位の実行割り当てを適用する
+        # HTTP経由の場合はリクエストIDを引き継ぎ、段階別の計測値はツール呼び出し単位で集計する
+        async with admitted(endpoint_class):
+            with request_context(get_request_id()), track_tool(name), \
+                    scheduling(tool_priority(name), mcp_user_id()), requested_model_tier(arguments):
+                response = await handler(arguments)
+    except AdmissionRejected as e:
+        return [TextContent(type="text", text=f"エラー: {endpoint_class}リクエストが混雑しています。"
+                                              f"{e.retry_after}秒後に再試行してください")]
     except Exception as e:
         return [TextContent(type="text", text=f"エラー: {str(e)}")]
+    
+    indent = None if name in COMPACT_TEXT_TOOLS or arguments.get("compact") else 2
+    return [TextContent(type="text", text=json.dumps(response, ensure_ascii=False, indent=indent))]
 
 # HTTP サーバー用の追加インポート
 from fastapi import FastAPI, HTTPException, Depends
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 import uvicorn
 from pydantic import BaseModel
-from typing import Optional
-from .auth import initialize_firebase, require_auth, get_current_user
+from typing import Literal
+from fastapi.security import HTTPAuthorizationCredentials
+from mcp.server.sse import SseServerTransport
+from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+from starlette.requests import Request
+from starlette.datastructures import Headers, MutableHeaders
+from .auth import initialize_firebase, require_auth, get_current_user, verify_firebase_token, get_auth_backend, get_jwks_store
+from .admission import admission
+from .result_store import get_result_store
+from datetime import datetime
 
 # HTTPサーバー用のPydanticモデル
 class ThreatRequest(BaseModel):
     threat_description: str
+    explain: Literal["none", "ids", "full"] = "full"
+    model_tier: Optional[str] = None
 
 class BatchThreatRequest(BaseModel):
     threat_descriptions: List[str]
+    explain: Literal["none", "ids", "full"] = "full"
+    fields: Optional[Union[str, List[str]]] = None
+    compact: bool = False
+    previous_results: Optional[List[Dict[str, Any]]] = None
+    model_tier: Optional[str] = None
 
 class DataTypesRequest(BaseModel):
     text: str
+    model_tier: Optional[str] = None
 
 class NormalizeRequest(BaseModel):
     attack_vector: Optional[str] = None
     data_types: Optional[List[str]] = None
     impact_types: Optional[List[str]] = None
+    model_tier: Optional[str] = None
+
+class CVSSVectorsRequest(BaseModel):
+    vectors: Optional[List[str]] = None
+    metrics: Optional[Dict[str, List[str]]] = None
+
+class EnvironmentalRescoreRequest(BaseModel):
+    vectors: List[str]
+    asset_classes: Optional[List[Optional[str]]] = None
+    device_types: Optional[List[str]] = None
+    overrides: Optional[Dict[str, Union[str, List[str]]]] = None
 
 # Firebase初期化
 from contextlib import asynccontextmanager
 
+# MCPのstreamable HTTPトランスポート（セッション管理はアプリの起動ごとに生成）
+mcp_session_manager: Optional[StreamableHTTPSessionManager] = None
+
+# 旧クライアント向けのSSEトランスポート（GET /sse でストリーム接続、POST /messages/ でメッセージ送信）
+sse_transport = SseServerTransport("/messages/")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """アプリケーションのライフサイクル管理"""
-    # 起動時の処理
-    try:
-        initialize_firebase()
-    except Exception as e:
-        logger.warning(f"Firebase initialization warning: {e}")
+    global mcp_session_manager
+    
+    # 起動時の処理（LOG_FORMAT指定時はキュー経由の非同期ログ出力を構成）
+    configure_logging_from_env()
+    
+    jwks_refresh_task = None
+    if get_auth_backend() == "jwks":
+        # 鍵を事前に読み込み、期限前にバックグラウンドで更新する（リクエスト経路では取得しない）
+        # iss・audが未設定なら起動しない（共有JWKSで他プロジェクトのトークンを受け付けないようにする）
+        jwks_store = get_jwks_store()
+        try:
+            await asyncio.to_thread(jwks_store.refresh)
+        except Exception as e:
+            logger.warning(f"JWKS initial load warning: {e}")
+        jwks_refresh_task = asyncio.create_task(jwks_store.run_refresh_loop())
+    else:
+        try:
+            initialize_firebase()
+        except Exception as e:
+            logger.warning(f"Firebase initialization warning: {e}")
     
-    yield
+    # REFERENCE_CORPORA_WATCH_INTERVAL（秒）を指定した場合は参照文ファイルの更新を監視する
+    watch_interval = float(os.getenv("REFERENCE_CORPORA_WATCH_INTERVAL", "0"))
+    corpora_watch_task = asyncio.create_task(watch_reference_corpora(watch_interval)) if watch_interval > 0 else None
     
-    # 終了時の処理（必要に応じて）
-    pass
+    # 全MCPクライアントで同じServer（モデル・キャッシュ・接続プール）を共有する
+    mcp_session_manager = StreamableHTTPSessionManager(app=server)
+    async with mcp_session_manager.run():
+        yield
+    mcp_session_manager = None
+    
+    if jwks_refresh_task is not None:
+        jwks_refresh_task.cancel()
+    if corpora_watch_task is not None:
+        corpora_watch_task.cancel()
+    
+    # 終了時の処理
+    shutdown_executors()
 
 # FastAPIアプリケーション
 app = FastAPI(
     title="MCP Threat Extraction Server",
     description="医療機器の脅威記述文からCVSSスコアとセキュリティ特徴を抽出するHTTPサーバー",
     version="0.3.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # CORS設定
@@ -353,8 +803,37 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
 
+# 一定サイズ以上のレスポンスはAccept-Encodingに応じてgzip圧縮する
+app.add_middleware(GZipMiddleware, minimum_size=int(os.getenv("GZIP_MIN_SIZE", "1000")))
+
+class RequestIdMiddleware:
+    """X-Request-IDを引き継ぎ（なければ採番し）、ログの相関用にコンテキストへ設定してレスポンスヘッダーで返す"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        incoming = Headers(scope=scope).get("x-request-id", "")
+        if len(incoming) > 128 or not incoming.isprintable():
+            incoming = ""
+        
+        with request_context(incoming or None) as request_id:
+            async def send_with_request_id(message):
+                if message["type"] == "http.response.start":
+                    MutableHeaders(scope=message).append("X-Request-ID", request_id)
+                await send(message)
+            
+            await self.app(scope, receive, send_with_request_id)
+
+app.add_middleware(RequestIdMiddleware)
+
 @app.get("/")
 @app.head("/")
 async def root():
@@ -379,67 +858,187 @@ async def auth_status():
     auth_disabled = os.getenv("DISABLE_AUTH", "false").lower() == "true"
     return {
         "auth_enabled": not auth_disabled,
-        "auth_method": "firebase" if not auth_disabled else "disabled"
+        "auth_method": get_auth_backend() if not auth_disabled else "disabled"
     }
 
 
-@app.post("/extract_cvss")
-async def extract_cvss_endpoint(request: ThreatRequest, current_user: dict = Depends(require_auth)):
-    """単一の脅威記述文からCVSSスコアを抽出"""
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheusテキスト形式のメトリクス"""
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
+@app.get("/metrics/rules")
+async def rule_metrics(current_user: dict = Depends(require_auth)):
+    """CVSS決定ルールの分岐ヒット数・パターン一致数・チェックコスト"""
+    return get_cvss_logic_engine().rule_report()
+
+@app.get("/metrics/executors")
+async def executor_metrics(current_user: dict = Depends(require_auth)):
+    """LLMプール・CPUプールの利用状況"""
+    return executor_stats()
+
+@app.get("/metrics/models")
+async def model_metrics(current_user: dict = Depends(require_auth)):
+    """モデル階層ごとの読み込み状態・推定メモリ・レイテンシと、直近の読み込み・退避イベント"""
+    return get_model_registry().stats()
+
+def require_result_store():
+    """結果ストアが無効（RESULT_STORE_PATH未設定）なら503"""
+    store = get_result_store()
+    if store is None:
+        raise HTTPException(status_code=503, detail="結果ストアが無効です（RESULT_STORE_PATHを設定してください）")
+    return store
+
+@app.get("/analyses")
+async def list_analyses(device_type: Optional[str] = None, attack_vector: Optional[str] = None,
+                        severity: Optional[str] = None, description_hash: Optional[str] = None,
+                        min_score: Optional[float] = None, max_score: Optional[float] = None,
+                        since: Optional[datetime] = None, until: Optional[datetime] = None,
+                        cursor: Optional[int] = None, limit: int = 50,
+                        current_user: dict = Depends(require_auth)):
+    """保存済みの分析結果を新しい順に検索（next_cursorをcursorに渡して次ページを取得）"""
+    store = require_result_store()
+    return await asyncio.to_thread(
+        store.query,
+        limit=limit,
+        device_type=device_type,
+        attack_vector=attack_vector,
+        severity=severity,
+        description_hash=description_hash,
+        min_score=min_score,
+        max_score=max_score,
+        since=since.timestamp() if since else None,
+        until=until.timestamp() if until else None,
+        cursor=cursor
+    )
+
+@app.get("/analyses/{analysis_id}")
+async def get_analysis(analysis_id: int, explain: Literal["none", "ids", "full"] = "full",
+                       current_user: dict = Depends(require_auth)):
+    """保存済みの分析結果1件（抽出特徴・ロジックパスを含む）"""
+    store = require_result_store()
+    item = await asyncio.to_thread(store.get, analysis_id, explain)
+    if item is None:
+        raise HTTPException(status_code=404, detail=f"分析結果が見つかりません: {analysis_id}")
+    return item
+
+@app.post("/reference_corpora/reload")
+async def reload_reference_corpora_endpoint(current_user: dict = Depends(require_auth)):
+    """参照文ファイルを再読み込みし、処理中のリクエストを止めずに参照行列を入れ替える"""
     try:
-        result = await call_tool("extract_cvss", {"threat_description": request.threat_description})
-        response_data = json.loads(result[0].text)
-        response_data["user"] = current_user["uid"]
-        return JSONResponse(content=response_data)
+        return await run_cpu(reload_reference_corpora)
+    except (ValueError, OSError) as e:
+        raise HTTPException(status_code=400, detail=f"参照文ファイルを読み込めません: {e}")
+
+async def run_tool_endpoint(name: str, arguments: Dict[str, Any], current_user: dict) -> ORJSONResponse:
+    """ツールの結果辞書をそのままorjsonで返す（入力エラーは400、その他は500）"""
+    try:
+        with track_tool(name), scheduling(tool_priority(name), current_user["uid"]), \
+                requested_model_tier(arguments):
+            response_data = await TOOL_HANDLERS[name](arguments)
+    except ToolInputError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    response_data["user"] = current_user["uid"]
+    return ORJSONResponse(content=response_data)
+
+@app.post("/extract_cvss")
+async def extract_cvss_endpoint(request: ThreatRequest, current_user: dict = Depends(require_auth),
+                                _slot: None = Depends(admission("single"))):
+    """単一の脅威記述文からCVSSスコアを抽出"""
+    return await run_tool_endpoint("extract_cvss", request.model_dump(), current_user)
 
 @app.post("/extract_cvss_batch")
-async def extract_cvss_batch_endpoint(request: BatchThreatRequest, current_user: dict = Depends(require_auth)):
+async def extract_cvss_batch_endpoint(request: BatchThreatRequest, current_user: dict = Depends(require_auth),
+                                      _slot: None = Depends(admission("batch"))):
     """複数の脅威記述文からCVSSスコアをバッチ抽出"""
-    try:
-        result = await call_tool("extract_cvss_batch", {"threat_descriptions": request.threat_descriptions})
-        response_data = json.loads(result[0].text)
-        response_data["user"] = current_user["uid"]
-        return JSONResponse(content=response_data)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await run_tool_endpoint("extract_cvss_batch", request.model_dump(), current_user)
 
 @app.post("/extract_data_types")
-async def extract_data_types_endpoint(request: DataTypesRequest, current_user: dict = Depends(require_auth)):
+async def extract_data_types_endpoint(request: DataTypesRequest, current_user: dict = Depends(require_auth),
+                                      _slot: None = Depends(admission("normalize"))):
     """テキストからデータタイプを抽出"""
-    try:
-        result = await call_tool("extract_data_types", {"text": request.text})
-        response_data = json.loads(result[0].text)
-        response_data["user"] = current_user["uid"]
-        return JSONResponse(content=response_data)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await run_tool_endpoint("extract_data_types", request.model_dump(), current_user)
 
 @app.post("/normalize_features")
-async def normalize_features_endpoint(request: NormalizeRequest, current_user: dict = Depends(require_auth)):
+async def normalize_features_endpoint(request: NormalizeRequest, current_user: dict = Depends(require_auth),
+                                      _slot: None = Depends(admission("normalize"))):
     """セキュリティ特徴を正規化"""
-    try:
-        arguments = {}
-        if request.attack_vector:
-            arguments["attack_vector"] = request.attack_vector
-        if request.data_types:
-            arguments["data_types"] = request.data_types
-        if request.impact_types:
-            arguments["impact_types"] = request.impact_types
-        
-        result = await call_tool("normalize_features", arguments)
-        response_data = json.loads(result[0].text)
-        response_data["user"] = current_user["uid"]
-        return JSONResponse(content=response_data)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    arguments = {}
+    if request.attack_vector:
+        arguments["attack_vector"] = request.attack_vector
+    if request.data_types:
+        arguments["data_types"] = request.data_types
+    if request.impact_types:
+        arguments["impact_types"] = request.impact_types
+    if request.model_tier:
+        arguments["model_tier"] = request.model_tier
+    
+    return await run_tool_endpoint("normalize_features", arguments, current_user)
+
+@app.post("/score_cvss_vectors")
+async def score_cvss_vectors_endpoint(request: CVSSVectorsRequest, current_user: dict = Depends(require_auth),
+                                      _slot: None = Depends(admission("batch"))):
+    """CVSSベクトル/メトリクス配列からベーススコアを一括計算"""
+    return await run_tool_endpoint("score_cvss_vectors", request.model_dump(), current_user)
+
+@app.post("/rescore_cvss_environmental")
+async def rescore_cvss_environmental_endpoint(request: EnvironmentalRescoreRequest, current_user: dict = Depends(require_auth),
+                                              _slot: None = Depends(admission("batch"))):
+    """資産分類プロファイルでCVSS現状・環境評価スコアを一括再計算"""
+    return await run_tool_endpoint("rescore_cvss_environmental", request.model_dump(), current_user)
+
+class MCPTransportApp:
+    """
+    MCPトランスポートのASGIアプリ（HTTPエンドポイントと同じFirebase認証を通過したリクエストのみ渡す）
+    認証済みのクレームはscope["user"]に保存し、call_toolがユーザー単位の実行割り当てに使う
+    """
+    
+    def __init__(self, handler):
+        self.handler = handler
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            authorization = Request(scope).headers.get("authorization", "")
+            scheme, _, token = authorization.partition(" ")
+            credentials = None
+            if scheme.lower() == "bearer" and token:
+                credentials = HTTPAuthorizationCredentials(scheme=scheme, credentials=token)
+            try:
+                scope["user"] = await verify_firebase_token(credentials)
+            except HTTPException as e:
+                response = ORJSONResponse({"detail": e.detail}, status_code=e.status_code, headers=e.headers)
+                await response(scope, receive, send)
+                return
+        await self.handler(scope, receive, send)
+
+async def handle_streamable_http(scope, receive, send):
+    """streamable HTTPトランスポートのリクエストをセッション管理に渡す"""
+    if mcp_session_manager is None:
+        response = ORJSONResponse({"detail": "MCPトランスポートが起動していません"}, status_code=503)
+        await response(scope, receive, send)
+        return
+    await mcp_session_manager.handle_request(scope, receive, send)
+
+async def handle_sse(scope, receive, send):
+    """SSEストリームを開き、接続ごとにMCPセッションを実行"""
+    async with sse_transport.connect_sse(scope, receive, send) as (read_stream, write_stream):
+        await server.run(read_stream, write_stream, server.create_initialization_options())
+
+app.add_route("/mcp", MCPTransportApp(handle_streamable_http), include_in_schema=False)
+app.add_route("/sse", MCPTransportApp(handle_sse), include_in_schema=False)
+app.mount("/messages", MCPTransportApp(sse_transport.handle_post_message))
 
 # メイン実行
 async def main():
     """サーバーを起動する"""
     from mcp.server.stdio import stdio_server
     
+    # 標準出力はMCPの通信に使うため、ログは標準エラー出力へ書き出す
+    configure_logging_from_env(sys.stderr)
+    
     async with stdio_server() as (read_stream, write_stream):
         await server.run(
             read_stream,
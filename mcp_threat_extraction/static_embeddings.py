@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+静的エンベディング（トークン単位の埋め込み表）
+設定中のSentenceTransformerで語彙の各トークンを1回ずつエンコードして埋め込み表を作り、
+推論時はトークン化と表の行の平均だけでエンベディングを求める（Transformerの推論なし）。
+短い入力（攻撃経路・データ種別など1〜2語の値）の正規化を軽くするためのバックエンド
+
+埋め込み表はメモリマップで読み込むため、複数プロセスで同じ表を共有できる
+
+使い方:
+    python -m mcp_threat_extraction.static_embeddings distill ./static-minilm
+    NORMALIZER_BACKEND=static STATIC_EMBEDDINGS_PATH=./static-minilm mcp-threat-extraction
+"""
+
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import numpy as np
+from tokenizers import Tokenizer
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+EMBEDDINGS_FILE = "embeddings.npy"
+TOKENIZER_FILE = "tokenizer.json"
+META_FILE = "static_embeddings.json"
+
+
+def _token_text(tokenizer: Tokenizer, token_id: int) -> str:
+    """トークンを単独でエンコードする時の文字列（サブワードの接頭辞などは除く）"""
+    text = tokenizer.decode([token_id]).strip()
+    if not text:
+        text = tokenizer.id_to_token(token_id) or ""
+    return text.removeprefix("##").replace("▁", " ").strip() or text
+
+
+def distill(tokenizer: Tokenizer, encode: Callable[[List[str]], np.ndarray], output_dir: str,
+            source_model: str = "", batch_size: int = 1024) -> Path:
+    """
+    語彙の各トークンをencodeで埋め込み、埋め込み表・トークナイザー・メタ情報を保存する
+
+    Args:
+        tokenizer: 元モデルのトークナイザー
+        encode: 文のリストをエンベディング行列に変換する関数（元モデルのencode）
+        output_dir: 出力先ディレクトリ
+        source_model: 元モデル名（メタ情報に記録）
+        batch_size: 1回にエンコードするトークン数
+    """
+    output = Path(output_dir)
+    output.mkdir(parents=True, exist_ok=True)
+    vocab_size = tokenizer.get_vocab_size()
+    texts = [_token_text(tokenizer, token_id) for token_id in range(vocab_size)]
+
+    start = time.perf_counter()
+    table = None
+    for begin in range(0, vocab_size, batch_size):
+        embeddings = np.asarray(encode(texts[begin:begin + batch_size]), dtype=np.float32)
+        if table is None:
+            table = np.lib.format.open_memmap(output / EMBEDDINGS_FILE, mode="w+", dtype=np.float16,
+                                              shape=(vocab_size, embeddings.shape[1]))
+        table[begin:begin + len(embeddings)] = embeddings
+    table.flush()
+    dim = table.shape[1]
+    del table
+
+    tokenizer.save(str(output / TOKENIZER_FILE))
+    meta = {"source_model": source_model, "vocab_size": vocab_size, "dim": dim, "pooling": "mean"}
+    (output / META_FILE).write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+    logger.info(f"Static embeddings distilled: {vocab_size} tokens x {dim} in {time.perf_counter() - start:.1f}s")
+    return output
+
+
+def distill_from_sentence_transformer(model_name: str, output_dir: str, batch_size: int = 1024) -> Path:
+    """SentenceTransformerモデルから静的エンベディングを作成"""
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name)
+    tokenizer = model.tokenizer.backend_tokenizer
+    return distill(tokenizer, lambda texts: model.encode(texts, batch_size=256), output_dir, model_name, batch_size)
+
+
+class StaticEmbeddingModel:
+    """
+    静的エンベディングのエンコーダー（SentenceTransformerのencodeと同じ呼び出し方）
+    入力文のトークン（特殊トークンを除く）の埋め込みを平均する
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.meta = json.loads((self.path / META_FILE).read_text(encoding="utf-8"))
+        self.embeddings = np.load(self.path / EMBEDDINGS_FILE, mmap_mode="r")
+        self.tokenizer = Tokenizer.from_file(str(self.path / TOKENIZER_FILE))
+        self.tokenizer.no_padding()
+        self.tokenizer.no_truncation()
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.embeddings.shape[1]
+
+    def memory_bytes(self) -> int:
+        """埋め込み表のバイト数（メモリマップのためプロセス間で共有される）"""
+        return self.embeddings.nbytes
+
+    def encode(self, texts: List[str], normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        """各文のトークン埋め込みの平均（トークンがない文はゼロベクトル）"""
+        result = np.zeros((len(texts), self.embeddings.shape[1]), dtype=np.float32)
+        for row, encoding in enumerate(self.tokenizer.encode_batch(list(texts), add_special_tokens=False)):
+            if encoding.ids:
+                result[row] = self.embeddings[encoding.ids].astype(np.float32).mean(axis=0)
+        if normalize_embeddings:
+            result /= np.maximum(np.linalg.norm(result, axis=1, keepdims=True), 1e-12)
+        return result
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="静的エンベディングの作成")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    distill_parser = subparsers.add_parser("distill", help="SentenceTransformerから埋め込み表を作成")
+    distill_parser.add_argument("output_dir")
+    distill_parser.add_argument("--model", default="all-MiniLM-L6-v2", help="元モデル（既定all-MiniLM-L6-v2）")
+    distill_parser.add_argument("--batch-size", type=int, default=1024)
+
+    args = parser.parse_args(argv)
+    output = distill_from_sentence_transformer(args.model, args.output_dir, args.batch_size)
+    print(f"STATIC_EMBEDDINGS_PATH={output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
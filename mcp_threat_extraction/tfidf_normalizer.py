@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+文字n-gramのTF-IDFによる軽量なセマンティック正規化
+起動時に参照文で文字n-gramのTF-IDFを学習し（数ミリ秒）、カテゴリの重心との類似度で判定する（最近傍重心分類）。
+torch・SentenceTransformerを読み込まないため、USE_SMALL_MODELでも重い低メモリ環境向け
+
+使い方:
+    NORMALIZER_BACKEND=tfidf mcp-threat-extraction
+
+TF-IDFの類似度はSentenceTransformerより全体に低いため、閾値は別に設定する
+（TFIDF_MATCH_THRESHOLD 既定0.1 / TFIDF_TEXT_THRESHOLD 既定0.15）
+"""
+
+import os
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from .logging_config import get_logger
+from .semantic_normalizer_optimized import CATEGORY_TYPES, OptimizedSemanticNormalizer, ReferenceSnapshot
+
+logger = get_logger(__name__)
+
+
+class CharTfidfEncoder:
+    """文字n-gramのTF-IDFエンコーダー（学習済みのものはSentenceTransformerのencodeと同じ呼び出し方）"""
+
+    def __init__(self, ngram_range: Tuple[int, int] = (2, 3)):
+        self.ngram_range = ngram_range
+        self.vectorizer = TfidfVectorizer(analyzer="char_wb", ngram_range=ngram_range, dtype=np.float32)
+
+    def fit(self, texts: List[str]) -> "CharTfidfEncoder":
+        """textsで語彙とIDFを学習した新しいエンコーダー（自身は変更しない）"""
+        encoder = CharTfidfEncoder(self.ngram_range)
+        encoder.vectorizer.fit(texts)
+        return encoder
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return len(self.vectorizer.vocabulary_)
+
+    def memory_bytes(self) -> int:
+        """語彙（n-gram文字列と辞書）とIDFのおおよそのバイト数"""
+        vocabulary = self.vectorizer.vocabulary_
+        return sys.getsizeof(vocabulary) + sum(sys.getsizeof(ngram) for ngram in vocabulary) + self.vectorizer.idf_.nbytes
+
+    def encode(self, texts: List[str], normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        """各文のTF-IDFベクトル（L2正規化済み、学習時の語彙にないn-gramだけの文はゼロベクトル）"""
+        return self.vectorizer.transform(list(texts)).toarray()
+
+
+class TfidfSemanticNormalizer(OptimizedSemanticNormalizer):
+    """文字n-gramのTF-IDFと最近傍重心分類によるセマンティック正規化（単件・一括のメソッドは基底クラスと同じ）"""
+
+    reference_index_kind = "centroid"
+
+    def __init__(self, model_name: str = "char-tfidf", references_path: Optional[str] = None,
+                 ngram_range: Tuple[int, int] = (2, 3), **kwargs):
+        """
+        初期化
+        Args:
+            model_name: 表示用の名前（モデルの読み込みはしない）
+            references_path: 参照文ファイルのパス（既定はreference_corpora_path()）
+            ngram_range: 文字n-gramの長さの範囲
+        """
+        self.match_threshold = float(os.getenv("TFIDF_MATCH_THRESHOLD", "0.1"))
+        self.text_threshold = float(os.getenv("TFIDF_TEXT_THRESHOLD", "0.15"))
+        super().__init__(model_name, references_path, model=CharTfidfEncoder(ngram_range), backend="tfidf")
+
+    def _precompute_embeddings(self, corpora: Dict[str, Any]) -> Tuple[ReferenceSnapshot, int]:
+        """参照文でTF-IDFを学習し直してから参照行列を作成（語彙が変わるため全参照文を再計算する）"""
+        sentences = sorted({
+            text
+            for category_type in CATEGORY_TYPES
+            for texts in corpora[category_type].values()
+            for text in texts
+        })
+        # 処理中のリクエストは旧スナップショットのエンコーダーを使い続ける
+        self.model = self.model.fit(sentences)
+        self._sentence_embeddings.clear()
+        logger.info(f"Char TF-IDF fitted: {len(sentences)} sentences, "
+                    f"{self.model.get_sentence_embedding_dimension()} features")
+        return super()._precompute_embeddings(corpora)
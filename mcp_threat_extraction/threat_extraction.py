@@ -4,22 +4,26 @@ from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.runnables import RunnableLambda
 import os
 import json
+import time
 from pprint import pprint
 from dotenv import load_dotenv
 from tqdm import tqdm
 from typing import Dict, Tuple
+import sqlite3
 from dataclasses import dataclass
 from .logging_config import get_logger
+from .result_store import get_result_store
+from .metrics import stage_timer, register_cache, lru_cache_info, NORMALIZER_INIT_SECONDS
 from .threat_data import (
     DEVICE_TYPES, THREAT_TEMPLATES, COUNTERMEASURES_DB,
     ASSET_CLASSIFICATION, DATA_CLASSIFICATION, CVSS_ATTACK_PATTERNS,
     ATTACK_VECTORS, ATTACK_COMPLEXITY, PRIVILEGES_REQUIRED,
     USER_INTERACTION, SCOPE, IMPACT_LEVELS, SEVERITY_RATINGS
 )
-from .cvss_logic import CVSSMetrics, CVSSCalculator, CVSSLogicEngine
+from .cvss_logic import CVSSMetrics, CVSSCalculator, CVSSLogicEngine, RuleProfiler, render_logic_paths
 
 # セマンティック正規化器のインポート
-from .semantic_normalizer_optimized import OptimizedSemanticNormalizer
+from .model_registry import current_model_tier, get_model_registry, normalizer_timer
 
 # 最適化されたSemanticNormalizerのインスタンス（レイジーローディング）
 # Logger設定
@@ -28,12 +32,40 @@ logger = get_logger(__name__)
 semantic_normalizer = None
 
 def get_semantic_normalizer():
-    """SemanticNormalizerのレイジーローディング"""
+    """SemanticNormalizerのレイジーローディング（既定の正規化器も登録簿から取得し、リクエストがモデル階層を指定していればその正規化器。サーバーと共有し、初回の読み込み時間を記録する）"""
     global semantic_normalizer
+    tier = current_model_tier()
+    if tier is not None:
+        return get_model_registry().get(tier)
     if semantic_normalizer is None:
-        semantic_normalizer = OptimizedSemanticNormalizer()
+        start_time = time.perf_counter()
+        semantic_normalizer = get_model_registry().get_default()
+        init_time = time.perf_counter() - start_time
+        logger.info(f"Semantic normalizer initialized in {init_time:.2f} seconds")
+        NORMALIZER_INIT_SECONDS.set(init_time)
     return semantic_normalizer
 
+# CVSSロジックエンジン（機器索引の構築は初回のみ）
+cvss_logic_engine = None
+
+def get_cvss_logic_engine() -> CVSSLogicEngine:
+    """CVSSLogicEngineのレイジーローディング"""
+    global cvss_logic_engine
+    if cvss_logic_engine is None:
+        cvss_logic_engine = CVSSLogicEngine(ASSET_CLASSIFICATION, DATA_CLASSIFICATION, CVSS_ATTACK_PATTERNS,
+                                             profiler=create_rule_profiler())
+        register_cache("device_classification", lru_cache_info(cvss_logic_engine._classify_device_cached))
+    return cvss_logic_engine
+
+def create_rule_profiler():
+    """CVSS_RULE_PROFILING（off/on/adaptive）に応じたルールプロファイラを生成"""
+    mode = os.getenv("CVSS_RULE_PROFILING", "off").lower()
+    if mode not in ("on", "adaptive"):
+        return None
+    interval = int(os.getenv("CVSS_RULE_REORDER_INTERVAL", "1000"))
+    logger.info(f"CVSSルールプロファイリング有効: mode={mode}")
+    return RuleProfiler(adaptive=(mode == "adaptive"), reorder_interval=interval)
+
 def normalize_features_with_semantic(raw: dict) -> dict:
     """最適化されたSemanticNormalizerを使用した特徴の正規化"""
     
@@ -78,8 +110,10 @@ def determine_cvss_from_features(features: dict, threat_description: str) -> CVS
     
     logic_paths = {}
     
-    # CVSSロジックエンジンを初期化
-    cvss_logic = CVSSLogicEngine(ASSET_CLASSIFICATION, DATA_CLASSIFICATION, CVSS_ATTACK_PATTERNS)
+    cvss_logic = get_cvss_logic_engine()
+    
+    # デバイスタイプを一度だけ資産分類・機器キーワードに解決し、各決定関数で共有
+    device = cvss_logic.classify_device(features.get("device_type", ""))
     
     # データタイプの補完: AIが抽出できなかった場合は脅威記述文から推定
     if not features.get("data_type"):
@@ -106,7 +140,7 @@ def determine_cvss_from_features(features: dict, threat_description: str) -> CVS
     # 攻撃複雑度の決定（共通モジュール）
     ac, ac_path = cvss_logic.determine_attack_complexity_with_path(
         threat_description, 
-        features.get("device_type", "")
+        device
     )
     logic_paths["attack_complexity"] = ac_path
     
@@ -128,14 +162,14 @@ def determine_cvss_from_features(features: dict, threat_description: str) -> CVS
     # スコープの決定（共通モジュール）
     scope, scope_path = cvss_logic.determine_scope_with_path(
         threat_description, 
-        features.get("device_type", "")
+        device
     )
     logic_paths["scope"] = scope_path
     
     # CIA影響度の決定（共通モジュール）
     c, i, a, cia_path = cvss_logic.determine_cia_impact_with_path(
         threat_description, 
-        features.get("device_type", ""),
+        device,
         features.get("impact_type", []),
         features.get("data_type", []),
         features.get("attack_type", "")
@@ -204,31 +238,70 @@ cvss_prompt = ChatPromptTemplate.from_template("""
 {format_instructions}
 """)
 
-# メインのチェーン
-chain = (
+# LLMによる特徴抽出チェーン（上流I/O待ちの段階）
+llm_chain = (
     {"threat_description": RunnableLambda(lambda x: x), "format_instructions": RunnableLambda(lambda _: parser.get_format_instructions())}
     | prompt
     | llm
     | parser
-    | semantic_normalizer_lambda
 )
 
+# メインのチェーン
+chain = llm_chain | semantic_normalizer_lambda
+
+def extract_raw_features(threat_description: str) -> dict:
+    """LLMで脅威記述文から未正規化の特徴を抽出（I/O待ちの段階、llm_chainと同じ処理を段階ごとに計測）"""
+    messages = prompt.invoke({
+        "threat_description": threat_description,
+        "format_instructions": parser.get_format_instructions()
+    })
+    with stage_timer("llm_call"):
+        message = llm.invoke(messages)
+    with stage_timer("json_parse"):
+        return parser.invoke(message)
+
+def score_raw_features(raw_features: dict, threat_description: str, explain: str = "full") -> dict:
+    """LLMの抽出結果を正規化してCVSSスコアを計算（埋め込み推論・ルール評価のCPU段階）"""
+    with stage_timer("semantic_normalization"), normalizer_timer():
+        features = normalize_features_with_semantic(raw_features)
+    return build_cvss_result(features, threat_description, explain)
+
 # CVSS計算を含む拡張チェーン
-def calculate_cvss_with_ai(threat_description: str) -> dict:
-    """脅威記述からCVSSスコアを計算"""
+def calculate_cvss_with_ai(threat_description: str, explain: str = "full") -> dict:
+    """
+    脅威記述からCVSSスコアを計算
+    
+    Args:
+        threat_description: 脅威記述文
+        explain: ロジックパスの出力形式（"none"、"ids"、"full"）
+    """
     # Step 1: 特徴抽出
     features = chain.invoke(threat_description)
-    
+    return build_cvss_result(features, threat_description, explain)
+
+def build_cvss_result(features: dict, threat_description: str, explain: str = "full") -> dict:
+    """正規化済みの特徴からCVSSメトリクス・スコアを決定して結果をまとめる"""
     # Step 2: CVSSメトリクス決定
-    cvss_metrics = determine_cvss_from_features(features, threat_description)
+    with stage_timer("cvss_logic"):
+        cvss_metrics = determine_cvss_from_features(features, threat_description)
     
     # Step 3: CVSSスコア計算（共通モジュールを使用）
-    calculator = CVSSCalculator()
-    base_score = calculator.calculate_cvss_score(cvss_metrics)
-    severity = calculator.get_severity_rating(base_score)
+    with stage_timer("scoring"):
+        calculator = CVSSCalculator()
+        base_score = calculator.calculate_cvss_score(cvss_metrics)
+        severity = calculator.get_severity_rating(base_score)
+    
+    # Step 4: 結果ストアが有効なら保存（保存の失敗は評価結果に影響させない）
+    store = get_result_store()
+    if store is not None:
+        try:
+            with stage_timer("result_store"):
+                store.save(threat_description, features, cvss_metrics, base_score, severity)
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to store analysis result: {e}")
     
     # 結果をまとめる
-    return {
+    result = {
         "threat_description": threat_description,
         "extracted_features": features,
         "cvss_metrics": {
@@ -242,12 +315,18 @@ def calculate_cvss_with_ai(threat_description: str) -> dict:
             "availability_impact": cvss_metrics.availability,
             "base_score": base_score,
             "severity": severity
-        },
-        "logic_tree_paths": cvss_metrics.logic_paths
+        }
     }
+    
+    # ロジックパスは要求された形式でのみ展開する
+    logic_tree_paths = render_logic_paths(cvss_metrics.logic_paths, explain)
+    if logic_tree_paths is not None:
+        result["logic_tree_paths"] = logic_tree_paths
+    
+    return result
 
 # CVSS計算付きバッチ処理関数
-def process_threats_with_cvss(threat_descriptions: list) -> list:
+def process_threats_with_cvss(threat_descriptions: list, explain: str = "full") -> list:
     """脅威リストを処理してCVSSスコアを含む結果を返す"""
     results = []
     
@@ -255,7 +334,7 @@ def process_threats_with_cvss(threat_descriptions: list) -> list:
     
     for threat in tqdm(threat_descriptions):
         try:
-            result = calculate_cvss_with_ai(threat)
+            result = calculate_cvss_with_ai(threat, explain)
             results.append(result)
         except Exception as e:
             results.append({
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+流入制御のテストスクリプト
+同時処理数・待機数の上限と、上限超過時の429応答を確認します
+"""
+
+import os
+import sys
+import asyncio
+from pathlib import Path
+
+# プロジェクトのルートを追加
+sys.path.insert(0, str(Path(__file__).parent))
+os.environ.setdefault("DISABLE_AUTH", "true")
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from mcp_threat_extraction.admission import AdmissionLimiter, AdmissionRejected, admission, admission_limiters
+
+
+def test_limiter_queues_then_rejects():
+    """上限までは待機し、待機枠を超えると即座に拒否される"""
+    limiter = AdmissionLimiter("test", max_in_flight=1, max_queued=1, retry_after=3)
+
+    async def scenario():
+        assert await limiter.acquire() == 0.0
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.stats() == {"max_in_flight": 1, "max_queued": 1, "in_flight": 1, "queued": 1}
+
+        try:
+            await limiter.acquire()
+        except AdmissionRejected as e:
+            assert e.retry_after == 3
+        else:
+            raise AssertionError("AdmissionRejected expected")
+
+        # 解放された枠は待機中のリクエストに引き渡される
+        await asyncio.sleep(0.05)
+        limiter.release(service_seconds=10.0)
+        assert await waiter >= 0.05
+        assert limiter.in_flight == 1 and limiter.queued == 0
+
+        # 処理時間の実績からRetry-Afterを見積もる
+        assert limiter.estimate_retry_after() == 10
+        limiter.release()
+        assert limiter.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_queue():
+    """待機中に取り消されたリクエストは枠を消費しない"""
+    limiter = AdmissionLimiter("test", max_in_flight=1, max_queued=2)
+
+    async def scenario():
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert limiter.queued == 0
+        limiter.release()
+        assert limiter.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_http_429_with_retry_after():
+    """待機枠がない状態で処理中なら429とRetry-Afterを返す"""
+    limiter = admission_limiters["batch"]
+    original = (limiter.max_in_flight, limiter.max_queued)
+    limiter.max_in_flight, limiter.max_queued = 1, 0
+    limiter.in_flight = 1  # 処理中のリクエストを模擬
+
+    app = FastAPI()
+
+    @app.get("/bulk")
+    async def bulk(_slot: None = Depends(admission("batch"))):
+        return {"ok": True}
+
+    try:
+        with TestClient(app) as client:
+            response = client.get("/bulk")
+        assert response.status_code == 429
+        assert int(response.headers["retry-after"]) >= 1
+
+        limiter.in_flight = 0
+        with TestClient(app) as client:
+            assert client.get("/bulk").json() == {"ok": True}
+        assert limiter.in_flight == 0
+    finally:
+        limiter.max_in_flight, limiter.max_queued = original
+        limiter.in_flight = 0
+
+
+if __name__ == "__main__":
+    test_limiter_queues_then_rejects()
+    test_cancelled_waiter_leaves_queue()
+    test_http_429_with_retry_after()
+    print("✅ すべてのテストが成功しました！")
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+認証トークンキャッシュのテストスクリプト
+検証済みIDトークンがexpまで再利用され、未キャッシュの検証がワーカースレッドで行われることを確認します
+"""
+
+import os
+import sys
+import time
+import asyncio
+import threading
+from pathlib import Path
+
+# プロジェクトのルートを追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fastapi.security import HTTPAuthorizationCredentials
+
+from mcp_threat_extraction import auth as auth_module
+from mcp_threat_extraction.auth import TokenCache, token_cache, verify_firebase_token
+
+
+def test_cache_expiry_and_eviction():
+    """expを過ぎたエントリは返さず、上限を超えると古いものから追い出す"""
+    cache = TokenCache(max_size=2)
+    now = time.time()
+    cache.put("a", {"uid": "a", "exp": now + 60})
+    cache.put("b", {"uid": "b", "exp": now + 60})
+    assert cache.get("a")["uid"] == "a"  # aを最近使用にする
+    cache.put("c", {"uid": "c", "exp": now + 60})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+    cache.put("expired", {"uid": "x", "exp": now - 1})
+    assert cache.get("expired") is None
+    cache.put("no-exp", {"uid": "y"})
+    assert cache.get("no-exp") is None
+    assert (cache.hits, cache.misses) == (3, 3)
+
+
+def test_verify_uses_cache_and_worker_thread():
+    """同じトークンの2回目以降はFirebaseに問い合わせない"""
+    calls = []
+
+    def fake_verify(token):
+        calls.append(threading.current_thread())
+        return {"uid": "u1", "exp": time.time() + 3600}
+
+    original = auth_module.auth.verify_id_token
+    disable_auth = os.environ.pop("DISABLE_AUTH", None)
+    auth_module.auth.verify_id_token = fake_verify
+    token_cache.clear()
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials="token-1")
+
+    async def scenario():
+        first = await verify_firebase_token(credentials)
+        second = await verify_firebase_token(credentials)
+        return first, second
+
+    try:
+        first, second = asyncio.run(scenario())
+    finally:
+        auth_module.auth.verify_id_token = original
+        if disable_auth is not None:
+            os.environ["DISABLE_AUTH"] = disable_auth
+        token_cache.clear()
+
+    assert first["uid"] == second["uid"] == "u1"
+    assert len(calls) == 1
+    assert calls[0] is not threading.main_thread()
+
+
+if __name__ == "__main__":
+    test_cache_expiry_and_eviction()
+    test_verify_uses_cache_and_worker_thread()
+    print("✅ すべてのテストが成功しました！")
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+JWKSによるオフライン認証のテストスクリプト
+ローカルで発行した鍵・トークンで、ネットワークなしに認証経路全体を検証できることを確認します
+"""
+
+import os
+import sys
+import json
+import tempfile
+from pathlib import Path
+
+# プロジェクトのルートを追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fastapi.testclient import TestClient
+
+from mcp_threat_extraction import auth as auth_module
+from mcp_threat_extraction.auth import JWKSKeyStore, UnknownSigningKeyError, token_cache
+from mcp_threat_extraction.local_tokens import generate_signing_key, mint_token
+from mcp_threat_extraction.server import app
+
+ISSUER = "https://securetoken.google.com/local-project"
+AUDIENCE = "local-project"
+
+
+def test_key_store_verifies_and_rotates():
+    """署名・iss・audを検証し、鍵の入れ替え後は新しいkidのトークンを受け付ける"""
+    with tempfile.TemporaryDirectory() as tmp:
+        jwks_file = Path(tmp) / "jwks.json"
+        old_pem, old_jwks = generate_signing_key("old")
+        jwks_file.write_text(json.dumps(old_jwks))
+        store = JWKSKeyStore(str(jwks_file), issuer=ISSUER, audience=AUDIENCE)
+
+        claims = store.verify(mint_token(old_pem, "u1", "old", ISSUER, AUDIENCE))
+        assert claims["uid"] == "u1" and claims["aud"] == AUDIENCE
+
+        for bad_token in (mint_token(old_pem, "u1", "old", ISSUER, "other-project"),
+                          mint_token(old_pem, "u1", "old", "https://evil.example", AUDIENCE)):
+            try:
+                store.verify(bad_token)
+            except auth_module.JOSEError:
+                pass
+            else:
+                raise AssertionError("JOSEError expected")
+
+        new_pem, new_jwks = generate_signing_key("new")
+        new_token = mint_token(new_pem, "u2", "new", ISSUER, AUDIENCE)
+        try:
+            store.verify(new_token)
+        except UnknownSigningKeyError:
+            pass
+        else:
+            raise AssertionError("UnknownSigningKeyError expected before refresh")
+
+        jwks_file.write_text(json.dumps(new_jwks))
+        assert store.refresh() == 1
+        assert store.verify(new_token)["uid"] == "u2"
+
+
+def test_key_store_requires_issuer_and_audience():
+    """iss・audが未設定のJWKS認証は起動時に失敗する（共有JWKSで他プロジェクトのトークンを受け付けない）"""
+    for issuer, audience in ((None, AUDIENCE), (ISSUER, None), (None, None)):
+        try:
+            JWKSKeyStore(auth_module.FIREBASE_JWKS_URL, issuer=issuer, audience=audience)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("ValueError expected")
+
+    names = ("FIREBASE_PROJECT_ID", "JWT_ISSUER", "JWT_AUDIENCE", "JWKS_SOURCE")
+    saved_env = {name: os.environ.pop(name, None) for name in names}
+    saved_store = auth_module._jwks_store
+    auth_module._jwks_store = None
+    try:
+        try:
+            auth_module.get_jwks_store()
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("ValueError expected")
+        os.environ["FIREBASE_PROJECT_ID"] = "local-project"
+        store = auth_module.get_jwks_store()
+        assert store.issuer == ISSUER and store.audience == AUDIENCE
+    finally:
+        auth_module._jwks_store = saved_store
+        for name, value in saved_env.items():
+            os.environ.pop(name, None)
+            if value is not None:
+                os.environ[name] = value
+
+
+def test_http_auth_with_local_jwks():
+    """AUTH_BACKEND=jwksでHTTPの認証経路全体がローカルの鍵だけで動作する"""
+    saved_env = {name: os.environ.pop(name, None) for name in ("DISABLE_AUTH", "AUTH_BACKEND")}
+    os.environ["AUTH_BACKEND"] = "jwks"
+    saved_store = auth_module._jwks_store
+    token_cache.clear()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        jwks_file = Path(tmp) / "jwks.json"
+        private_pem, jwks = generate_signing_key()
+        jwks_file.write_text(json.dumps(jwks))
+        auth_module._jwks_store = JWKSKeyStore(str(jwks_file), issuer=ISSUER, audience=AUDIENCE)
+
+        try:
+            with TestClient(app) as client:
+                token = mint_token(private_pem, "load-user", issuer=ISSUER, audience=AUDIENCE)
+                response = client.get("/auth/me", headers={"Authorization": f"Bearer {token}"})
+                assert response.status_code == 200
+                assert response.json()["user"]["uid"] == "load-user"
+
+                expired = mint_token(private_pem, "load-user", issuer=ISSUER, audience=AUDIENCE, lifetime=-60)
+                response = client.get("/auth/me", headers={"Authorization": f"Bearer {expired}"})
+                assert response.status_code == 401
+                assert response.json()["detail"] == "認証トークンが期限切れです"
+
+                response = client.get("/auth/me", headers={"Authorization": "Bearer not-a-jwt"})
+                assert response.status_code == 401
+
+                # 同じJWKSで署名された別プロジェクト（aud・iss違い）のトークンは拒否する
+                for bad_token in (mint_token(private_pem, "other", issuer=ISSUER, audience="other-project"),
+                                  mint_token(private_pem, "other", issuer="https://securetoken.google.com/other-project",
+                                             audience=AUDIENCE)):
+                    response = client.get("/auth/me", headers={"Authorization": f"Bearer {bad_token}"})
+                    assert response.status_code == 401
+
+                assert client.get("/auth/status").json()["auth_method"] == "jwks"
+        finally:
+            auth_module._jwks_store = saved_store
+            token_cache.clear()
+            for name, value in saved_env.items():
+                os.environ.pop(name, None)
+                if value is not None:
+                    os.environ[name] = value
+
+
+if __name__ == "__main__":
+    test_key_store_verifies_and_rotates()
+    test_key_store_requires_issuer_and_audience()
+    test_http_auth_with_local_jwks()
+    print("✅ すべてのテストが成功しました！")
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+JSONLバッチ処理のテストスクリプト
+完了順の追記、入力エラーの記録、中断後のチェックポイントからの再開を確認します
+"""
+
+import io
+import sys
+import json
+import asyncio
+import tempfile
+from pathlib import Path
+
+# プロジェクトのルートを追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+from mcp_threat_extraction.batch import run_batch
+
+
+async def fake_process(threat: str) -> dict:
+    """LLMを使わずに結果を返す処理（後の行ほど早く終わる）"""
+    await asyncio.sleep(0.001 * (len(threat) % 5))
+    return {
+        "threat_description": threat,
+        "extracted_features": {"device_type": "PACS"},
+        "cvss_metrics": {"base_score": float(len(threat) % 10), "severity": "Low"}
+    }
+
+
+def write_input(path: Path, count: int) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            f.write(json.dumps({"id": f"t{i}", "threat_description": f"threat-{i}" * (i % 3 + 1)}) + "\n")
+        f.write("\n")
+        f.write('"plain string threat"\n')
+        f.write("{broken\n")
+
+
+def read_output(path: Path) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_batch_streams_all_lines():
+    """全行が1回ずつ出力され、fields射影と入力エラーが反映される"""
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path, output_path = Path(tmp) / "in.jsonl", Path(tmp) / "out.jsonl"
+        write_input(input_path, 50)
+        progress = io.StringIO()
+        summary = asyncio.run(run_batch(str(input_path), str(output_path), process=fake_process, concurrency=4,
+                                        fields="cvss_metrics.base_score", progress_stream=progress))
+
+        results = read_output(output_path)
+        assert sorted(r["line"] for r in results) == list(range(50)) + [51, 52]
+        by_line = {r["line"]: r for r in results}
+        assert len(by_line[0].pop("fingerprint")) == 32
+        assert by_line[0] == {"line": 0, "id": "t0", "cvss_metrics": {"base_score": 8.0}}
+        assert "cvss_metrics" in by_line[51]
+        assert "入力の形式が不正です" in by_line[52]["error"]
+        assert summary["completed"] == 52 and summary["errors"] == 1
+        assert "処理済み 52/52 (100.0%)" in progress.getvalue()
+
+        # 完了済みのバッチを再実行しても処理し直さない
+        again = asyncio.run(run_batch(str(input_path), str(output_path), process=fake_process))
+        assert again["processed"] == 0
+        assert len(read_output(output_path)) == 52
+
+
+def test_resume_after_crash():
+    """中断後の再実行はチェックポイント以降だけを処理し、重複を出力しない"""
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path, output_path = Path(tmp) / "in.jsonl", Path(tmp) / "out.jsonl"
+        write_input(input_path, 200)
+        calls = {"count": 0}
+
+        async def crashing_process(threat: str) -> dict:
+            calls["count"] += 1
+            if calls["count"] == 120:
+                raise KeyboardInterrupt
+            return await fake_process(threat)
+
+        try:
+            asyncio.run(run_batch(str(input_path), str(output_path), process=crashing_process, concurrency=8,
+                                  checkpoint_every=25, progress_stream=io.StringIO()))
+        except KeyboardInterrupt:
+            pass
+        else:
+            raise AssertionError("KeyboardInterrupt expected")
+
+        # チェックポイント後に書かれかけた行は再開時に切り詰められる
+        with open(output_path, "a", encoding="utf-8") as f:
+            f.write('{"line": 0, "partial": tru')
+        checkpoint = json.loads(Path(f"{output_path}.ckpt").read_text())
+        assert not checkpoint["finished"] and checkpoint["completed"] > 0
+
+        summary = asyncio.run(run_batch(str(input_path), str(output_path), process=fake_process, concurrency=8,
+                                        progress_stream=io.StringIO()))
+        assert summary["processed"] == 202 - checkpoint["completed"]
+
+        lines = [r["line"] for r in read_output(output_path)]
+        assert sorted(lines) == list(range(200)) + [201, 202]
+
+
+if __name__ == "__main__":
+    test_batch_streams_all_lines()
+    test_resume_after_crash()
+    print("✅ すべてのテストが成功しました！")
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+CVSS一括スコアリングのテストスクリプト
+ベクトル化された計算がスカラー版calculate_cvss_scoreと一致することを確認します
+"""
+
+import sys
+import itertools
+from pathlib import Path
+
+import numpy as np
+
+# パッケージのパスを追加
+sys.path.insert(0, str(Path(__file__).parent / "mcp_threat_extraction"))
+
+import cvss_logic
+from cvss_logic import (
+    CVSSCalculator, CVSSMetrics, CVSS_BASE_METRICS, CVSS_METRIC_VALUES, CVSS_OPTIONAL_METRIC_VALUES,
+    CVSS_TEMPORAL_WEIGHTS, CVSS_REQUIREMENT_WEIGHTS, derive_requirement_profiles, parse_cvss_vector
+)
+from threat_data import ASSET_CLASSIFICATION
+
+
+def _all_combinations():
+    """全ベースメトリクスの組み合わせ（2592通り）"""
+    return list(itertools.product(*(CVSS_METRIC_VALUES[key] for key in CVSS_BASE_METRICS)))
+
+
+def test_batch_matches_scalar():
+    """列指向の一括計算が全組み合わせでスカラー版と一致する"""
+    calculator = CVSSCalculator()
+    combinations = _all_combinations()
+    expected = [calculator.calculate_cvss_score(CVSSMetrics(*combo)) for combo in combinations]
+
+    scores, severities = calculator.calculate_cvss_scores_batch(*zip(*combinations))
+
+    assert np.array_equal(scores, np.array(expected))
+    assert severities.tolist() == [calculator.get_severity_rating(score) for score in expected]
+
+
+def test_vectors_match_columns():
+    """ベクトル文字列入力が列指向入力と同じ結果を返す"""
+    calculator = CVSSCalculator()
+    combinations = _all_combinations()
+    vectors = [
+        "CVSS:3.1/" + "/".join(f"{key}:{value}" for key, value in zip(CVSS_BASE_METRICS, combo))
+        for combo in combinations
+    ]
+
+    vector_scores, _ = calculator.calculate_cvss_scores_from_vectors(vectors)
+    column_scores, _ = calculator.calculate_cvss_scores_batch(*zip(*combinations))
+
+    assert np.array_equal(vector_scores, column_scores)
+
+
+def test_known_vectors():
+    """代表的なベクトルのスコア"""
+    calculator = CVSSCalculator()
+    scores, severities = calculator.calculate_cvss_scores_from_vectors([
+        "CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:H/A:H",
+        "CVSS:3.1/AV:P/AC:H/PR:H/UI:R/S:U/C:N/I:N/A:N",
+        "AV:A/AC:L/PR:N/UI:N/S:C/C:H/I:H/A:H",
+    ])
+    assert scores.tolist() == [9.8, 0.0, 9.6]
+    assert severities.tolist() == ["Critical", "None", "Critical"]
+
+
+def test_invalid_input():
+    """不正な入力はValueErrorになる"""
+    calculator = CVSSCalculator()
+    for vector in ["CVSS:3.1/AV:X/AC:L/PR:N/UI:N/S:U/C:H/I:H/A:H",
+                   "CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:H",
+                   "CVSS:2.0/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:H/A:H"]:
+        try:
+            parse_cvss_vector(vector)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"ValueError expected for {vector}")
+
+    try:
+        calculator.calculate_cvss_scores_batch(["N"], ["L"], ["N"], ["N"], ["U"], ["H"], ["H"], ["H", "H"])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("ValueError expected for mismatched column lengths")
+
+
+def _roundup(value):
+    """CVSSv3.1仕様のRoundup"""
+    int_input = round(value * 100000)
+    if int_input % 10000 == 0:
+        return int_input / 100000.0
+    return (int_input // 10000 + 1) / 10.0
+
+
+def _reference_environmental(calculator, m):
+    """CVSSv3.1仕様の環境評価式をスカラーで素直に実装した参照値"""
+    def pick(key):
+        value = m.get("M" + key, "X")
+        return m[key] if value == "X" else value
+
+    scope = pick("S")
+    cr, ir, ar = (CVSS_REQUIREMENT_WEIGHTS[m.get(key, "X")] for key in ("CR", "IR", "AR"))
+    miss = min(1 - ((1 - cr * calculator._get_impact_value(pick("C"))) *
+                    (1 - ir * calculator._get_impact_value(pick("I"))) *
+                    (1 - ar * calculator._get_impact_value(pick("A")))), 0.915)
+    if scope == "U":
+        impact = 6.42 * miss
+    else:
+        impact = 7.52 * (miss - 0.029) - 3.25 * ((miss * 0.9731 - 0.02) ** 13)
+    exploitability = (8.22 * calculator._get_av_value(pick("AV")) * calculator._get_ac_value(pick("AC")) *
+                      calculator._get_pr_value(pick("PR"), scope) * calculator._get_ui_value(pick("UI")))
+    factor = 1.0
+    for key, weights in CVSS_TEMPORAL_WEIGHTS.items():
+        factor *= weights[m.get(key, "X")]
+    if impact <= 0:
+        return 0.0
+    if scope == "U":
+        return _roundup(_roundup(min(impact + exploitability, 10)) * factor)
+    return _roundup(_roundup(min(1.08 * (impact + exploitability), 10)) * factor)
+
+
+def test_environmental_matches_reference():
+    """環境評価の一括計算がスカラーの参照実装と一致する"""
+    calculator = CVSSCalculator()
+    rng = np.random.default_rng(0)
+    rows = []
+    for _ in range(3000):
+        row = {key: str(rng.choice(CVSS_METRIC_VALUES[key])) for key in CVSS_BASE_METRICS}
+        for key, values in CVSS_OPTIONAL_METRIC_VALUES.items():
+            if rng.random() < 0.5:
+                row[key] = str(rng.choice(values))
+        rows.append(row)
+    vectors = ["CVSS:3.1/" + "/".join(f"{key}:{value}" for key, value in row.items()) for row in rows]
+
+    result = calculator.calculate_environmental_scores_from_vectors(vectors)
+
+    expected = [_reference_environmental(calculator, row) for row in rows]
+    assert np.array_equal(result["environmental_score"], np.array(expected))
+    base = [calculator.calculate_cvss_score(CVSSMetrics(*(row[key] for key in CVSS_BASE_METRICS))) for row in rows]
+    assert np.array_equal(result["base_score"], np.array(base))
+
+
+def test_requirement_profiles_and_overrides():
+    """資産分類ごとの要求度プロファイルを列として適用できる"""
+    profiles = derive_requirement_profiles(ASSET_CLASSIFICATION)
+    assert profiles["life_critical"] == {"CR": "L", "IR": "M", "AR": "H"}
+    assert profiles["information_systems"] == {"CR": "H", "IR": "M", "AR": "L"}
+
+    calculator = CVSSCalculator()
+    vectors = ["CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:N/A:N"] * 2
+    classes = ["life_critical", "information_systems"]
+    overrides = {key: [profiles[c][key] for c in classes] for key in ("CR", "IR", "AR")}
+    result = calculator.calculate_environmental_scores_from_vectors(vectors, overrides)
+
+    # 機密性のみの脅威は情報システムで高く、生命維持機器で低く評価される
+    low, high = result["environmental_score"].tolist()
+    assert low < result["base_score"][0] < high
+
+    # 仕様の計算例（NVD）と同じ現状評価スコア
+    result = calculator.calculate_environmental_scores_from_vectors(
+        ["CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:H/A:H/E:P/RL:O/RC:C"]
+    )
+    assert result["temporal_score"].tolist() == [8.8]
+
+    # 単一値は全行に適用される
+    result = calculator.calculate_environmental_scores_from_vectors(vectors, {"E": "U", "RL": "O"})
+    assert (result["temporal_score"] < result["base_score"]).all()
+
+
+def test_repeated_vectors_are_parsed_once():
+    """ベース・環境評価の一括計算とも、同一ベクトルの解析は1回にまとめる"""
+    calculator = CVSSCalculator()
+    distinct = ["CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:H/A:H/E:P/CR:H",
+                "CVSS:3.1/AV:P/AC:H/PR:H/UI:R/S:C/C:L/I:N/A:N",
+                "CVSS:3.1/AV:A/AC:L/PR:L/UI:N/S:U/C:N/I:H/A:L/MAV:N"]
+    vectors = [distinct[i % 3] for i in range(300)]
+    expected = calculator.calculate_environmental_scores_from_vectors(distinct, {"IR": "H"})
+
+    parsed = []
+
+    def counting_parse(vector):
+        parsed.append(vector)
+        return parse_cvss_vector(vector)
+
+    cvss_logic.parse_cvss_vector = counting_parse
+    try:
+        result = calculator.calculate_environmental_scores_from_vectors(vectors, {"IR": "H"})
+        assert parsed == distinct
+        parsed.clear()
+        scores, _ = calculator.calculate_cvss_scores_from_vectors(vectors)
+        assert parsed == distinct
+    finally:
+        cvss_logic.parse_cvss_vector = parse_cvss_vector
+
+    for key, values in expected.items():
+        assert np.array_equal(result[key], np.tile(values, 100)), key
+    assert np.array_equal(scores, np.tile(expected["base_score"], 100))
+
+    empty = calculator.calculate_environmental_scores_from_vectors([])
+    assert all(values.size == 0 for values in empty.values())
+
+
+if __name__ == "__main__":
+    test_batch_matches_scalar()
+    test_vectors_match_columns()
+    test_known_vectors()
+    test_invalid_input()
+    test_environmental_matches_reference()
+    test_requirement_profiles_and_overrides()
+    test_repeated_vectors_are_parsed_once()
+    print("✅ すべてのテストが成功しました！")
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+CVSSロジックエンジンのテストスクリプト
+機器索引による分類が従来の線形走査と一致すること、
+頻度順の走査でも固定順と同じ決定になること、ロジックパスの説明文が従来と同じことを確認します
+"""
+
+import sys
+import json
+import random
+from pathlib import Path
+
+# パッケージのパスを追加
+sys.path.insert(0, str(Path(__file__).parent / "mcp_threat_extraction"))
+
+from cvss_logic import CVSSLogicEngine, RuleProfiler, DEVICE_PATTERN_GROUPS, SCANNED_PATTERN_GROUPS, render_logic_paths
+from threat_data import (
+    ASSET_CLASSIFICATION, DATA_CLASSIFICATION, CVSS_ATTACK_PATTERNS, DEVICE_TYPES, THREAT_TEMPLATES
+)
+
+
+def _linear_asset_class(device_type):
+    """従来の資産分類（ASSET_CLASSIFICATIONを順に走査）"""
+    for asset_class, details in ASSET_CLASSIFICATION.items():
+        if any(device in device_type for device in details.get("devices", [])):
+            return asset_class
+    return None
+
+
+def _linear_match(group, device_type):
+    """従来のキーワード判定（リストを順に走査）"""
+    for keyword in CVSS_ATTACK_PATTERNS[group]:
+        if keyword in device_type:
+            return keyword
+    return None
+
+
+def _sample_device_types(count=5000):
+    """機器名・キーワードを連結・部分切り出しした入力を生成"""
+    pool = list(DEVICE_TYPES)
+    for details in ASSET_CLASSIFICATION.values():
+        pool.extend(details.get("devices", []))
+    for group in DEVICE_PATTERN_GROUPS:
+        pool.extend(CVSS_ATTACK_PATTERNS[group])
+
+    rng = random.Random(0)
+    samples = ["", "不明な機器"] + pool
+    for _ in range(count):
+        parts = [rng.choice(pool)[rng.randint(0, 2):] for _ in range(rng.randint(1, 3))]
+        samples.append("".join(parts))
+    return samples
+
+
+def test_device_index_matches_linear_scan():
+    """索引による分類が全グループで線形走査と一致する"""
+    engine = CVSSLogicEngine(ASSET_CLASSIFICATION, DATA_CLASSIFICATION, CVSS_ATTACK_PATTERNS)
+
+    for device_type in _sample_device_types():
+        device = engine.classify_device(device_type)
+        assert device.asset_class == _linear_asset_class(device_type), device_type
+        for group in DEVICE_PATTERN_GROUPS:
+            assert device.match(group) == _linear_match(group, device_type), (group, device_type)
+
+
+def test_classification_record_is_shared():
+    """解決済みの分類レコードを渡しても文字列と同じ判定になる"""
+    engine = CVSSLogicEngine(ASSET_CLASSIFICATION, DATA_CLASSIFICATION, CVSS_ATTACK_PATTERNS)
+    threat = "手術ロボットのファームウェアを改ざんし、他システムへ横展開した"
+    device = engine.classify_device("手術ロボット")
+
+    assert engine.classify_device("手術ロボット") is device
+    assert engine.determine_attack_complexity_with_path(threat, device)[0] == \
+        engine.determine_attack_complexity_with_path(threat, "手術ロボット")[0] == "H"
+    assert engine.determine_scope_with_path(threat, device)[0] == "C"
+    assert engine.determine_cia_impact_with_path(threat, device)[:3] == \
+        engine.determine_cia_impact_with_path(threat, "手術ロボット")[:3]
+
+
+def _sample_threats(count=4000):
+    """脅威テンプレートと攻撃パターンを連結した入力を生成（パターンの出現頻度に偏りを持たせる）"""
+    names = [name for templates in THREAT_TEMPLATES.values() for name in templates]
+    keywords = [pattern for group in SCANNED_PATTERN_GROUPS for pattern in CVSS_ATTACK_PATTERNS[group]]
+    modifiers = ["保守", "外部", "院内", "リモート", "物理", "破壊", "管理者", "診断", "自動", "ワーム"]
+    categories = list(THREAT_TEMPLATES) + ["ソフトウェア"]
+
+    rng = random.Random(1)
+    samples = []
+    for _ in range(count):
+        # 後方のパターンほど多く出現させ、並べ替えが起きるようにする
+        parts = [rng.choice(names)] + rng.choices(keywords, weights=range(1, len(keywords) + 1), k=rng.randint(0, 2))
+        if rng.random() < 0.3:
+            parts.append(rng.choice(modifiers))
+        rng.shuffle(parts)
+        samples.append(("".join(parts), rng.choice(categories), rng.choice(DEVICE_TYPES), rng.choice([None, True, False])))
+    return samples
+
+
+def _decide(engine, threat_name, category, device_type, flag):
+    """全メトリクスの決定値・通過したルール（IDとパラメータ）と、描画したロジックパス"""
+    results = [
+        engine.determine_attack_vector_with_path(category, threat_name, device_type),
+        engine.determine_attack_complexity_with_path(threat_name, device_type),
+        engine.determine_privileges_required_with_path(threat_name, category, flag),
+        engine.determine_user_interaction_with_path(threat_name, flag),
+        engine.determine_scope_with_path(threat_name, device_type),
+        engine.determine_cia_impact_with_path(threat_name, device_type),
+    ]
+    paths = {str(number): result[-1] for number, result in enumerate(results)}
+    return ([(result[:-1], list(result[-1].steps)) for result in results],
+            render_logic_paths(paths, "full"), render_logic_paths(paths, "ids"))
+
+
+def test_adaptive_order_matches_fixed_order():
+    """頻度順に並べ替えた走査でも固定順と同じ決定値・分岐・一致パターン・ロジックパスになる"""
+    fixed = CVSSLogicEngine(ASSET_CLASSIFICATION, DATA_CLASSIFICATION, CVSS_ATTACK_PATTERNS)
+    adaptive = CVSSLogicEngine(ASSET_CLASSIFICATION, DATA_CLASSIFICATION, CVSS_ATTACK_PATTERNS,
+                               profiler=RuleProfiler(adaptive=True, reorder_interval=50))
+
+    for sample in _sample_threats():
+        assert _decide(adaptive, *sample) == _decide(fixed, *sample), sample
+
+    report = adaptive.rule_report()
+    assert report["reorders"] > 0
+    assert any(adaptive.pattern_order[group] != CVSS_ATTACK_PATTERNS[group] for group in SCANNED_PATTERN_GROUPS)
+    assert sorted(adaptive.pattern_order["usb_attacks"]) == sorted(CVSS_ATTACK_PATTERNS["usb_attacks"])
+    assert report["decisions"]["attack_vector"]["count"] == 4000
+    assert fixed.rule_report() == {"enabled": False, "mode": "off"}
+
+
+def test_scan_comparisons_are_counted_once():
+    """プロファイラには実際に走査した比較回数だけを記録し、並べ替え後も定義順で最初に一致したパターンを返す"""
+    group = "usb_attacks"
+    definition = CVSS_ATTACK_PATTERNS[group]
+    hot, earlier = "メモリスティック", definition[0]
+
+    engine = CVSSLogicEngine(ASSET_CLASSIFICATION, DATA_CLASSIFICATION, CVSS_ATTACK_PATTERNS,
+                             profiler=RuleProfiler())
+    assert engine._match_first(group, hot) == hot
+    assert engine.rule_report()["pattern_groups"][group]["mean_comparisons"] == definition.index(hot) + 1
+
+    profiler = RuleProfiler(adaptive=True)
+    engine = CVSSLogicEngine(ASSET_CLASSIFICATION, DATA_CLASSIFICATION, CVSS_ATTACK_PATTERNS, profiler=profiler)
+    for _ in range(3):
+        engine._match_first(group, hot)
+    engine.reorder_patterns()
+    assert engine.pattern_order[group][0] == hot
+    # 定義順のままのグループは同じリストを使い続ける
+    assert engine.pattern_order["wireless_attacks"] is engine._definition_order["wireless_attacks"]
+
+    profiler.reset()
+    # 走査は先頭の1回で一致し、ロジックパスには定義順で先の一致パターンを返す
+    assert engine._match_first(group, earlier + hot) == earlier
+    assert engine._match_first(group, hot) == hot
+    assert profiler.report()["pattern_groups"][group]["mean_comparisons"] == 1
+
+
+# 代表的な脅威の入力（脅威名, カテゴリ, 機器種別, 認証・操作フラグ, 影響タイプ）
+REPRESENTATIVE_THREATS = [
+    ("USBマルウェア", "物理", "人工呼吸器", None, ["完全性重視"]),
+    ("リモートからのSQLインジェクション攻撃", "ネットワーク", "電子カルテシステム", True, ["機密性重視"]),
+    ("院内ネットワーク経由のランサムウェア", "ソフトウェア", "CTスキャナー", None, ["可用性重視"]),
+]
+
+# ロジックパスをルールIDで記録する前の実装が各メトリクスについて出力していた説明文
+PRE_RULE_ID_LOGIC_PATHS = [
+    {'attack_vector': {'decision_tree': '攻撃ベクトル決定フロー（医療機器版）',
+                       'checks': ["USB攻撃パターン検出: 'USBマルウェア' → YES", '院内スタッフの日常使用 → Adjacent'],
+                       'reasoning': '院内でのUSBメモリ共有慣行を考慮した隣接ネットワーク評価',
+                       'result': 'AV:A (Adjacent - 院内USBネットワーク)'},
+     'attack_complexity': {'decision_tree': '攻撃複雑度決定フロー（医療機器版）',
+                           'checks': ["高複雑度医療機器: '人工呼吸器' → High (デフォルト)"],
+                           'reasoning': '人工呼吸器は複雑な制御システムを持つため攻撃も複雑化',
+                           'result': 'AC:H (High)'},
+     'privileges_required': {'decision_tree': '必要権限決定フロー（医療機器版）',
+                             'checks': ['一般的攻撃（デフォルト低権限）'],
+                             'reasoning': '医療機器の一般的な操作権限で実行可能な攻撃',
+                             'result': 'PR:L'},
+     'user_interaction': {'decision_tree': 'ユーザー操作決定フロー（医療機器版）',
+                          'checks': ["ユーザー操作必要攻撃: 'USBマルウェア' → Required"],
+                          'reasoning': 'USBマルウェアは医療従事者による操作やクリックが必要な攻撃',
+                          'result': 'UI:R (Required)'},
+     'scope': {'decision_tree': 'スコープ決定フロー（医療機器版）',
+               'checks': ['一般的攻撃（デフォルト単体）'],
+               'reasoning': '一般的な攻撃は単一機器に限定される（安全側評価）',
+               'result': 'S:U (Unchanged)'},
+     'cia_impact': {'decision_tree': 'CIA影響度決定フロー（医療機器版）',
+                    'checks': ['Step 1: 攻撃タイプ別基本影響度の決定（各CIA属性を独立評価）',
+                               '完全性重視攻撃フラグ → I:H',
+                               '最終基本影響度: C:L, I:H, A:L',
+                               'Step 2: 医療機器資産分類による調整',
+                               "資産分類: life_critical → '人工呼吸器'",
+                               '→ 完全性: +1段階 (高優先度)',
+                               '→ 可用性: +2段階 (最高優先度)',
+                               '機密性調整: Base:L(値:1) + 資産調整:0 → 最終:L',
+                               '完全性調整: Base:H(値:2) + 資産調整:1 → 最終:H',
+                               '可用性調整: Base:L(値:1) + 資産調整:2 → 最終:H'],
+                    'reasoning': '医療機器の資産分類を考慮してCIA影響度を決定',
+                    'result': '最終CIA: C:L, I:H, A:H'}},
+    {'attack_vector': {'decision_tree': '攻撃ベクトル決定フロー（医療機器版）',
+                       'checks': ['ネットワーク攻撃 → YES', '院内ネットワーク/HIS/PACS/DICOM → NO', 'リモート/インターネット攻撃 → Network'],
+                       'reasoning': 'インターネット経由のリモート攻撃',
+                       'result': 'AV:N (Network)'},
+     'attack_complexity': {'decision_tree': '攻撃複雑度決定フロー（医療機器版）',
+                           'checks': ['一般的攻撃（デフォルト高複雑度）'],
+                           'reasoning': '詳細不明な攻撃は安全側評価で高複雑度とする',
+                           'result': 'AC:H (High)'},
+     'privileges_required': {'decision_tree': '必要権限決定フロー（医療機器版）',
+                             'checks': ['認証が必要 → YES', '一般ユーザー権限 → PR:L'],
+                             'reasoning': '',
+                             'result': 'PR:L'},
+     'user_interaction': {'decision_tree': 'ユーザー操作決定フロー（医療機器版）',
+                          'checks': ['requires_user_interaction: true'],
+                          'reasoning': '',
+                          'result': 'UI:R'},
+     'scope': {'decision_tree': 'スコープ決定フロー（医療機器版）',
+               'checks': ["ネットワーク接続重要機器: '電子カルテ' → Unchanged (デフォルト)"],
+               'reasoning': '電子カルテへの攻撃は当該機器に限定される（安全側評価）',
+               'result': 'S:U (Unchanged)'},
+     'cia_impact': {'decision_tree': 'CIA影響度決定フロー（医療機器版）',
+                    'checks': ['Step 1: 攻撃タイプ別基本影響度の決定（各CIA属性を独立評価）',
+                               '機密性重視攻撃フラグ → C:H',
+                               "完全性攻撃パターン: 'SQLインジェクション' → I:H",
+                               '最終基本影響度: C:H, I:H, A:L',
+                               'Step 2: 医療機器資産分類による調整',
+                               "資産分類: information_systems → '電子カルテシステム'",
+                               '→ 機密性: +2段階 (最高優先度)',
+                               '→ 完全性: +1段階 (高優先度)',
+                               '機密性調整: Base:H(値:2) + 資産調整:2 → 最終:H',
+                               '完全性調整: Base:H(値:2) + 資産調整:1 → 最終:H',
+                               '可用性調整: Base:L(値:1) + 資産調整:0 → 最終:L'],
+                    'reasoning': '医療機器の資産分類を考慮してCIA影響度を決定',
+                    'result': '最終CIA: C:H, I:H, A:L'}},
+    {'attack_vector': {'decision_tree': '攻撃ベクトル決定フロー（医療機器版）',
+                       'checks': ["院内ネットワーク攻撃: '院内ネットワーク' → YES"],
+                       'reasoning': '病院内ネットワークセグメント内での攻撃として評価',
+                       'result': 'AV:A (Adjacent Network)'},
+     'attack_complexity': {'decision_tree': '攻撃複雑度決定フロー（医療機器版）',
+                           'checks': ['一般的攻撃（デフォルト高複雑度）'],
+                           'reasoning': '詳細不明な攻撃は安全側評価で高複雑度とする',
+                           'result': 'AC:H (High)'},
+     'privileges_required': {'decision_tree': '必要権限決定フロー（医療機器版）',
+                             'checks': ['一般的攻撃（デフォルト低権限）'],
+                             'reasoning': '医療機器の一般的な操作権限で実行可能な攻撃',
+                             'result': 'PR:L'},
+     'user_interaction': {'decision_tree': 'ユーザー操作決定フロー（医療機器版）',
+                          'checks': ["ユーザー操作必要攻撃: 'ランサムウェア' → Required"],
+                          'reasoning': 'ランサムウェアは医療従事者による操作やクリックが必要な攻撃',
+                          'result': 'UI:R (Required)'},
+     'scope': {'decision_tree': 'スコープ決定フロー（医療機器版）',
+               'checks': ["スコープ変更攻撃: 'ランサムウェア' → Changed"],
+               'reasoning': 'ランサムウェアは初期侵入点から他のシステムや機器に影響を拡大する攻撃',
+               'result': 'S:C (Changed)'},
+     'cia_impact': {'decision_tree': 'CIA影響度決定フロー（医療機器版）',
+                    'checks': ['Step 1: 攻撃タイプ別基本影響度の決定（各CIA属性を独立評価）',
+                               '可用性重視攻撃フラグ → A:H',
+                               "複合影響攻撃: 'ランサムウェア' → I:H, A:H",
+                               'ネットワーク系攻撃 → C:H（通常ネットワーク経由で情報取得可能）',
+                               '最終基本影響度: C:H, I:H, A:H',
+                               'Step 2: 医療機器資産分類による調整',
+                               "資産分類: diagnostic_imaging → 'CTスキャナー'",
+                               '→ 機密性: +1段階 (高優先度)',
+                               '→ 完全性: +1段階 (高優先度)',
+                               '機密性調整: Base:H(値:2) + 資産調整:1 → 最終:H',
+                               '完全性調整: Base:H(値:2) + 資産調整:1 → 最終:H',
+                               '可用性調整: Base:H(値:2) + 資産調整:0 → 最終:H'],
+                    'reasoning': '医療機器の資産分類を考慮してCIA影響度を決定',
+                    'result': '最終CIA: C:H, I:H, A:H'}},
+]
+
+
+def _logic_paths(engine, threat_name, category, device_type, flag, impact_types):
+    """代表的な脅威のメトリクスごとのロジックパス"""
+    return {
+        "attack_vector": engine.determine_attack_vector_with_path(category, threat_name, device_type)[-1],
+        "attack_complexity": engine.determine_attack_complexity_with_path(threat_name, device_type)[-1],
+        "privileges_required": engine.determine_privileges_required_with_path(threat_name, category, flag)[-1],
+        "user_interaction": engine.determine_user_interaction_with_path(threat_name, flag)[-1],
+        "scope": engine.determine_scope_with_path(threat_name, device_type)[-1],
+        "cia_impact": engine.determine_cia_impact_with_path(threat_name, device_type, impact_types)[-1],
+    }
+
+
+def test_rendered_logic_paths_match_previous_output():
+    """explain=fullの説明文は従来の文字列と一致し、ids・noneは所定の形になる"""
+    engine = CVSSLogicEngine(ASSET_CLASSIFICATION, DATA_CLASSIFICATION, CVSS_ATTACK_PATTERNS)
+    for threat, expected in zip(REPRESENTATIVE_THREATS, PRE_RULE_ID_LOGIC_PATHS):
+        paths = _logic_paths(engine, *threat)
+        assert render_logic_paths(paths, "full") == expected, threat
+        # 既定はfull
+        assert render_logic_paths(paths) == expected
+
+        ids = render_logic_paths(paths, "ids")
+        assert list(ids) == list(paths)
+        for metric, path in paths.items():
+            # パラメータなしのルールはID文字列、ありは[ID, パラメータ...]
+            assert ids[metric] == [step[0] if len(step) == 1 else list(step) for step in path.steps]
+            assert all(isinstance(step, str) or (isinstance(step, list) and len(step) > 1) for step in ids[metric])
+        assert json.loads(json.dumps(ids, ensure_ascii=False)) == ids
+
+        assert render_logic_paths(paths, "none") is None
+
+    paths = _logic_paths(engine, *REPRESENTATIVE_THREATS[0])
+    assert render_logic_paths(paths, "ids")["attack_vector"] == [["av.usb", "USBマルウェア"], "av.usb.staff"]
+    try:
+        render_logic_paths(paths, "verbose")
+        raise AssertionError("ValueError expected")
+    except ValueError:
+        pass
+
+
+if __name__ == "__main__":
+    test_device_index_matches_linear_scan()
+    test_classification_record_is_shared()
+    test_adaptive_order_matches_fixed_order()
+    test_scan_comparisons_are_counted_once()
+    test_rendered_logic_paths_match_previous_output()
+    print("✅ すべてのテストが成功しました！")
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+実行レイヤーのテストスクリプト
+ブロッキング処理をプールで実行してもイベントループが応答し続けること、
+空き枠が優先度順・ユーザー間で公平に割り当てられることを確認します
+"""
+
+import sys
+import time
+import asyncio
+from pathlib import Path
+
+# プロジェクトのルートを追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+from mcp_threat_extraction.executors import ExecutorPool, scheduling
+
+
+def test_blocking_work_keeps_loop_responsive():
+    """プールでブロッキング処理中もイベントループのタスクが進む"""
+    pool = ExecutorPool("test-cpu", 2)
+
+    async def scenario():
+        ticks = []
+
+        async def ticker():
+            for _ in range(10):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.02)
+
+        results = await asyncio.gather(
+            pool.run(time.sleep, 0.3),
+            pool.run(time.sleep, 0.3),
+            pool.run(sum, [1, 2, 3]),
+            ticker()
+        )
+        return results, ticks
+
+    try:
+        results, ticks = asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+
+    assert results[2] == 6
+    # 0.3秒のブロッキング中もティッカーは遅延なく進む
+    assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.15
+
+    stats = pool.stats()
+    assert stats["max_workers"] == 2
+    assert stats["completed"] == 3
+    assert stats["active"] == 0 and stats["queued"] == 0
+    # 3件目は先行の2件が終わるまで待機する
+    assert stats["mean_wait_ms"] > 0
+
+
+def test_failures_are_counted():
+    """例外は呼び出し元に伝わり、失敗数として集計される"""
+    pool = ExecutorPool("test-llm", 1)
+
+    def fail():
+        raise ValueError("upstream error")
+
+    async def scenario():
+        try:
+            await pool.run(fail)
+        except ValueError:
+            return True
+        return False
+
+    try:
+        assert asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+
+    stats = pool.stats()
+    assert stats["failed"] == 1 and stats["completed"] == 0
+
+
+def test_interactive_first_and_fair_bulk():
+    """枠が空くとinteractiveが先に実行され、bulkはユーザー間で交互に実行される"""
+    pool = ExecutorPool("test-sched", 1)
+    order = []
+
+    async def scenario():
+        release = asyncio.Event()
+        loop = asyncio.get_running_loop()
+
+        def blocker():
+            asyncio.run_coroutine_threadsafe(release.wait(), loop).result()
+
+        def record(label):
+            order.append(label)
+
+        with scheduling("bulk", "alice"):
+            running = asyncio.create_task(pool.run(blocker))
+            await asyncio.sleep(0.01)
+            tasks = [asyncio.create_task(pool.run(record, f"alice-{i}")) for i in range(3)]
+        with scheduling("bulk", "bob"):
+            tasks.append(asyncio.create_task(pool.run(record, "bob-0")))
+        with scheduling("interactive", "carol"):
+            tasks.append(asyncio.create_task(pool.run(record, "carol")))
+        await asyncio.sleep(0.01)
+
+        stats = pool.stats()
+        assert stats["waiting_by_priority"] == {"interactive": 1, "bulk": 4}
+        release.set()
+        await asyncio.gather(running, *tasks)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+
+    assert order == ["carol", "alice-0", "bob-0", "alice-1", "alice-2"]
+
+
+def test_reserved_slots_stay_free_for_interactive():
+    """interactive専用枠はbulkに使われない"""
+    pool = ExecutorPool("test-reserved", 2, reserved_interactive=1)
+
+    async def scenario():
+        with scheduling("bulk", "alice"):
+            bulk = [asyncio.create_task(pool.run(time.sleep, 0.2)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        assert pool.stats()["running_by_priority"] == {"interactive": 0, "bulk": 1}
+
+        start = time.monotonic()
+        with scheduling("interactive"):
+            await pool.run(sum, [1])
+        # 実行中のbulkの完了を待たずに開始できる
+        assert time.monotonic() - start < 0.1
+        await asyncio.gather(*bulk)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+
+
+def test_cancelled_caller_keeps_slot_until_thread_finishes():
+    """実行中に呼び出し元が取り消されても、スレッドが終わるまで枠は返却されない"""
+    pool = ExecutorPool("test-cancel", 1)
+    running = []
+
+    def work(label):
+        running.append(label)
+        time.sleep(0.2)
+        running.remove(label)
+        return len(running)
+
+    async def scenario():
+        first = asyncio.create_task(pool.run(work, "first"))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        await asyncio.sleep(0.01)
+        assert pool.stats()["running_by_priority"]["interactive"] == 1
+        # 取り消されたタスクのスレッドが終わってから開始するため、同時に実行されるのは1件だけ
+        assert await pool.run(work, "second") == 0
+        try:
+            await first
+        except asyncio.CancelledError:
+            pass
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+
+    stats = pool.stats()
+    assert stats["running_by_priority"] == {"interactive": 0, "bulk": 0}
+    assert stats["completed"] == 2 and stats["active"] == 0 and stats["queued"] == 0
+
+
+if __name__ == "__main__":
+    test_blocking_work_keeps_loop_responsive()
+    test_failures_are_counted()
+    test_interactive_first_and_fair_bulk()
+    test_reserved_slots_stay_free_for_interactive()
+    test_cancelled_caller_keeps_slot_until_thread_finishes()
+    print("✅ すべてのテストが成功しました！")
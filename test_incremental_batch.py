@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+差分再評価のテストスクリプト
+前回の出力とフィンガープリントが一致する件は引き継ぎ、新規・変更された件だけを評価することを確認します
+"""
+
+import os
+import sys
+import json
+import asyncio
+import tempfile
+import importlib
+from pathlib import Path
+
+# プロジェクトのルートを追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+from mcp_threat_extraction import fingerprint
+from mcp_threat_extraction.batch import run_batch
+from mcp_threat_extraction.fingerprint import item_fingerprint, output_options, PreviousResults
+
+
+def make_process(calls: list):
+    async def process(threat: str) -> dict:
+        calls.append(threat)
+        return {"threat_description": threat, "cvss_metrics": {"base_score": 5.0, "severity": "Medium"}}
+    return process
+
+
+def write_lines(path: Path, threats: list) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for i, threat in enumerate(threats):
+            f.write(json.dumps({"id": f"t{i}", "threat_description": threat}, ensure_ascii=False) + "\n")
+
+
+def read_output(path: Path) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return {record["line"]: record for record in map(json.loads, f)}
+
+
+def test_fingerprint_inputs():
+    """記述文・入力の特徴・出力形式・パイプラインの版のいずれかが変わるとフィンガープリントが変わる"""
+    options = output_options("none", None, False)
+    base = item_fingerprint("PACSへの不正アクセス", options=options)
+    assert base == item_fingerprint("PACSへの不正アクセス", options=options)
+    assert base != item_fingerprint("PACSへの不正アクセス。", options=options)
+    assert base != item_fingerprint("PACSへの不正アクセス", {"attack_vector": "network"}, options=options)
+    assert base != item_fingerprint("PACSへの不正アクセス", options=output_options("full", None, False))
+    assert output_options("none", [("cvss_metrics", "base_score")], False) == {
+        "explain": "none", "fields": "cvss_metrics.base_score", "compact": False
+    }
+    assert set(fingerprint.pipeline_components()) == {"model", "prompt", "rules", "normalizer", "reference_corpora",
+                                                      "threat_data"}
+
+    fingerprint.pipeline_version.cache_clear()
+    saved = fingerprint.pipeline_components
+    fingerprint.pipeline_components = lambda: {**saved(), "rules": "changed"}
+    try:
+        assert base != item_fingerprint("PACSへの不正アクセス", options=options)
+    finally:
+        fingerprint.pipeline_components = saved
+        fingerprint.pipeline_version.cache_clear()
+
+    # ルールプロファイリングは判定結果を変えないため、切り替えても引き継ぎは無効にならない
+    saved_mode = os.environ.get("CVSS_RULE_PROFILING")
+    os.environ["CVSS_RULE_PROFILING"] = "adaptive"
+    fingerprint.pipeline_components.cache_clear()
+    try:
+        assert base == item_fingerprint("PACSへの不正アクセス", options=options)
+    finally:
+        if saved_mode is None:
+            os.environ.pop("CVSS_RULE_PROFILING")
+        else:
+            os.environ["CVSS_RULE_PROFILING"] = saved_mode
+        fingerprint.pipeline_components.cache_clear()
+        fingerprint.pipeline_version.cache_clear()
+    print("✓ フィンガープリントが入力とパイプラインの版を反映します")
+
+
+def test_batch_diff_mode():
+    """前回の出力を指定すると新規・変更された行だけを評価し、残りは引き継ぐ"""
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        threats = [f"脅威{i}: 輸液ポンプへの攻撃" for i in range(20)]
+        write_lines(tmp / "night1.jsonl", threats)
+        calls = []
+        asyncio.run(run_batch(str(tmp / "night1.jsonl"), str(tmp / "out1.jsonl"), process=make_process(calls)))
+        assert len(calls) == 20
+
+        # 2件を変更し、1件を追加（行の位置がずれても引き継ぐ）
+        threats[3] = "脅威3: 輸液ポンプのファームウェア改ざん"
+        threats[10] = "脅威10: PACSへの不正アクセス"
+        threats.insert(0, "新規: 手術ロボットへのDoS攻撃")
+        write_lines(tmp / "night2.jsonl", threats)
+        calls = []
+        summary = asyncio.run(run_batch(str(tmp / "night2.jsonl"), str(tmp / "out2.jsonl"),
+                                        process=make_process(calls), previous=str(tmp / "out1.jsonl")))
+        assert sorted(calls) == sorted([threats[0], threats[4], threats[11]])
+        assert summary["reused"] == 18 and summary["completed"] == 21
+
+        first, second = read_output(tmp / "out1.jsonl"), read_output(tmp / "out2.jsonl")
+        assert second[5]["threat_description"] == threats[5]
+        assert second[5]["id"] == "t5" and second[5]["fingerprint"] == first[4]["fingerprint"]
+
+        # 同じファイルを前回と今回の出力に指定するとエラー
+        try:
+            asyncio.run(run_batch(str(tmp / "night2.jsonl"), str(tmp / "out2.jsonl"),
+                                  process=make_process([]), previous=str(tmp / "out2.jsonl"), restart=True))
+            raise AssertionError("ValueError expected")
+        except ValueError:
+            pass
+    print(f"✓ 変更された{len(calls)}件だけを評価しました")
+
+
+def test_previous_results_skips_errors():
+    """エラーになった件と書きかけの行は引き継がない"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "prev.jsonl"
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"line": 0, "fingerprint": "a", "cvss_metrics": {"base_score": 1.0}}) + "\n")
+            f.write(json.dumps({"line": 1, "fingerprint": "b", "error": "timeout"}) + "\n")
+            f.write('{"line": 2, "fingerp')
+        previous = PreviousResults(str(path))
+        try:
+            assert len(previous) == 1 and "b" not in previous
+            assert previous.get("a") == {"cvss_metrics": {"base_score": 1.0}}
+        finally:
+            previous.close()
+
+
+def test_batch_tool_reuses_previous_results():
+    """extract_cvss_batchはprevious_resultsのフィンガープリントが一致する記述文を再計算しない"""
+    server = importlib.import_module("mcp_threat_extraction.server")
+    calls = []
+
+    async def fake_calculate(threat: str, explain: str = "full") -> dict:
+        calls.append(threat)
+        return {"threat_description": threat, "extracted_features": {},
+                "cvss_metrics": {"base_score": 7.5, "severity": "High"}}
+
+    saved = server.calculate_cvss_async
+    server.calculate_cvss_async = fake_calculate
+    try:
+        arguments = {"threat_descriptions": ["脅威A", "脅威B"], "fields": "cvss_metrics.base_score"}
+        first = asyncio.run(server.extract_cvss_batch_tool(arguments))
+        calls.clear()
+        second = asyncio.run(server.extract_cvss_batch_tool({
+            **arguments,
+            "threat_descriptions": ["脅威A", "脅威C"],
+            "previous_results": first["results"]
+        }))
+    finally:
+        server.calculate_cvss_async = saved
+
+    assert calls == ["脅威C"]
+    assert second["results"][0] == first["results"][0]
+    assert second["statistics"]["reused"] == 1 and second["statistics"]["recomputed"] == 1
+    assert second["statistics"]["severity_distribution"] == {"High": 1}
+    print("✓ 前回の結果を引き継ぎ、変更された記述文だけを評価しました")
+
+
+if __name__ == "__main__":
+    test_fingerprint_inputs()
+    test_batch_diff_mode()
+    test_previous_results_skips_errors()
+    test_batch_tool_reuses_previous_results()
+    print("\n✅ すべてのテストが成功しました！")
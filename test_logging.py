@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+構造化ログのテストスクリプト
+キュー経由のJSON出力、リクエストID・段階別所要時間の付与、DEBUGログのサンプリングを確認します
+"""
+
+import os
+import io
+import sys
+import json
+import asyncio
+import logging
+from pathlib import Path
+
+# プロジェクトのルートを追加
+sys.path.insert(0, str(Path(__file__).parent))
+os.environ.setdefault("DISABLE_AUTH", "true")
+
+from fastapi.testclient import TestClient
+
+from mcp_threat_extraction.executors import ExecutorPool
+from mcp_threat_extraction.logging_config import (
+    SamplingFilter, get_stage_timings, parse_sample_rates, record_stage, request_context,
+    setup_logging, shutdown_logging
+)
+from mcp_threat_extraction.server import app
+
+
+def test_json_lines_through_queue():
+    """JSONの各行にリクエストID・段階別の所要時間・extraが含まれる"""
+    stream = io.StringIO()
+    logger = setup_logging("test_json_logging", json_format=True, stream=stream, sample_rates={})
+    logger.propagate = False
+    try:
+        with request_context("req-1"):
+            record_stage("llm_call", 0.25)
+            record_stage("llm_call", 0.25)
+            logger.info("tool finished", extra={"tool": "extract_cvss"})
+        logger.info("outside request")
+    finally:
+        shutdown_logging()
+        logger.handlers.clear()
+
+    first, second = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert first["message"] == "tool finished" and first["level"] == "INFO"
+    assert first["request_id"] == "req-1"
+    assert first["stages_ms"] == {"llm_call": 500.0}
+    assert first["tool"] == "extract_cvss"
+    assert "request_id" not in second and "stages_ms" not in second
+
+
+def test_exception_through_queue():
+    """例外のトレースバックはメッセージに埋め込まずexc_infoとして出力する"""
+    stream = io.StringIO()
+    logger = setup_logging("test_json_exception", json_format=True, stream=stream, sample_rates={})
+    logger.propagate = False
+    try:
+        try:
+            raise RuntimeError("upstream failed")
+        except RuntimeError:
+            logger.exception("tool %s failed", "extract_cvss")
+    finally:
+        shutdown_logging()
+        logger.handlers.clear()
+
+    entry = json.loads(stream.getvalue())
+    assert entry["message"] == "tool extract_cvss failed" and entry["level"] == "ERROR"
+    assert entry["exc_info"].startswith("Traceback")
+    assert "RuntimeError: upstream failed" in entry["exc_info"]
+
+
+def test_debug_sampling():
+    """DEBUGだけを間引き、同じリクエストでは判定が一定になる"""
+    rates = parse_sample_rates("mcp_threat_extraction.semantic_normalizer_optimized=0, mcp_threat_extraction=0.5")
+    sampler = SamplingFilter(rates)
+    assert sampler.rate_for("mcp_threat_extraction.semantic_normalizer_optimized") == 0.0
+    assert sampler.rate_for("mcp_threat_extraction.server") == 0.5
+    assert sampler.rate_for("uvicorn") == 1.0
+
+    def record(name, level, request_id=None):
+        rec = logging.LogRecord(name, level, __file__, 0, "msg", None, None)
+        rec.request_id = request_id
+        return rec
+
+    normalizer = "mcp_threat_extraction.semantic_normalizer_optimized"
+    assert not sampler.filter(record(normalizer, logging.DEBUG))
+    assert sampler.filter(record(normalizer, logging.INFO))
+
+    server = "mcp_threat_extraction.server"
+    kept = [i for i in range(200) if sampler.filter(record(server, logging.DEBUG, f"req-{i}"))]
+    assert 60 <= len(kept) <= 140
+    for i in range(20):
+        assert len({sampler.filter(record(server, logging.DEBUG, f"req-{i}")) for _ in range(5)}) == 1
+
+
+def test_stage_timings_follow_request_into_pool():
+    """ワーカースレッドで計測した段階の所要時間がリクエストに集計される"""
+    pool = ExecutorPool("test-logging", 2)
+
+    async def scenario():
+        with request_context() as request_id:
+            await asyncio.gather(pool.run(record_stage, "cvss_logic", 0.001),
+                                 pool.run(record_stage, "cvss_logic", 0.002))
+            return request_id, get_stage_timings()
+
+    try:
+        request_id, stages = asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+
+    assert len(request_id) == 32
+    assert stages == {"cvss_logic": 3.0}
+
+
+def test_http_request_id_header():
+    """X-Request-IDを引き継ぎ、なければ採番してレスポンスで返す"""
+    with TestClient(app) as client:
+        response = client.get("/", headers={"X-Request-ID": "client-abc"})
+        assert response.headers["x-request-id"] == "client-abc"
+
+        generated = client.get("/").headers["x-request-id"]
+        assert len(generated) == 32
+
+
+if __name__ == "__main__":
+    test_json_lines_through_queue()
+    test_exception_through_queue()
+    test_debug_sampling()
+    test_stage_timings_follow_request_into_pool()
+    test_http_request_id_header()
+    print("✅ すべてのテストが成功しました！")
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+MCP HTTPトランスポートの統合テストスクリプト
+FastAPIアプリを同一プロセスで起動し、MCPクライアントからstreamable HTTP / SSEで接続できることを確認します
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import threading
+from pathlib import Path
+
+# プロジェクトのルートを追加
+sys.path.insert(0, str(Path(__file__).parent))
+os.environ.setdefault("DISABLE_AUTH", "true")
+
+import importlib
+
+import uvicorn
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+from mcp.client.streamable_http import streamablehttp_client
+from sse_starlette.sse import AppStatus
+
+from mcp_threat_extraction.server import app
+from mcp_threat_extraction import admission, executors
+from mcp_threat_extraction.admission import AdmissionLimiter
+
+server_module = importlib.import_module("mcp_threat_extraction.server")
+
+VECTOR = "CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:H/A:H"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class _LocalServer:
+    """テスト用にuvicornをバックグラウンドスレッドで起動"""
+
+    def __init__(self):
+        self.port = _free_port()
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        # sse-starletteの終了通知イベントは最初に使ったイベントループに結び付くため、起動ごとに作り直させる
+        AppStatus.should_exit_event = None
+        self.thread.start()
+        deadline = time.monotonic() + 10
+        while not self.server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("server did not start")
+            time.sleep(0.05)
+        return f"http://127.0.0.1:{self.port}"
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+async def _exercise(session: ClientSession):
+    """ツール一覧の取得とLLMを使わないツールの呼び出し"""
+    await session.initialize()
+    tools = await session.list_tools()
+    assert "score_cvss_vectors" in [tool.name for tool in tools.tools]
+
+    result = await session.call_tool("score_cvss_vectors", {"vectors": [VECTOR]})
+    assert json.loads(result.content[0].text)["base_scores"] == [9.8]
+
+
+def test_streamable_http_and_sse_transports():
+    """streamable HTTP（/mcp）とSSE（/sse）の両方で同じサーバーに接続できる"""
+
+    async def scenario(base_url):
+        async with streamablehttp_client(f"{base_url}/mcp") as (read_stream, write_stream, _):
+            async with ClientSession(read_stream, write_stream) as session:
+                await _exercise(session)
+
+        async with sse_client(f"{base_url}/sse") as (read_stream, write_stream):
+            async with ClientSession(read_stream, write_stream) as session:
+                await _exercise(session)
+
+    with _LocalServer() as base_url:
+        asyncio.run(asyncio.wait_for(scenario(base_url), timeout=30))
+
+
+def test_tool_calls_use_admission_and_user():
+    """MCPのツール呼び出しもエンドポイント種別の流入制御を通り、認証したユーザーで実行プールに割り当てる"""
+    observed = []
+
+    async def recording_handler(arguments):
+        observed.append((executors._scheduling.get(), admission.admission_limiters["batch"].in_flight))
+        return {"ok": True}
+
+    async def scenario(base_url):
+        async with streamablehttp_client(f"{base_url}/mcp") as (read_stream, write_stream, _):
+            async with ClientSession(read_stream, write_stream) as session:
+                await session.initialize()
+                result = await session.call_tool("score_cvss_vectors", {"vectors": [VECTOR]})
+                assert json.loads(result.content[0].text) == {"ok": True}
+
+                # 処理枠・待機枠が埋まっていれば実行せずに混雑を返す
+                admission.admission_limiters["batch"] = AdmissionLimiter("batch", 1, 0, retry_after=3)
+                admission.admission_limiters["batch"].in_flight = 1
+                result = await session.call_tool("score_cvss_vectors", {"vectors": [VECTOR]})
+                assert "混雑" in result.content[0].text and "3秒後" in result.content[0].text
+
+    saved_handler = server_module.TOOL_HANDLERS["score_cvss_vectors"]
+    saved_limiter = admission.admission_limiters["batch"]
+    server_module.TOOL_HANDLERS["score_cvss_vectors"] = recording_handler
+    try:
+        with _LocalServer() as base_url:
+            asyncio.run(asyncio.wait_for(scenario(base_url), timeout=30))
+    finally:
+        server_module.TOOL_HANDLERS["score_cvss_vectors"] = saved_handler
+        admission.admission_limiters["batch"] = saved_limiter
+
+    # DISABLE_AUTH=trueの開発ユーザーがbulkとして割り当てられ、処理中はbatchの枠を1つ使う
+    assert observed == [(("bulk", "dev-user"), 1)]
+    assert saved_limiter.in_flight == 0
+    print("✓ MCPのツール呼び出しに流入制御とユーザー単位の割り当てを適用しました")
+
+
+if __name__ == "__main__":
+    test_streamable_http_and_sse_transports()
+    test_tool_calls_use_admission_and_user()
+    print("✅ すべてのテストが成功しました！")
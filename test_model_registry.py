@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+モデル登録簿のテストスクリプト
+必要時の読み込み・メモリ予算によるLRU退避・リクエストごとのモデル階層の指定と、イベント・レイテンシの報告を確認します
+"""
+
+import os
+import sys
+import time
+import threading
+import importlib
+from pathlib import Path
+
+os.environ.setdefault("DISABLE_AUTH", "true")
+
+# プロジェクトのルートを追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+from mcp_threat_extraction import model_registry
+from mcp_threat_extraction.model_registry import (
+    DEFAULT_MODEL_TIERS, ModelRegistry, current_model_tier, default_normalizer_spec, model_tier, normalizer_timer
+)
+
+MB = 2 ** 20
+
+
+def fake(mb, **options):
+    """テスト用の正規化器の定義（推定メモリmb）"""
+    return {"backend": "fake", "mb": mb, **options}
+
+
+class FakeNormalizer:
+    def __init__(self, spec):
+        self.spec = spec
+
+    def memory_bytes(self) -> int:
+        return int(self.spec["mb"] * MB)
+
+
+def fake_loader(spec):
+    time.sleep(spec.get("delay", 0))
+    return FakeNormalizer(spec)
+
+
+def test_lru_eviction_within_budget():
+    """予算を超えたら最も長く使われていない階層から退避する"""
+    registry = ModelRegistry({"a": fake(1), "b": fake(1), "c": fake(1), "d": fake(1.5)}, 3 * MB,
+                             loader=fake_loader)
+    first = registry.get("a")
+    registry.get("b")
+    registry.get("c")
+    assert registry.get("a") is first
+    assert registry.stats()["lru_order"] == ["b", "c", "a"]
+
+    registry.get("d")
+    stats = registry.stats()
+    assert stats["lru_order"] == ["a", "d"]
+    assert stats["memory_used_mb"] == 2.5
+    assert [(e["event"], e["model"]) for e in stats["events"]] == [
+        ("load", "a"), ("load", "b"), ("load", "c"), ("load", "d"), ("evict", "b"), ("evict", "c")
+    ]
+    assert stats["models"]["b"]["evictions"] == 1 and not stats["models"]["b"]["loaded"]
+    assert stats["models"]["a"]["loads"] == 1
+
+    # 退避した階層は次の利用時に読み込み直す
+    registry.get("b")
+    assert registry.stats()["models"]["b"]["loads"] == 2
+    print("✓ メモリ予算を超えた階層をLRUで退避しました")
+
+
+def test_oversized_model_is_kept():
+    """予算より大きい階層も直近に使ったものは残す"""
+    registry = ModelRegistry({"small": fake(1), "huge": fake(10)}, 4 * MB, loader=fake_loader)
+    registry.get("small")
+    registry.get("huge")
+    assert registry.stats()["lru_order"] == ["huge"]
+    print("✓ 予算超過の階層も利用中は保持しました")
+
+
+def test_concurrent_get_loads_once():
+    """同じ階層を同時に要求しても読み込みは1回"""
+    registry = ModelRegistry({"slow": fake(1, delay=0.2)}, 4 * MB, loader=fake_loader)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get("slow"))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(result) for result in results}) == 1
+    assert registry.stats()["models"]["slow"]["loads"] == 1
+    print("✓ 同時の要求でも読み込みは1回でした")
+
+
+def test_default_normalizer_is_shared_and_counted():
+    """既定の正規化器は予算に含めて退避せず、同じ定義の階層は既定の正規化器を共有する"""
+    registry = ModelRegistry({"accurate": fake(2), "other": fake(1.5), "extra": fake(1)}, 4 * MB,
+                             loader=fake_loader, default_spec=fake(2))
+    default = registry.get_default()
+    assert registry.get("accurate") is default and registry.get_default() is default
+    stats = registry.stats()
+    assert stats["default"]["loaded"] and stats["memory_used_mb"] == 2.0
+    assert stats["models"]["accurate"]["shared_with_default"] and stats["models"]["accurate"]["loaded"]
+    assert stats["lru_order"] == []
+    assert [(e["event"], e["model"]) for e in stats["events"]] == [("load", "default")]
+
+    # 既定の正規化器の分も数えて予算を超えたら階層を退避する（既定の正規化器は残す）
+    registry.get("other")
+    registry.get("extra")
+    stats = registry.stats()
+    assert stats["lru_order"] == ["extra"] and stats["memory_used_mb"] == 3.0
+    assert stats["models"]["other"]["evictions"] == 1
+    assert registry.loaded_normalizers()[0] is default
+
+    # 既定の階層定義のうち、プロセスの既定と同じモデルの階層だけを共有する（省略された既定値は補って比較）
+    for default_spec, expected in (({"backend": "transformer"}, {"accurate"}),
+                                   ({"backend": "transformer", "model_name": "paraphrase-MiniLM-L3-v2"}, {"fast"}),
+                                   ({"backend": "tfidf"}, {"light"}),
+                                   ({"backend": "static", "path": "./static-minilm"}, set())):
+        stats = ModelRegistry(DEFAULT_MODEL_TIERS, 64 * MB, default_spec=default_spec).stats()
+        assert {name for name, usage in stats["models"].items() if usage["shared_with_default"]} == expected
+
+    saved = {key: os.environ.get(key) for key in ("NORMALIZER_BACKEND", "USE_SMALL_MODEL")}
+    try:
+        os.environ.pop("NORMALIZER_BACKEND", None)
+        os.environ["USE_SMALL_MODEL"] = "true"
+        assert default_normalizer_spec() == {"backend": "transformer", "model_name": "paraphrase-MiniLM-L3-v2"}
+        os.environ["NORMALIZER_BACKEND"] = "tfidf"
+        assert default_normalizer_spec() == {"backend": "tfidf"}
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+    print("✓ 既定の正規化器を予算に含めて共有しました")
+
+
+def test_model_tier_context():
+    """model_tierで階層を指定し、未知の階層はValueError、レイテンシは階層ごとに記録する"""
+    saved = model_registry._model_registry
+    model_registry._model_registry = ModelRegistry({"fast": fake(1)}, 4 * MB, loader=fake_loader)
+    try:
+        assert current_model_tier() is None
+        with model_tier(None):
+            assert current_model_tier() is None
+        with model_tier("fast"):
+            assert current_model_tier() == "fast"
+            with normalizer_timer():
+                time.sleep(0.01)
+        assert current_model_tier() is None
+        try:
+            with model_tier("unknown"):
+                pass
+            raise AssertionError("ValueError expected")
+        except ValueError:
+            pass
+        usage = model_registry._model_registry.stats()["models"]["fast"]
+        assert usage["calls"] == 1 and usage["mean_latency_ms"] >= 10
+    finally:
+        model_registry._model_registry = saved
+    print("✓ リクエストごとにモデル階層を指定しました")
+
+
+def test_server_default_normalizer_comes_from_registry():
+    """モデル階層を指定しないリクエストの正規化器も登録簿の既定の正規化器（サーバーと抽出処理で共有）"""
+    server = importlib.import_module("mcp_threat_extraction.server")
+    from mcp_threat_extraction import threat_extraction
+
+    saved = (model_registry._model_registry, threat_extraction.semantic_normalizer)
+    model_registry._model_registry = ModelRegistry({"light": {"backend": "tfidf"}}, 64 * MB,
+                                                   default_spec={"backend": "tfidf"})
+    threat_extraction.semantic_normalizer = None
+    try:
+        default = server.get_semantic_normalizer()
+        assert threat_extraction.get_semantic_normalizer() is default
+        with model_tier("light"):
+            assert server.get_semantic_normalizer() is default
+        stats = model_registry._model_registry.stats()
+        assert stats["default"]["loaded"] and stats["memory_used_mb"] == stats["default"]["memory_mb"]
+        assert [event["model"] for event in stats["events"]] == ["default"]
+    finally:
+        model_registry._model_registry, threat_extraction.semantic_normalizer = saved
+    print("✓ 既定の正規化器を登録簿から共有しました")
+
+
+def test_endpoints_with_model_tier():
+    """HTTPリクエストのmodel_tierで登録簿の正規化器を使い、/metrics/modelsで状態を確認できる"""
+    from fastapi.testclient import TestClient
+    server = importlib.import_module("mcp_threat_extraction.server")
+
+    saved = model_registry._model_registry
+    model_registry._model_registry = ModelRegistry({"light": {"backend": "tfidf"}}, 64 * MB,
+                                                   default_spec={"backend": "transformer"})
+    try:
+        with TestClient(server.app) as client:
+            response = client.post("/normalize_features",
+                                   json={"attack_vector": "USBメモリ", "data_types": ["MRI画像"], "model_tier": "light"})
+            assert response.status_code == 200, response.text
+            body = response.json()
+            assert body["attack_vector"]["normalized"] == "usb"
+            assert body["data_types"]["normalized"] == ["diagnostic_imaging"]
+
+            response = client.post("/extract_data_types",
+                                   json={"text": "電子カルテから患者の個人情報が漏洩する", "model_tier": "light"})
+            assert response.json()["extracted_data_types"] == ["personal_medical"]
+
+            response = client.post("/normalize_features", json={"attack_vector": "USB", "model_tier": "unknown"})
+            assert response.status_code == 400
+
+            stats = client.get("/metrics/models").json()
+            assert stats["models"]["light"]["loaded"] and stats["models"]["light"]["calls"] == 2
+            assert stats["events"][0]["event"] == "load" and stats["events"][0]["model"] == "light"
+            assert 'mcp_normalizer_duration_seconds_count{model="light"}' in client.get("/metrics").text
+    finally:
+        model_registry._model_registry = saved
+    print("✓ エンドポイントでモデル階層を指定しました")
+
+
+if __name__ == "__main__":
+    test_lru_eviction_within_budget()
+    test_oversized_model_is_kept()
+    test_concurrent_get_loads_once()
+    test_default_normalizer_is_shared_and_counted()
+    test_model_tier_context()
+    test_server_default_normalizer_comes_from_registry()
+    test_endpoints_with_model_tier()
+    print("\n✅ すべてのテストが成功しました！")
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+プロセスプールのテストスクリプト
+ワーカープロセスでのシャード処理がプロセス内の計算と一致し、入力順に結合されることを確認します
+"""
+
+import io
+import sys
+import json
+import asyncio
+import tempfile
+from pathlib import Path
+
+# プロジェクトのルートを追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+from mcp_threat_extraction.batch import run_batch
+from mcp_threat_extraction.process_pool import ShardProcessPool, score_shard
+from mcp_threat_extraction.threat_data import ASSET_CLASSIFICATION
+
+ATTACK_VECTORS = ["network", "usb", "wireless", "local", "physical"]
+IMPACT_TYPES = ["機密性重視", "完全性重視", "可用性重視"]
+
+
+def make_items(count: int) -> list:
+    """正規化済みの特徴（LLM・正規化器なしで評価できる入力）"""
+    devices = [device for asset in ASSET_CLASSIFICATION.values() for device in asset["devices"]]
+    items = []
+    for i in range(count):
+        features = {
+            "attack_vector": ATTACK_VECTORS[i % len(ATTACK_VECTORS)],
+            "device_type": devices[i % len(devices)],
+            "attack_type": ["マルウェア", "改ざん", "DoS攻撃"][i % 3],
+            "requires_authentication": i % 2 == 0,
+            "requires_user_interaction": i % 3 == 0,
+            "asset_category": "",
+            "data_type": [["personal_medical"], ["device_configuration"], ["vital_biometric"]][i % 3],
+            "impact_type": [IMPACT_TYPES[i % len(IMPACT_TYPES)]]
+        }
+        items.append((f"脅威{i}: {features['device_type']}への{features['attack_type']}", None, features))
+    return items
+
+
+def test_pool_matches_in_process_scoring():
+    """ワーカーの結果はプロセス内の計算と同じで、シャードの順序が保たれる"""
+    items = make_items(40)
+    expected = score_shard(items, "ids", compact=True)
+    shards = [items[i:i + 7] for i in range(0, len(items), 7)]
+
+    with ShardProcessPool(workers=2) as pool:
+        assert pool.warm_up() >= 1
+        merged = [result for shard_results in pool.map(shards, "ids", compact=True) for result in shard_results]
+
+    assert merged == expected
+    assert all("threat_description" not in result and "extracted_features" not in result for result in merged)
+    assert {"base_score", "severity"} <= set(merged[0]["cvss_metrics"])
+
+
+def test_batch_with_workers():
+    """--workers指定のバッチは全行を入力順の内容で出力し、特徴のない行はエラーにする"""
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path, output_path = Path(tmp) / "in.jsonl", Path(tmp) / "out.jsonl"
+        items = make_items(25)
+        with open(input_path, "w", encoding="utf-8") as f:
+            for i, (threat, _, features) in enumerate(items):
+                f.write(json.dumps({"id": i, "threat_description": threat, "extracted_features": features},
+                                   ensure_ascii=False) + "\n")
+            f.write(json.dumps({"id": "no-features", "threat_description": "特徴なし"}, ensure_ascii=False) + "\n")
+
+        summary = asyncio.run(run_batch(str(input_path), str(output_path), workers=2, shard_size=4,
+                                        explain="none", progress_stream=io.StringIO()))
+
+        with open(output_path, encoding="utf-8") as f:
+            results = {r["line"]: r for r in map(json.loads, f)}
+        expected = score_shard(items, "none")
+        assert sorted(results) == list(range(26))
+        for i in range(25):
+            assert results[i]["id"] == i
+            assert results[i]["threat_description"] == items[i][0]
+            assert results[i]["cvss_metrics"] == expected[i]["cvss_metrics"]
+        assert "LLM抽出済みの特徴" in results[25]["error"]
+        assert summary["completed"] == 26 and summary["errors"] == 1
+
+
+if __name__ == "__main__":
+    test_pool_matches_in_process_scoring()
+    test_batch_with_workers()
+    print("✅ すべてのテストが成功しました！")
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+参照文ファイルと再読み込みのテストスクリプト
+追加・変更された参照文だけを再計算し、処理中の検索を止めずに参照行列を入れ替えることを確認します
+"""
+
+import os
+import sys
+import json
+import zlib
+import tempfile
+import threading
+import importlib
+from pathlib import Path
+
+import numpy as np
+
+os.environ.setdefault("DISABLE_AUTH", "true")
+
+# プロジェクトのルートを追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+from mcp_threat_extraction.semantic_normalizer_optimized import (
+    OptimizedSemanticNormalizer, load_reference_corpora, DEFAULT_REFERENCE_CORPORA_PATH
+)
+
+
+class BigramEncoder:
+    """文字bigramのハッシュによる決定的なエンコーダー（テスト用、エンコードした文を記録する）"""
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, normalize_embeddings=False):
+        self.encoded.extend(texts)
+        vectors = np.zeros((len(texts), 128), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for i in range(len(text) - 1):
+                vectors[row, zlib.crc32(text[i:i + 2].encode("utf-8")) % 128] += 1.0
+        if normalize_embeddings:
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors
+
+
+def write_corpora(path: Path, corpora: dict) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(corpora, f, ensure_ascii=False)
+
+
+def test_default_corpora():
+    """同梱の参照文ファイルに3種別のカテゴリがそろっている"""
+    corpora = load_reference_corpora(str(DEFAULT_REFERENCE_CORPORA_PATH))
+    assert len(corpora["data_type"]) == 7
+    assert set(corpora["attack_vector"]) == {"network", "usb", "wireless", "local", "physical"}
+    assert set(corpora["impact_type"]) == {"機密性重視", "完全性重視", "可用性重視"}
+    print(f"✓ 参照文ファイル version={corpora['version']}")
+
+
+def test_reload_reembeds_only_changes():
+    """再読み込みでは追加・変更された参照文だけをエンコードし、旧スナップショットはそのまま残る"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "corpora.json"
+        corpora = load_reference_corpora(str(DEFAULT_REFERENCE_CORPORA_PATH))
+        write_corpora(path, corpora)
+
+        encoder = BigramEncoder()
+        normalizer = OptimizedSemanticNormalizer(references_path=str(path), model=encoder)
+        total = len({t for kind in ("data_type", "attack_vector", "impact_type")
+                     for texts in corpora[kind].values() for t in texts})
+        assert len(encoder.encoded) == total
+        assert normalizer.find_best_match("USBメモリを使用したマルウェア攻撃", "attack_vector") == "usb"
+
+        old_snapshot = normalizer._snapshot
+        corpora["version"] = 2
+        corpora["attack_vector"]["usb"][0] = "USBメモリ経由のマルウェア感染"
+        corpora["attack_vector"]["usb"].append("USBメモリからのランサムウェア侵入")
+        write_corpora(path, corpora)
+        encoder.encoded.clear()
+        summary = normalizer.reload_references()
+
+        assert sorted(encoder.encoded) == sorted(["USBメモリ経由のマルウェア感染", "USBメモリからのランサムウェア侵入"])
+        assert summary["previous_version"] == 1 and summary["version"] == 2
+        assert summary["added"] == 2 and summary["removed"] == 1 and summary["reembedded"] == 2
+        assert summary["changed_categories"] == ["attack_vector_usb"]
+        assert normalizer.embeddings_cache["attack_vector_usb"].shape[0] == 8
+        assert old_snapshot.embeddings["attack_vector_usb"].shape[0] == 7
+        assert normalizer.find_best_match("USBメモリからのランサムウェア侵入", "attack_vector") == "usb"
+
+        # 不正なファイルは読み込まず、現在の参照文を使い続ける
+        corpora["impact_type"]["可用性重視"] = []
+        write_corpora(path, corpora)
+        try:
+            normalizer.reload_references()
+            raise AssertionError("ValueError expected")
+        except ValueError:
+            pass
+        assert normalizer.corpora_version == 2
+    print("✓ 変更された参照文だけを再計算しました")
+
+
+def test_reload_while_matching():
+    """再読み込み中も検索が失敗しない"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "corpora.json"
+        corpora = load_reference_corpora(str(DEFAULT_REFERENCE_CORPORA_PATH))
+        write_corpora(path, corpora)
+        normalizer = OptimizedSemanticNormalizer(references_path=str(path), model=BigramEncoder())
+
+        errors, stop = [], threading.Event()
+
+        def match_loop():
+            while not stop.is_set():
+                try:
+                    assert normalizer.find_best_match("物理的機器への直接攻撃", "attack_vector") == "physical"
+                except Exception as e:
+                    errors.append(e)
+
+        threads = [threading.Thread(target=match_loop) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for i in range(20):
+            corpora["version"] = i + 2
+            corpora["data_type"]["public_research"] = [f"公開研究データ{i}", "匿名化された研究統計データ"]
+            write_corpora(path, corpora)
+            normalizer.reload_references()
+        stop.set()
+        for thread in threads:
+            thread.join()
+        assert not errors, errors[:1]
+    print("✓ 検索を止めずに参照行列を入れ替えました")
+
+
+def test_reload_endpoint():
+    """POST /reference_corpora/reloadで読み込み済みの正規化器を再読み込みする"""
+    from fastapi.testclient import TestClient
+    server = importlib.import_module("mcp_threat_extraction.server")
+    from mcp_threat_extraction import threat_extraction
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "corpora.json"
+        corpora = load_reference_corpora(str(DEFAULT_REFERENCE_CORPORA_PATH))
+        write_corpora(path, corpora)
+        os.environ["REFERENCE_CORPORA_PATH"] = str(path)
+        saved = threat_extraction.semantic_normalizer
+        threat_extraction.semantic_normalizer = OptimizedSemanticNormalizer(model=BigramEncoder())
+        try:
+            corpora["version"] = 3
+            corpora["impact_type"]["可用性重視"].append("医療機器の停止による診療の中断")
+            write_corpora(path, corpora)
+            with TestClient(server.app) as client:
+                response = client.post("/reference_corpora/reload")
+                assert response.status_code == 200, response.text
+                body = response.json()
+                assert body["version"] == 3 and body["reembedded"] == 1
+                assert body["changed_categories"] == ["impact_type_可用性重視"]
+
+                path.write_text("{}", encoding="utf-8")
+                assert client.post("/reference_corpora/reload").status_code == 400
+            assert threat_extraction.semantic_normalizer.corpora_version == 3
+        finally:
+            threat_extraction.semantic_normalizer = saved
+            del os.environ["REFERENCE_CORPORA_PATH"]
+    print("✓ エンドポイントから再読み込みしました")
+
+
+if __name__ == "__main__":
+    test_default_corpora()
+    test_reload_reembeds_only_changes()
+    test_reload_while_matching()
+    test_reload_endpoint()
+    print("\n✅ すべてのテストが成功しました！")
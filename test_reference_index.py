@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+参照文索引のテストスクリプト
+総当たり索引が従来の線形走査と同じ結果を返し、IVF索引が近傍クラスタの探索で同じカテゴリを判定することを確認します
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# プロジェクトのルートを追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+from mcp_threat_extraction.reference_index import (
+    BruteForceIndex, IVFIndex, build_reference_index, normalize_rows
+)
+
+CATEGORIES = ["a", "b", "c", "d"]
+
+
+def make_clustered(count: int, rng: np.random.Generator):
+    """カテゴリごとにまとまった正規化済みベクトル"""
+    centers = normalize_rows(rng.standard_normal((len(CATEGORIES), 32)))
+    labels = rng.integers(0, len(CATEGORIES), count)
+    vectors = normalize_rows(centers[labels] + 0.5 * normalize_rows(rng.standard_normal((count, 32))))
+    return vectors, labels, centers
+
+
+def test_brute_force_matches_linear_scan():
+    """カテゴリごとの最大類似度が線形走査と一致する"""
+    rng = np.random.default_rng(0)
+    vectors, labels, _ = make_clustered(500, rng)
+    index = BruteForceIndex(vectors, labels, CATEGORIES)
+    for query in normalize_rows(rng.standard_normal((20, 32))):
+        expected = [np.max(vectors[labels == label] @ query) for label in range(len(CATEGORIES))]
+        assert np.allclose(index.label_scores(query), expected, atol=1e-6)
+    print("✓ 総当たり索引は線形走査と同じ類似度を返します")
+
+
+def test_ivf_recall():
+    """IVFは全クラスタを探索すれば厳密、既定の探索数でも最良カテゴリが一致する"""
+    rng = np.random.default_rng(1)
+    vectors, labels, centers = make_clustered(5000, rng)
+    brute = BruteForceIndex(vectors, labels, CATEGORIES)
+    queries = normalize_rows(centers[rng.integers(0, len(CATEGORIES), 200)]
+                             + 0.5 * normalize_rows(rng.standard_normal((200, 32))))
+
+    exhaustive = IVFIndex(vectors, labels, CATEGORIES, nprobe=10 ** 6)
+    assert exhaustive.nprobe == exhaustive.nlist
+    for query in queries[:20]:
+        assert np.allclose(exhaustive.label_scores(query), brute.label_scores(query), atol=1e-6)
+
+    ivf = IVFIndex(vectors, labels, CATEGORIES, nprobe=8)
+    assert ivf.nlist == int(np.sqrt(5000)) and len(ivf) == 5000
+    agreement = np.mean([np.argmax(ivf.label_scores(q)) == np.argmax(brute.label_scores(q)) for q in queries])
+    assert agreement >= 0.95, agreement
+    print(f"✓ IVFの最良カテゴリ一致率 {agreement:.3f}")
+
+
+def test_build_reference_index_selection():
+    """autoは件数で索引を選び、REFERENCE_INDEXで固定できる"""
+    rng = np.random.default_rng(2)
+    vectors, labels, _ = make_clustered(300, rng)
+    assert build_reference_index(vectors, labels, CATEGORIES).kind == "brute"
+    assert build_reference_index(vectors, labels, CATEGORIES, kind="ivf", nprobe=2).nprobe == 2
+
+    os.environ["REFERENCE_INDEX_IVF_MIN_SIZE"] = "100"
+    try:
+        assert build_reference_index(vectors, labels, CATEGORIES).kind == "ivf"
+    finally:
+        del os.environ["REFERENCE_INDEX_IVF_MIN_SIZE"]
+
+    try:
+        build_reference_index(vectors, labels, CATEGORIES, kind="hnsw")
+        raise AssertionError("ValueError expected")
+    except ValueError:
+        pass
+    print("✓ 件数と設定に応じて索引を選択しました")
+
+
+if __name__ == "__main__":
+    test_brute_force_matches_linear_scan()
+    test_ivf_recall()
+    test_build_reference_index_selection()
+    print("\n✅ すべてのテストが成功しました！")
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+分析結果ストアのテストスクリプト
+評価結果の保存、条件検索とページング、ロジックパスの復元、索引の利用を確認します
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# プロジェクトのルートを追加
+sys.path.insert(0, str(Path(__file__).parent))
+os.environ.setdefault("DISABLE_AUTH", "true")
+
+from fastapi.testclient import TestClient
+
+from mcp_threat_extraction.result_store import ResultStore, description_hash
+from mcp_threat_extraction.server import app
+from mcp_threat_extraction.threat_extraction import build_cvss_result
+
+FEATURES = [
+    {"attack_vector": "network", "device_type": "PACS", "attack_type": "不正アクセス", "requires_authentication": False,
+     "requires_user_interaction": False, "asset_category": "", "data_type": ["diagnostic_imaging"],
+     "impact_type": ["機密性重視"]},
+    {"attack_vector": "usb", "device_type": "輸液ポンプ", "attack_type": "マルウェア", "requires_authentication": True,
+     "requires_user_interaction": True, "asset_category": "", "data_type": ["medication_protocol"],
+     "impact_type": ["完全性重視"]},
+]
+
+
+def test_results_are_stored_and_queryable():
+    """build_cvss_resultの結果が保存され、条件・ページングで検索できる"""
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["RESULT_STORE_PATH"] = str(Path(tmp) / "analyses.db")
+        try:
+            results = []
+            for i in range(12):
+                features = dict(FEATURES[i % 2])
+                results.append(build_cvss_result(features, f"脅威{i}: {features['device_type']}", explain="full"))
+
+            with TestClient(app) as client:
+                page = client.get("/analyses", params={"device_type": "PACS", "limit": 4}).json()
+                assert len(page["items"]) == 4 and page["next_cursor"] is not None
+                assert [item["threat_description"] for item in page["items"]] == ["脅威10: PACS", "脅威8: PACS",
+                                                                                  "脅威6: PACS", "脅威4: PACS"]
+                rest = client.get("/analyses", params={"device_type": "PACS", "cursor": page["next_cursor"]}).json()
+                assert len(rest["items"]) == 2 and rest["next_cursor"] is None
+
+                usb = client.get("/analyses", params={"attack_vector": "usb", "limit": 1}).json()["items"][0]
+                assert usb["cvss_metrics"] == results[11]["cvss_metrics"]
+                assert usb["description_hash"] == description_hash("脅威11: 輸液ポンプ")
+
+                detail = client.get(f"/analyses/{usb['id']}").json()
+                assert detail["logic_tree_paths"] == results[11]["logic_tree_paths"]
+                assert detail["extracted_features"]["device_type"] == "輸液ポンプ"
+                assert "logic_tree_paths" not in client.get(f"/analyses/{usb['id']}", params={"explain": "none"}).json()
+                assert client.get("/analyses/999999").status_code == 404
+
+                high = client.get("/analyses", params={"min_score": results[0]["cvss_metrics"]["base_score"]}).json()
+                assert all(item["cvss_metrics"]["base_score"] >= results[0]["cvss_metrics"]["base_score"]
+                           for item in high["items"])
+        finally:
+            del os.environ["RESULT_STORE_PATH"]
+
+        with TestClient(app) as client:
+            assert client.get("/analyses").status_code == 503
+
+
+def test_filters_use_indexes():
+    """絞り込み条件ごとに索引が使われる（全件走査にならない）"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ResultStore(str(Path(tmp) / "analyses.db"))
+        for filters in ({"device_type": "PACS"}, {"severity": "High", "cursor": 100},
+                        {"description_hash": "x"}, {"attack_vector": "usb"}):
+            plan = store.explain_query(**filters)
+            assert "USING INDEX" in plan or "USING COVERING INDEX" in plan, (filters, plan)
+        # スコア・期間の範囲条件はそれぞれの索引で絞り込む
+        for filters, index in (({"min_score": 7.0}, "idx_analyses_score"),
+                               ({"min_score": 4.0, "max_score": 7.0}, "idx_analyses_score"),
+                               ({"since": 1700000000.0}, "idx_analyses_created"),
+                               ({"since": 1700000000.0, "until": 1800000000.0}, "idx_analyses_created")):
+            plan = store.explain_query(**filters)
+            assert index in plan and "SCAN analyses" not in plan, (filters, plan)
+
+
+if __name__ == "__main__":
+    test_results_are_stored_and_queryable()
+    test_filters_use_indexes()
+    print("✅ すべてのテストが成功しました！")
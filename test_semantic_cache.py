@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+意味キャッシュ（言い換えた脅威記述文での特徴の再利用）のテスト
+"""
+
+import os
+import sys
+import asyncio
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+# プロジェクトのルートを追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+from mcp_threat_extraction import semantic_cache
+from mcp_threat_extraction.semantic_cache import VectorIndex, SemanticFeatureCache
+
+FEATURES = {
+    "attack_vector": "usb",
+    "device_type": "輸液ポンプ",
+    "attack_type": "マルウェア感染",
+    "requires_authentication": False,
+    "requires_user_interaction": True,
+    "asset_category": "",
+    "data_type": ["medication_protocol"],
+    "impact_type": ["完全性重視"]
+}
+
+
+def bigram_embed(texts):
+    """文字bigramのハッシュによる決定的なエンベディング（テスト用、L2正規化済み）"""
+    vectors = np.zeros((len(texts), 64), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for i in range(len(text) - 1):
+            vectors[row, zlib.crc32(text[i:i + 2].encode("utf-8")) % 64] += 1.0
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_vector_index_search_and_wrap():
+    """総当たり検索がブロックをまたいで最大類似度を返し、上限で古いものから上書きする"""
+    print("=== ベクトル索引のテスト ===")
+    index = VectorIndex(dim=4, max_size=3, block_size=2)
+    assert index.search(np.array([1, 0, 0, 0])) == (-1, -1.0)
+    for vector in ([1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0]):
+        index.add(np.array(vector, dtype=np.float32))
+    slot, score = index.search(np.array([0, 0, 1, 0], dtype=np.float32))
+    assert (slot, round(score, 3)) == (2, 1.0)
+    assert index._vectors.dtype == np.float16
+
+    assert index.add(np.array([0, 0, 0, 1], dtype=np.float32)) == 0
+    assert len(index) == 3
+    assert index.search(np.array([1, 0, 0, 0], dtype=np.float32))[1] < 0.5
+    print("✓ 検索と上書きが正しく動作します")
+
+
+def test_cache_hit_for_paraphrase():
+    """閾値以上の言い換えは一致し、無関係な記述文は一致しない"""
+    print("=== 言い換えの一致テスト ===")
+    cache = SemanticFeatureCache(bigram_embed, threshold=0.8)
+    original = "USBメモリ経由で輸液ポンプにマルウェアを感染させる"
+    match, embedding = cache.lookup(original)
+    assert match is None and cache.misses == 1
+    cache.add(original, FEATURES, embedding)
+
+    match, _ = cache.lookup("USBメモリ経由で輸液ポンプにマルウェアを感染させた")
+    assert match is not None
+    assert match["matched_description"] == original
+    assert 0.8 <= match["similarity"] <= 1.0
+    assert match["features"] == FEATURES and match["features"] is not FEATURES
+
+    match, _ = cache.lookup("院内ネットワークからPACSの画像を盗聴する")
+    assert match is None
+    assert (cache.hits, cache.misses) == (1, 2)
+    print(f"✓ 言い換えのみ一致しました（hits={cache.hits}, misses={cache.misses}）")
+
+
+def test_lookup_during_clear():
+    """検索中にclearされても旧索引の位置で記述文を引かず、不一致として扱う"""
+    print("=== 検索中の削除のテスト ===")
+    cache = SemanticFeatureCache(bigram_embed, threshold=0.8)
+    original = "USBメモリ経由で輸液ポンプにマルウェアを感染させる"
+    cache.add(original, FEATURES, bigram_embed([original])[0])
+
+    index = cache._index
+    search = index.search
+
+    def search_then_clear(query):
+        result = search(query)
+        cache.clear()
+        return result
+
+    index.search = search_then_clear
+    match, _ = cache.lookup(original)
+    assert match is None and (cache.hits, cache.misses) == (0, 1)
+    assert len(cache) == 0
+    print("✓ 検索中に削除されても不一致として扱いました")
+
+
+def test_calculate_cvss_async_reuses_features():
+    """キャッシュに一致した場合はLLMを呼ばずに評価し、一致した記述文と類似度を返す"""
+    print("=== LLM呼び出しの省略テスト ===")
+    import importlib
+    server = importlib.import_module("mcp_threat_extraction.server")
+
+    cache = SemanticFeatureCache(bigram_embed, threshold=0.8)
+    original = "USBメモリ経由で輸液ポンプにマルウェアを感染させる"
+    cache.add(original, FEATURES, bigram_embed([original])[0])
+
+    def fail_llm(threat_description):
+        raise AssertionError("LLM should not be called")
+
+    os.environ["SEMANTIC_CACHE"] = "on"
+    saved_cache, saved_extract = semantic_cache._semantic_cache, server.extract_raw_features
+    semantic_cache._semantic_cache = cache
+    server.extract_raw_features = fail_llm
+    try:
+        paraphrase = "USBメモリ経由で輸液ポンプにマルウェアを感染させた"
+        result = asyncio.run(server.calculate_cvss_async(paraphrase, "none"))
+    finally:
+        semantic_cache._semantic_cache = saved_cache
+        server.extract_raw_features = saved_extract
+        os.environ.pop("SEMANTIC_CACHE", None)
+
+    assert result["threat_description"] == paraphrase
+    assert result["semantic_cache"]["matched_description"] == original
+    assert result["semantic_cache"]["similarity"] >= 0.8
+    assert result["extracted_features"]["device_type"] == "輸液ポンプ"
+    assert "base_score" in result["cvss_metrics"]
+    print(f"✓ キャッシュの特徴で評価しました（類似度 {result['semantic_cache']['similarity']}）")
+
+
+def test_cache_disabled_by_default():
+    """SEMANTIC_CACHEを設定しなければ無効"""
+    os.environ.pop("SEMANTIC_CACHE", None)
+    assert semantic_cache.get_semantic_cache() is None
+
+
+if __name__ == "__main__":
+    test_vector_index_search_and_wrap()
+    test_cache_hit_for_paraphrase()
+    test_lookup_during_clear()
+    test_calculate_cvss_async_reuses_features()
+    test_cache_disabled_by_default()
+    print("\n✅ すべてのテストが成功しました！")
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+HTTPレスポンス整形のテストスクリプト
+バッチ結果のfields射影・compact指定、gzip圧縮、メトリクス出力を確認します
+"""
+
+import importlib
+import json
+import os
+import sys
+from pathlib import Path
+
+# プロジェクトのルートを追加
+sys.path.insert(0, str(Path(__file__).parent))
+os.environ.setdefault("DISABLE_AUTH", "true")
+
+from fastapi.testclient import TestClient
+
+from mcp_threat_extraction.server import app, parse_field_paths, project_fields, shape_batch_result
+
+
+RESULT = {
+    "threat_description": "外部からPACSの画像が改ざんされた",
+    "extracted_features": {"device_type": "PACS"},
+    "cvss_metrics": {"attack_vector": "N", "base_score": 7.5, "severity": "High"},
+    "logic_tree_paths": {"scope": {"decision_tree": "..."}}
+}
+
+
+def test_field_projection():
+    """ドット区切りのパスで入れ子構造を保ったまま射影する"""
+    paths = parse_field_paths("cvss_metrics.base_score, cvss_metrics.severity,missing.key")
+    assert project_fields(RESULT, paths) == {"cvss_metrics": {"base_score": 7.5, "severity": "High"}}
+    assert parse_field_paths(["threat_description"]) == [("threat_description",)]
+    assert parse_field_paths("") is None
+
+    try:
+        parse_field_paths("cvss_metrics..base_score")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("ValueError expected for empty path segment")
+
+
+def test_compact_results():
+    """compactでは記述文・抽出特徴を省き、エラーは常に残す"""
+    assert shape_batch_result(RESULT, None, True) == {
+        "cvss_metrics": RESULT["cvss_metrics"],
+        "logic_tree_paths": RESULT["logic_tree_paths"]
+    }
+    assert shape_batch_result(RESULT, None, False) is RESULT
+
+    error = {"threat_description": "...", "error": "timeout"}
+    assert shape_batch_result(error, parse_field_paths("cvss_metrics.base_score"), True) == {"error": "timeout"}
+
+
+def test_large_responses_are_gzipped():
+    """閾値を超えるレスポンスはAccept-Encodingに応じて圧縮される"""
+    vectors = ["CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:H/A:H"] * 2000
+    with TestClient(app) as client:
+        response = client.post("/score_cvss_vectors", json={"vectors": vectors},
+                               headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        assert len(response.json()["base_scores"]) == 2000
+
+        small = client.post("/score_cvss_vectors", json={"vectors": vectors[:1]},
+                            headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in small.headers
+
+
+def test_prometheus_metrics():
+    """ツール呼び出しの成否とレイテンシがPrometheus形式で出力される"""
+    with TestClient(app) as client:
+        client.post("/score_cvss_vectors", json={"vectors": ["CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:H/A:H"]})
+        client.post("/score_cvss_vectors", json={"vectors": ["invalid"]})
+        response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    lines = response.text.splitlines()
+    for expected in ('mcp_tool_requests_total{status="success",tool="score_cvss_vectors"}',
+                     'mcp_tool_requests_total{status="error",tool="score_cvss_vectors"}',
+                     'mcp_tool_duration_seconds_count{tool="score_cvss_vectors"}',
+                     'mcp_tool_requests_in_flight{tool="score_cvss_vectors"} 0.0',
+                     'mcp_process_rss_bytes'):
+        assert any(line.startswith(expected) for line in lines), expected
+
+
+def test_input_errors_are_400_and_parser_errors_are_500():
+    """入力エラーだけを400にし、LLM応答の解析エラー（ValueErrorのサブクラス）は500のままにする"""
+    server = importlib.import_module("mcp_threat_extraction.server")
+
+    async def malformed_reply(threat_description, explain="full"):
+        raise json.JSONDecodeError("Expecting value", "not json", 0)
+
+    saved = server.calculate_cvss_async
+    server.calculate_cvss_async = malformed_reply
+    try:
+        with TestClient(app) as client:
+            response = client.post("/extract_cvss", json={"threat_description": "外部からPACSの画像が改ざんされた"})
+            assert response.status_code == 500, response.text
+
+            assert client.post("/extract_cvss", json={"threat_description": ""}).status_code == 400
+            assert client.post("/score_cvss_vectors", json={"vectors": ["invalid"]}).status_code == 400
+            response = client.post("/extract_cvss_batch", json={"threat_descriptions": ["..."], "fields": "a..b"})
+            assert response.status_code == 400
+    finally:
+        server.calculate_cvss_async = saved
+
+
+if __name__ == "__main__":
+    test_field_projection()
+    test_compact_results()
+    test_large_responses_are_gzipped()
+    test_prometheus_metrics()
+    test_input_errors_are_400_and_parser_errors_are_500()
+    print("✅ すべてのテストが成功しました！")
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+静的エンベディングのテストスクリプト
+埋め込み表の作成・メモリマップでの読み込み・平均プーリングと、正規化器のバックエンドとしての利用を確認します
+"""
+
+import os
+import sys
+import json
+import zlib
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from tokenizers import Tokenizer
+from tokenizers.models import WordLevel
+from tokenizers.pre_tokenizers import Whitespace
+
+# プロジェクトのルートを追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+from mcp_threat_extraction.static_embeddings import distill, StaticEmbeddingModel
+from mcp_threat_extraction.semantic_normalizer_optimized import OptimizedSemanticNormalizer, create_embedding_model
+
+WORDS = ["[UNK]", "usb", "memory", "stick", "wifi", "bluetooth", "wireless", "internet", "remote", "network",
+         "patient", "record", "image", "scan", "leak", "tamper", "outage", "stop", "device", "attack"]
+
+
+def make_tokenizer() -> Tokenizer:
+    tokenizer = Tokenizer(WordLevel({word: i for i, word in enumerate(WORDS)}, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = Whitespace()
+    return tokenizer
+
+
+def hash_encode(texts):
+    """文ごとに決まる乱数ベクトル（元モデルの代わり）"""
+    return np.stack([np.random.default_rng(zlib.crc32(t.encode("utf-8"))).standard_normal(16) for t in texts])
+
+
+def test_distill_and_mean_pooling():
+    """語彙の各トークンを1回ずつエンコードし、推論時はトークンの行を平均する"""
+    with tempfile.TemporaryDirectory() as tmp:
+        encoded = []
+
+        def encode(texts):
+            encoded.extend(texts)
+            return hash_encode(texts)
+
+        distill(make_tokenizer(), encode, tmp, source_model="test-model", batch_size=7)
+        assert encoded == WORDS
+        meta = json.loads((Path(tmp) / "static_embeddings.json").read_text())
+        assert meta == {"source_model": "test-model", "vocab_size": len(WORDS), "dim": 16, "pooling": "mean"}
+
+        model = StaticEmbeddingModel(tmp)
+        assert isinstance(model.embeddings, np.memmap)
+        assert model.get_sentence_embedding_dimension() == 16
+        vectors = model.encode(["usb memory", "", "unknownword"])
+        expected = hash_encode(["usb", "memory"]).astype(np.float16).astype(np.float32).mean(axis=0)
+        assert np.allclose(vectors[0], expected, atol=1e-3)
+        assert not vectors[1].any()
+        assert np.allclose(vectors[2], hash_encode(["[UNK]"])[0], atol=1e-2)
+        normalized = model.encode(["usb memory"], normalize_embeddings=True)
+        assert np.isclose(np.linalg.norm(normalized[0]), 1.0)
+    print("✓ 埋め込み表の作成と平均プーリングが正しく動作します")
+
+
+def test_normalizer_with_static_backend():
+    """静的エンベディングを正規化器のエンコーダーとして使える"""
+    with tempfile.TemporaryDirectory() as tmp:
+        distill(make_tokenizer(), hash_encode, tmp)
+        corpora = {
+            "version": 1,
+            "data_type": {"personal_medical": ["patient record"], "diagnostic_imaging": ["image scan"]},
+            "attack_vector": {"usb": ["usb memory stick"], "wireless": ["wifi bluetooth wireless"],
+                              "network": ["internet remote network"]},
+            "impact_type": {"機密性重視": ["leak"], "完全性重視": ["tamper"], "可用性重視": ["outage stop"]}
+        }
+        path = Path(tmp) / "corpora.json"
+        path.write_text(json.dumps(corpora, ensure_ascii=False), encoding="utf-8")
+
+        os.environ["STATIC_EMBEDDINGS_PATH"] = tmp
+        try:
+            normalizer = OptimizedSemanticNormalizer(references_path=str(path), backend="static")
+        finally:
+            del os.environ["STATIC_EMBEDDINGS_PATH"]
+        assert isinstance(normalizer.model, StaticEmbeddingModel)
+        assert normalizer.normalize_attack_vector("usb stick") == "usb"
+        assert normalizer.normalize_attack_vector("wireless bluetooth") == "wireless"
+        assert normalizer.normalize_data_types(["patient record"]) == ["personal_medical"]
+
+    try:
+        create_embedding_model("static", "all-MiniLM-L6-v2")
+        raise AssertionError("ValueError expected")
+    except ValueError:
+        pass
+    print("✓ 静的エンベディングで正規化しました")
+
+
+if __name__ == "__main__":
+    test_distill_and_mean_pooling()
+    test_normalizer_with_static_backend()
+    print("\n✅ すべてのテストが成功しました！")
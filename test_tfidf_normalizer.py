@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+文字n-gramのTF-IDF正規化のテストスクリプト
+参照文での学習・最近傍重心による判定・単件と一括の一致・torchを読み込まないことを確認します
+"""
+
+import os
+import sys
+import json
+import logging
+import tempfile
+import subprocess
+from pathlib import Path
+
+import numpy as np
+
+# プロジェクトのルートを追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+from mcp_threat_extraction.reference_index import CentroidIndex, normalize_rows
+from mcp_threat_extraction.semantic_normalizer_optimized import create_semantic_normalizer, load_reference_corpora
+from mcp_threat_extraction.tfidf_normalizer import TfidfSemanticNormalizer, CharTfidfEncoder
+
+
+def test_centroid_index():
+    """カテゴリの重心との類似度を返す"""
+    vectors = normalize_rows(np.array([[1.0, 0.0], [0.8, 0.6], [0.0, 1.0]]))
+    index = CentroidIndex(vectors, np.array([0, 0, 1]), ["a", "b"])
+    scores = index.label_scores(np.array([1.0, 0.0], dtype=np.float32))
+    assert len(index) == 3
+    assert np.isclose(scores[0], 0.9 / np.linalg.norm([0.9, 0.3]))
+    assert np.isclose(scores[1], 0.0)
+    print("✓ 重心索引のスコアが正しく計算されます")
+
+
+def test_tfidf_classification():
+    """同梱の参照文で学習し、短い値をカテゴリに判定する"""
+    normalizer = create_semantic_normalizer("tfidf")
+    assert isinstance(normalizer, TfidfSemanticNormalizer)
+    assert normalizer.backend == "tfidf"
+    assert normalizer.normalize_attack_vector("USBメモリ") == "usb"
+    assert normalizer.normalize_attack_vector("Bluetooth") == "wireless"
+    assert normalizer.normalize_attack_vector("") == "local"
+    assert sorted(normalizer.normalize_data_types(["MRI画像", "電子カルテ", "network"])) == [
+        "diagnostic_imaging", "personal_medical"
+    ]
+    assert normalizer.normalize_impact_types(["情報漏洩", "可用性重視"]) in (
+        ["機密性重視", "可用性重視"], ["可用性重視", "機密性重視"]
+    )
+    assert normalizer.extract_data_types_from_text("管理者の認証情報を盗んでアクセスログを消去する") == [
+        "operational_admin"
+    ]
+    print("✓ TF-IDFで短い値と記述文を判定しました")
+
+
+def test_single_and_batch_agree():
+    """一括のメソッドは単件のメソッドと同じ結果を返す"""
+    normalizer = TfidfSemanticNormalizer()
+    texts = ["インターネット経由", "", "USBポート", "院内Wi-Fi", "機器の盗難", "天気"]
+    batch = normalizer.find_best_matches(texts, "attack_vector")
+    assert batch == [normalizer.find_best_match(text, "attack_vector") for text in texts]
+    assert batch[1] is None
+    assert normalizer.find_best_matches(texts, "unknown_type") == [None] * len(texts)
+
+    descriptions = ["病院のネットワークに侵入してMRI画像を盗む", "ペースメーカーの設定パラメータを書き換える"]
+    assert normalizer.extract_data_types_from_texts(descriptions) == [
+        normalizer.extract_data_types_from_text(text) for text in descriptions
+    ]
+    assert normalizer.extract_data_types_from_texts([]) == []
+    print("✓ 単件と一括の結果が一致しました")
+
+
+def test_decision_debug_log():
+    """判定のDEBUGログはDEBUGが有効な時だけ出力し、入力と判定をextraに含める"""
+    class Capture(logging.Handler):
+        def __init__(self):
+            super().__init__()
+            self.records = []
+
+        def emit(self, record):
+            self.records.append(record)
+
+    normalizer = TfidfSemanticNormalizer()
+    decision_logger = logging.getLogger("mcp_threat_extraction.semantic_normalizer_optimized")
+    handler = Capture()
+    saved_level = decision_logger.level
+    decision_logger.addHandler(handler)
+    try:
+        decision_logger.setLevel(logging.INFO)
+        normalizer.find_best_matches(["USBメモリ"], "attack_vector")
+        assert handler.records == []
+
+        decision_logger.setLevel(logging.DEBUG)
+        normalizer.find_best_matches(["USBメモリ"], "attack_vector")
+        [record] = handler.records
+        assert record.getMessage() == "Normalizer decision: attack_vector 'USBメモリ' -> usb"
+        assert (record.category_type, record.input, record.decision) == ("attack_vector", "USBメモリ", "usb")
+        assert isinstance(record.score, float)
+    finally:
+        decision_logger.removeHandler(handler)
+        decision_logger.setLevel(saved_level)
+    print("✓ 判定のDEBUGログはDEBUG有効時のみ出力しました")
+
+
+def test_reload_refits_encoder():
+    """再読み込みでTF-IDFを学習し直し、旧スナップショットは旧エンコーダーのまま使える"""
+    corpora = load_reference_corpora()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "corpora.json"
+        path.write_text(json.dumps(corpora, ensure_ascii=False), encoding="utf-8")
+        normalizer = TfidfSemanticNormalizer(references_path=str(path))
+        old = normalizer._snapshot
+        assert normalizer.find_best_match("ペースメーカー", "attack_vector") is None
+
+        corpora["version"] = 2
+        corpora["attack_vector"]["physical"].append("ペースメーカーへの接触")
+        path.write_text(json.dumps(corpora, ensure_ascii=False), encoding="utf-8")
+        summary = normalizer.reload_references()
+        assert summary["added"] == 1
+        assert summary["reembedded"] == len(set().union(*normalizer._snapshot.sentences().values()))
+        assert normalizer._snapshot.encoder is not old.encoder
+        assert isinstance(old.encoder, CharTfidfEncoder)
+        assert normalizer.find_best_match("ペースメーカー", "attack_vector") == "physical"
+        # 旧スナップショットの索引は旧エンコーダーの次元のまま
+        assert old.indexes["attack_vector"].centroids.shape[1] == old.encoder.get_sentence_embedding_dimension()
+    print("✓ 再読み込みでTF-IDFを学習し直しました")
+
+
+def test_tfidf_backend_does_not_import_torch():
+    """NORMALIZER_BACKEND=tfidfでは正規化器を初期化してもtorchを読み込まない"""
+    code = (
+        "import sys, importlib\n"
+        "server = importlib.import_module('mcp_threat_extraction.server')\n"
+        "from mcp_threat_extraction.executors import get_cpu_executor\n"
+        "get_cpu_executor()\n"
+        "normalizer = server.get_semantic_normalizer()\n"
+        "assert normalizer.normalize_attack_vector('USBメモリ') == 'usb'\n"
+        "print(sorted(name for name in ('torch', 'sentence_transformers', 'transformers') if name in sys.modules))\n"
+    )
+    env = {**os.environ, "NORMALIZER_BACKEND": "tfidf", "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "dummy")}
+    result = subprocess.run([sys.executable, "-c", code], cwd=Path(__file__).parent, env=env,
+                            capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == "[]"
+    print("✓ tfidfバックエンドはtorchを読み込みません")
+
+
+if __name__ == "__main__":
+    test_centroid_index()
+    test_tfidf_classification()
+    test_single_and_batch_agree()
+    test_decision_debug_log()
+    test_reload_refits_encoder()
+    test_tfidf_backend_does_not_import_torch()
+    print("\n✅ すべてのテストが成功しました！")